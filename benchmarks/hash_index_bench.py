@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Compare HashIndex radius-search strategies (linear scan, multi-index hashing,
+BK-tree) on random 64-bit hashes.
+
+    python benchmarks/hash_index_bench.py
+    python benchmarks/hash_index_bench.py --sizes 10000 100000 --radii 6 16 --json out.json
+
+Queries are DB hashes with a few random bit flips (hits) mixed with fresh
+random hashes (misses), the same shape as attachment lookups against the
+pHash blocklist. BK-tree builds are pure Python, so large sizes take a while;
+use --bktree-max to cap them.
+"""
+from __future__ import annotations
+
+import argparse, json, random, sys, time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from satpambot.bot.modules.discord_bot.helpers.hash_index import HashIndex
+
+
+def _queries(vals, n, rng):
+    out = []
+    for i in range(n):
+        if i % 2 == 0:
+            v = vals[rng.randrange(len(vals))]
+            for _ in range(rng.randrange(0, 5)):
+                v ^= 1 << rng.randrange(64)
+            out.append(v)
+        else:
+            out.append(rng.getrandbits(64))
+    return out
+
+
+def run(sizes, radii, n_queries, bktree_max, seed=1234):
+    rng = random.Random(seed)
+    results = []
+    for size in sizes:
+        vals = [rng.getrandbits(64) for _ in range(size)]
+        qs = _queries(vals, n_queries, rng)
+        for strategy in ("linear", "mih", "bktree", "auto"):
+            if strategy == "bktree" and size > bktree_max:
+                continue
+            t0 = time.perf_counter()
+            idx = HashIndex(vals, strategy=strategy)
+            idx.hits(qs[:1], max_distance=1)  # force lazy band/BK-tree build
+            build_s = time.perf_counter() - t0
+            for r in radii:
+                t0 = time.perf_counter()
+                hits = idx.hits(qs, max_distance=r)
+                dt = time.perf_counter() - t0
+                row = {
+                    "size": size, "strategy": strategy, "radius": r,
+                    "build_s": round(build_s, 4),
+                    "us_per_query": round(dt / len(qs) * 1e6, 2),
+                    "hits": sum(hits),
+                }
+                if strategy == "auto":
+                    row["plan"] = idx._plan(r)
+                results.append(row)
+                print(f"{size:>8} {strategy:>7} r={r:<3} build={build_s:8.3f}s  {row['us_per_query']:>10.2f} us/query  hits={row['hits']}"
+                      + (f"  plan={row['plan']}" if "plan" in row else ""))
+    return results
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    ap.add_argument("--radii", type=int, nargs="+", default=[6, 10, 16])
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--bktree-max", type=int, default=1_000_000)
+    ap.add_argument("--json", help="write results to this file")
+    args = ap.parse_args(argv)
+    results = run(args.sizes, args.radii, args.queries, args.bktree_max)
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2), encoding="utf-8")
+        print("wrote", args.json)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
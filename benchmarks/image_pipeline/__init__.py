@@ -0,0 +1 @@
+"""Offline image-guard benchmark suite; see bench.py (run: python -m benchmarks.image_pipeline)."""
@@ -0,0 +1,3 @@
+from benchmarks.image_pipeline.bench import main
+
+raise SystemExit(main())
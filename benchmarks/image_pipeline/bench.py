@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark of the image-guard path on a synthetic corpus.
+
+    python -m benchmarks.image_pipeline --json bench/image_$(git rev-parse --short HEAD).json
+    python -m benchmarks.image_pipeline --per-kind 5 --targets phash tile --no-index
+    python -m benchmarks.image_pipeline --json new.json --compare old.json   # exit 1 on slowdowns
+
+Every job (one hashing function, or one index type at one DB size) runs in a
+fresh spawned process, so its peak RSS is its own and not the sum of earlier
+jobs. The first call of each job is a warm-up and is not timed.
+
+Hashing targets: phash (img_hashing.phash_list_from_bytes), multi
+(image_hashing.compute_all_hashes), tile (tile_phash_list_from_bytes), orb
+(orb_descriptors_from_bytes) and ocr (the OCR worker function). orb and ocr
+report "skipped" when cv2 or tesseract are not installed.
+
+Index targets: phash blocklist HashIndex.first_within (r=6), TileIndex.best
+and OrbMatcher.good_counts, each at several DB sizes. Half of the queries
+are near-duplicates of DB rows and half are misses.
+
+--compare flags a job whose p95 latency grew, or whose throughput shrank, by
+more than --max-slowdown (default 1.25x).
+"""
+from __future__ import annotations
+
+import argparse, json, multiprocessing, os, platform, random, subprocess, sys, tempfile, time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+ROOT = Path(__file__).resolve().parents[2]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from benchmarks.image_pipeline import corpus as corpus_mod
+
+_H = "satpambot.bot.modules.discord_bot.helpers"
+# name -> (module, function, kwargs)
+HASH_TARGETS = {
+    "phash": (f"{_H}.img_hashing", "phash_list_from_bytes", {}),
+    "multi": (f"{_H}.image_hashing", "compute_all_hashes", {}),
+    "tile": (f"{_H}.img_hashing", "tile_phash_list_from_bytes", {}),
+    "orb": (f"{_H}.img_hashing", "orb_descriptors_from_bytes", {}),
+    "ocr": (f"{_H}.ocr_service", "_tesseract", {"lang": "", "timeout": 30}),
+}
+INDEX_TARGETS = ("phash_index", "tile_index", "orb_store")
+
+
+# ---------- measurements (run inside the job process) ----------
+def _peak_rss_mb() -> Optional[float]:
+    try:
+        import resource
+    except ImportError:  # windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _summary(lat_s: List[float], wall_s: float) -> Dict[str, Any]:
+    import numpy as np
+    if not lat_s:
+        return {"n": 0}
+    ms = np.asarray(lat_s) * 1000.0
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {
+        "n": len(lat_s),
+        "per_s": round(len(lat_s) / wall_s, 2) if wall_s > 0 else None,
+        "p50_ms": round(float(p50), 3), "p95_ms": round(float(p95), 3), "p99_ms": round(float(p99), 3),
+        "max_ms": round(float(ms.max()), 3),
+    }
+
+
+def _unavailable(name: str) -> Optional[str]:
+    if name == "orb":
+        from satpambot.bot.modules.discord_bot.helpers import img_hashing
+        return "cv2 not installed" if img_hashing.cv2 is None else None
+    if name == "ocr":
+        try:
+            import pytesseract
+            pytesseract.get_tesseract_version()
+        except Exception as e:
+            return f"tesseract unavailable ({type(e).__name__})"
+    return None
+
+
+def _hash_job(name: str, corpus_dir: str, repeat: int) -> Dict[str, Any]:
+    import importlib
+    mod, fn, kwargs = HASH_TARGETS[name]
+    row: Dict[str, Any] = {"job": name, "kind": "hash"}
+    why = _unavailable(name)
+    if why:
+        row["skipped"] = why
+        return row
+    func = getattr(importlib.import_module(mod), fn)
+    corpus = corpus_mod.load(Path(corpus_dir))
+    first = next(d for items in corpus.values() for d in items)
+    func(first, **kwargs)  # warm-up: imports, cv2/numpy init
+    row["rss_before_mb"] = _peak_rss_mb()
+    lat: List[float] = []
+    by_kind: Dict[str, List[float]] = {}
+    errors = 0
+    t_all = time.perf_counter()
+    for _ in range(repeat):
+        for kind, items in corpus.items():
+            for data in items:
+                t0 = time.perf_counter()
+                try:
+                    func(data, **kwargs)
+                except Exception:
+                    errors += 1
+                dt = time.perf_counter() - t0
+                lat.append(dt)
+                by_kind.setdefault(kind, []).append(dt)
+    row.update(_summary(lat, time.perf_counter() - t_all))
+    row["by_kind_p50_ms"] = {k: _summary(v, sum(v))["p50_ms"] for k, v in by_kind.items()}
+    row["errors"] = errors
+    row["peak_rss_mb"] = _peak_rss_mb()
+    return row
+
+
+def _index_job(name: str, size: int, queries: int, seed: int) -> Dict[str, Any]:
+    import numpy as np
+    from satpambot.bot.modules.discord_bot.helpers.hash_index import HashIndex
+    from satpambot.bot.modules.discord_bot.helpers.orb_store import OrbMatcher, OrbStore
+    from satpambot.bot.modules.discord_bot.helpers.tile_index import TileIndex
+
+    rng = np.random.default_rng(seed)
+    row: Dict[str, Any] = {"job": name, "kind": "index", "size": size}
+
+    def near(rows: "np.ndarray", flips: int) -> "np.ndarray":
+        """Half of the queries: DB rows with a few bits flipped; the other half random."""
+        q = rows[rng.integers(0, len(rows), queries)].copy()
+        bits = np.uint64(1) << rng.integers(0, 64, q.shape).astype(np.uint64)
+        q ^= np.where(rng.random(q.shape) < flips / 64.0, bits, np.uint64(0))
+        miss = rng.integers(0, 2 ** 63, q.shape, dtype=np.int64).astype(np.uint64)
+        return np.where((np.arange(queries) % 2 == 0).reshape((-1,) + (1,) * (q.ndim - 1)), q, miss)
+
+    t0 = time.perf_counter()
+    if name == "phash_index":
+        db = rng.integers(0, 2 ** 63, size, dtype=np.int64).astype(np.uint64) << np.uint64(1)
+        idx = HashIndex(int(v) for v in db)
+        qs = [int(v) for v in near(db, 3)]
+        idx.first_within(qs[:1], max_distance=6)  # lazy structures
+        call = lambda q: idx.first_within([q], max_distance=6)
+    elif name == "tile_index":
+        db = rng.integers(0, 2 ** 63, (size, 9), dtype=np.int64).astype(np.uint64)
+        idx = TileIndex(tiles=9)
+        idx.extend(db.tolist())
+        qs = [[format(int(v), "016x") for v in r] for r in near(db, 4)]
+        call = lambda q: idx.best(["|".join(q)], min_tiles=6, per_tile_max_distance=8)
+    else:
+        store = OrbStore(os.path.join(tempfile.mkdtemp(prefix="orbbench"), "refs"))
+        for i in range(size):
+            store.add(f"ref{i}", rng.integers(0, 256, (64, 32), dtype=np.uint8))
+        matcher = OrbMatcher(store)
+        qs = [rng.integers(0, 256, (64, 32), dtype=np.uint8) for _ in range(max(4, queries // 20))]
+        call = matcher.good_counts
+    row["build_s"] = round(time.perf_counter() - t0, 4)
+    call(qs[0])  # warm-up
+    row["rss_before_mb"] = _peak_rss_mb()
+    lat = []
+    t_all = time.perf_counter()
+    for q in qs:
+        t1 = time.perf_counter()
+        call(q)
+        lat.append(time.perf_counter() - t1)
+    row.update(_summary(lat, time.perf_counter() - t_all))
+    row["peak_rss_mb"] = _peak_rss_mb()
+    return row
+
+
+# ---------- driver ----------
+def _in_fresh_process(fn, *args) -> Dict[str, Any]:
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+        return pool.submit(fn, *args).result()
+
+
+def _meta(args, corpus: Dict[str, List[bytes]]) -> Dict[str, Any]:
+    versions = {}
+    for mod in ("numpy", "PIL", "cv2", "imagehash", "pytesseract"):
+        try:
+            versions[mod] = getattr(__import__(mod), "__version__", "?")
+        except Exception:
+            versions[mod] = None
+    try:
+        rev = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, timeout=10).stdout.strip()
+    except Exception:
+        rev = ""
+    return {
+        "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git": rev or None,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "versions": versions,
+        "seed": args.seed,
+        "repeat": args.repeat,
+        "corpus": {k: {"n": len(v), "bytes": sum(map(len, v))} for k, v in corpus.items()},
+    }
+
+
+def _key(row: Dict[str, Any]) -> tuple:
+    return (row.get("job"), row.get("size"))
+
+
+def compare(new: Dict[str, Any], old: Dict[str, Any], max_slowdown: float) -> List[str]:
+    """Human-readable regressions of new vs old (empty when none)."""
+    before = {_key(r): r for r in old.get("results", [])}
+    out = []
+    for r in new.get("results", []):
+        o = before.get(_key(r))
+        if not o or "p95_ms" not in r or "p95_ms" not in o:
+            continue
+        label = r["job"] + (f"@{r['size']}" if r.get("size") else "")
+        if o["p95_ms"] and r["p95_ms"] > o["p95_ms"] * max_slowdown:
+            out.append(f"{label}: p95 {o['p95_ms']}ms -> {r['p95_ms']}ms ({r['p95_ms'] / o['p95_ms']:.2f}x)")
+        if o.get("per_s") and r.get("per_s") and r["per_s"] * max_slowdown < o["per_s"]:
+            out.append(f"{label}: throughput {o['per_s']}/s -> {r['per_s']}/s")
+    return out
+
+
+def _print_row(r: Dict[str, Any]) -> None:
+    label = r["job"] + (f"@{r['size']}" if r.get("size") else "")
+    if "skipped" in r:
+        print(f"{label:>22}  skipped: {r['skipped']}")
+        return
+    print(f"{label:>22}  {r.get('per_s') or 0:>9.1f}/s  p50={r.get('p50_ms', 0):>9.3f}ms  p95={r.get('p95_ms', 0):>9.3f}ms"
+          f"  p99={r.get('p99_ms', 0):>9.3f}ms  rss={r.get('peak_rss_mb')}MB"
+          + (f"  build={r['build_s']}s" if "build_s" in r else "")
+          + (f"  errors={r['errors']}" if r.get("errors") else ""))
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--per-kind", type=int, default=20, help="images per corpus kind")
+    ap.add_argument("--kinds", nargs="+", default=list(corpus_mod.KINDS), choices=corpus_mod.KINDS)
+    ap.add_argument("--targets", nargs="+", default=list(HASH_TARGETS), choices=list(HASH_TARGETS))
+    ap.add_argument("--repeat", type=int, default=1, help="passes over the corpus per hashing target")
+    ap.add_argument("--seed", type=int, default=1234)
+    ap.add_argument("--corpus-dir", help="reuse/keep the corpus here (generated if missing)")
+    ap.add_argument("--no-index", action="store_true", help="skip the index lookup jobs")
+    ap.add_argument("--index-sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    ap.add_argument("--orb-sizes", type=int, nargs="+", default=[100, 1_000], help="reference images in the ORB store")
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--json", help="write results to this file")
+    ap.add_argument("--compare", help="previous results JSON to check for slowdowns")
+    ap.add_argument("--max-slowdown", type=float, default=1.25)
+    args = ap.parse_args(argv)
+
+    tmp = None
+    if args.corpus_dir and (Path(args.corpus_dir) / "manifest.json").exists():
+        corpus_dir = Path(args.corpus_dir)
+        corpus = corpus_mod.load(corpus_dir, args.kinds)
+    else:
+        t0 = time.perf_counter()
+        corpus = corpus_mod.generate(args.per_kind, args.seed, args.kinds)
+        if args.corpus_dir:
+            corpus_dir = Path(args.corpus_dir)
+        else:
+            tmp = tempfile.TemporaryDirectory(prefix="imgbench")
+            corpus_dir = Path(tmp.name)
+        corpus_mod.write(corpus, corpus_dir)
+        print(f"corpus: {sum(map(len, corpus.values()))} images in {time.perf_counter() - t0:.1f}s -> {corpus_dir}")
+
+    results = []
+    try:
+        for name in args.targets:
+            row = _in_fresh_process(_hash_job, name, str(corpus_dir), args.repeat)
+            _print_row(row)
+            results.append(row)
+        if not args.no_index:
+            for name in INDEX_TARGETS:
+                for size in (args.orb_sizes if name == "orb_store" else args.index_sizes):
+                    row = _in_fresh_process(_index_job, name, size, args.queries, args.seed)
+                    _print_row(row)
+                    results.append(row)
+    finally:
+        if tmp is not None:
+            tmp.cleanup()
+
+    report = {"meta": _meta(args, corpus), "results": results}
+    if args.json:
+        Path(args.json).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.json).write_text(json.dumps(report, indent=2), encoding="utf-8")
+        print("wrote", args.json)
+    if args.compare:
+        old = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+        if (old.get("meta") or {}).get("corpus") != report["meta"]["corpus"]:
+            print("warning: the corpus differs from", args.compare, "(different --per-kind/--kinds/--seed?)")
+        regressions = compare(report, old, args.max_slowdown)
+        for line in regressions:
+            print("SLOWER", line)
+        if regressions:
+            return 1
+        print(f"no slowdowns beyond {args.max_slowdown}x vs {args.compare}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,130 @@
+"""
+Synthetic image corpus for the image-guard benchmarks.
+
+Everything is generated from a seed, so two runs (or two releases) hash the
+same bytes. Kinds:
+
+    png, jpeg, webp   random smooth "photos" with a few shapes
+    gif               animated GIF: mostly repeated frames plus a few scene changes
+    crop              15-35% crops of the base images (tile matching)
+    rotate            base images rotated 3-15 degrees
+    scam              text-overlay "scam cards" (OCR / keyword path)
+"""
+from __future__ import annotations
+
+import io, json, random
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+KINDS = ("png", "jpeg", "webp", "gif", "crop", "rotate", "scam")
+
+SCAM_LINES = (
+    "FREE DISCORD NITRO", "Claim your gift now!", "Steam gift card 50$",
+    "Verify your account", "airdrop: connect wallet", "discord-gift.ru/claim",
+)
+
+
+def _font(size: int):
+    try:
+        return ImageFont.load_default(size=size)
+    except TypeError:  # Pillow < 10.1: bitmap font only
+        return ImageFont.load_default()
+
+
+def base_image(rng: random.Random, size: Tuple[int, int] = (640, 480)) -> Image.Image:
+    """Upscaled low-res noise (smooth gradients) with a few random shapes on top."""
+    w, h = size
+    nrng = np.random.default_rng(rng.getrandbits(32))
+    small = (nrng.random((h // 40, w // 40, 3)) * 255).astype(np.uint8)
+    img = Image.fromarray(small).resize(size, Image.BICUBIC)
+    d = ImageDraw.Draw(img)
+    for _ in range(rng.randrange(3, 8)):
+        x0, y0 = rng.randrange(w), rng.randrange(h)
+        x1, y1 = x0 + rng.randrange(20, w // 2), y0 + rng.randrange(20, h // 2)
+        fill = tuple(rng.randrange(256) for _ in range(3))
+        (d.ellipse if rng.random() < 0.5 else d.rectangle)((x0, y0, x1, y1), fill=fill)
+    return img
+
+
+def scam_card(rng: random.Random, size: Tuple[int, int] = (800, 450)) -> Image.Image:
+    img = base_image(rng, size)
+    d = ImageDraw.Draw(img)
+    w, h = size
+    d.rounded_rectangle((40, 40, w - 40, h - 40), radius=24, fill=(250, 250, 250))
+    y = 70
+    for line in rng.sample(SCAM_LINES, 3):
+        d.text((70, y), line, fill=(20, 20, 20), font=_font(rng.choice((30, 36, 44))))
+        y += 90
+    return img
+
+
+def animated_gif(rng: random.Random, frames: int = 60, size: Tuple[int, int] = (320, 240)) -> bytes:
+    # quantized once per scene: GIF-encoding RGB frames re-quantizes every frame and is slow
+    scenes = [base_image(rng, size).quantize(64) for _ in range(rng.randrange(2, 5))]
+    seq = []
+    for i in range(frames):
+        f = scenes[i * len(scenes) // frames].copy()
+        f.putpixel((i % size[0], 0), i % 64)  # keeps Pillow from merging identical frames
+        seq.append(f)
+    buf = io.BytesIO()
+    seq[0].save(buf, format="GIF", save_all=True, append_images=seq[1:], duration=40, loop=0)
+    return buf.getvalue()
+
+
+def _encode(img: Image.Image, fmt: str) -> bytes:
+    buf = io.BytesIO()
+    if fmt == "JPEG":
+        img.convert("RGB").save(buf, format="JPEG", quality=85)
+    else:
+        img.save(buf, format=fmt)
+    return buf.getvalue()
+
+
+def generate(per_kind: int = 20, seed: int = 1234, kinds=KINDS) -> Dict[str, List[bytes]]:
+    """{kind: [encoded image bytes, ...]}"""
+    rng = random.Random(seed)
+    out: Dict[str, List[bytes]] = {k: [] for k in kinds}
+    for _ in range(per_kind):
+        base = base_image(rng)
+        for kind in kinds:
+            if kind == "png":
+                out[kind].append(_encode(base, "PNG"))
+            elif kind == "jpeg":
+                out[kind].append(_encode(base, "JPEG"))
+            elif kind == "webp":
+                out[kind].append(_encode(base, "WEBP"))
+            elif kind == "gif":
+                out[kind].append(animated_gif(rng))
+            elif kind == "crop":
+                w, h = base.size
+                f = rng.uniform(0.15, 0.35)
+                dx, dy = int(w * f * rng.random()), int(h * f * rng.random())
+                out[kind].append(_encode(base.crop((dx, dy, dx + int(w * (1 - f)), dy + int(h * (1 - f)))), "PNG"))
+            elif kind == "rotate":
+                out[kind].append(_encode(base.rotate(rng.choice((-1, 1)) * rng.uniform(3, 15), expand=True), "PNG"))
+            elif kind == "scam":
+                out[kind].append(_encode(scam_card(rng), "PNG"))
+    return out
+
+
+def write(corpus: Dict[str, List[bytes]], root: Path) -> Path:
+    """Store a corpus as root/<kind>/<n>.bin plus manifest.json; returns root."""
+    root.mkdir(parents=True, exist_ok=True)
+    manifest = {}
+    for kind, items in corpus.items():
+        (root / kind).mkdir(exist_ok=True)
+        manifest[kind] = []
+        for i, data in enumerate(items):
+            p = root / kind / f"{i:04d}.bin"
+            p.write_bytes(data)
+            manifest[kind].append(p.relative_to(root).as_posix())
+    (root / "manifest.json").write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+    return root
+
+
+def load(root: Path, kinds: Optional[List[str]] = None) -> Dict[str, List[bytes]]:
+    manifest = json.loads((root / "manifest.json").read_text(encoding="utf-8"))
+    return {k: [(root / p).read_bytes() for p in v] for k, v in manifest.items() if not kinds or k in kinds}
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Measure what OnlineNB hashing mode (ML_NB_HASH_BITS) costs against the exact
+token model, on logged messages.
+
+    python benchmarks/nb_hashing_eval.py
+    python benchmarks/nb_hashing_eval.py --model data/ml_state/base.json.gz --bits 14 16 18 20
+    python benchmarks/nb_hashing_eval.py --messages labeled.jsonl --json out.json
+
+--model is an ML state snapshot (mlsnap_*.json.gz from the ml-state thread,
+or the local base.json.gz) or a plain OnlineNB.to_dict() JSON file. The
+exact model is hashed into 2**k buckets with OnlineNB.from_dict(..., hash_bits=k),
+which gives the same counts hashing mode would have learned. Each message
+(--messages, JSONL with a "text" field, default data/shadow_samples.jsonl)
+is scored by both models. Per k the tool reports:
+  - decision agreement at --threshold, and the mean/max |p_exact - p_hashed|;
+  - non-empty buckets vs exact vocabulary, and bucket collisions;
+  - gzipped snapshot bytes of both models.
+When the messages carry "label" ("phish"/"safe"), both models are also
+retrained from scratch on the first --train-frac of them and accuracy on the
+rest is compared.
+"""
+from __future__ import annotations
+
+import argparse, gzip, json, os, sys, zlib
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from satpambot.ml.feature_extractor import tokenize_text
+from satpambot.ml.online_nb import OnlineNB
+
+
+def load_model_dict(path: str) -> dict:
+    raw = Path(path).read_bytes()
+    if raw[:2] == b"\x1f\x8b":
+        raw = gzip.decompress(raw)
+    d = json.loads(raw.decode("utf-8"))
+    return d.get("model", d) if "version" in d else d
+
+
+def load_messages(path: str) -> list:
+    out = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                row = json.loads(line)
+            except ValueError:
+                continue
+            if row.get("text"):
+                out.append((tokenize_text(row["text"]), row.get("label")))
+    return out
+
+
+def _snapshot_bytes(m: OnlineNB) -> int:
+    return len(gzip.compress(json.dumps(m.to_dict(), separators=(",", ":")).encode("utf-8")))
+
+
+def _collisions(vocab, bits: int) -> int:
+    """Tokens that share a bucket with an earlier token."""
+    mask = (1 << bits) - 1
+    return len(vocab) - len({zlib.crc32(t.encode("utf-8", "surrogatepass")) & mask for t in vocab})
+
+
+def _accuracy(model: OnlineNB, rows, threshold: float) -> float:
+    ok = sum((p["phish"] >= threshold) == (lab == "phish") for p, (_, lab) in zip(model.predict_proba_batch([t for t, _ in rows]), rows))
+    return ok / max(1, len(rows))
+
+
+def run(model_dict: dict, messages: list, bits_list, threshold: float, train_frac: float):
+    exact = OnlineNB.from_dict(model_dict, hash_bits=0)
+    docs = [t for t, _ in messages]
+    p_exact = [p["phish"] for p in exact.predict_proba_batch(docs)]
+    labeled = [(t, lab) for t, lab in messages if lab in ("phish", "safe")]
+    split = int(len(labeled) * train_frac)
+    train, test = labeled[:split], labeled[split:]
+    acc_exact = None
+    if train and test:
+        m = OnlineNB(hash_bits=0)
+        for t, lab in train:
+            m.learn(t, lab)
+        acc_exact = _accuracy(m, test, threshold)
+    print(f"exact: vocab={exact.vocab_size} snapshot={_snapshot_bytes(exact)}B messages={len(docs)}"
+          + (f" holdout_acc={acc_exact:.4f}" if acc_exact is not None else ""))
+    results = []
+    for bits in bits_list:
+        hashed = OnlineNB.from_dict(model_dict, hash_bits=bits)
+        p_hashed = [p["phish"] for p in hashed.predict_proba_batch(docs)]
+        diffs = [abs(a - b) for a, b in zip(p_exact, p_hashed)]
+        row = {
+            "bits": bits,
+            "buckets_used": hashed.vocab_size,
+            "vocab": exact.vocab_size,
+            "collisions": _collisions(exact._vocab, bits),
+            "agreement": round(sum((a >= threshold) == (b >= threshold) for a, b in zip(p_exact, p_hashed)) / max(1, len(docs)), 4),
+            "mean_abs_diff": round(sum(diffs) / max(1, len(diffs)), 6),
+            "max_abs_diff": round(max(diffs, default=0.0), 6),
+            "snapshot_bytes": _snapshot_bytes(hashed),
+            "snapshot_bytes_exact": _snapshot_bytes(exact),
+            "counts_mb": round(2 * (1 << bits) * (hashed._pos.itemsize + hashed._lpos.itemsize) / 2**20, 1),
+        }
+        if train and test:
+            m = OnlineNB(hash_bits=bits)
+            for t, lab in train:
+                m.learn(t, lab)
+            row["holdout_acc"] = round(_accuracy(m, test, threshold), 4)
+            row["holdout_acc_exact"] = round(acc_exact, 4)
+        results.append(row)
+        print(f"k={bits:<3} buckets={row['buckets_used']:>8} collisions={row['collisions']:>7} agree={row['agreement']:.4f} "
+              f"mean|dp|={row['mean_abs_diff']:.5f} max|dp|={row['max_abs_diff']:.4f} snapshot={row['snapshot_bytes']}B "
+              f"arrays={row['counts_mb']}MB" + (f" holdout_acc={row['holdout_acc']:.4f}" if "holdout_acc" in row else ""))
+    return results
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--model", default=os.path.join(os.getenv("ML_STATE_DIR", "data/ml_state"), "base.json.gz"))
+    ap.add_argument("--messages", default="data/shadow_samples.jsonl")
+    ap.add_argument("--bits", type=int, nargs="+", default=[14, 16, 18, 20])
+    ap.add_argument("--threshold", type=float, default=0.5)
+    ap.add_argument("--train-frac", type=float, default=0.8)
+    ap.add_argument("--json", help="write results to this file")
+    args = ap.parse_args(argv)
+    try:
+        model_dict = load_model_dict(args.model)
+    except FileNotFoundError:
+        print(f"no model at {args.model}; pass --model (mlsnap_*.json.gz or OnlineNB.to_dict() JSON)")
+        return 2
+    if model_dict.get("hash_bits"):
+        print("the snapshot is already hashed; compare against a token-mode snapshot")
+        return 2
+    results = run(model_dict, load_messages(args.messages), args.bits, args.threshold, args.train_frac)
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2), encoding="utf-8")
+        print("wrote", args.json)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
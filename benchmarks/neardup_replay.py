@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Replay a message stream through helpers/near_duplicate.py and report
+throughput, detection, flagged baseline messages and memory.
+
+    python benchmarks/neardup_replay.py                         # synthetic: quiet chat + one scam wave
+    python benchmarks/neardup_replay.py --wave-rate 600 --scales 1 4 16
+    python benchmarks/neardup_replay.py --replay messages.jsonl  # {"t", "guild", "user", "channel", "content", "spam"?}
+
+The synthetic stream is --baseline-minutes of organic chat (~2 messages/s,
+some repeated greetings) followed by a scam wave: --wave-rate copies per
+minute of a few templates, each with a different link path, number, emoji
+and punctuation, spread over 8 channels. "detected" counts wave copies
+posted after their cluster was flagged; "baseline_flagged" counts flagged
+organic messages (the repeated greeting is a real near duplicate, but has
+no link, so the guard with NEARDUP_ACTION=delete leaves it). --scales
+multiplies the wave; the tracemalloc peak must level off, because the index
+only holds the last window and at most NEARDUP_BUCKET_MAX per bucket.
+"""
+from __future__ import annotations
+
+import argparse, json, random, sys, time, tracemalloc
+from pathlib import Path
+from typing import Any, Dict, Iterator, List
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from satpambot.bot.modules.discord_bot.helpers.near_duplicate import NearDuplicateDetector, simhash64
+
+TEMPLATES = [
+    "{e} FREE NITRO for everyone{p} claim before it expires https://discord-gift.ru/{code} {n} left",
+    "@everyone steam is giving {n}$ gift cards{p} get yours https://steamcommunnity.com/gift/{code} {e}",
+    "hey i accidentally reported you{p} talk to the admin here https://discord.gg/{code} quick {e}",
+]
+WORDS = ("ada yang mau mabar gw baru beli siapa online cara setting bot update patch malam ini main rekomendasi "
+         "game lagi ngapain tolong bantu jadwal turnamen wkwk iya dong kok gitu bang server rank push hero skin "
+         "event besok tadi seru banget kalah menang tim solo duo lag ping sinyal hp laptop kuliah kerja tidur").split()
+
+
+def synthetic(seed: int, baseline_min: float, wave_rate: int, wave_minutes: float, scale: int = 1) -> List[Dict[str, Any]]:
+    rng = random.Random(seed)
+    ev: List[Dict[str, Any]] = []
+    t = 0.0
+    while t < baseline_min * 60:
+        t += rng.expovariate(2.0)
+        u = rng.randrange(1000, 1500)
+        if rng.random() < 0.05:
+            text = "selamat pagi semua semoga harinya menyenangkan"
+        else:
+            text = " ".join(rng.choice(WORDS) for _ in range(rng.randrange(4, 14)))
+        ev.append({"t": t, "guild": 1, "user": u, "channel": rng.randrange(10, 18), "content": text})
+    start = t
+    n = int(wave_rate * wave_minutes * scale)
+    gap = 60.0 / (wave_rate * scale)
+    for i in range(n):
+        text = rng.choice(TEMPLATES).format(e=rng.choice("🎁🔥💸✨"), p=rng.choice(["!", "!!", ".", ""]),
+                                            code=f"{rng.getrandbits(32):x}", n=rng.randrange(1, 500))
+        ev.append({"t": start + i * gap, "guild": 1, "user": 5_000_000 + i, "channel": rng.randrange(10, 18),
+                   "content": text, "spam": True})
+    return ev
+
+
+def read_events(path: str) -> Iterator[Dict[str, Any]]:
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def _memory(events: List[Dict[str, Any]], hashes: List[Any]):
+    tracemalloc.start()
+    det = NearDuplicateDetector()
+    for i, (e, h) in enumerate(zip(events, hashes)):
+        det.add(e["guild"], h, e["t"], e["user"], e["channel"], i)
+    cur, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return cur, peak, len(det)
+
+
+def replay(events: List[Dict[str, Any]]) -> Dict[str, Any]:
+    clock = time.perf_counter
+    t0 = clock()
+    hashes = [simhash64(e.get("content", "")) for e in events]
+    t_hash = clock() - t0
+    det = NearDuplicateDetector()
+    spam = detected = baseline_flagged = 0
+    t0 = clock()
+    for i, (e, h) in enumerate(zip(events, hashes)):
+        v = det.add(e["guild"], h, e["t"], e["user"], e["channel"], i)
+        flagged = v is not None and v.flagged
+        if e.get("spam"):
+            spam += 1
+            detected += flagged
+        else:
+            baseline_flagged += flagged
+    t_add = clock() - t0
+    cur, peak, indexed = _memory(events, hashes)
+    n = len(events)
+    return {
+        "messages": n,
+        "simhash_us": round(t_hash / n * 1e6, 1) if n else None,
+        "add_us": round(t_add / n * 1e6, 1) if n else None,
+        "spam": spam,
+        "detected": detected,
+        "baseline_flagged": baseline_flagged,
+        "indexed_end": indexed,
+        "mem_current_kb": round(cur / 1024),
+        "mem_peak_kb": round(peak / 1024),
+    }
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--replay", help="JSONL message stream to replay instead of the synthetic one")
+    ap.add_argument("--baseline-minutes", type=float, default=30)
+    ap.add_argument("--wave-rate", type=int, default=300, help="spam copies per minute")
+    ap.add_argument("--wave-minutes", type=float, default=2)
+    ap.add_argument("--scales", type=int, nargs="+", default=[1, 4, 16])
+    ap.add_argument("--seed", type=int, default=1234)
+    ap.add_argument("--json", help="write results to this file")
+    args = ap.parse_args(argv)
+    if args.replay:
+        runs = [("replay", list(read_events(args.replay)))]
+    else:
+        runs = [(f"x{s}", synthetic(args.seed, args.baseline_minutes, args.wave_rate, args.wave_minutes, s)) for s in args.scales]
+    results = []
+    for name, events in runs:
+        row = {"run": name, **replay(events)}
+        results.append(row)
+        print(f"{name:>7} messages={row['messages']:>7} simhash={row['simhash_us']}us add={row['add_us']}us "
+              f"detected={row['detected']}/{row['spam']} baseline_flagged={row['baseline_flagged']} indexed={row['indexed_end']} "
+              f"mem peak={row['mem_peak_kb']}KB now={row['mem_current_kb']}KB")
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2), encoding="utf-8")
+        print("wrote", args.json)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
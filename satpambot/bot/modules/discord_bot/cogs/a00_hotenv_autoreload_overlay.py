@@ -197,6 +197,11 @@ class HotEnvAutoReloadOverlay(commands.Cog):  # type: ignore[misc]
                         if os.environ.get(k) != v: os.environ[k] = v; changed_env += 1
             except Exception: pass
         logging.warning("[hotenv] env merged: %s changes", changed_env)
+        if changed_env:
+            try:
+                from ..helpers.keyword_scanner import get_keyword_scanner
+                get_keyword_scanner().rebuild()  # OCR_BLOCKWORDS / NSFW_SOFT_KEYWORDS are read at build time
+            except Exception: pass
         # targets
         targets: List[str] = []
         if MODE == "auto":
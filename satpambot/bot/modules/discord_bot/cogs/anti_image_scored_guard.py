@@ -9,7 +9,11 @@ from typing import Optional, Dict
 
 import discord
 
-from ..helpers.score_utils import extract_text_ocr, extract_urls, is_bad_url, simple_bytes_hash, contains_phish_keywords
+from ..helpers.score_utils import is_bad_url, simple_bytes_hash, contains_phish_keywords
+from ..helpers.message_analysis import analyze
+from ..helpers.attachment_cache import get_attachment_cache
+from ..helpers.ocr_service import priority_for
+from ..helpers.image_verdict import get_image_verdict_pipeline
 
 try:
     from PIL import Image
@@ -59,6 +63,7 @@ class AntiImageScoredGuard(commands.Cog):
         self._recent_msgs: Dict[int, list[float]] = {}
         self._fp_thread_id_by_guild: Dict[int, int] = {}
         self._booted = False  # ensure one-time bootstrap
+        self.verdicts = get_image_verdict_pipeline(lambda: self.wl.get("images", []))
 
     @commands.Cog.listener()
     async def on_ready(self):
@@ -96,10 +101,9 @@ class AntiImageScoredGuard(commands.Cog):
                 for a in getattr(msg, "attachments", []) or []:
                     if (a.content_type or "").startswith("image/"):
                         try:
-                            b = await a.read()
+                            sha1 = (await get_attachment_cache().get(a, store=False)).sha1
                         except Exception:
                             continue
-                        sha1 = simple_bytes_hash(b)
                         d = self.wl
                         imgs = set(d.get("images", []))
                         if sha1 not in imgs:
@@ -144,17 +148,16 @@ class AntiImageScoredGuard(commands.Cog):
         names = {r.name for r in getattr(member, "roles", [])}
         return any(s in names for s in self.cfg["skip_roles"])
 
-    def _signals(self, b: bytes, message: discord.Message) -> Dict[str, bool]:
-        sig = {"kw": False, "url": False, "burst": False, "young": False, "wl_img": False, "wl_chan_protected": False}
-        sha1 = simple_bytes_hash(b)
-        if sha1 in set(self.wl.get("images", [])):
+    def _signals(self, b: bytes, message: discord.Message, verdict=None) -> Dict[str, bool]:
+        sig = {"kw": False, "url": False, "burst": False, "young": False, "wl_img": False, "wl_chan_protected": False, "known_bad": False}
+        if verdict is not None:
+            sig["wl_img"] = verdict.action == "allow"
+            sig["known_bad"] = verdict.action == "block"
+            sig["kw"] = bool(verdict.text) and contains_phish_keywords(verdict.text)
+        elif simple_bytes_hash(b) in set(self.wl.get("images", [])):
             sig["wl_img"] = True
 
-        txt = extract_text_ocr(b)
-        if txt and contains_phish_keywords(txt):
-            sig["kw"] = True
-
-        urls = extract_urls(message.content or "")
+        urls = analyze(message).urls
         if urls and any(is_bad_url(u) for u in urls):
             sig["url"] = True
 
@@ -245,13 +248,17 @@ class AntiImageScoredGuard(commands.Cog):
         if not img_attachments: return
 
         try:
-            b = await img_attachments[0].read()
+            entry = await get_attachment_cache().get(img_attachments[0])
         except Exception:
             return
+        b = entry.data
 
-        sig = self._signals(b, message)
+        verdict = await self.verdicts.check(b, sha256=entry.sha256, sha1=entry.sha1, priority=priority_for(message.author))
+        sig = self._signals(b, message, verdict)
 
         desc = f"signals: `kw={int(sig['kw'])}, url={int(sig['url'])}, burst={int(sig['burst'])}, young={int(sig['young'])}`"
+        if verdict.stage:
+            desc += f" • verdict={verdict.action} ({verdict.stage}: {verdict.reason})"
         if sig["wl_chan_protected"]:
             desc += " • channel=protected(log-only)"
         e = discord.Embed(
@@ -266,7 +273,7 @@ class AntiImageScoredGuard(commands.Cog):
             await self._send_to_fp_thread(message.guild, e, self._make_view(b, message))
             return
 
-        high_conf = (sig["url"] and sig["kw"]) or (sig["url"] and (sig["burst"] or sig["young"])) or (sig["kw"] and (sig["burst"] or sig["young"]))
+        high_conf = sig["known_bad"] or (sig["url"] and sig["kw"]) or (sig["url"] and (sig["burst"] or sig["young"])) or (sig["kw"] and (sig["burst"] or sig["young"]))
         medium = (sig["url"] or sig["kw"]) and not high_conf
 
         if high_conf:
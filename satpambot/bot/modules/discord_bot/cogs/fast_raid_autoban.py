@@ -1,9 +1,146 @@
-try:
-    from discord.ext import commands  # type: ignore
-except Exception:
-    class _Base: pass
-    class commands:  # type: ignore
-        Cog = _Base
-class _DummyCog(commands.Cog):
-    def __init__(self, bot): self.bot = bot
-async def setup(bot): return None
+from __future__ import annotations
+
+from discord.ext import commands
+
+import asyncio, logging, os, time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+import discord
+
+from ..helpers.raid_detector import RAID_COOLDOWN_SEC, RaidVerdict, get_raid_detector
+from ..helpers.ban_utils import safe_ban_7d
+
+log = logging.getLogger(__name__)
+
+# ENV (detection thresholds: helpers/raid_detector.py)
+ENABLED = os.getenv("RAID_GUARD_ENABLED","1").lower() not in {"0","false","no"}
+# alert|slowmode|lockdown|ban, comma separated; lockdown/slowmode hit the channels active in the window
+ACTIONS = {a.strip() for a in os.getenv("RAID_ACTIONS","alert,slowmode").lower().split(",") if a.strip()}
+SLOWMODE_SEC = int(os.getenv("RAID_SLOWMODE_SEC","30"))
+ALERT_CHANNEL_ID = int(os.getenv("RAID_ALERT_CHANNEL_ID","0") or 0)
+BAN_INTERVAL_SEC = float(os.getenv("RAID_BAN_INTERVAL_SEC","1.0"))  # spacing between queued bans
+BAN_QUEUE_MAX = int(os.getenv("RAID_BAN_QUEUE_MAX","2000"))
+
+class FastRaidAutoban(commands.Cog):
+    """Feeds joins and messages to the raid detector and runs the configured response."""
+
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+        self.detector = get_raid_detector()
+        self._bans: "asyncio.Queue[Tuple[int, int, str]]" = asyncio.Queue(maxsize=BAN_QUEUE_MAX)
+        self._queued: "OrderedDict[Tuple[int, int], None]" = OrderedDict()  # dedupe, bounded like the queue
+        self._worker: Optional[asyncio.Task] = None
+        self._restore: Dict[int, asyncio.Task] = {}  # guild id -> pending restore
+
+    def cog_unload(self):
+        if self._worker is not None:
+            self._worker.cancel()
+        for t in self._restore.values():
+            t.cancel()
+
+    @commands.Cog.listener()
+    async def on_member_join(self, member: discord.Member):
+        if not ENABLED or member.bot:
+            return
+        created = member.created_at.timestamp() if member.created_at else None
+        v = self.detector.on_join(member.guild.id, member.id, time.time(), created_at=created, name=member.name)
+        if v.active:
+            await self._respond(member.guild, v)
+
+    @commands.Cog.listener()
+    async def on_message(self, message: discord.Message):
+        if not ENABLED or not message.guild or message.author.bot:
+            return
+        atts = [(a.filename, a.size) for a in message.attachments]
+        v = self.detector.on_message(message.guild.id, message.author.id, message.channel.id, time.time(),
+                                     message.content or "", atts)
+        if v.active:
+            await self._respond(message.guild, v)
+
+    # --- response ---
+    async def _respond(self, guild: discord.Guild, v: RaidVerdict):
+        if v.started:
+            log.warning("[raid] guild=%s raid detected: %s", guild.id, ", ".join(v.reasons))
+            if "alert" in ACTIONS:
+                await self._alert(guild, v)
+            if ACTIONS & {"slowmode", "lockdown"} and guild.id not in self._restore:
+                self._restore[guild.id] = asyncio.ensure_future(self._contain(guild))
+        if "ban" in ACTIONS:
+            for uid in v.suspects:
+                self._enqueue_ban(guild.id, uid, f"Raid: {', '.join(v.reasons[:3])}")
+
+    async def _alert(self, guild: discord.Guild, v: RaidVerdict):
+        ch = guild.get_channel(ALERT_CHANNEL_ID) if ALERT_CHANNEL_ID else None
+        if ch is None:
+            return
+        try:
+            await ch.send(f"⚠️ Raid terdeteksi: {', '.join(v.reasons)}. Aksi: {', '.join(sorted(ACTIONS))}.")
+        except Exception:
+            log.debug("[raid] alert failed", exc_info=True)
+
+    async def _contain(self, guild: discord.Guild):
+        """Slowmode/lockdown on the active channels until the raid has been quiet for the cooldown, then restore."""
+        now = time.time()
+        ids = self.detector.recent_channels(guild.id, now)
+        if guild.system_channel is not None:
+            ids.append(guild.system_channel.id)
+        channels = [c for c in (guild.get_channel(i) for i in dict.fromkeys(ids)) if isinstance(c, discord.TextChannel)]
+        saved: List[Tuple[discord.TextChannel, int, Optional[discord.PermissionOverwrite]]] = []
+        role = guild.default_role
+        try:
+            for ch in channels:
+                prev_delay = ch.slowmode_delay
+                prev_ow = ch.overwrites_for(role) if "lockdown" in ACTIONS else None
+                try:
+                    if "slowmode" in ACTIONS and prev_delay < SLOWMODE_SEC:
+                        await ch.edit(slowmode_delay=SLOWMODE_SEC, reason="Raid containment")
+                    if prev_ow is not None:
+                        ow = discord.PermissionOverwrite.from_pair(*prev_ow.pair())
+                        ow.send_messages = False
+                        await ch.set_permissions(role, overwrite=ow, reason="Raid lockdown")
+                    saved.append((ch, prev_delay, prev_ow))
+                except discord.Forbidden:
+                    log.warning("[raid] no permission to contain #%s", ch.name)
+                except Exception:
+                    log.debug("[raid] containment failed for %s", ch.id, exc_info=True)
+            while self.detector.is_active(guild.id, time.time()):
+                await asyncio.sleep(min(30.0, RAID_COOLDOWN_SEC))
+        finally:
+            for ch, prev_delay, prev_ow in saved:
+                try:
+                    if "slowmode" in ACTIONS and ch.slowmode_delay != prev_delay:
+                        await ch.edit(slowmode_delay=prev_delay, reason="Raid over")
+                    if prev_ow is not None:
+                        await ch.set_permissions(role, overwrite=None if prev_ow.is_empty() else prev_ow, reason="Raid over")
+                except Exception:
+                    log.debug("[raid] restore failed for %s", ch.id, exc_info=True)
+            self._restore.pop(guild.id, None)
+            log.info("[raid] guild=%s containment lifted (%d channels)", guild.id, len(saved))
+
+    def _enqueue_ban(self, guild_id: int, user_id: int, reason: str):
+        key = (guild_id, user_id)
+        if key in self._queued:
+            return
+        try:
+            self._bans.put_nowait((guild_id, user_id, reason))
+        except asyncio.QueueFull:
+            log.warning("[raid] ban queue full, dropping %s", user_id)
+            return
+        self._queued[key] = None
+        while len(self._queued) > BAN_QUEUE_MAX * 2:
+            self._queued.popitem(last=False)
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.ensure_future(self._ban_worker())
+
+    async def _ban_worker(self):
+        # one ban at a time, spaced out: REST rate limits apply per guild and a raid is hundreds of accounts
+        while True:
+            guild_id, user_id, reason = await self._bans.get()
+            guild = self.bot.get_guild(guild_id)
+            if guild is not None:
+                ok = await safe_ban_7d(guild, discord.Object(id=user_id), reason=reason[:500])
+                log.info("[raid] ban user=%s guild=%s ok=%s queued=%d", user_id, guild_id, ok, self._bans.qsize())
+            await asyncio.sleep(BAN_INTERVAL_SEC)
+
+async def setup(bot):
+    await bot.add_cog(FastRaidAutoban(bot))
@@ -13,7 +13,9 @@ try:
 except Exception:
     aiohttp = None  # type: ignore
 
-from ..helpers.safety_utils import extract_urls, norm_domain, is_suspicious_domain, SHORTENERS
+from ..helpers.safety_utils import norm_domain, is_suspicious_domain, SHORTENERS
+from ..helpers.message_analysis import analyze
+from ..helpers.domain_reputation import get_domain_reputation
 
 log = logging.getLogger(__name__)
 
@@ -100,14 +102,21 @@ class LinkGuard(commands.Cog):
                 pass
         if not ENABLED or message.author.bot or not message.guild:
             return
-        urls = extract_urls(message.content or "")
+        urls = analyze(message).urls
         if not urls:
             return
         allow = _allowlist()
+        rep = get_domain_reputation()
         hits = []
         for u in urls:
             eu = await self._expand(u)
             host = norm_domain(urlparse(eu).hostname or "")
+            # moderator regex entries (!wl/!bl add <regex>): one combined match per URL
+            pat = rep.match_url(eu)
+            if pat is not None:
+                if pat[0] == "black":
+                    hits.append((eu, host))
+                continue
             if is_suspicious_domain(host, allow):
                 hits.append((eu, host))
         if hits:
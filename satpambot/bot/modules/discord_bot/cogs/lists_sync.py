@@ -7,6 +7,8 @@ from typing import Optional, List, Tuple
 import discord
 
 from satpambot.bot.modules.discord_bot.helpers import lists_loader, modlog, github_sync
+from satpambot.bot.modules.discord_bot.helpers.message_analysis import MessageAnalysis, analyze
+from satpambot.bot.modules.discord_bot.helpers.pattern_matcher import validate_pattern
 
 log = logging.getLogger(__name__)
 
@@ -28,21 +30,8 @@ LISTS_GITHUB_ENABLED = _env_bool("GITHUB_SYNC_ENABLED", True)
 class ListsSync(commands.Cog):
 
     def _extract_domains_from_text(self, text: str):
-        # Extract raw domains and domains from URLs
-        doms = set()
-        if not text:
-            return doms
-        # from URLs
-        for m in re.finditer(r"https?://([^/\s:]+)", text, re.IGNORECASE):
-            doms.add(m.group(1).lower())
-        # bare domains
-        for m in re.finditer(r"\b([a-z0-9-]+(?:\.[a-z0-9-]+)+)\b", text, re.IGNORECASE):
-            doms.add(m.group(1).lower())
-        # strip common trailing punctuation
-        cleaned = set()
-        for d in doms:
-            cleaned.add(d.strip(".,;:!?)(").lower())
-        return cleaned
+        # URL hosts + bare domains (helpers/message_analysis)
+        return set(MessageAnalysis(text).text_domains)
 
     def __init__(self, bot: commands.Bot):
         self.bot = bot
@@ -125,8 +114,8 @@ class ListsSync(commands.Cog):
 
     async def _handle_command(self, message: discord.Message, which: str, cmd: str, arg: str):
         lists = lists_loader.load_whitelist_blacklist()
-        wl_domains = set(lists["wl_domains"]); wl_patterns = lists["wl_patterns"]
-        bl_domains = set(lists["bl_domains"]); bl_patterns = lists["bl_patterns"]
+        wl_domains = set(lists["wl_domains"]); wl_patterns = list(lists["wl_patterns"])
+        bl_domains = set(lists["bl_domains"]); bl_patterns = list(lists["bl_patterns"])
         changed = False
 
         if cmd == "show":
@@ -145,6 +134,12 @@ class ListsSync(commands.Cog):
             await message.reply(f"Format: `!{which} {cmd} <domain|regex>`", mention_author=False)
             return
 
+        if cmd == "add" and not re.search(r"[a-z0-9-]+\.[a-z]{2,}", arg.lower()):
+            err = validate_pattern(arg)
+            if err:
+                await message.reply(f"❌ Regex ditolak: {err}", mention_author=False)
+                return
+
         if which == "wl":
             if cmd == "add":
                 if re.search(r"[a-z0-9-]+\.[a-z]{2,}", arg.lower()):
@@ -194,9 +189,9 @@ class ListsSync(commands.Cog):
             pass
         # --- end guard ---
 
-        # THREAD/FORUM EXEMPTION — auto-inserted
+        # THREAD/FORUM EXEMPTION — auto-inserted (except our own list threads)
         ch = getattr(message, "channel", None)
-        if ch is not None:
+        if ch is not None and getattr(ch, "id", None) not in {self._wh_thread_id, self._bl_thread_id} - {None}:
             try:
                 import discord
                 # Exempt true Thread objects
@@ -234,7 +229,7 @@ class ListsSync(commands.Cog):
 
         # Auto-add domains from plain text (no commands needed)
         if (in_wl or in_bl) and (message.content or "").strip():
-            domains = self._extract_domains_from_text(message.content or "")
+            domains = set(analyze(message).text_domains)
             if domains:
                 lists = lists_loader.load_whitelist_blacklist()
                 wl_domains = set(lists["wl_domains"]); wl_patterns = lists["wl_patterns"]
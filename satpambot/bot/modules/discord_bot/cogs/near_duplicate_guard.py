@@ -0,0 +1,60 @@
+from __future__ import annotations
+
+from discord.ext import commands
+
+import logging, os, time
+import discord
+
+from ..helpers.message_analysis import analyze
+from ..helpers.near_duplicate import get_near_duplicate_detector
+
+log = logging.getLogger(__name__)
+
+# ENV (clustering thresholds: helpers/near_duplicate.py)
+ENABLED = os.getenv("NEARDUP_GUARD_ENABLED","1").lower() not in {"0","false","no"}
+# delete: flagged copies carrying a link, invite or @everyone/@here | delete_all: every flagged copy | log
+ACTION = os.getenv("NEARDUP_ACTION","delete").lower()
+
+class NearDuplicateGuard(commands.Cog):
+    """Removes the same (slightly edited) text posted across channels or accounts within minutes."""
+
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+        self.detector = get_near_duplicate_detector()
+
+    @commands.Cog.listener()
+    async def on_message(self, message: discord.Message):
+        if not ENABLED or not message.guild or message.author.bot:
+            return
+        perms = getattr(message.author, "guild_permissions", None)
+        if perms is not None and perms.manage_messages:
+            return
+        a = analyze(message)
+        v = self.detector.add(message.guild.id, a.simhash, time.time(), message.author.id, message.channel.id, message.id)
+        if v is None or not v.flagged:
+            return
+        if v.newly_flagged:
+            log.warning("[neardup] guild=%s cluster=%s: %d copies, %d channels, %d authors",
+                        message.guild.id, v.cluster, v.size, v.channels, v.authors)
+        risky = bool(a.urls or a.invite_codes or a.mention_everyone)
+        if ACTION == "log" or (ACTION != "delete_all" and not risky):
+            return
+        try:
+            await message.delete()
+        except discord.NotFound:
+            pass
+        except Exception as e:
+            log.debug("[neardup] delete failed: %r", e)
+        for channel_id, message_id in v.earlier:
+            ch = message.guild.get_channel_or_thread(channel_id)
+            if ch is None:
+                continue
+            try:
+                await ch.get_partial_message(message_id).delete()
+            except discord.NotFound:
+                pass
+            except Exception as e:
+                log.debug("[neardup] delete of earlier copy %s failed: %r", message_id, e)
+
+async def setup(bot):
+    await bot.add_cog(NearDuplicateGuard(bot))
@@ -10,6 +10,12 @@ from ..helpers.hash_utils import sha256_bytes
 from ..helpers.safety_utils import extract_urls, norm_domain, is_suspicious_domain
 from ..helpers.ban_utils import safe_ban_7d
 from ..helpers.ocr_clients import smart_ocr
+from ..helpers.ocr_service import priority_for
+from ..helpers.attachment_cache import get_attachment_cache
+from ..helpers.invite_resolver import get_invite_resolver
+from ..helpers.brand_index import get_brand_index
+from ..helpers.keyword_scanner import get_keyword_scanner
+from ..helpers.message_analysis import INVITE_RE
 
 log = logging.getLogger(__name__)
 
@@ -22,17 +28,13 @@ OCR_SCORE_THRESHOLD = float(os.getenv("OCR_SCORE_THRESHOLD","0.0"))  # placehold
 
 # Soft NSFW policy (ENV names provided by user)
 SOFT_POLICY = os.getenv("NSFW_SOFT_POLICY","allow").lower()  # allow|delete|log (never ban)
-SOFT_WORDS = {w.strip().lower() for w in (os.getenv("NSFW_SOFT_KEYWORDS","nsfw,18+,r18,lewd").split(",")) if w.strip()}
 SOFT_TIMEOUT_MIN = int(os.getenv("NSFW_SOFT_TIMEOUT_MIN","0"))  # reserved / format keep
 SOFT_THRESHOLD = float(os.getenv("NSFW_SOFT_THRESHOLD","0"))    # reserved / format keep
 
-INVITE_RE = re.compile(r'(?:discord(?:\.gg|\.com/invite)/)([a-zA-Z0-9-]+)', re.I)
-PHISH_WORDS = re.compile(r'(nitro|airdrop|bonus|free|verify|steam|robux|wallet|crypto)', re.I)
 
-CACHE_TTL = 86400
 MAX_BYTES = 1572864
+OCR_DEADLINE_SEC = float(os.getenv("OCR_DEADLINE_SEC","8"))
 _last_user: dict[int, float] = {}
-_seen: dict[str, float] = {}
 
 class OCRGuard(commands.Cog):
     def __init__(self, bot: commands.Bot):
@@ -47,54 +49,37 @@ class OCRGuard(commands.Cog):
         _last_user[uid] = now
         return True
 
-    def _dedupe(self, h: str) -> bool:
-        now = time.time()
-        ts = _seen.get(h, 0.0)
-        if ts and (now - ts) < CACHE_TTL:
-            return True
-        _seen[h] = now
-        return False
-
     async def _handle_invites(self, message: discord.Message, text: str) -> bool:
         codes = [m.group(1) for m in INVITE_RE.finditer(text or "")]
         if not codes:
             return False
-        # fetch nsfw_level per code; ban only if nsfw
-        for code in codes:
-            try:
-                inv = await self.bot.fetch_invite(code, with_counts=False)
-            except Exception:
-                inv = None
-            if not inv or not inv.guild:
-                # strict handling -> delete only
-                if OCR_ACTION in {"delete","ban"}:
-                    try: await message.delete()
-                    except Exception: pass
-                return True
-            nsfw_level = getattr(inv.guild, "nsfw_level", -1) or -1
-            if nsfw_level >= 2 and OCR_ACTION == "ban":
-                try: await message.delete()
-                except Exception: pass
-                await safe_ban_7d(message.guild, message.author, reason=f"OCR NSFW invite (nsfw_level={nsfw_level})")
-                return True
-            else:
-                if OCR_ACTION in {"delete","ban"}:
-                    try: await message.delete()
-                    except Exception: pass
-                return True
-        return False
+        # nsfw_level per code (cached, one lookup per code); ban only if nsfw
+        infos = await get_invite_resolver(self.bot).resolve_many(codes)
+        nsfw = [i for i in infos.values() if i is not None and i.nsfw]
+        if nsfw and OCR_ACTION == "ban":
+            try: await message.delete()
+            except Exception: pass
+            await safe_ban_7d(message.guild, message.author, reason=f"OCR NSFW invite (nsfw_level={nsfw[0].nsfw_level})")
+            return True
+        # strict handling -> delete only (invalid codes and failed lookups included)
+        if OCR_ACTION in {"delete","ban"}:
+            try: await message.delete()
+            except Exception: pass
+        return True
 
-    def _is_soft_only(self, text: str) -> bool:
+    def _is_soft_only(self, text: str, hits: Optional[dict] = None) -> bool:
         low = (text or "").lower()
         if not low:
             return False
         if INVITE_RE.search(low): 
             return False
-        if PHISH_WORDS.search(low): 
+        # soft (NSFW_SOFT_KEYWORDS) and phishing words come from one keyword_scanner pass
+        hits = get_keyword_scanner().scan(text) if hits is None else hits
+        if "ocr_phish" in hits: 
             return False
         if extract_urls(low): 
             return False
-        return any(w in low for w in SOFT_WORDS)
+        return "soft" in hits
 
     @commands.Cog.listener()
     async def on_message(self, message: discord.Message):
@@ -142,13 +127,12 @@ class OCRGuard(commands.Cog):
             if att.size > MAX_BYTES:
                 continue
             try:
-                b = await att.read()
+                entry = await get_attachment_cache().get(att)
             except Exception:
                 continue
-            h = sha256_bytes(b)
-            if self._dedupe(h):
-                continue
-            txt = await smart_ocr(b, filename=att.filename or "image.jpg")
+            # reposts are answered from the persistent OCR cache (keyed by sha256)
+            txt = await smart_ocr(entry.data, filename=att.filename or "image.jpg", sha256=entry.sha256,
+                                  priority=priority_for(message.author), deadline=OCR_DEADLINE_SEC)
             if not txt:
                 continue
 
@@ -157,7 +141,8 @@ class OCRGuard(commands.Cog):
                 return
 
             # 2) soft-NSFW policy
-            if self._is_soft_only(txt):
+            hits = get_keyword_scanner().scan(txt)
+            if self._is_soft_only(txt, hits):
                 if SOFT_POLICY == "delete":
                     try: await message.delete()
                     except Exception: pass
@@ -165,7 +150,7 @@ class OCRGuard(commands.Cog):
                 return
 
             # 3) non-invite phishing indicators => apply OCR_ACTION but never ban for soft-only
-            risky = bool(PHISH_WORDS.search(txt))
+            risky = "ocr_phish" in hits or bool(get_brand_index().scan_text(txt))
             if not risky:
                 urls = extract_urls(txt)
                 for u in urls:
@@ -9,6 +9,8 @@ from typing import Dict, List, Tuple
 import discord
 from discord.ext import commands, tasks
 
+from ..helpers.message_analysis import tokenize_words
+
 try:
     # prefer project helper if available
     from ..helpers.memory_upsert import upsert_pinned_memory
@@ -31,18 +33,7 @@ STOPWORDS = {
 }
 
 def _tokenize(text: str) -> List[str]:
-    toks = []
-    cur = []
-    for ch in text.lower():
-        if ch.isalnum():
-            cur.append(ch)
-        else:
-            if cur:
-                toks.append(''.join(cur))
-                cur = []
-    if cur:
-        toks.append(''.join(cur))
-    return toks
+    return tokenize_words(text)
 
 def _should_skip_channel(ch: discord.abc.GuildChannel) -> bool:
     # NEVER touch special/system/pinned channels; miner only reads history
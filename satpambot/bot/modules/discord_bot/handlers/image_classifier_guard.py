@@ -5,6 +5,7 @@ from satpambot.bot.modules.discord_bot.utils.actions import delete_message_safe
 from satpambot.bot.modules.discord_bot.helpers.image_classifier import classify_image
 from satpambot.bot.modules.discord_bot.helpers.permissions import is_exempt_user, is_whitelisted_channel
 from ..helpers.log_utils import find_text_channel
+from ..helpers.attachment_cache import read_attachment
 
 logger = logging.getLogger(__name__)
 
@@ -19,7 +20,7 @@ async def handle_image_classifier(message: discord.Message):
             return
         for att in atts:
             try:
-                data = await att.read()
+                data = await read_attachment(att)
                 res = classify_image(data)
                 if not res or not res.get("enabled"):
                     continue
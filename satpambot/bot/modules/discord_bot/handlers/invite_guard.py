@@ -1,17 +1,30 @@
 from __future__ import annotations
 
-import re, logging, discord
+import logging, os, discord
 from satpambot.bot.modules.discord_bot.utils.actions import delete_message_safe
+from satpambot.bot.modules.discord_bot.helpers.message_analysis import INVITE_RE, analyze
+from satpambot.bot.modules.discord_bot.helpers.invite_resolver import get_invite_resolver
 
 logger = logging.getLogger(__name__)
-INVITE_RE = re.compile(r"(?:https?://)?(?:discord(?:app)?\.com/invite/|discord\.gg/|dis\.gd/)([A-Za-z0-9-]+)", re.I)
+
+# all: delete every outside invite (default) | nsfw: only NSFW servers and codes that could not be checked
+INVITE_GUARD_MODE = os.getenv("INVITE_GUARD_MODE", "all").lower()
 
 async def check_nsfw_invites(message: discord.Message, bot):
     try:
         if not message or getattr(message.author, "bot", False):
             return
-        text = getattr(message, "content", "") or ""
-        if INVITE_RE.search(text):
-            await delete_message_safe(message, actor="InviteGuard")
+        codes = analyze(message).invite_codes
+        if not codes:
+            return
+        # shared with OCRGuard: cached per code, one REST call per code during a raid
+        infos = await get_invite_resolver(bot).resolve_many(codes)
+        own = getattr(getattr(message, "guild", None), "id", None)
+        for info in infos.values():
+            if info is not None and info.valid and own is not None and info.guild_id == own:
+                continue  # invite to this server
+            if INVITE_GUARD_MODE != "nsfw" or info is None or info.nsfw:
+                await delete_message_safe(message, actor="InviteGuard")
+                return
     except Exception:
         logger.debug("check_nsfw_invites failed", exc_info=True)
@@ -0,0 +1,173 @@
+"""
+helpers/attachment_cache.py
+One CDN download per attachment, shared by every guard that looks at it.
+
+    entry = await get_attachment_cache().get(att)    # CachedAttachment or raises like att.read()
+    entry.data, entry.sha256, entry.sha1k
+    b = await read_attachment(att)                   # bytes only
+
+Concurrent readers of the same attachment (same id + URL) share a single
+in-flight ``att.read()``. Bytes are kept under a global memory budget with LRU
+eviction and a TTL, so the guards that run for one message (AntiImageScoredGuard,
+OCRGuard, GuardAdvisor, image handlers) hit memory instead of the CDN.
+
+ENV:
+  ATTACH_CACHE_MAX_MB       total budget            (default 64)
+  ATTACH_CACHE_ITEM_MAX_MB  larger files are not kept (default 16)
+  ATTACH_CACHE_TTL          seconds since last use  (default 300)
+"""
+from __future__ import annotations
+
+import asyncio, hashlib, os, time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+SHA1K_BYTES = 12288  # feature_extractor.sha1k prefix length
+
+
+class CachedAttachment:
+    __slots__ = ("data", "ts", "_sha256", "_sha1", "_sha1k")
+
+    def __init__(self, data: bytes):
+        self.data = data
+        self.ts = time.monotonic()
+        self._sha256: Optional[str] = None
+        self._sha1: Optional[str] = None
+        self._sha1k: Optional[str] = None
+
+    @property
+    def size(self) -> int:
+        return len(self.data)
+
+    @property
+    def sha256(self) -> str:
+        if self._sha256 is None:
+            self._sha256 = hashlib.sha256(self.data).hexdigest()
+        return self._sha256
+
+    @property
+    def sha1(self) -> str:
+        """Full-content sha1 (score_utils.simple_bytes_hash)."""
+        if self._sha1 is None:
+            self._sha1 = hashlib.sha1(self.data).hexdigest()
+        return self._sha1
+
+    @property
+    def sha1k(self) -> str:
+        """sha1 of the first 12 KiB (feature_extractor.sha1k)."""
+        if self._sha1k is None:
+            self._sha1k = hashlib.sha1(self.data[:SHA1K_BYTES]).hexdigest()
+        return self._sha1k
+
+
+def attachment_key(att: Any) -> Hashable:
+    return (getattr(att, "id", None), str(getattr(att, "url", "") or getattr(att, "proxy_url", "") or ""))
+
+
+class AttachmentCache:
+    def __init__(self, max_bytes: Optional[int] = None, ttl: Optional[float] = None, max_item_bytes: Optional[int] = None):
+        self.max_bytes = int(max_bytes or float(os.getenv("ATTACH_CACHE_MAX_MB", "64")) * 1024 * 1024)
+        self.max_item_bytes = int(max_item_bytes or float(os.getenv("ATTACH_CACHE_ITEM_MAX_MB", "16")) * 1024 * 1024)
+        self.ttl = float(ttl or os.getenv("ATTACH_CACHE_TTL", "300"))
+        self._items: "OrderedDict[Hashable, CachedAttachment]" = OrderedDict()
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self._bytes = 0
+        self.stats = {"hits": 0, "misses": 0, "shared": 0, "evicted": 0, "expired": 0}
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    @property
+    def total_bytes(self) -> int:
+        return self._bytes
+
+    def _drop(self, key: Hashable) -> None:
+        e = self._items.pop(key, None)
+        if e is not None:
+            self._bytes -= e.size
+
+    def _expire(self, now: float) -> None:
+        # dict order is last-use order (peek refreshes ts), so stop at the first fresh entry
+        for key, e in list(self._items.items()):
+            if now - e.ts < self.ttl:
+                break
+            self._drop(key)
+            self.stats["expired"] += 1
+
+    def _store(self, key: Hashable, entry: CachedAttachment) -> None:
+        if entry.size > self.max_item_bytes or entry.size > self.max_bytes:
+            return
+        self._drop(key)
+        self._items[key] = entry
+        self._bytes += entry.size
+        while self._bytes > self.max_bytes and self._items:
+            old, _ = next(iter(self._items.items()))
+            self._drop(old)
+            self.stats["evicted"] += 1
+
+    def peek(self, att: Any) -> Optional[CachedAttachment]:
+        key = attachment_key(att)
+        e = self._items.get(key)
+        if e is None:
+            return None
+        if time.monotonic() - e.ts >= self.ttl:
+            self._drop(key)
+            self.stats["expired"] += 1
+            return None
+        e.ts = time.monotonic()  # sliding TTL keeps dict order == last-use order
+        self._items.move_to_end(key)
+        return e
+
+    async def get(self, att: Any, store: bool = True) -> CachedAttachment:
+        """
+        Cached entry for att, downloading it at most once. store=False (history
+        backfills) still joins an in-flight read but does not fill the cache.
+        Read errors propagate to every waiter and are not cached.
+        """
+        self._expire(time.monotonic())
+        e = self.peek(att)
+        if e is not None:
+            self.stats["hits"] += 1
+            return e
+        key = attachment_key(att)
+        fut = self._inflight.get(key)
+        if fut is not None:
+            self.stats["shared"] += 1
+            return await asyncio.shield(fut)
+        self.stats["misses"] += 1
+        fut = asyncio.ensure_future(self._fetch(att, key, store))
+        fut.add_done_callback(lambda f: f.cancelled() or f.exception())  # no "never retrieved" noise
+        self._inflight[key] = fut
+        # shield: one cancelled guard must not cancel the download for the others
+        return await asyncio.shield(fut)
+
+    async def _fetch(self, att: Any, key: Hashable, store: bool) -> CachedAttachment:
+        try:
+            entry = CachedAttachment(await att.read())
+            if store:
+                self._store(key, entry)
+            return entry
+        finally:
+            self._inflight.pop(key, None)
+
+    async def read(self, att: Any, store: bool = True) -> bytes:
+        return (await self.get(att, store=store)).data
+
+    def clear(self) -> None:
+        self._items.clear()
+        self._bytes = 0
+
+
+_default: Optional[AttachmentCache] = None
+
+
+def get_attachment_cache() -> AttachmentCache:
+    global _default
+    if _default is None:
+        _default = AttachmentCache()
+    return _default
+
+
+async def read_attachment(att: Any, store: bool = True) -> bytes:
+    """Drop-in for ``await att.read()`` going through the shared cache."""
+    return await get_attachment_cache().read(att, store=store)
@@ -0,0 +1,174 @@
+"""
+helpers/brand_index.py
+Brand-impersonation index: confusable skeletons + deletion neighbourhoods.
+
+    idx = get_brand_index()
+    idx.match("dіsc0rd.com")            # -> ("discord.com", 0)   Cyrillic i, zero
+    idx.match("steamcomunity.com")      # -> ("steamcommunity.com", 1)
+    idx.match("discord-gift.ru")        # -> ("discord.com", 0)   brand name as a hyphen part
+    idx.scan_text(ocr_text)             # -> [("disc0rd-nitro.com", "discord.com", 0), ...]
+
+Each brand domain is reduced to a skeleton. The skeleton decodes punycode,
+applies NFKD and drops combining marks, folds Cyrillic and Greek homoglyphs
+and digit/letter swaps (0->o, 1/i->l, rn->m), and removes hyphens. Every
+string within the brand's edit budget of that skeleton by deletions
+(SymSpell) is stored in one dict. A candidate is skeletonized the same way,
+and its own deletions are looked up. Only the few brands found that way get
+an exact (transposition-aware) distance check, so a lookup costs a few
+dozen dict probes instead of a Levenshtein table per brand.
+
+The edit budget depends on the brand's name length without the TLD: 0 for up
+to 3 chars (x.com, t.co only match by skeleton), 1 for up to 7, 2 beyond.
+A hyphen-separated part of the name that equals a brand name of 4+ chars
+("discord-gift", "free-roblox") also matches, at distance 0. The brand domains
+themselves never match.
+
+Brands: url_check.CRITICAL_BRANDS + TYPOSQUAT_BRANDS (comma separated) +
+the JSON list in TYPOSQUAT_BRANDS_FILE.
+
+ENV:
+  TYPOSQUAT_BRANDS        extra brand domains
+  TYPOSQUAT_BRANDS_FILE   JSON list of brand domains (default data/brand_domains.json)
+"""
+from __future__ import annotations
+
+import json, os, re, unicodedata
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from .url_check import CRITICAL_BRANDS, reg_domain
+
+MAX_EDITS = 2
+
+# homoglyphs of latin letters (Cyrillic, Greek, fullwidth is handled by NFKD) and digit/symbol swaps
+_CONFUSABLES = str.maketrans({
+    "а": "a", "е": "e", "о": "o", "р": "p", "с": "c", "у": "y", "х": "x", "і": "l", "ї": "l",
+    "ј": "j", "ԁ": "d", "ѕ": "s", "ԛ": "q", "ԝ": "w", "һ": "h", "ӏ": "l", "к": "k", "м": "m",
+    "т": "t", "в": "b", "н": "h", "ɡ": "g", "ɩ": "l", "ı": "l",
+    "α": "a", "β": "b", "ε": "e", "ι": "l", "κ": "k", "ν": "v", "ο": "o", "ρ": "p", "τ": "t", "υ": "u", "χ": "x",
+    "0": "o", "1": "l", "i": "l", "|": "l", "!": "l", "3": "e", "4": "a", "5": "s", "7": "t", "8": "b",
+    "@": "a", "$": "s", "-": None, "_": None,
+})
+_MULTI = (("rn", "m"), ("vv", "w"))
+
+_DOMAIN_RE = re.compile(r"(?<![\w.-])((?:[\w-]+\.)+[^\W\d_]{2,})(?![\w-])", re.UNICODE)
+
+
+def skeleton(domain: str) -> str:
+    d = (domain or "").strip().strip(".").lower()
+    if "xn--" in d:
+        try:
+            d = d.encode("ascii").decode("idna")
+        except Exception:
+            pass
+    d = "".join(c for c in unicodedata.normalize("NFKD", d) if not unicodedata.combining(c))
+    d = d.translate(_CONFUSABLES)
+    for a, b in _MULTI:
+        d = d.replace(a, b)
+    return d
+
+
+def edit_budget(brand: str) -> int:
+    name = brand.split(".")[0]
+    return 0 if len(name) <= 3 else 1 if len(name) <= 7 else MAX_EDITS
+
+
+def deletes(s: str, k: int) -> Set[str]:
+    """Every string obtained from s by deleting up to k characters (s included)."""
+    out = frontier = {s}
+    for _ in range(k):
+        frontier = {w[:i] + w[i + 1:] for w in frontier for i in range(len(w))}
+        out = out | frontier
+    return out
+
+
+def osa_distance(a: str, b: str, limit: int) -> int:
+    """Optimal-string-alignment distance (adjacent swaps cost 1); > limit as soon as it is exceeded."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    prev2, prev = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        cur = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+            if prev2 is not None and i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                cur[j] = min(cur[j], prev2[j - 2] + 1)
+        if min(cur) > limit:
+            return limit + 1
+        prev2, prev = prev, cur
+    return prev[-1]
+
+
+def configured_brands() -> List[str]:
+    out = list(CRITICAL_BRANDS)
+    out += [b.strip().lower() for b in re.split(r"[\s,;]+", os.getenv("TYPOSQUAT_BRANDS", "")) if b.strip()]
+    try:
+        with open(os.getenv("TYPOSQUAT_BRANDS_FILE", "data/brand_domains.json"), "r", encoding="utf-8") as f:
+            out += [str(b).strip().lower() for b in json.load(f) if str(b).strip()]
+    except Exception:
+        pass
+    return list(dict.fromkeys(out))
+
+
+class BrandIndex:
+    def __init__(self, brands: Optional[Iterable[str]] = None):
+        self.brands: List[str] = list(dict.fromkeys(b.lower() for b in (brands if brands is not None else configured_brands())))
+        self._exact = set(self.brands)
+        self._skel: Dict[str, str] = {}                   # brand -> skeleton
+        self._by_name: Dict[str, str] = {}                # skeleton of the name label -> brand
+        self._by_delete: Dict[str, Set[str]] = {}         # deletion variant -> brands
+        for b in self.brands:
+            s = self._skel[b] = skeleton(b)
+            name = skeleton(b.split(".")[0])
+            if len(name) >= 4:
+                self._by_name.setdefault(name, b)
+            for v in deletes(s, edit_budget(b)):
+                self._by_delete.setdefault(v, set()).add(b)
+        self._lens = {len(s) for s in self._skel.values()}
+
+    def __len__(self) -> int:
+        return len(self.brands)
+
+    def match(self, domain: str) -> Optional[Tuple[str, int]]:
+        """(impersonated brand, skeleton edit distance) or None; the brand itself is never a match."""
+        d = reg_domain((domain or "").strip().strip(".").lower())
+        if not d or d in self._exact:
+            return None
+        parts = d.split(".")[0].split("-")
+        if len(parts) > 1:
+            for p in parts:
+                b = self._by_name.get(skeleton(p))
+                if b is not None:
+                    return b, 0
+        s = skeleton(d)
+        if not any(abs(len(s) - n) <= MAX_EDITS for n in self._lens):
+            return None
+        cands: Set[str] = set()
+        for v in deletes(s, MAX_EDITS):
+            cands |= self._by_delete.get(v, set())
+        best = None
+        for b in cands:
+            k = edit_budget(b)
+            dist = osa_distance(s, self._skel[b], k)
+            if dist <= k and (best is None or dist < best[1]):
+                best = (b, dist)
+        return best
+
+    def scan_text(self, text: str) -> List[Tuple[str, str, int]]:
+        """(domain as written, brand, distance) for every domain-like token in text (OCR output, messages)."""
+        out = []
+        for m in _DOMAIN_RE.finditer(text or ""):
+            hit = self.match(m.group(1))
+            if hit is not None:
+                out.append((m.group(1), hit[0], hit[1]))
+        return out
+
+
+_default: Optional[BrandIndex] = None
+
+
+def get_brand_index() -> BrandIndex:
+    global _default
+    if _default is None:
+        _default = BrandIndex()
+    return _default
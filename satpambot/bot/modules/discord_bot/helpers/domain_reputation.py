@@ -0,0 +1,218 @@
+"""
+helpers/domain_reputation.py
+Domain white/black lists compiled once into a reversed-label suffix trie.
+
+    rep = get_domain_reputation()
+    rep.check("login.discord-gift.ru")     # -> "black" | "white" | "sus" | "unknown"
+    rep.lookup("cdn.discordapp.com")       # -> ("white", "discordapp.com") | None
+    rep.check_url("https://x.ru/gift/..")  # regex entries first, then check(host)
+
+Rule syntax (same in every list file):
+
+    example.com      example.com and every subdomain
+    *.example.com    subdomains only (".example.com" is the same)
+    *.ru             TLD rule: everything under .ru (".ru" in FAST_BAD_DOMAINS)
+
+A lookup walks the host's labels right to left (com -> example -> login), so it
+costs O(labels) whatever the list sizes are. The most specific matching rule
+wins, so a white "yandex.ru" beats a black ".ru". On a tie black beats white.
+"sus" means no list matched but the registrable domain impersonates a brand
+(helpers/brand_index.py: confusable skeletons, edit distance <= 2).
+
+Sources: WHITELIST_DOMAINS_FILE + URL_WHITELIST_JSON_FILE (url_check's
+built-in defaults if the first is missing), and BLACKLIST_DOMAINS_FILE +
+URL_BLOCKLIST_JSON_FILE + FAST_BAD_DOMAINS. The files are stat'ed at most
+every DOMAIN_REP_POLL seconds and the trie is rebuilt only when one changed.
+lists_loader.save_lists() calls invalidate() so its own writes apply at once.
+
+The "patterns" (regex) entries of the same files are compiled into one
+pattern_matcher.PatternSet per list. The trie and both sets are rebuilt
+together and swapped in as one snapshot, so a lookup never mixes old and new
+lists. A black pattern beats a white one.
+
+ENV:
+  DOMAIN_REP_POLL   seconds between list file stat checks (default 2)
+"""
+from __future__ import annotations
+
+import logging, os, threading, time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from . import lists_loader
+from .pattern_matcher import PatternSet
+from .brand_index import get_brand_index
+from .url_check import DEFAULT_WHITELIST
+
+log = logging.getLogger(__name__)
+
+_EXACT = "\x00="   # rule ends exactly here (plain rules also set _WILD)
+_WILD = "\x00*"    # rule covers every deeper label
+_PRIORITY = {"black": 2, "white": 1, "sus": 0}
+
+
+def to_ascii(host: str) -> str:
+    """Lowercase ASCII (punycode) host without port, trailing dot or leading www."""
+    h = (host or "").strip().lower().split("/")[0].split(":")[0].strip(".")
+    if h.startswith("www."):
+        h = h[4:]
+    try:
+        h = h.encode("idna").decode("ascii")
+    except Exception:
+        pass
+    return h
+
+
+class DomainTrie:
+    """Reversed-label trie of domain rules; each rule carries a kind ("white", "black", "sus")."""
+
+    def __init__(self):
+        self._root: Dict[str, dict] = {}
+        self.rules = 0
+
+    @classmethod
+    def from_rules(cls, rules: Iterable[str], kind: str) -> "DomainTrie":
+        t = cls()
+        for r in rules:
+            t.add(r, kind)
+        return t
+
+    def add(self, rule: str, kind: str) -> bool:
+        raw = (rule or "").strip().lower()
+        wild_only = raw.startswith("*.") or raw.startswith(".")
+        host = to_ascii(raw.lstrip("*").lstrip("."))
+        if not host:
+            return False
+        node = self._root
+        for label in reversed(host.split(".")):
+            node = node.setdefault(label, {})
+        marks = (_WILD,) if wild_only else (_EXACT, _WILD)
+        for m in marks:
+            node.setdefault(m, {}).setdefault(kind, raw)
+        self.rules += 1
+        return True
+
+    def match(self, host: str) -> Optional[Tuple[str, str]]:
+        """(kind, rule) of the most specific rule covering host, or None."""
+        labels = to_ascii(host).split(".")
+        if not labels or not labels[0]:
+            return None
+        best, node = None, self._root
+        n = len(labels)
+        for depth, label in enumerate(reversed(labels), 1):
+            node = node.get(label)
+            if node is None:
+                break
+            marks = node.get(_EXACT if depth == n else _WILD)
+            if marks:
+                kind = max(marks, key=_PRIORITY.get)
+                best = (kind, marks[kind])  # deeper rules overwrite shallower ones
+        return best
+
+
+class DomainReputation:
+    def __init__(self, white_files: Optional[List[Path]] = None, black_files: Optional[List[Path]] = None,
+                 default_white: Iterable[str] = DEFAULT_WHITELIST, extra_black: Optional[Iterable[str]] = None,
+                 poll: Optional[float] = None):
+        self.white_files = [Path(p) for p in (white_files or [lists_loader.WL_FILE, lists_loader.URL_WL_JSON])]
+        self.black_files = [Path(p) for p in (black_files or [lists_loader.BL_FILE, lists_loader.URL_BL_JSON])]
+        self.default_white = list(default_white)
+        if extra_black is None:
+            from .safety_utils import FAST_BAD_DOMAINS  # safety_utils imports this module
+            extra_black = FAST_BAD_DOMAINS
+        self.extra_black = list(extra_black)
+        self.poll = float(poll if poll is not None else os.getenv("DOMAIN_REP_POLL", "2"))
+        self._snap: Tuple[DomainTrie, PatternSet, PatternSet] = (DomainTrie(), PatternSet(), PatternSet())
+        self._key: Optional[tuple] = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+        self.rebuilds = 0
+
+    def _stat_key(self) -> tuple:
+        out = []
+        for p in self.white_files + self.black_files:
+            try:
+                st = p.stat()
+                out.append((st.st_mtime_ns, st.st_size))
+            except OSError:
+                out.append(None)
+        return tuple(out)
+
+    def _build(self) -> Tuple[DomainTrie, PatternSet, PatternSet]:
+        t = DomainTrie()
+        white_main = self.white_files[0] if self.white_files else None
+        for p in self.white_files:
+            for rule in lists_loader._read_any(p):
+                t.add(rule, "white")
+        if white_main is not None and not white_main.exists():
+            for rule in self.default_white:
+                t.add(rule, "white")
+        for p in self.black_files:
+            for rule in lists_loader._read_any(p):
+                t.add(rule, "black")
+        for rule in self.extra_black:
+            t.add(rule, "black")
+        white = PatternSet(p for f in self.white_files for p in lists_loader._read_patterns(f))
+        black = PatternSet(p for f in self.black_files for p in lists_loader._read_patterns(f))
+        return t, white, black
+
+    def refresh(self, force: bool = False) -> DomainTrie:
+        return self._refresh(force)[0]
+
+    def _refresh(self, force: bool = False) -> Tuple[DomainTrie, PatternSet, PatternSet]:
+        now = time.monotonic()
+        if not force and self._key is not None and now - self._checked < self.poll:
+            return self._snap
+        self._checked = now
+        key = self._stat_key()
+        if key != self._key:
+            with self._lock:
+                if key != self._key:
+                    self._snap = self._build()  # built fully, then swapped in one step
+                    self._key = key
+                    self.rebuilds += 1
+                    log.debug("[domain_rep] rebuilt: %d rules, %d/%d patterns",
+                              self._snap[0].rules, len(self._snap[1]), len(self._snap[2]))
+        return self._snap
+
+    def invalidate(self) -> None:
+        """Re-read the lists on the next lookup (after writing them)."""
+        self._key = None
+
+    def lookup(self, host: str) -> Optional[Tuple[str, str]]:
+        return self.refresh().match(host)
+
+    def check(self, host: str) -> str:
+        d = to_ascii(host)
+        if not d:
+            return "unknown"
+        hit = self.lookup(d)
+        if hit is not None:
+            return hit[0]
+        return "sus" if get_brand_index().match(d) is not None else "unknown"
+
+    def match_url(self, url: str) -> Optional[Tuple[str, str]]:
+        """("black" | "white", regex entry) of the first pattern matching url, or None."""
+        _, white, black = self._refresh()
+        hit = black.match(url)
+        if hit is not None:
+            return "black", hit
+        hit = white.match(url)
+        return ("white", hit) if hit is not None else None
+
+    def check_url(self, url: str) -> str:
+        hit = self.match_url(url)
+        if hit is not None:
+            return hit[0]
+        from .message_analysis import url_host
+        return self.check(url_host(url) if "://" in url else url)
+
+
+_default: Optional[DomainReputation] = None
+
+
+def get_domain_reputation() -> DomainReputation:
+    global _default
+    if _default is None:
+        _default = DomainReputation()
+    return _default
@@ -1,15 +1,20 @@
-import re
+from .keyword_scanner import get_keyword_scanner
+
+# mood -> (whole words, emoji); checked in this order
+EMOTION_WORDS = {
+    "happy": (("terima kasih", "makasih", "thanks", "mantap", "keren", "bagus", "nice", "good"), ("😂", "🤣", "😊", "❤️", "✨")),
+    "sad": (("sedih", "down", "capek", "lelah", "gagal"), ("😢", "😭", "😞")),
+    "angry": (("marah", "kesal", "jengkel", "bt"), ("😠", "💢", "😤")),
+}
+_SCORES = {"happy": 0.8, "sad": 0.7, "angry": 0.7}
 
 class EmotionModel:
     def __init__(self):
         pass
 
     def update_from_text(self, user_id: int, text: str):
-        t = (text or "").lower()
-        if re.search(r"\b(terima kasih|makasih|thanks|mantap|keren|bagus|nice|good)\b", t) or any(x in t for x in ["😂","🤣","😊","❤️","✨"]):
-            return "happy", 0.8
-        if re.search(r"\b(sedih|down|capek|lelah|gagal)\b", t) or any(x in t for x in ["😢","😭","😞"]):
-            return "sad", 0.7
-        if re.search(r"\b(marah|kesal|jengkel|bt)\b", t) or any(x in t for x in ["😠","💢","😤"]):
-            return "angry", 0.7
+        hits = get_keyword_scanner().scan(text or "")
+        for mood in EMOTION_WORDS:
+            if f"emotion:{mood}" in hits:
+                return mood, _SCORES[mood]
         return "neutral", 0.3
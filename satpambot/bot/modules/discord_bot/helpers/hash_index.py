@@ -0,0 +1,572 @@
+"""
+helpers/hash_index.py
+Packed Hamming index for perceptual hashes (phash/dhash/ahash, hex or int).
+
+Hashes are stored as a contiguous ``uint64`` matrix (one row per hash, one
+column per 64-bit word) so a batch of queries is answered with a single
+broadcasted XOR + popcount instead of a Python ``int(a,16) ^ int(b,16)`` loop.
+
+    idx = HashIndex(["f0e1d2c3b4a59687", ...])
+    idx.first_within(["f0e1d2c3b4a59686"], max_distance=6)  # -> (0, 0, 1)
+    idx.nearest(["..."], k=3)                                # -> [[(pos, dist), ...]]
+    HashIndex.from_sorted(np.memmap(...))   # read-only, uses the array in place
+
+Radius queries can also run sublinearly (``strategy=``):
+    "linear"  vectorized full scan (always exact, best for large radii)
+    "mih"     multi-index hashing: 64 bits split into ``bands`` bands, one
+              sorted table per band; pigeonhole guarantees a match within r has
+              some band within r // bands, candidates are then verified exactly
+    "bktree"  BK-tree over the integer hashes (pure Python, opt-in; the
+              benchmark shows the vectorized scan beating it at every radius)
+    "auto"    (default) per query picks mih when its probe cost beats a scan,
+              i.e. small radii (the 6-10 used by dhash/phash_reconcile) on big DBs
+
+NumPy is optional; without it the same API falls back to ``int.bit_count``.
+"""
+from __future__ import annotations
+
+import itertools
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+try:
+    import numpy as np
+except Exception:  # pragma: no cover
+    np = None  # type: ignore
+
+HashLike = Union[str, int]
+
+_MASK64 = (1 << 64) - 1
+# rows compared per broadcast step; keeps the (queries x rows) scratch small
+BLOCK_ROWS = 65536
+
+if np is not None:
+    _POP8 = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+    _HAS_BITWISE_COUNT = hasattr(np, "bitwise_count")
+else:  # pragma: no cover
+    _POP8 = None
+    _HAS_BITWISE_COUNT = False
+
+
+def parse_hash(h: Any) -> Optional[int]:
+    """Hex string / int / imagehash object -> int, or None if unparsable."""
+    if h is None or isinstance(h, bool):
+        return None
+    if isinstance(h, int):
+        return h if h >= 0 else None
+    try:
+        s = str(h).strip().lower()
+        if s.startswith("0x"):
+            s = s[2:]
+        return int(s, 16) if s else None
+    except Exception:
+        return None
+
+
+def popcount64(arr: "np.ndarray") -> "np.ndarray":
+    """Per-element popcount of a uint64 array (same shape, small int dtype)."""
+    if _HAS_BITWISE_COUNT:
+        return np.bitwise_count(arr)
+    a = np.ascontiguousarray(arr, dtype=np.uint64)
+    return _POP8[a.view(np.uint8)].reshape(a.shape + (8,)).sum(axis=-1, dtype=np.uint16)
+
+
+def _words_needed(v: int) -> int:
+    return max(1, (v.bit_length() + 63) // 64)
+
+
+def _split_words(v: int, words: int) -> List[int]:
+    return [(v >> (64 * i)) & _MASK64 for i in range(words)]
+
+
+def _high_bits(v: int, words: int) -> int:
+    """Set bits of v above the first `words` 64-bit words."""
+    return (v >> (64 * words)).bit_count()
+
+
+def pack_hashes(hashes: Iterable[HashLike], words: int = 1) -> "np.ndarray":
+    """Pack hashes into an (N, words) uint64 matrix; unparsable entries become 0."""
+    rows = []
+    for h in hashes:
+        v = parse_hash(h)
+        rows.append(_split_words(v or 0, words))
+    if not rows:
+        return np.zeros((0, words), dtype=np.uint64)
+    return np.array(rows, dtype=np.uint64).reshape(len(rows), words)
+
+
+STRATEGIES = ("auto", "linear", "mih", "bktree")
+# "auto": a vectorized scan of one row costs roughly this many band-table probe units
+# (benchmarks/hash_index_bench.py: ~6 ns per scanned row vs ~100 ns per probe unit)
+LINEAR_ROW_COST = 0.06
+# unindexed tail rows tolerated before the band tables are rebuilt
+MIH_REBUILD_MIN = 1024
+
+_FLIP_MASKS: Dict[Tuple[int, int], Any] = {}
+
+
+def _flip_masks(width: int, radius: int):
+    """All width-bit masks with popcount <= radius, as a uint64 array."""
+    key = (width, radius)
+    if key not in _FLIP_MASKS:
+        masks = [0]
+        for r in range(1, min(radius, width) + 1):
+            for combo in itertools.combinations(range(width), r):
+                m = 0
+                for b in combo:
+                    m |= 1 << b
+                masks.append(m)
+        _FLIP_MASKS[key] = np.array(masks, dtype=np.uint64)
+    return _FLIP_MASKS[key]
+
+
+def _n_masks(width: int, radius: int) -> int:
+    from math import comb
+    return sum(comb(width, r) for r in range(0, min(radius, width) + 1))
+
+
+class BandIndex:
+    """
+    Multi-index hashing tables for 64-bit hashes: for each band a sorted array of
+    band values plus the row order, so a probe set is resolved with one
+    ``searchsorted`` per band.
+    """
+
+    def __init__(self, bands: int = 4, bits: int = 64):
+        self.bands = max(1, min(int(bands), bits))
+        self.bits = bits
+        edges = [round(i * bits / self.bands) for i in range(self.bands + 1)]
+        self.spans = [(edges[i], edges[i + 1] - edges[i]) for i in range(self.bands)]
+        self.built = 0
+        self._vals: List[Any] = []
+        self._order: List[Any] = []
+
+    def rebuild(self, col: "np.ndarray") -> None:
+        """col: (N,) uint64 column of the hashes to index."""
+        self._vals, self._order = [], []
+        for shift, width in self.spans:
+            v = (col >> np.uint64(shift)) & np.uint64((1 << width) - 1)
+            order = np.argsort(v, kind="stable").astype(np.int64)
+            self._vals.append(v[order])
+            self._order.append(order)
+        self.built = int(col.shape[0])
+
+    def probe_cost(self, n: int, radius: int) -> float:
+        sub = radius // self.bands
+        return sum(_n_masks(w, sub) * (1.0 + n / float(1 << w)) for _, w in self.spans)
+
+    def candidates(self, v: int, radius: int) -> "np.ndarray":
+        """Indexed rows that may be within radius of v (superset, unverified)."""
+        sub = radius // self.bands
+        out = []
+        for (shift, width), vals, order in zip(self.spans, self._vals, self._order):
+            q = (v >> shift) & ((1 << width) - 1)
+            probes = np.uint64(q) ^ _flip_masks(width, sub)
+            lo = np.searchsorted(vals, probes, side="left")
+            hi = np.searchsorted(vals, probes, side="right")
+            for a, b in zip(lo[hi > lo].tolist(), hi[hi > lo].tolist()):
+                out.append(order[a:b])
+        if not out:
+            return np.zeros(0, dtype=np.int64)
+        return np.unique(np.concatenate(out))
+
+
+class BKTree:
+    """Burkhard-Keller tree over integer hashes under Hamming distance."""
+
+    def __init__(self):
+        self._root: Optional[list] = None  # node = [value, [positions], {dist: child}]
+        self.size = 0
+
+    def add(self, v: int, pos: int) -> None:
+        self.size += 1
+        if self._root is None:
+            self._root = [v, [pos], {}]
+            return
+        node = self._root
+        while True:
+            d = (v ^ node[0]).bit_count()
+            if d == 0:
+                node[1].append(pos)
+                return
+            child = node[2].get(d)
+            if child is None:
+                node[2][d] = [v, [pos], {}]
+                return
+            node = child
+
+    def search(self, v: int, radius: int) -> List[Tuple[int, int]]:
+        """[(position, distance), ...] of every value within radius."""
+        out: List[Tuple[int, int]] = []
+        if self._root is None:
+            return out
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            d = (v ^ node[0]).bit_count()
+            if d <= radius:
+                out.extend((p, d) for p in node[1])
+            lo, hi = d - radius, d + radius
+            for cd, child in node[2].items():
+                if lo <= cd <= hi:
+                    stack.append(child)
+        return out
+
+
+class HashIndex:
+    """Append-only Hamming index. Positions are stable for the index lifetime."""
+
+    def __init__(self, hashes: Iterable[HashLike] = (), payloads: Optional[Iterable[Any]] = None, bits: int = 64,
+                 strategy: str = "auto", bands: int = 4):
+        if strategy not in STRATEGIES:
+            raise ValueError(f"unknown strategy {strategy!r}; expected one of {STRATEGIES}")
+        self.strategy = strategy
+        self._band: Optional[BandIndex] = BandIndex(bands) if np is not None else None
+        self._bk: Optional[BKTree] = None
+        self._words = max(1, (int(bits) + 63) // 64)
+        self._n = 0
+        self._keys: List[HashLike] = []
+        self._payloads: List[Any] = []
+        self._ints: List[int] = []
+        self._exact: Dict[int, int] = {}
+        self._arr = np.zeros((0, self._words), dtype=np.uint64) if np is not None else None
+        self._sorted: Optional["np.ndarray"] = None
+        self.extend(hashes, payloads)
+
+    @classmethod
+    def from_sorted(cls, arr: "np.ndarray", strategy: str = "auto", bands: int = 4) -> "HashIndex":
+        """
+        Read-only index over a sorted (N,) uint64 array used in place (e.g. a
+        memmap): no per-row Python objects, exact lookups by binary search.
+        Keys are the hashes as ints; payloads are None.
+        """
+        idx = cls(strategy=strategy, bands=bands)
+        idx._arr = arr.reshape(-1, 1)
+        idx._sorted = arr
+        idx._n = int(arr.shape[0])
+        return idx
+
+    # ---------- building ----------
+    def __len__(self) -> int:
+        return self._n
+
+    def __contains__(self, h: Any) -> bool:
+        v = parse_hash(h)
+        return v is not None and self._exact_pos(v) is not None
+
+    @property
+    def words(self) -> int:
+        return self._words
+
+    def key(self, pos: int) -> HashLike:
+        if self._sorted is not None:
+            return int(self._sorted[pos])
+        return self._keys[pos]
+
+    def payload(self, pos: int) -> Any:
+        return None if self._sorted is not None else self._payloads[pos]
+
+    def keys(self) -> List[HashLike]:
+        if self._sorted is not None:
+            return self._sorted.tolist()
+        return list(self._keys[: self._n])
+
+    def _int(self, pos: int) -> int:
+        return int(self._sorted[pos]) if self._sorted is not None else self._ints[pos]
+
+    def _exact_pos(self, v: int) -> Optional[int]:
+        """Position of the first stored hash equal to v, or None."""
+        if self._sorted is None:
+            return self._exact.get(v)
+        if v > _MASK64 or not self._n:
+            return None
+        i = int(np.searchsorted(self._sorted, np.uint64(v)))
+        return i if i < self._n and int(self._sorted[i]) == v else None
+
+    def _check_writable(self) -> None:
+        if self._sorted is not None:
+            raise TypeError("HashIndex.from_sorted() views are read-only")
+
+    def _widen(self, words: int) -> None:
+        if words <= self._words:
+            return
+        if self._arr is not None:
+            pad = np.zeros((self._arr.shape[0], words - self._words), dtype=np.uint64)
+            self._arr = np.hstack([self._arr, pad])
+        self._words = words
+
+    def _reserve(self, extra: int) -> None:
+        if self._arr is None:
+            return
+        need = self._n + extra
+        cap = self._arr.shape[0]
+        if need <= cap:
+            return
+        new_cap = max(need, cap * 2, 64)
+        grown = np.zeros((new_cap, self._words), dtype=np.uint64)
+        grown[: self._n] = self._arr[: self._n]
+        self._arr = grown
+
+    def add(self, h: HashLike, payload: Any = None) -> Optional[int]:
+        """Append one hash; returns its position or None if it could not be parsed."""
+        self._check_writable()
+        v = parse_hash(h)
+        if v is None:
+            return None
+        self._widen(_words_needed(v))
+        self._reserve(1)
+        pos = self._n
+        if self._arr is not None:
+            self._arr[pos] = _split_words(v, self._words)
+        self._keys.append(h)
+        self._payloads.append(payload)
+        self._ints.append(v)
+        self._exact.setdefault(v, pos)
+        self._n += 1
+        return pos
+
+    def extend(self, hashes: Iterable[HashLike], payloads: Optional[Iterable[Any]] = None) -> int:
+        self._check_writable()
+        parsed: List[Tuple[HashLike, int, Any]] = []
+        pl = iter(payloads) if payloads is not None else None
+        for h in hashes:
+            p = next(pl, None) if pl is not None else None
+            v = parse_hash(h)
+            if v is not None:
+                parsed.append((h, v, p))
+        if not parsed:
+            return 0
+        self._widen(max(_words_needed(v) for _, v, _ in parsed))
+        self._reserve(len(parsed))
+        start = self._n
+        if self._arr is not None:
+            block = [_split_words(v, self._words) for _, v, _ in parsed]
+            self._arr[start : start + len(parsed)] = np.array(block, dtype=np.uint64).reshape(len(parsed), self._words)
+        for i, (h, v, p) in enumerate(parsed):
+            self._keys.append(h)
+            self._payloads.append(p)
+            self._ints.append(v)
+            self._exact.setdefault(v, start + i)
+        self._n += len(parsed)
+        return len(parsed)
+
+    # ---------- querying ----------
+    def _parse_queries(self, queries: Iterable[HashLike]) -> List[Tuple[int, int]]:
+        """Return (query_index, int_value) for parsable queries."""
+        if isinstance(queries, (str, int)):
+            queries = [queries]
+        out: List[Tuple[int, int]] = []
+        for qi, q in enumerate(queries):
+            v = parse_hash(q)
+            if v is not None:
+                out.append((qi, v))
+        return out
+
+    def _blocks(self, qvals: Sequence[int]) -> Iterator[Tuple[int, Any]]:
+        """Yield (row_offset, dist) where dist is a (len(qvals), rows) distance block."""
+        if not qvals or not self._n:
+            return
+        if self._arr is None:  # pure-python fallback
+            yield 0, [[(q ^ v).bit_count() for v in self._ints] for q in qvals]
+            return
+        # stored hashes are zero above self._words, so a wider query only adds
+        # the popcount of its high bits; the index itself is left untouched
+        Q = np.array([_split_words(v, self._words) for v in qvals], dtype=np.uint64)
+        high = np.array([_high_bits(v, self._words) for v in qvals], dtype=np.int32)
+        for start in range(0, self._n, BLOCK_ROWS):
+            rows = self._arr[start : min(self._n, start + BLOCK_ROWS)]
+            x = Q[:, None, :] ^ rows[None, :, :]
+            d = popcount64(x).sum(axis=-1, dtype=np.int32)
+            yield start, d + high[:, None] if high.any() else d
+
+    def _plan(self, radius: int) -> str:
+        """Pick the radius-search strategy for this query."""
+        if self.strategy == "bktree":
+            return "bktree"
+        # band tables cover single-word (64-bit) hashes and need NumPy
+        if self.strategy == "linear" or self._band is None or self._words != 1:
+            return "linear"
+        if self.strategy == "mih":
+            return "mih"
+        if self._n < MIH_REBUILD_MIN:
+            return "linear"
+        return "mih" if self._band.probe_cost(self._n, radius) < self._n * LINEAR_ROW_COST else "linear"
+
+    def _ensure_bk(self) -> BKTree:
+        if self._bk is None:
+            self._bk = BKTree()
+        for pos in range(self._bk.size, self._n):
+            self._bk.add(self._int(pos), pos)
+        return self._bk
+
+    def _ensure_band(self) -> BandIndex:
+        band = self._band
+        if self._n - band.built > max(MIH_REBUILD_MIN, band.built // 8):
+            band.rebuild(self._arr[: self._n, 0])
+        return band
+
+    def _radius_search(self, qvals: Sequence[int], radius: int, plan: str) -> List[List[Tuple[int, int]]]:
+        """Per query, [(position, distance), ...] within radius sorted by position."""
+        out: List[List[Tuple[int, int]]] = []
+        if plan == "bktree":
+            bk = self._ensure_bk()
+            for v in qvals:
+                out.append(sorted(bk.search(v, radius)))
+            return out
+        band = self._ensure_band()
+        tail = np.arange(band.built, self._n, dtype=np.int64)
+        for v in qvals:
+            high = _high_bits(v, 1)
+            v &= _MASK64
+            if high > radius:
+                out.append([])
+                continue
+            cand = band.candidates(v, radius - high) if band.built else np.zeros(0, dtype=np.int64)
+            if tail.size:
+                cand = np.concatenate([cand, tail])
+            if not cand.size:
+                out.append([])
+                continue
+            d = popcount64(self._arr[cand, 0] ^ np.uint64(v)).astype(np.int32) + high
+            keep = d <= radius
+            out.append(sorted(zip(cand[keep].tolist(), d[keep].tolist())))
+        return out
+
+    def distances(self, query: HashLike) -> List[int]:
+        """Distance from one query to every stored hash (by position)."""
+        v = parse_hash(query)
+        if v is None:
+            return []
+        out: List[int] = []
+        for _, d in self._blocks([v]):
+            out.extend(int(x) for x in d[0])
+        return out
+
+    def first_within(self, queries: Iterable[HashLike], max_distance: int = 0) -> Optional[Tuple[int, int, int]]:
+        """
+        First (query_index, position, distance) with distance <= max_distance.
+        Exact matches are checked first; queries are tried in order.
+        """
+        parsed = self._parse_queries(queries)
+        for qi, v in parsed:
+            pos = self._exact_pos(v)
+            if pos is not None:
+                return qi, pos, 0
+        if max_distance <= 0 or not parsed:
+            return None
+        qvals = [v for _, v in parsed]
+        plan = self._plan(max_distance)
+        if plan != "linear":
+            for (qi, _), found in zip(parsed, self._radius_search(qvals, max_distance, plan)):
+                if found:
+                    return qi, found[0][0], found[0][1]
+            return None
+        best: Optional[Tuple[int, int, int]] = None
+        for start, d in self._blocks(qvals):
+            if self._arr is None:
+                for row, dists in enumerate(d):
+                    for j, dist in enumerate(dists):
+                        if dist <= max_distance:
+                            cand = (parsed[row][0], start + j, int(dist))
+                            if best is None or cand[0] < best[0]:
+                                best = cand
+                            break
+                continue
+            hits = d <= max_distance
+            rows_hit = np.flatnonzero(hits.any(axis=1))
+            for row in rows_hit:
+                j = int(np.argmax(hits[row]))
+                cand = (parsed[int(row)][0], start + j, int(d[row, j]))
+                if best is None or cand[0] < best[0]:
+                    best = cand
+            if best is not None and best[0] == parsed[0][0]:
+                break
+        return best
+
+    def any_within(self, queries: Iterable[HashLike], max_distance: int = 0) -> bool:
+        return self.first_within(queries, max_distance) is not None
+
+    def hits(self, queries: Iterable[HashLike], max_distance: int = 0) -> List[bool]:
+        """Per query: is any stored hash within max_distance (unparsable -> False)."""
+        if isinstance(queries, (str, int)):
+            queries = [queries]
+        queries = list(queries)
+        out = [False] * len(queries)
+        parsed = self._parse_queries(queries)
+        pending = []
+        for qi, v in parsed:
+            if self._exact_pos(v) is not None:
+                out[qi] = True
+            else:
+                pending.append((qi, v))
+        if max_distance <= 0 or not pending:
+            return out
+        plan = self._plan(max_distance)
+        if plan != "linear":
+            for (qi, _), found in zip(pending, self._radius_search([v for _, v in pending], max_distance, plan)):
+                out[qi] = bool(found)
+            return out
+        for _, d in self._blocks([v for _, v in pending]):
+            if self._arr is None:
+                row_hit = [any(x <= max_distance for x in dists) for dists in d]
+            else:
+                row_hit = (d <= max_distance).any(axis=1).tolist()
+            for (qi, _), hit in zip(pending, row_hit):
+                if hit:
+                    out[qi] = True
+        return out
+
+    def all_within(self, queries: Iterable[HashLike], max_distance: int) -> List[Tuple[int, int, int]]:
+        """Every (query_index, position, distance) pair with distance <= max_distance."""
+        parsed = self._parse_queries(queries)
+        out: List[Tuple[int, int, int]] = []
+        plan = self._plan(max_distance)
+        if plan != "linear" and parsed:
+            for (qi, _), found in zip(parsed, self._radius_search([v for _, v in parsed], max_distance, plan)):
+                out.extend((qi, pos, dist) for pos, dist in found)
+            out.sort(key=lambda t: (t[0], t[2], t[1]))
+            return out
+        for start, d in self._blocks([v for _, v in parsed]):
+            if self._arr is None:
+                for row, dists in enumerate(d):
+                    out.extend((parsed[row][0], start + j, int(x)) for j, x in enumerate(dists) if x <= max_distance)
+                continue
+            rows, cols = np.nonzero(d <= max_distance)
+            out.extend((parsed[int(r)][0], start + int(c), int(d[r, c])) for r, c in zip(rows, cols))
+        out.sort(key=lambda t: (t[0], t[2], t[1]))
+        return out
+
+    def nearest(self, queries: Iterable[HashLike], k: int = 1) -> List[List[Tuple[int, int]]]:
+        """
+        k nearest stored hashes per query as [(position, distance), ...] sorted by distance.
+        Unparsable queries yield an empty list.
+        """
+        if isinstance(queries, (str, int)):
+            queries = [queries]
+        queries = list(queries)
+        parsed = self._parse_queries(queries)
+        result: List[List[Tuple[int, int]]] = [[] for _ in queries]
+        if k <= 0 or not parsed or not self._n:
+            return result
+        acc: List[List[Tuple[int, int]]] = [[] for _ in parsed]
+        for start, d in self._blocks([v for _, v in parsed]):
+            if self._arr is None:
+                for row, dists in enumerate(d):
+                    acc[row].extend((start + j, int(x)) for j, x in enumerate(dists))
+                    acc[row] = sorted(acc[row], key=lambda t: (t[1], t[0]))[:k]
+                continue
+            kk = min(k, d.shape[1])
+            part = np.argpartition(d, kk - 1, axis=1)[:, :kk]
+            for row in range(d.shape[0]):
+                acc[row].extend((start + int(j), int(d[row, j])) for j in part[row])
+                acc[row] = sorted(acc[row], key=lambda t: (t[1], t[0]))[:k]
+        for (qi, _), hits in zip(parsed, acc):
+            result[qi] = hits
+        return result
+
+
+def hamming_int(a: HashLike, b: HashLike) -> Optional[int]:
+    """Scalar Hamming distance between two hashes, or None if either is unparsable."""
+    x, y = parse_hash(a), parse_hash(b)
+    if x is None or y is None:
+        return None
+    return (x ^ y).bit_count()
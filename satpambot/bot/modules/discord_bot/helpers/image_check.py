@@ -1,7 +1,9 @@
 # Blacklist image check with multi-hash (auto 2025-08-09T12:25:01.106184Z)
-import os, json, re
+import os, json, re, hashlib
 from datetime import datetime
-from satpambot.bot.modules.discord_bot.helpers.image_hashing import compute_all_hashes, hamming
+from satpambot.bot.modules.discord_bot.helpers.image_hashing import compute_all_hashes, compute_all_hashes_batch, hamming
+from satpambot.bot.modules.discord_bot.helpers.hash_index import HashIndex, np, pack_hashes, popcount64
+from satpambot.bot.modules.discord_bot.helpers.phash_store import AppendOnlyStore
 
 DATA_FILE = os.getenv("BLACKLIST_IMAGE_HASHES", "data/blacklist_image_hashes.json")
 PHASH_MAX = int(os.getenv("IMG_PHASH_MAX_DIST", "16"))
@@ -24,22 +26,88 @@ def _load_md5_list():
         pass
     return arr
 
-def _load_db():
+_MD5 = {"key": None, "set": frozenset()}
+
+def md5_blacklist():
+    """Set of blacklisted md5s from TXT_FILE, re-read only when the file changes."""
     try:
-        with open(DATA_FILE, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except Exception:
-        return []
+        st = os.stat(TXT_FILE); key = (st.st_mtime_ns, st.st_size)
+    except OSError:
+        key = None
+    if key != _MD5["key"]:
+        _MD5["set"] = frozenset(_load_md5_list()) if key else frozenset(); _MD5["key"] = key
+    return _MD5["set"]
+
+def db_version():
+    """Changes whenever the blacklist DB does (cache key for derived verdicts)."""
+    store = _store(); return (id(store), store.version)
+
+_STORE = {"store": None}
+
+def _store() -> AppendOnlyStore:
+    # DATA_FILE stays a JSON list (snapshot); new entries are appended to DATA_FILE + ".log"
+    if _STORE["store"] is None:
+        _STORE["store"] = AppendOnlyStore(DATA_FILE, read_snapshot=lambda obj: obj if isinstance(obj, list) else [],
+                                          write_snapshot=list, indent=2)
+    _STORE["store"].refresh()
+    return _STORE["store"]
+
+def _load_db():
+    return _store().items
+
+class _EntryIndex:
+    """phash/dhash/ahash indexes + (N, grid*grid) region matrix over the blacklist entries."""
+    def __init__(self, items):
+        self.items = [e for e in items if isinstance(e, dict)]
+        self.phash = HashIndex(e.get("phash", 0) for e in self.items)
+        self.dhash = HashIndex(e.get("dhash", 0) for e in self.items)
+        self.ahash = HashIndex(e.get("ahash", 0) for e in self.items)
+        self.regions = None
+        if REGION_USE and np is not None and self.items:
+            width = max(len(e.get("regions") or []) for e in self.items)
+            if width:
+                rows = [list(e.get("regions") or []) + [None] * (width - len(e.get("regions") or [])) for e in self.items]
+                self.regions = pack_hashes([h for r in rows for h in r]).reshape(len(rows), width)
+                self.region_valid = np.array([[h is not None for h in r] for r in rows], dtype=bool)
+
+    def match_mask(self, sample):
+        n = len(self.items)
+        if np is None or len(self.phash) != n or len(self.dhash) != n or len(self.ahash) != n:
+            return [_match_entry(e, sample) for e in self.items]
+        pd = np.asarray(self.phash.distances(sample.get("phash", 0)))
+        dd = np.asarray(self.dhash.distances(sample.get("dhash", 0)))
+        ad = np.asarray(self.ahash.distances(sample.get("ahash", 0)))
+        mask = (pd <= PHASH_MAX) | ((dd <= DHASH_MAX) & (ad <= AHASH_MAX))
+        sr = sample.get("regions") or []
+        if self.regions is not None and sr:
+            w = min(len(sr), self.regions.shape[1])
+            q = pack_hashes(sr[:w]).reshape(1, w)
+            close = (popcount64(self.regions[:, :w] ^ q) <= DHASH_MAX) & self.region_valid[:, :w]
+            mask |= close.sum(axis=1) >= REGION_MAX_HITS
+        return mask.tolist()
+
+_INDEX = {"key": None, "index": None}
 
-def _save_db(items):
-    os.makedirs(os.path.dirname(DATA_FILE), exist_ok=True)
-    with open(DATA_FILE, "w", encoding="utf-8") as f:
-        json.dump(items, f, ensure_ascii=False, indent=2)
+def _load_index() -> _EntryIndex:
+    store = _store(); key = (id(store), store.version)
+    if _INDEX["key"] != key or _INDEX["index"] is None:
+        _INDEX["index"] = _EntryIndex(store.items); _INDEX["key"] = key
+    return _INDEX["index"]
 
 def add_to_blacklist(image_bytes: bytes, note: str = None, added_by: str = None):
     entry = compute_all_hashes(image_bytes)
     entry.update({"note": note or "", "added_by": added_by or "dashboard", "added_at": datetime.utcnow().isoformat() + "Z"})
-    items = _load_db(); items.append(entry); _save_db(items); return entry
+    _store().add(entry); return entry
+
+def add_many_to_blacklist(images, note: str = None, added_by: str = None):
+    """Bulk add (folder of samples): one batched hash pass and one DB write. Undecodable images are skipped."""
+    now = datetime.utcnow().isoformat() + "Z"
+    entries = [e for e in compute_all_hashes_batch(list(images)) if e is not None]
+    for e in entries:
+        e.update({"note": note or "", "added_by": added_by or "dashboard", "added_at": now})
+    if entries:
+        _store().extend(entries)
+    return entries
 
 def _match_entry(entry, sample):
     pm = hamming(entry.get("phash",0), sample.get("phash",0)) <= PHASH_MAX
@@ -55,11 +123,11 @@ def _match_entry(entry, sample):
         if hits >= REGION_MAX_HITS: return True
     return False
 
+def matches_blacklist(sample) -> bool:
+    """sample: compute_all_hashes() output (e.g. the executor's "multi" family)."""
+    return bool(sample) and any(_load_index().match_mask(sample))
+
 def is_blacklisted_image(image_bytes: bytes):
-    s = compute_all_hashes(image_bytes)
-    md5s = set(_load_md5_list())
-    if md5s and 'md5' in s and (s['md5'] or '').lower() in md5s:
+    if hashlib.md5(image_bytes).hexdigest() in md5_blacklist():
         return True
-    for e in _load_db():
-        if _match_entry(e, s): return True
-    return False
+    return matches_blacklist(compute_all_hashes(image_bytes))
@@ -0,0 +1,412 @@
+"""
+helpers/image_features.py
+Decode an image once and derive every perceptual hash from shared buffers.
+
+    f = ImageFeatures.from_bytes(data)
+    f.phash_hex        # imagehash.phash-compatible 16-hex string
+    f.dhash64_hex      # feature_extractor.dhash64 convention
+    f.tile_hashes(3)   # per-tile pHash ints (row-major)
+    [v.phash_hex for v in f.variants()]   # mirror, rot +/-7deg, 95% crop
+    ImageFeatures.frames_from_bytes(gif)  # scene-change keyframes of an animation
+
+Decoding uses ``Image.draft()`` for JPEG (DCT-domain downscale) and an early
+``reduce()`` for other formats, so a 4000x3000 screenshot is never converted or
+copied at full size unless ``full=True`` (OCR/ORB), ``.image()`` or
+``dhash64_hex`` asks for it.
+From the reduced grayscale base a small pyramid is built lazily: 9x8 (dhash),
+32x32 (phash), 8x8 (ahash, block mean of 32x32) and a 256x256 base used for
+tile grids and augmented variants. Each hash family is computed on first access
+only and cached on the instance.
+
+Animated GIF/WebP frames are picked by scene change rather than a fixed
+stride: every frame gets a 32x32 luminance thumbnail, and a frame becomes a
+keyframe only if its histogram / thumbnail delta to every keyframe kept so far
+reaches IMG_KEYFRAME_DELTA. Near-identical padding frames are therefore never
+hashed, the payload frame of a "200 copies + 1 scam frame" GIF always is, and
+the scan stops after IMG_KEYFRAME_BUDGET_MS of this thread's CPU time per
+attachment.
+
+Bit conventions match the existing call sites (row-major, MSB first):
+    phash / phash_hex   imagehash.phash: unnormalized DCT-II, median of 8x8
+    phash_ortho         image_hashing.phash: ortho DCT, median of low[1:,1:]
+    dhash / dhash_hex   imagehash.dhash / img_hashing: right > left on 9x8
+    dhash64_hex         feature_extractor.dhash64: left > right on 9x8, from the
+                        full-size frame with PIL's default resample (exact
+                        values are stored in the ML state whitelist)
+    dhash_sq            image_hashing.dhash: right > left on 9x9 (72 bits)
+    ahash               image_hashing.ahash: pixel > mean on 8x8
+"""
+from __future__ import annotations
+
+import io, os, time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+try:
+    import numpy as np
+except Exception:  # pragma: no cover
+    np = None  # type: ignore
+
+try:
+    from PIL import Image, ImageFile, ImageOps
+    ImageFile.LOAD_TRUNCATED_IMAGES = True
+    _LANCZOS = getattr(Image, "Resampling", Image).LANCZOS
+except Exception:  # pragma: no cover
+    Image = None  # type: ignore
+    ImageOps = None  # type: ignore
+    _LANCZOS = None
+
+try:
+    import scipy.fftpack  # noqa: F401  (only probed: image_hashing falls back to fft2 without it)
+    _HAVE_SCIPY = True
+except Exception:
+    _HAVE_SCIPY = False
+
+BASE_SIZE = 256
+# decoded frames are reduced to at least this many pixels on the short side
+DRAFT_MIN = 512
+# keyframe sampling for animations (see module docstring)
+KEYFRAME_DELTA = float(os.getenv("IMG_KEYFRAME_DELTA", "0.08"))
+KEYFRAME_BUDGET_MS = float(os.getenv("IMG_KEYFRAME_BUDGET_MS", "150"))
+THUMB_SIZE = 32
+
+_DCT_CACHE: Dict[int, Any] = {}
+
+
+def _dct_matrix(n: int):
+    """scipy.fftpack.dct type-II (norm=None) as an (n, n) matrix: y = M @ x."""
+    m = _DCT_CACHE.get(n)
+    if m is None:
+        k = np.arange(n)[:, None]
+        i = np.arange(n)[None, :]
+        m = 2.0 * np.cos(np.pi * k * (2 * i + 1) / (2.0 * n))
+        _DCT_CACHE[n] = m
+    return m
+
+
+def dct2(arr, ortho: bool = False):
+    """2-D DCT-II over the last two axes (batched: (..., n, n))."""
+    n = arr.shape[-1]
+    m = _dct_matrix(n)
+    d = m @ np.asarray(arr, dtype=np.float64) @ m.T
+    if ortho:
+        f = np.full(n, np.sqrt(1.0 / (2 * n)))
+        f[0] = np.sqrt(1.0 / (4 * n))
+        d = d * f[:, None] * f[None, :]
+    return d
+
+
+def bits_to_int(bits) -> int:
+    """Boolean array -> int, row-major with the first element as MSB."""
+    flat = np.asarray(bits, dtype=bool).ravel()
+    packed = np.packbits(flat)
+    return int.from_bytes(packed.tobytes(), "big") >> (8 * packed.size - flat.size)
+
+
+def bits_to_u64(bits):
+    """(N, ..., <=64 bits) boolean batch -> (N,) uint64, same bit order as bits_to_int."""
+    b = np.asarray(bits, dtype=bool)
+    flat = b.reshape(b.shape[0], -1)
+    nb = flat.shape[1]
+    if nb > 64:
+        raise ValueError(f"{nb} bits do not fit in uint64")
+    if nb < 64:
+        flat = np.concatenate([np.zeros((flat.shape[0], 64 - nb), dtype=bool), flat], axis=1)
+    return np.packbits(flat, axis=1).view(">u8").ravel().astype(np.uint64)
+
+
+def bits_to_ints(bits) -> List[int]:
+    """(N, ...) boolean batch -> N Python ints of any width (bits_to_int per row)."""
+    b = np.asarray(bits, dtype=bool)
+    flat = b.reshape(b.shape[0], -1)
+    if flat.shape[1] <= 64:
+        return [int(v) for v in bits_to_u64(flat)]
+    packed = np.packbits(flat, axis=1)
+    shift = 8 * packed.shape[1] - flat.shape[1]
+    return [int.from_bytes(row.tobytes(), "big") >> shift for row in packed]
+
+
+def hex_of(v: int, nbits: int = 64) -> str:
+    return f"{v:0{(nbits + 3) // 4}x}"
+
+
+# ---------- array-level hash kernels (shared with image_hashing) ----------
+# All kernels work on one (h, w) array or a stacked (N, h, w) batch.
+def phash_bits(g32, hash_size: int = 8):
+    """imagehash.phash on a (32, 32) gray array."""
+    low = dct2(g32)[..., :hash_size, :hash_size]
+    return low > np.median(low, axis=(-2, -1), keepdims=True)
+
+
+def phash_ortho_bits(g32, hash_size: int = 8):
+    """image_hashing.phash on a (32, 32) gray array."""
+    arr = np.asarray(g32, dtype=np.float32)
+    d = dct2(arr, ortho=True) if _HAVE_SCIPY else np.fft.fft2(arr).real
+    low = d[..., :hash_size, :hash_size]
+    return low > np.median(low[..., 1:, 1:], axis=(-2, -1), keepdims=True)
+
+
+def dhash_bits(g, reverse: bool = False):
+    """Column differences of a (h, w+1) gray array: right > left (or left > right)."""
+    a = np.asarray(g, dtype=np.int16)
+    return a[..., :-1] > a[..., 1:] if reverse else a[..., 1:] > a[..., :-1]
+
+
+def ahash_bits(g8):
+    p = np.asarray(g8, dtype=np.float32)
+    return p > p.mean(axis=(-2, -1), keepdims=True)
+
+
+def frame_signature(frame: "Image.Image") -> Tuple[Any, Any]:
+    """(32-bin luminance histogram, 32x32 thumbnail) used to compare frames cheaply."""
+    g = frame.convert("L")
+    g.thumbnail((THUMB_SIZE * 4, THUMB_SIZE * 4))  # reducing_gap path: cheap on big frames
+    a = np.asarray(g.resize((THUMB_SIZE, THUMB_SIZE), getattr(Image, "Resampling", Image).BOX), dtype=np.float32)
+    hist = np.bincount((a.ravel() // 8).astype(np.int64), minlength=32) / a.size
+    return hist, a
+
+
+def frame_delta(s1: Tuple[Any, Any], s2: Tuple[Any, Any]) -> float:
+    """0 (same) .. 1: max of histogram total-variation and mean thumbnail difference."""
+    return float(max(0.5 * np.abs(s1[0] - s2[0]).sum(), np.abs(s1[1] - s2[1]).mean() / 255.0))
+
+
+def _reduce_for_hashing(im: "Image.Image", min_side: int) -> "Image.Image":
+    w, h = im.size
+    factor = min(w, h) // max(1, min_side)
+    if factor >= 2:
+        try:
+            return im.reduce(factor)
+        except Exception:
+            return im
+    return im
+
+
+class ImageFeatures:
+    """Lazily computed hashes for one decoded frame."""
+
+    def __init__(self, gray: "Image.Image", source_size: Optional[Tuple[int, int]] = None,
+                 data: Optional[bytes] = None, frame: int = 0, full: bool = False):
+        self._gray = gray
+        self.source_size = source_size or gray.size
+        self._data = data
+        self._frame = frame
+        self._full = full
+        self._levels: Dict[Tuple[int, int], Any] = {}
+        self._cache: Dict[Any, Any] = {}
+
+    # ---------- construction ----------
+    @staticmethod
+    def _open(data: bytes, full: bool) -> "Image.Image":
+        im = Image.open(io.BytesIO(data))
+        if not full and getattr(im, "format", None) == "JPEG":
+            try:
+                im.draft("L", (DRAFT_MIN, DRAFT_MIN))
+            except Exception:
+                pass
+        return im
+
+    @classmethod
+    def _from_frame(cls, im: "Image.Image", data: Optional[bytes], source_size, frame: int, full: bool) -> "ImageFeatures":
+        if not full:
+            im = _reduce_for_hashing(im, DRAFT_MIN)
+        return cls(im.convert("L"), source_size=source_size, data=data, frame=frame, full=full)
+
+    @classmethod
+    def from_bytes(cls, data: bytes, full: bool = False) -> Optional["ImageFeatures"]:
+        """First frame of data, or None if it cannot be decoded. full=True skips draft/reduce."""
+        if not data or Image is None or np is None:
+            return None
+        try:
+            with cls._open(data, full) as im:
+                size = im.size
+                im.load()
+                return cls._from_frame(im, data, size, 0, full)
+        except Exception:
+            return None
+
+    @classmethod
+    def keyframes(cls, frames: Iterable[Tuple[int, "Image.Image"]], data: Optional[bytes] = None,
+                  source_size=None, max_frames: int = 6, full: bool = False,
+                  budget_ms: Optional[float] = None, min_delta: Optional[float] = None) -> List["ImageFeatures"]:
+        """
+        Scene-change keyframes from (index, frame) pairs: a frame is kept when it
+        differs from every kept keyframe by >= min_delta. At most 4*max_frames
+        candidates are decoded within budget_ms; if more than max_frames remain,
+        the first frame plus the largest changes win (returned in frame order).
+        """
+        budget = (KEYFRAME_BUDGET_MS if budget_ms is None else budget_ms) / 1000.0
+        min_delta = KEYFRAME_DELTA if min_delta is None else min_delta
+        t0 = time.thread_time()
+        kept: List[Tuple[float, int, "ImageFeatures", Any]] = []
+        for i, fr in frames:
+            try:
+                sig = frame_signature(fr)
+                d = min((frame_delta(sig, k[3]) for k in kept), default=1.0)
+                if d >= min_delta:
+                    kept.append((d, i, cls._from_frame(fr, data, source_size or fr.size, i, full), sig))
+            except Exception:
+                pass
+            if len(kept) >= 4 * max_frames or (kept and time.thread_time() - t0 > budget):
+                break
+        if len(kept) > max_frames:
+            kept = kept[:1] + sorted(kept[1:], key=lambda k: -k[0])[: max_frames - 1]
+            kept.sort(key=lambda k: k[1])
+        return [k[2] for k in kept]
+
+    @classmethod
+    def frames_from_bytes(cls, data: bytes, max_frames: int = 6, full: bool = False,
+                          budget_ms: Optional[float] = None) -> List["ImageFeatures"]:
+        """First frame of a still image, or up to max_frames keyframes of an animation."""
+        if not data or Image is None or np is None:
+            return []
+        try:
+            with cls._open(data, full) as im:
+                size = im.size
+                nframes = int(getattr(im, "n_frames", 1) or 1)
+                if nframes <= 1:
+                    im.load()
+                    return [cls._from_frame(im, data, size, 0, full)]
+
+                def frames():
+                    for i in range(nframes):
+                        try:
+                            im.seek(i)
+                        except Exception:
+                            return
+                        yield i, im
+                return cls.keyframes(frames(), data, size, max_frames, full, budget_ms)
+        except Exception:
+            return []
+
+    @classmethod
+    def from_image(cls, img: "Image.Image", full: bool = True) -> "ImageFeatures":
+        return cls._from_frame(img, None, img.size, 0, full)
+
+    # ---------- buffers ----------
+    def gray(self, size: Tuple[int, int]):
+        """(h, w) uint8 array of the frame resized to size=(w, h); cached per size."""
+        arr = self._levels.get(size)
+        if arr is None:
+            if size == (8, 8):
+                # ahash level: 4x4 block mean of the 32x32 level (no extra resample)
+                g32 = self.gray((32, 32)).astype(np.float32)
+                arr = g32.reshape(8, 4, 8, 4).mean(axis=(1, 3))
+            else:
+                arr = np.asarray(self._gray.resize(size, _LANCZOS))
+            self._levels[size] = arr
+        return arr
+
+    def base_image(self) -> "Image.Image":
+        """256x256 grayscale base shared by tile grids and augmented variants."""
+        b = self._cache.get("base")
+        if b is None:
+            b = self._gray.resize((BASE_SIZE, BASE_SIZE), _LANCZOS) if self._gray.size != (BASE_SIZE, BASE_SIZE) else self._gray
+            self._cache["base"] = b
+        return b
+
+    def image(self, mode: str = "L") -> "Image.Image":
+        """Full-resolution frame (re-decodes once if this instance was drafted/reduced)."""
+        key = ("full", mode)
+        img = self._cache.get(key)
+        if img is not None:
+            return img
+        if self._full or self._data is None:
+            img = self._gray if mode == "L" else self._gray.convert(mode)
+        else:
+            with Image.open(io.BytesIO(self._data)) as im:
+                if self._frame:
+                    im.seek(self._frame)
+                img = im.convert(mode)
+        self._cache[key] = img
+        return img
+
+    def _memo(self, key, fn):
+        if key not in self._cache:
+            try:
+                self._cache[key] = fn()
+            except Exception:
+                self._cache[key] = None
+        return self._cache[key]
+
+    # ---------- hash families ----------
+    @property
+    def phash(self) -> Optional[int]:
+        return self._memo("phash", lambda: bits_to_int(phash_bits(self.gray((32, 32)))))
+
+    @property
+    def phash_hex(self) -> Optional[str]:
+        v = self.phash
+        return None if v is None else hex_of(v)
+
+    @property
+    def phash_ortho(self) -> Optional[int]:
+        return self._memo("phash_ortho", lambda: bits_to_int(phash_ortho_bits(self.gray((32, 32)))))
+
+    @property
+    def dhash(self) -> Optional[int]:
+        return self._memo("dhash", lambda: bits_to_int(dhash_bits(self.gray((9, 8)))))
+
+    @property
+    def dhash_hex(self) -> Optional[str]:
+        v = self.dhash
+        return None if v is None else hex_of(v)
+
+    @property
+    def dhash64_hex(self) -> Optional[str]:
+        # persisted whitelists compare this exactly: full decode + PIL's default resample, as before
+        def build():
+            full = self._cache.get(("full", "L"))
+            if full is None and not self._full and self._data is not None:
+                with Image.open(io.BytesIO(self._data)) as im:
+                    if self._frame:
+                        im.seek(self._frame)
+                    small = im.convert("L").resize((9, 8))
+            else:
+                small = (full if full is not None else self._gray).resize((9, 8))
+            return hex_of(bits_to_int(dhash_bits(np.asarray(small), reverse=True)))
+        return self._memo("dhash64", build)
+
+    @property
+    def dhash_sq(self) -> Optional[int]:
+        return self._memo("dhash_sq", lambda: bits_to_int(dhash_bits(self.gray((9, 9)))))
+
+    @property
+    def ahash(self) -> Optional[int]:
+        return self._memo("ahash", lambda: bits_to_int(ahash_bits(self.gray((8, 8)))))
+
+    def tiles(self, grid: int = 3) -> List["ImageFeatures"]:
+        """grid*grid tile features (row-major) cropped from the 256x256 base."""
+        def build():
+            base = self.base_image()
+            W, H = base.size
+            xs = [int(W * i / grid) for i in range(grid + 1)]
+            ys = [int(H * i / grid) for i in range(grid + 1)]
+            return [ImageFeatures(base.crop((xs[c], ys[r], xs[c + 1], ys[r + 1])), full=True)
+                    for r in range(grid) for c in range(grid)]
+        return self._memo(("tiles", grid), build) or []
+
+    def tile_hashes(self, grid: int = 3, ortho: bool = False) -> List[int]:
+        """Per-tile pHash ints, row-major. ortho=True uses the image_hashing convention."""
+        attr = "phash_ortho" if ortho else "phash"
+        return [getattr(t, attr) for t in self.tiles(grid)]
+
+    def variants(self, max_extra: int = 4) -> List["ImageFeatures"]:
+        """Augmented copies of the 256x256 base: mirror, rotate +7/-7 deg, 95% center crop."""
+        def build():
+            base = self.base_image()
+            out = []
+            try:
+                out.append(ImageOps.mirror(base))
+            except Exception:
+                pass
+            for deg in (7, -7):
+                try:
+                    out.append(base.rotate(deg, expand=True, fillcolor=0))
+                except Exception:
+                    pass
+            w, h = base.size
+            dw, dh = int(w * 0.025), int(h * 0.025)
+            if w - 2 * dw > 8 and h - 2 * dh > 8:
+                out.append(base.crop((dw, dh, w - dw, h - dh)))
+            return [ImageFeatures(v, full=True) for v in out]
+        return (self._memo("variants", build) or [])[:max_extra]
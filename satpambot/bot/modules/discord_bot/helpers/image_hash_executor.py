@@ -0,0 +1,226 @@
+"""
+helpers/image_hash_executor.py
+Run image decode + hashing off the event loop.
+
+    ex = get_image_hash_executor()
+    res = await ex.hash_bytes(data, ("phash", "dhash64"))
+    # {"phash": ["f0e1..."], "dhash64": "a1b2..."}   ({} on overload/timeout)
+
+Every requested hash family is computed in ONE worker round trip, so the bytes
+are shipped to the pool once. Families may be a list of names or a mapping
+name -> kwargs for the underlying function, e.g. {"phash": {"augment": True}}.
+
+ENV:
+  IMG_HASH_POOL        process | thread        (default process)
+  IMG_HASH_WORKERS     worker count            (default min(2, cpu_count))
+  IMG_HASH_TIMEOUT     per-job seconds         (default 5)
+  IMG_HASH_MAX_QUEUE   max in-flight jobs      (default 32; extra jobs are rejected)
+"""
+from __future__ import annotations
+
+import asyncio, importlib, logging, multiprocessing, os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, Iterable, Mapping, Optional, Union
+
+log = logging.getLogger(__name__)
+
+_IMG = "satpambot.bot.modules.discord_bot.helpers.img_hashing"
+
+# family name -> (module, function); functions take (data: bytes, **kwargs)
+FAMILIES: Dict[str, tuple] = {
+    "phash": (_IMG, "phash_list_from_bytes"),
+    "dhash": (_IMG, "dhash_list_from_bytes"),
+    "tile": (_IMG, "tile_phash_list_from_bytes"),
+    "orb": (_IMG, "orb_descriptors_array"),
+    "dhash64": ("satpambot.ml.feature_extractor", "dhash64"),
+    "multi": ("satpambot.bot.modules.discord_bot.helpers.image_hashing", "compute_all_hashes"),
+}
+
+Families = Union[Iterable[str], Mapping[str, Mapping[str, Any]]]
+
+
+class ImageHashBusy(RuntimeError):
+    """Raised by submit() when max_queue jobs are already in flight."""
+
+
+def _normalize(families: Families) -> Dict[str, Dict[str, Any]]:
+    if isinstance(families, str):
+        families = [families]
+    if isinstance(families, Mapping):
+        items = {str(k): dict(v or {}) for k, v in families.items()}
+    else:
+        items = {str(k): {} for k in families}
+    unknown = [k for k in items if k not in FAMILIES]
+    if unknown:
+        raise ValueError(f"unknown hash families: {unknown}")
+    return items
+
+
+def _run_families(data: bytes, families: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """Worker entry point (must stay top-level so it pickles)."""
+    out: Dict[str, Any] = {}
+    for name, kwargs in families.items():
+        mod, fn = FAMILIES[name]
+        try:
+            out[name] = getattr(importlib.import_module(mod), fn)(data, **kwargs)
+        except Exception:
+            out[name] = None
+    return out
+
+
+def _warm() -> None:
+    # import PIL/numpy once per worker instead of on the first job
+    for mod in {m for m, _ in FAMILIES.values()}:
+        try:
+            importlib.import_module(mod)
+        except Exception:
+            pass
+
+
+class ImageHashExecutor:
+    def __init__(self, workers: Optional[int] = None, timeout: Optional[float] = None,
+                 max_queue: Optional[int] = None, mode: Optional[str] = None):
+        self.workers = int(workers or os.getenv("IMG_HASH_WORKERS") or max(1, min(2, os.cpu_count() or 1)))
+        self.timeout = float(timeout or os.getenv("IMG_HASH_TIMEOUT") or 5.0)
+        self.max_queue = int(max_queue or os.getenv("IMG_HASH_MAX_QUEUE") or 32)
+        self.mode = (mode or os.getenv("IMG_HASH_POOL") or "process").lower()
+        self._pool: Optional[Executor] = None
+        self._inflight = 0
+        self._stuck = 0  # timed-out jobs still running in the current pool
+        self._generation = 0  # bumped by _recycle(); late callbacks from an old pool are ignored
+        self._futures: set = set()
+        self.stats = {"done": 0, "timeout": 0, "rejected": 0, "cancelled": 0, "errors": 0, "recycled": 0}
+
+    @property
+    def pending(self) -> int:
+        return self._inflight
+
+    def _get_pool(self) -> Executor:
+        if self._pool is None:
+            if self.mode == "thread":
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="imghash")
+            else:
+                # spawn: forking a process that runs the gateway threads is not safe
+                ctx = multiprocessing.get_context(os.getenv("IMG_HASH_START_METHOD", "spawn"))
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=ctx, initializer=_warm)
+        return self._pool
+
+    def _recycle(self) -> None:
+        """Drop a pool whose workers are wedged on runaway jobs and start fresh next time."""
+        pool, self._pool = self._pool, None
+        self._stuck = 0
+        self._generation += 1
+        self.stats["recycled"] += 1
+        if pool is None:
+            return
+        procs = list((getattr(pool, "_processes", None) or {}).values())
+        try:
+            pool.shutdown(wait=False, cancel_futures=True)
+        except Exception:
+            pass
+        for p in procs:
+            try:
+                p.terminate()
+            except Exception:
+                pass
+
+    async def submit(self, data: bytes, families: Families = ("phash",), timeout: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Hash data in the pool. Raises ImageHashBusy when the queue is full and
+        asyncio.TimeoutError when the job exceeds its deadline. Cancelling the
+        awaiting task drops the job if it has not started yet.
+        """
+        fams = _normalize(families)
+        if not data or not fams:
+            return {}
+        if self._inflight >= self.max_queue:
+            self.stats["rejected"] += 1
+            raise ImageHashBusy(f"{self._inflight} image hash jobs in flight")
+        loop = asyncio.get_running_loop()
+        self._inflight += 1
+        cf = None
+        try:
+            try:
+                cf = self._get_pool().submit(_run_families, data, fams)
+            except (BrokenProcessPool, RuntimeError):
+                self._recycle()
+                cf = self._get_pool().submit(_run_families, data, fams)
+            self._futures.add(cf)
+            res = await asyncio.wait_for(asyncio.wrap_future(cf, loop=loop), timeout or self.timeout)
+            self.stats["done"] += 1
+            return res
+        except asyncio.TimeoutError:
+            self.stats["timeout"] += 1
+            if cf is not None and cf.running():
+                self._stuck += 1
+                # the job may still finish: then its worker is free again
+                gen = self._generation
+                cf.add_done_callback(lambda _f: self._stuck_done(loop, gen))
+                if self._stuck >= self.workers:
+                    log.warning("[imghash] %s workers stuck past %.1fs, recycling pool", self._stuck, timeout or self.timeout)
+                    self._recycle()
+            raise
+        except asyncio.CancelledError:
+            self.stats["cancelled"] += 1
+            raise
+        except BrokenProcessPool:
+            self.stats["errors"] += 1
+            self._recycle()
+            return {}
+        finally:
+            self._inflight -= 1
+            if cf is not None:
+                self._futures.discard(cf)
+
+    def _stuck_done(self, loop: asyncio.AbstractEventLoop, generation: int) -> None:
+        """Done-callback of a timed-out job (pool thread): count its worker as free again, on the loop."""
+        try:
+            loop.call_soon_threadsafe(self._unstuck, generation)
+        except RuntimeError:
+            pass  # loop closed
+
+    def _unstuck(self, generation: int) -> None:
+        if generation == self._generation and self._stuck > 0:
+            self._stuck -= 1
+
+    async def hash_bytes(self, data: bytes, families: Families = ("phash",), timeout: Optional[float] = None) -> Dict[str, Any]:
+        """Like submit() but returns {} instead of raising on overload/timeout/failure."""
+        fams = _normalize(families)  # unknown family names are a caller bug: let ValueError through
+        try:
+            return await self.submit(data, fams, timeout=timeout)
+        except asyncio.CancelledError:
+            raise
+        except ImageHashBusy:
+            log.debug("[imghash] queue full, skipping image")
+        except asyncio.TimeoutError:
+            log.debug("[imghash] job timed out")
+        except Exception:
+            self.stats["errors"] += 1
+            log.debug("[imghash] job failed", exc_info=True)
+        return {}
+
+    def cancel_all(self) -> int:
+        """Cancel every job that has not started yet; returns how many were dropped."""
+        n = 0
+        for cf in list(self._futures):
+            if cf.cancel():
+                n += 1
+        return n
+
+    def shutdown(self, wait: bool = False) -> None:
+        self.cancel_all()
+        pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=wait, cancel_futures=True)
+
+
+_default: Optional[ImageHashExecutor] = None
+
+
+def get_image_hash_executor() -> ImageHashExecutor:
+    """Process-wide shared executor (configured from ENV)."""
+    global _default
+    if _default is None:
+        _default = ImageHashExecutor()
+    return _default
@@ -1,30 +1,59 @@
 # Multi-hash & region hashing (auto 2025-08-09T12:25:01.106136Z)
 from PIL import Image, ImageOps
 import io, numpy as np
+from typing import List, Optional, Sequence
+from satpambot.bot.modules.discord_bot.helpers.image_features import (
+    ImageFeatures, ahash_bits, bits_to_int, bits_to_ints, bits_to_u64, dhash_bits, phash_ortho_bits)
 def _to_gray(img: Image.Image, size=256): im=img.convert("L"); return im.resize((size,size)) if size else im
 def ahash(img: Image.Image, hash_size=8)->int:
-    g=_to_gray(img, hash_size); p=np.asarray(g, dtype=np.float32); avg=p.mean(); bits=(p>avg).flatten(); h=0
-    for b in bits: h=(h<<1)|int(b); return h
+    return bits_to_int(ahash_bits(np.asarray(_to_gray(img, hash_size))))
 def dhash(img: Image.Image, hash_size=8)->int:
-    g=_to_gray(img, hash_size+1); a=np.asarray(g, dtype=np.int16); diff=a[:,1:]>a[:,:-1]; h=0
-    for b in diff.flatten(): h=(h<<1)|int(b); return h
+    return bits_to_int(dhash_bits(np.asarray(_to_gray(img, hash_size+1))))
 def phash(img: Image.Image, hash_size=8, highfreq_factor=4)->int:
-    g=_to_gray(img, hash_size*highfreq_factor); arr=np.asarray(g, dtype=np.float32)
-    try: import scipy.fftpack as fp; d=fp.dct(fp.dct(arr,axis=0,norm='ortho'),axis=1,norm='ortho')
-    except Exception: d=np.fft.fft2(arr).real
-    low=d[:hash_size,:hash_size]; med=np.median(low[1:,1:]); bits=(low>med).flatten(); h=0
-    for b in bits: h=(h<<1)|int(b); return h
-def hamming(x:int,y:int)->int: return int(bin(int(x)^int(y)).count("1"))
+    return bits_to_int(phash_ortho_bits(np.asarray(_to_gray(img, hash_size*highfreq_factor)), hash_size))
+def hamming(x:int,y:int)->int: return (int(x)^int(y)).bit_count()
+_BATCH_KERNELS = {
+    ahash: lambda g, hs: ahash_bits(g),
+    dhash: lambda g, hs: dhash_bits(g),
+    phash: lambda g, hs: phash_ortho_bits(g, hs),
+}
+_BATCH_SIZE = {ahash: lambda hs: hs, dhash: lambda hs: hs+1, phash: lambda hs: hs*4}
 def region_hashes(img: Image.Image, grid=3, hash_fn=phash, hash_size=8):
-    W,H=img.size; xs=[int(W*i/grid) for i in range(grid+1)]; ys=[int(H*i/grid) for i in range(grid+1)]; out=[]
-    for i in range(grid):
-        for j in range(grid):
-            tile=img.crop((xs[i],ys[j],xs[i+1],ys[j+1])); out.append(hash_fn(tile, hash_size=hash_size))
-    return out
+    W,H=img.size; xs=[int(W*i/grid) for i in range(grid+1)]; ys=[int(H*i/grid) for i in range(grid+1)]
+    tiles=[img.crop((xs[i],ys[j],xs[i+1],ys[j+1])) for i in range(grid) for j in range(grid)]
+    if hash_fn not in _BATCH_KERNELS:
+        return [hash_fn(t, hash_size=hash_size) for t in tiles]
+    # built-in families: stack the tiles and hash them in one array pass
+    size=_BATCH_SIZE[hash_fn](hash_size)
+    stack=np.stack([np.asarray(_to_gray(t, size)) for t in tiles])
+    return bits_to_ints(_BATCH_KERNELS[hash_fn](stack, hash_size))
 def compute_all_hashes(image_bytes: bytes):
-    img=Image.open(io.BytesIO(image_bytes)).convert("RGB")
-    return { "phash": phash(img), "dhash": dhash(img), "ahash": ahash(img), "regions": region_hashes(img) }
-
+    # one (drafted) decode shared by every family; regions are column-major like region_hashes()
+    f=ImageFeatures.from_bytes(image_bytes)
+    if f is None: raise ValueError("cannot decode image")
+    t=f.tile_hashes(3, ortho=True); regions=[t[r*3+c] for c in range(3) for r in range(3)]
+    return { "phash": f.phash_ortho, "dhash": f.dhash_sq, "ahash": f.ahash, "regions": regions }
+def compute_all_hashes_batch(images: Sequence[bytes], grid=3) -> List[Optional[dict]]:
+    """
+    compute_all_hashes for many images: every whole-image and region pHash goes
+    through one stacked DCT, dhash/ahash through one array op each.
+    Undecodable inputs yield None instead of raising.
+    """
+    feats=[ImageFeatures.from_bytes(b) for b in images]
+    ok=[i for i,f in enumerate(feats) if f is not None]
+    out: List[Optional[dict]]=[None]*len(feats)
+    if not ok: return out
+    n, k = len(ok), grid*grid
+    g32=[feats[i].gray((32,32)) for i in ok]
+    # tiles in column-major order (matches region_hashes / compute_all_hashes)
+    for i in ok:
+        t=feats[i].tiles(grid); g32.extend(t[r*grid+c].gray((32,32)) for c in range(grid) for r in range(grid))
+    ph=bits_to_u64(phash_ortho_bits(np.stack(g32))).tolist()
+    dh=bits_to_ints(dhash_bits(np.stack([feats[i].gray((9,9)) for i in ok])))
+    ah=bits_to_u64(ahash_bits(np.stack([feats[i].gray((8,8)) for i in ok]))).tolist()
+    for j,i in enumerate(ok):
+        out[i]={ "phash": ph[j], "dhash": dh[j], "ahash": ah[j], "regions": ph[n+j*k:n+(j+1)*k] }
+    return out
 
 def calculate_image_hash(image_bytes: bytes) -> str:
     """Backward-compatible wrapper: return phash hex string."""
@@ -0,0 +1,334 @@
+"""
+helpers/image_verdict.py
+One cost-ordered verdict for an image attachment, shared by the image guards.
+
+    pipe = get_image_verdict_pipeline()
+    v = await pipe.check(entry.data, sha256=entry.sha256, sha1=entry.sha1,
+                         priority=priority_for(message.author))
+    v.action, v.stage, v.reason     # "block", "hash", "phash 3a5f...c901 d=2"
+    v.timings                       # {"exact": 0.01, "whitelist": 0.0, "hash": 41.3} (ms)
+
+Stages run cheapest first and stop at the first confident verdict:
+
+    exact      sha256 verdict memo + md5 blacklist (image_check TXT)   ~us
+    whitelist  sha1 in the moderators' whitelist                       ~us
+    hash       pHash vs the shared blocklist, multi-hash vs image_check (one executor job)
+    tile       3x3 tile pHash vs the tile index (crops / collages)
+    orb        ORB descriptors vs the ORB store (heavy edits)
+    ocr        tesseract text with phishing keywords (never confident on its own)
+
+"block" and "allow" are confident; "suspect" (OCR keywords) and "clean" are
+not, and the caller combines them with its own signals. Every stage has a
+wall-clock budget, and the whole check has one too. A stage that runs out of
+time is listed in ``skipped`` and the cascade moves on while budget is left.
+Tile and ORB are skipped for free while their reference stores are empty.
+
+Final verdicts are remembered by sha256 together with the versions of every
+reference list, so a reposted image exits in the exact stage until a list
+changes. Verdicts with a skipped stage are not remembered.
+
+ENV:
+  IMG_VERDICT_BUDGET_MS    whole-check budget                 (default 6000)
+  IMG_VERDICT_STAGE_MS     per-stage budgets, "stage=ms,..."  (default hash=1500,tile=1500,orb=2500,ocr=4000)
+  IMG_VERDICT_MEMO         remembered verdicts                (default 4096)
+  IMG_TILE_INDEX_PATH      TileIndex.save() matrix            (default data/phash/tiles.npy)
+"""
+from __future__ import annotations
+
+import asyncio, hashlib, logging, os, time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Collection, Dict, List, Optional, Tuple, Union
+
+from . import image_check, static_cfg
+from .image_hash_executor import ImageHashBusy, get_image_hash_executor
+from .ocr_service import PRIORITY_NORMAL, get_ocr_service
+from .orb_store import OrbMatcher, OrbStore
+from .phash_blocklist import get_blocklist
+from .score_utils import contains_phish_keywords
+from .tile_index import TileIndex
+
+log = logging.getLogger(__name__)
+
+STAGES = ("exact", "whitelist", "hash", "tile", "orb", "ocr")
+DEFAULT_STAGE_MS = {"exact": 50, "whitelist": 50, "hash": 1500, "tile": 1500, "orb": 2500, "ocr": 4000}
+
+Whitelist = Union[Collection[str], Callable[[], Collection[str]]]
+
+
+def parse_stage_budgets(spec: str) -> Dict[str, float]:
+    """'hash=1500,ocr=3000' -> {"hash": 1500.0, "ocr": 3000.0}; unknown stages are ignored."""
+    out: Dict[str, float] = {}
+    for part in (spec or "").split(","):
+        name, _, ms = part.partition("=")
+        name = name.strip().lower()
+        try:
+            if name in STAGES:
+                out[name] = float(ms)
+        except ValueError:
+            log.warning("[verdict] bad stage budget %r", part)
+    return out
+
+
+@dataclass
+class Verdict:
+    action: str = "clean"       # block | allow | suspect | clean
+    stage: str = ""             # stage that decided ("" when no stage did)
+    reason: str = ""
+    text: Optional[str] = None  # OCR text when the ocr stage ran
+    timings: Dict[str, float] = field(default_factory=dict)  # stage -> ms
+    skipped: List[str] = field(default_factory=list)         # "stage:timeout" | "stage:busy" | "stage:budget"
+
+    @property
+    def confident(self) -> bool:
+        return self.action in ("block", "allow")
+
+
+class _StageTimeout(Exception):
+    pass
+
+
+class ImageVerdictPipeline:
+    def __init__(self, whitelist: Optional[Whitelist] = None, *, blocklist=None, executor=None, ocr=None,
+                 tiles: Optional[TileIndex] = None, orb: Optional[OrbMatcher] = None,
+                 stage_budgets: Optional[Dict[str, float]] = None, budget_ms: Optional[float] = None,
+                 memo_size: Optional[int] = None, stages: Tuple[str, ...] = STAGES):
+        self.whitelist = whitelist
+        self.blocklist = blocklist if blocklist is not None else get_blocklist()
+        self.executor = executor if executor is not None else get_image_hash_executor()
+        self.ocr = ocr if ocr is not None else get_ocr_service()
+        self._tiles, self._tiles_key = tiles, "given" if tiles is not None else None
+        self._orb, self._orb_key = orb, "given" if orb is not None else None
+        self.stage_ms = dict(DEFAULT_STAGE_MS)
+        self.stage_ms.update(parse_stage_budgets(os.getenv("IMG_VERDICT_STAGE_MS", "")))
+        self.stage_ms.update(stage_budgets or {})
+        self.budget_ms = float(budget_ms or os.getenv("IMG_VERDICT_BUDGET_MS", "6000"))
+        self.memo_size = int(memo_size or os.getenv("IMG_VERDICT_MEMO", "4096"))
+        unknown = [s for s in stages if s not in STAGES]
+        if unknown:
+            raise ValueError(f"unknown stages: {unknown}")
+        self.stages = tuple(s for s in STAGES if s in stages)  # cost order is fixed
+        self._memo: "OrderedDict[str, Tuple[tuple, Verdict]]" = OrderedDict()
+        self._wl: Tuple[Any, frozenset] = (None, frozenset())
+        self.stats: Dict[str, int] = {s: 0 for s in STAGES}
+        self.stats.update({"undecided": 0, "skipped": 0})
+
+    # ---------- reference lists ----------
+    def _whitelist(self) -> frozenset:
+        wl = self.whitelist() if callable(self.whitelist) else self.whitelist
+        if not wl:
+            return frozenset()
+        key = (id(wl), len(wl))
+        if self._wl[0] != key:
+            self._wl = (key, frozenset(wl))
+        return self._wl[1]
+
+    @staticmethod
+    def _file_key(path: str) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(path)
+            return (st.st_mtime_ns, st.st_size)
+        except OSError:
+            return None
+
+    def tiles(self) -> Optional[TileIndex]:
+        """Given index, or the IMG_TILE_INDEX_PATH matrix (reloaded when the file changes)."""
+        if self._tiles_key == "given":
+            return self._tiles
+        path = os.getenv("IMG_TILE_INDEX_PATH", "data/phash/tiles.npy")
+        key = self._file_key(path)
+        if key != self._tiles_key:
+            self._tiles_key = key
+            try:
+                self._tiles = TileIndex.load(path) if key else None
+            except Exception:
+                log.warning("[verdict] cannot load tile index %s", path, exc_info=True)
+                self._tiles = None
+        return self._tiles
+
+    def orb(self) -> Optional[OrbMatcher]:
+        """Given matcher, or one over the default OrbStore (reopened when its offsets change)."""
+        if self._orb_key == "given":
+            return self._orb
+        store_path = os.getenv("ORB_STORE_PATH", "data/orb/orb_store")
+        key = self._file_key(store_path + ".offsets.npy")
+        if key != self._orb_key:
+            self._orb_key = key
+            try:
+                self._orb = OrbMatcher(OrbStore(store_path)) if key else None
+            except Exception:
+                log.warning("[verdict] cannot open ORB store %s", store_path, exc_info=True)
+                self._orb = None
+        return self._orb
+
+    def _refs_version(self) -> tuple:
+        tiles, orb = self.tiles(), self.orb()
+        return (self.blocklist.generation, image_check.db_version(), self._whitelist(),
+                len(tiles) if tiles is not None else 0, len(orb.store) if orb is not None else 0)
+
+    # ---------- stages ----------
+    # each returns (action, reason) for a verdict or None to fall through
+    def _exact(self, data: bytes, sha256: str, ctx: Dict[str, Any]):
+        hit = self._memo.get(sha256)
+        if hit is not None:
+            if hit[0] == ctx["refs"]:
+                self._memo.move_to_end(sha256)
+                ctx["text"] = hit[1].text
+                prev = hit[1]
+                return prev.action, f"seen before: {prev.action}" + (f" by {prev.stage} ({prev.reason})" if prev.stage else "")
+            self._memo.pop(sha256, None)
+        md5s = image_check.md5_blacklist()
+        if md5s and hashlib.md5(data).hexdigest() in md5s:
+            return "block", "md5 blacklist"
+        return None
+
+    def _whitelisted(self, data: bytes, sha1: Optional[str]):
+        wl = self._whitelist()
+        if wl and (sha1 or hashlib.sha1(data).hexdigest()) in wl:
+            return "allow", "sha1 whitelist"
+        return None
+
+    async def _hash(self, data: bytes, families, timeout: float) -> Dict[str, Any]:
+        try:
+            return await self.executor.submit(data, families, timeout=timeout)
+        except ImageHashBusy:
+            raise _StageTimeout("busy")
+        except asyncio.TimeoutError:
+            raise _StageTimeout("timeout")
+
+    async def _hashes(self, data: bytes, timeout: float):
+        res = await self._hash(data, ("phash", "multi"), timeout)
+        hit = self.blocklist.first_within(res.get("phash") or [], max_distance=static_cfg.PHASH_MAX_DISTANCE)
+        if hit is not None:
+            return "block", f"phash {hit[1]} d={hit[2]}"
+        if image_check.matches_blacklist(res.get("multi")):
+            return "block", "image_check multi-hash"
+        return None
+
+    async def _tile(self, data: bytes, timeout: float):
+        idx = self.tiles()
+        t0 = time.monotonic()
+        res = await self._hash(data, {"tile": {"grid": static_cfg.TILE_GRID}}, timeout)
+        sigs = res.get("tile") or []
+        if not sigs:
+            return None
+        left = max(0.0, timeout - (time.monotonic() - t0))
+        best = await asyncio.wait_for(asyncio.to_thread(idx.best, sigs, static_cfg.TILE_HIT_MIN, static_cfg.TILE_PHASH_DISTANCE), left)
+        if best >= static_cfg.TILE_HIT_MIN:
+            return "block", f"{best}/{static_cfg.TILE_GRID ** 2} tiles"
+        return None
+
+    async def _orb_match(self, data: bytes, timeout: float):
+        matcher = self.orb()
+        t0 = time.monotonic()
+        res = await self._hash(data, ("orb",), timeout)
+        desc = res.get("orb")
+        if desc is None or not len(desc):
+            return None
+        left = max(0.0, timeout - (time.monotonic() - t0))
+        top = await asyncio.wait_for(asyncio.to_thread(matcher.top_k, desc, 1, static_cfg.ORB_MIN_MATCH), left)
+        if top:
+            return "block", f"orb {top[0][0]} ({top[0][1]} matches)"
+        return None
+
+    async def _ocr(self, data: bytes, sha256: str, priority: int, timeout: float, ctx: Dict[str, Any]):
+        text = await self.ocr.ocr(data, sha256=sha256, priority=priority, deadline=timeout)
+        if text is None:
+            raise _StageTimeout("timeout")
+        ctx["text"] = text
+        if text and contains_phish_keywords(text):
+            return "suspect", "phishing keywords in OCR text"
+        return None
+
+    def _applicable(self, stage: str) -> bool:
+        if stage == "tile":
+            idx = self.tiles()
+            return idx is not None and len(idx) > 0
+        if stage == "orb":
+            if not getattr(static_cfg, "ORB_ENABLE", True):
+                return False
+            m = self.orb()
+            return m is not None and len(m.store) > 0
+        return True
+
+    # ---------- public API ----------
+    async def check(self, data: bytes, *, sha256: Optional[str] = None, sha1: Optional[str] = None,
+                    priority: int = PRIORITY_NORMAL, budget_ms: Optional[float] = None) -> Verdict:
+        """Run the stages in cost order until one is confident or the budget is spent."""
+        v = Verdict()
+        if not data:
+            return v
+        sha256 = sha256 or hashlib.sha256(data).hexdigest()
+        ctx: Dict[str, Any] = {"refs": self._refs_version(), "text": None}
+        start = time.monotonic()
+        deadline = start + (budget_ms or self.budget_ms) / 1000.0
+        for stage in self.stages:
+            left = deadline - time.monotonic()
+            if left <= 0:
+                v.skipped.append(f"{stage}:budget")
+                continue
+            if not self._applicable(stage):
+                continue
+            timeout = min(self.stage_ms.get(stage, left * 1000.0) / 1000.0, left)
+            t0 = time.monotonic()
+            try:
+                if stage == "exact":
+                    out = self._exact(data, sha256, ctx)
+                elif stage == "whitelist":
+                    out = self._whitelisted(data, sha1)
+                elif stage == "hash":
+                    out = await self._hashes(data, timeout)
+                elif stage == "tile":
+                    out = await self._tile(data, timeout)
+                elif stage == "orb":
+                    out = await self._orb_match(data, timeout)
+                else:
+                    out = await self._ocr(data, sha256, priority, timeout, ctx)
+            except asyncio.CancelledError:
+                raise
+            except (_StageTimeout, asyncio.TimeoutError) as e:
+                v.skipped.append(f"{stage}:{e or 'timeout'}")
+                out = None
+            except Exception:
+                log.debug("[verdict] stage %s failed", stage, exc_info=True)
+                v.skipped.append(f"{stage}:error")
+                out = None
+            v.timings[stage] = round((time.monotonic() - t0) * 1000.0, 3)
+            if out is not None:
+                v.action, v.reason = out
+                v.stage = stage
+                if v.confident or stage == "exact":
+                    break
+        v.text = ctx["text"]
+        self.stats[v.stage or "undecided"] += 1
+        if v.skipped:
+            self.stats["skipped"] += 1
+        elif v.stage != "exact":
+            self._remember(sha256, ctx["refs"], v)
+        return v
+
+    def _remember(self, sha256: str, refs: tuple, v: Verdict) -> None:
+        self._memo[sha256] = (refs, Verdict(v.action, v.stage, v.reason, v.text))
+        self._memo.move_to_end(sha256)
+        while len(self._memo) > self.memo_size:
+            self._memo.popitem(last=False)
+
+    def forget(self, sha256: Optional[str] = None) -> None:
+        """Drop one remembered verdict (or all of them)."""
+        if sha256 is None:
+            self._memo.clear()
+        else:
+            self._memo.pop(sha256, None)
+
+
+_default: Optional[ImageVerdictPipeline] = None
+
+
+def get_image_verdict_pipeline(whitelist: Optional[Whitelist] = None) -> ImageVerdictPipeline:
+    """Process-wide pipeline; the first caller's whitelist is kept unless a later one passes its own."""
+    global _default
+    if _default is None:
+        _default = ImageVerdictPipeline(whitelist)
+    elif whitelist is not None:
+        _default.whitelist = whitelist
+    return _default
@@ -1,5 +1,6 @@
 
 import io
+import numpy as np
 from typing import List, Iterable, Optional, Set
 try:
     from PIL import Image, ImageSequence, ImageFile, ImageOps, ImageFilter
@@ -9,15 +10,15 @@ except Exception:
     ImageSequence = None
     ImageOps = None
     ImageFilter = None
-try:
-    import imagehash
-except Exception:
-    imagehash = None
 try:
     import imageio.v2 as imageio
 except Exception:
     imageio = None
 
+from satpambot.bot.modules.discord_bot.helpers.hash_index import HashIndex
+from satpambot.bot.modules.discord_bot.helpers.image_features import ImageFeatures
+from satpambot.bot.modules.discord_bot.helpers.tile_index import TileIndex, parse_sig
+
 def _hamming_hex(a: str, b: str) -> int:
     try:
         return (int(a, 16) ^ int(b, 16)).bit_count()
@@ -50,91 +51,53 @@ def _augment_variants(img: "Image.Image", max_extra: int = 4):
     except Exception:
         pass
 
-def phash_list_from_bytes(data: bytes, max_frames: int = 6, augment: bool = False, augment_per_frame: int = 4) -> List[str]:
-    out: List[str] = []
-    seen: Set[str] = set()
-    if not data:
-        return out
-    def _add(img):
-        try:
-            if not imagehash or not Image:
-                return
-            g = img.convert("RGB")
-            hs = str(imagehash.phash(g))
-            if hs not in seen:
-                seen.add(hs); out.append(hs)
-            if augment:
-                k = 0
-                for v in _augment_variants(g, max_extra=augment_per_frame):
-                    try:
-                        hv = str(imagehash.phash(v))
-                        if hv not in seen:
-                            seen.add(hv); out.append(hv)
-                        k += 1
-                        if k >= augment_per_frame:
-                            break
-                    except Exception:
-                        continue
-        except Exception:
-            pass
-    # Pillow first
-    if Image:
+def _frames_with_fallback(data: bytes, max_frames: int) -> List[ImageFeatures]:
+    """Decode once via ImageFeatures; imageio only when Pillow cannot open the data."""
+    frames = ImageFeatures.frames_from_bytes(data, max_frames=max_frames)
+    if frames or not imageio or not Image:
+        return frames
+    try:
+        rdr = imageio.get_reader(io.BytesIO(data), format='WEBP')
+        frames = ImageFeatures.keyframes(((i, Image.fromarray(frm)) for i, frm in enumerate(rdr)), max_frames=max_frames)
+        if not frames:
+            raise ValueError("no frames")
+    except Exception:
         try:
-            with Image.open(io.BytesIO(data)) as im:
-                nframes = getattr(im, "n_frames", 1)
-                if nframes > 1 and ImageSequence is not None:
-                    step = max(1, nframes // max(1, min(nframes, max_frames)))
-                    idxs = list(range(0, nframes, step))[:max_frames]
-                    for i in idxs:
-                        try:
-                            im.seek(i)
-                            _add(im.copy())
-                        except Exception:
-                            continue
-                else:
-                    _add(im)
-                if out:
-                    return out
+            frames.append(ImageFeatures.from_image(Image.fromarray(imageio.imread(io.BytesIO(data))), full=False))
         except Exception:
             pass
-    # Fallback: imageio
-    if imageio:
-        try:
-            rdr = imageio.get_reader(io.BytesIO(data), format='WEBP')
-            c = 0
-            for frm in rdr:
-                try:
-                    if Image:
-                        _add(Image.fromarray(frm))
-                    c += 1
-                    if c >= max_frames:
-                        break
-                except Exception:
-                    continue
-            if out:
-                return out
-        except Exception:
-            try:
-                img = imageio.imread(io.BytesIO(data))
-                if Image:
-                    _add(Image.fromarray(img))
-            except Exception:
-                pass
+    return frames
+
+def _collect(frames: List[ImageFeatures], attr: str, augment: bool, augment_per_frame: int) -> List[str]:
+    out: List[str] = []
+    seen: Set[str] = set()
+    for f in frames:
+        cands = [f] + (f.variants(max_extra=augment_per_frame) if augment else [])
+        for c in cands:
+            hs = getattr(c, attr)
+            if hs and hs not in seen:
+                seen.add(hs); out.append(hs)
     return out
 
-def phash_hit(hashes: Iterable[str], db: Iterable[str], max_distance: int = 0) -> Optional[str]:
-    S = list(db) if not isinstance(db, (set, list, tuple)) else db
-    for h in hashes:
-        if not h:
-            continue
-        if h in S:
-            return h
-    if max_distance > 0:
-        for h in hashes:
-            for d in S:
-                if _hamming_hex(h, d) <= max_distance:
-                    return d
-    return None
+def phash_list_from_bytes(data: bytes, max_frames: int = 6, augment: bool = False, augment_per_frame: int = 4) -> List[str]:
+    if not data:
+        return []
+    return _collect(_frames_with_fallback(data, max_frames), "phash_hex", augment, augment_per_frame)
+
+def _as_index(db) -> HashIndex:
+    return db if isinstance(db, HashIndex) else HashIndex(db)
+
+def phash_hit(hashes: Iterable[str], db, max_distance: int = 0) -> Optional[str]:
+    """db: HashIndex (preferred, build once and reuse) or iterable of hex hashes."""
+    hashes = [h for h in hashes if h]
+    if not hashes or not db:
+        return None
+    idx = _as_index(db)
+    hit = idx.first_within(hashes, max_distance=max_distance)
+    if hit is None:
+        return None
+    qi, pos, dist = hit
+    return hashes[qi] if dist == 0 else idx.key(pos)
 
 
 # ---------- Tile pHash (grid-based) ----------
@@ -143,18 +106,14 @@ def tile_phash_from_image(img: Image.Image, grid: int = 3) -> List[str]:
     if not img or not Image:
         return []
     try:
-        W, H = img.size
-        tiles = []
-        for gy in range(grid):
-            for gx in range(grid):
-                x0 = int(gx * W / grid); x1 = int((gx+1) * W / grid)
-                y0 = int(gy * H / grid); y1 = int((gy+1) * H / grid)
-                tile = img.crop((x0, y0, x1, y1))
-                tiles.append(phash_hex(tile))
-        return tiles
+        return _tile_sig(ImageFeatures.from_image(img, full=False), grid)
     except Exception:
         return []
 
+def _tile_sig(f: ImageFeatures, grid: int) -> List[str]:
+    hs = f.tile_hashes(grid)
+    return [format(h, "016x") for h in hs] if hs and all(h is not None for h in hs) else []
+
 def tile_phash_list_from_bytes(data: bytes, grid: int = 3, max_frames: int = 4, augment: bool = True, augment_per_frame: int = 3) -> List[str]:
     """
     Returns list of tile-signatures. Each signature is 'h1|h2|...|hN' for grid*grid tiles.
@@ -162,62 +121,36 @@ def tile_phash_list_from_bytes(data: bytes, grid: int = 3, max_frames: int = 4,
     out: List[str] = []
     if not data or not Image:
         return out
-    try:
-        im = Image.open(io.BytesIO(data))
-        frames = ImageSequence.Iterator(im) if getattr(im, "is_animated", False) else [im]
-        c = 0
-        for frame in frames:
-            try:
-                base = frame.copy().convert("RGB")
-                sig = tile_phash_from_image(base, grid=grid)
-                if sig:
-                    out.append("|".join(sig))
-                if augment:
-                    k = 0
-                    for v in _augment_variants(base, max_extra=augment_per_frame):
-                        sig2 = tile_phash_from_image(v, grid=grid)
-                        if sig2:
-                            out.append("|".join(sig2))
-                        k += 1
-                        if k >= augment_per_frame:
-                            break
-                c += 1
-                if c >= max_frames:
-                    break
-            except Exception:
-                continue
-    except Exception:
-        pass
+    for f in _frames_with_fallback(data, max_frames):
+        for c in [f] + (f.variants(max_extra=augment_per_frame) if augment else []):
+            sig = _tile_sig(c, grid)
+            if sig:
+                out.append("|".join(sig))
     return out
 
-def tile_match_best(candidate_sigs: List[str], db_sigs: Iterable[str], grid: int, min_tiles: int, per_tile_max_distance: int) -> int:
+def _tile_indexes(db_sigs) -> List[TileIndex]:
+    if isinstance(db_sigs, TileIndex):
+        return [db_sigs]
+    by_width = {}
+    for sig in db_sigs:
+        r = parse_sig(sig)
+        if r:
+            by_width.setdefault(len(r), []).append(r)
+    return [TileIndex(rows, tiles=w) for w, rows in by_width.items()]
+
+def tile_match_best(candidate_sigs: List[str], db_sigs, grid: int, min_tiles: int, per_tile_max_distance: int) -> int:
     """
     Return best tile match count between candidate signatures and DB signatures.
     Two tile strings match on a tile if hamming(p,q) <= per_tile_max_distance.
+    db_sigs: TileIndex (preferred, build/load once and reuse) or iterable of signatures.
     """
     if not candidate_sigs or not db_sigs:
         return 0
-    def split_sig(sig: str) -> List[str]:
-        return [x for x in sig.split("|") if x]
     best = 0
-    DB = list(db_sigs) if not isinstance(db_sigs, (list, set, tuple)) else db_sigs
-    for cand in candidate_sigs:
-        C = split_sig(cand)
-        for db in DB:
-            D = split_sig(db)
-            if len(C) != len(D):
-                continue
-            hit = 0
-            for a, b in zip(C, D):
-                try:
-                    if _hamming_hex(a, b) <= per_tile_max_distance:
-                        hit += 1
-                except Exception:
-                    pass
-            if hit > best:
-                best = hit
-            if best >= min_tiles:
-                return best
+    for idx in _tile_indexes(db_sigs):
+        best = max(best, idx.best(candidate_sigs, min_tiles, per_tile_max_distance))
+        if best >= min_tiles:
+            break
     return best
 
 
@@ -238,47 +171,51 @@ def _orb_compute(img):
     except Exception:
         return None
 
-def orb_descriptors_from_bytes(data: bytes, max_frames: int = 2, augment: bool = True, augment_per_frame: int = 2, keep_per_frame: int = 64) -> List[List[int]]:
+def orb_descriptors_array(data: bytes, max_frames: int = 2, augment: bool = True, augment_per_frame: int = 2, keep_per_frame: int = 64) -> "np.ndarray":
     """
-    Return a compact list of ORB descriptors (as lists of ints) limited for storage.
+    ORB descriptors as one (N, 32) uint8 array (empty when cv2/PIL are missing),
+    ready for OrbStore.add / OrbMatcher.
     """
-    out: List[List[int]] = []
+    out: List["np.ndarray"] = []
     if not data or cv2 is None or not Image:
-        return out
+        return np.zeros((0, 32), dtype=np.uint8)
     try:
-        im = Image.open(io.BytesIO(data))
-        frames = ImageSequence.Iterator(im) if getattr(im, "is_animated", False) else [im]
-        c = 0
-        for frame in frames:
+        # keyframes at full resolution; ORB works on gray, RGB only for the rotate fill
+        for f in ImageFeatures.frames_from_bytes(data, max_frames=max_frames, full=True):
             try:
-                base = frame.copy().convert("RGB")
+                base = f.image("RGB")
                 des = _orb_compute(base)
                 if des is not None and len(des) > 0:
-                    out.extend([list(map(int, row)) for row in des[:keep_per_frame]])
+                    out.append(des[:keep_per_frame])
                 if augment:
                     k = 0
                     for v in _augment_variants(base, max_extra=augment_per_frame):
                         des2 = _orb_compute(v)
                         if des2 is not None and len(des2) > 0:
-                            out.extend([list(map(int, row)) for row in des2[:keep_per_frame]])
+                            out.append(des2[:keep_per_frame])
                         k += 1
                         if k >= augment_per_frame:
                             break
-                c += 1
-                if c >= max_frames:
-                    break
             except Exception:
                 continue
     except Exception:
         pass
-    return out
+    return np.vstack(out).astype(np.uint8, copy=False) if out else np.zeros((0, 32), dtype=np.uint8)
 
-def orb_match_count(descA: List[List[int]], descB: List[List[int]], ratio: float = 0.75) -> int:
-    if cv2 is None or not descA or not descB:
+def orb_descriptors_from_bytes(data: bytes, max_frames: int = 2, augment: bool = True, augment_per_frame: int = 2, keep_per_frame: int = 64) -> List[List[int]]:
+    """
+    Return a compact list of ORB descriptors (as lists of ints) limited for storage.
+    Prefer orb_descriptors_array + OrbStore for anything that is kept around.
+    """
+    return orb_descriptors_array(data, max_frames, augment, augment_per_frame, keep_per_frame).tolist()
+
+def orb_match_count(descA, descB, ratio: float = 0.75) -> int:
+    """descA/descB: (N, 32) uint8 arrays or lists of descriptor rows."""
+    if cv2 is None or descA is None or descB is None or not len(descA) or not len(descB):
         return 0
     try:
-        A = np.array(descA, dtype=np.uint8)
-        B = np.array(descB, dtype=np.uint8)
+        A = np.asarray(descA, dtype=np.uint8)
+        B = np.asarray(descB, dtype=np.uint8)
         bf = cv2.BFMatcher(cv2.NORM_HAMMING, crossCheck=False)
         matches = bf.knnMatch(A, B, k=2)
         good = 0
@@ -291,63 +228,14 @@ def orb_match_count(descA: List[List[int]], descB: List[List[int]], ratio: float
 
 
 def dhash_list_from_bytes(data: bytes, max_frames: int = 6, augment: bool = False, augment_per_frame: int = 4) -> List[str]:
-    out: List[str] = []
-    seen: Set[str] = set()
     if not data or not Image:
-        return out
-    def _dhash(img):
-        try:
-            g = img.convert("L").resize((9, 8))
-            px = list(g.getdata())
-            w, h = g.size
-            bits = []
-            for y in range(h):
-                row = px[y*w:(y+1)*w]
-                for x in range(w-1):
-                    bits.append(1 if row[x] < row[x+1] else 0)
-            v = 0
-            for b in bits:
-                v = (v << 1) | b
-            return f"{v:0{len(bits)//4}x}"
-        except Exception:
-            return None
-    try:
-        im = Image.open(io.BytesIO(data))
-        frames = ImageSequence.Iterator(im) if getattr(im, "is_animated", False) else [im]
-        c = 0
-        for frame in frames:
-            try:
-                base = frame.copy()
-                hs = _dhash(base)
-                if hs and hs not in seen:
-                    seen.add(hs); out.append(hs)
-                if augment:
-                    k = 0
-                    for v in _augment_variants(base, max_extra=augment_per_frame):
-                        d = _dhash(v)
-                        if d and d not in seen:
-                            seen.add(d); out.append(d)
-                        k += 1
-                        if k >= augment_per_frame:
-                            break
-                c += 1
-                if c >= max_frames:
-                    break
-            except Exception:
-                continue
-    except Exception:
-        pass
-    return out
+        return []
+    return _collect(_frames_with_fallback(data, max_frames), "dhash_hex", augment, augment_per_frame)
 
-def hex_hit(hashes: Iterable[str], db: Iterable[str], max_distance: int) -> Optional[str]:
+def hex_hit(hashes: Iterable[str], db, max_distance: int) -> Optional[str]:
+    """db: HashIndex (preferred) or iterable of hex hashes. Returns the matching DB hash."""
     if max_distance <= 0 or not hashes or not db:
         return None
-    DB = list(db) if not isinstance(db, (list, set, tuple)) else db
-    for h in hashes:
-        for d in DB:
-            try:
-                if _hamming_hex(h, d) <= max_distance:
-                    return d
-            except Exception:
-                pass
-    return None
+    idx = _as_index(db)
+    hit = idx.first_within([h for h in hashes if h], max_distance=max_distance)
+    return idx.key(hit[1]) if hit else None
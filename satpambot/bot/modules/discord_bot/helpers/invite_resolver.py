@@ -0,0 +1,212 @@
+"""
+helpers/invite_resolver.py
+Cached, single-flight Discord invite lookups shared by OCRGuard and handlers/invite_guard.
+
+    info = await get_invite_resolver(bot).resolve("abc123")
+    info is None               # lookup failed (rate limit, network); nothing cached
+    info.valid                 # False for unknown/expired codes (negative cache)
+    info.nsfw                  # guild is explicit or age restricted
+    info.guild_id, info.nsfw_level, info.member_count, info.presence_count
+
+Raid waves post the same invite hundreds of times. Every code is fetched at
+most once per INVITE_CACHE_TTL (INVITE_NEG_TTL for codes Discord reports as
+unknown), and concurrent lookups of one code share a single in-flight
+``bot.fetch_invite``. Transient errors are not cached. The cache is written to
+INVITE_CACHE_FILE (at most every INVITE_CACHE_SAVE_SEC) and reloaded on the
+next start, so a restart during a raid does not refetch every code.
+
+Codes are case-sensitive and kept as written.
+
+ENV:
+  INVITE_CACHE_TTL        seconds a resolved invite is kept   (default 3600)
+  INVITE_NEG_TTL          seconds an invalid code is kept     (default 600)
+  INVITE_CACHE_MAX        codes kept, LRU                     (default 5000)
+  INVITE_CACHE_FILE       warm-start file (default data/invite_cache.json, "" = off)
+  INVITE_CACHE_SAVE_SEC   minimum seconds between writes      (default 60)
+"""
+from __future__ import annotations
+
+import asyncio, json, logging, os, time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Iterable, NamedTuple, Optional
+
+import discord
+
+log = logging.getLogger(__name__)
+
+NSFW_LEVELS = (discord.NSFWLevel.explicit.value, discord.NSFWLevel.age_restricted.value)
+
+
+class InviteInfo(NamedTuple):
+    code: str
+    valid: bool
+    guild_id: Optional[int] = None
+    guild_name: str = ""
+    nsfw_level: int = -1            # discord.NSFWLevel value: 0 default, 1 explicit, 2 safe, 3 age_restricted
+    member_count: Optional[int] = None
+    presence_count: Optional[int] = None
+    fetched_at: float = 0.0         # wall clock, survives the warm-start file
+
+    @property
+    def nsfw(self) -> bool:
+        return self.valid and self.nsfw_level in NSFW_LEVELS
+
+
+def _info_from_invite(code: str, inv: Any) -> InviteInfo:
+    g = getattr(inv, "guild", None)
+    if g is None:
+        return InviteInfo(code, False, fetched_at=time.time())
+    lvl = getattr(g, "nsfw_level", None)
+    return InviteInfo(
+        code, True, getattr(g, "id", None), str(getattr(g, "name", "") or ""),
+        int(getattr(lvl, "value", lvl)) if lvl is not None else -1,
+        getattr(inv, "approximate_member_count", None), getattr(inv, "approximate_presence_count", None),
+        time.time(),
+    )
+
+
+class InviteResolver:
+    def __init__(self, bot: Any = None, ttl: Optional[float] = None, negative_ttl: Optional[float] = None,
+                 max_entries: Optional[int] = None, path: Optional[str] = None):
+        self.bot = bot
+        self.ttl = float(ttl or os.getenv("INVITE_CACHE_TTL", "3600"))
+        self.negative_ttl = float(negative_ttl or os.getenv("INVITE_NEG_TTL", "600"))
+        self.max_entries = int(max_entries or os.getenv("INVITE_CACHE_MAX", "5000"))
+        p = os.getenv("INVITE_CACHE_FILE", "data/invite_cache.json") if path is None else path
+        self.path = Path(p) if p else None
+        self.save_every = float(os.getenv("INVITE_CACHE_SAVE_SEC", "60"))
+        self._items: "OrderedDict[str, InviteInfo]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._loaded = False
+        self._dirty = False
+        self._saved_at = 0.0
+        self.stats = {"hits": 0, "misses": 0, "shared": 0, "errors": 0}
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def _fresh(self, info: InviteInfo, now: float) -> bool:
+        return now - info.fetched_at < (self.ttl if info.valid else self.negative_ttl)
+
+    def _store(self, info: InviteInfo) -> None:
+        self._items[info.code] = info
+        self._items.move_to_end(info.code)
+        while len(self._items) > self.max_entries:
+            self._items.popitem(last=False)
+        self._dirty = True
+
+    def peek(self, code: str) -> Optional[InviteInfo]:
+        """Cached info without a lookup (None when unknown or expired)."""
+        self._load()
+        info = self._items.get(code)
+        if info is None:
+            return None
+        if not self._fresh(info, time.time()):
+            del self._items[code]
+            return None
+        self._items.move_to_end(code)
+        return info
+
+    async def resolve(self, code: str) -> Optional[InviteInfo]:
+        code = (code or "").strip()
+        if not code:
+            return None
+        info = self.peek(code)
+        if info is not None:
+            self.stats["hits"] += 1
+            return info
+        fut = self._inflight.get(code)
+        if fut is not None:
+            self.stats["shared"] += 1
+            return await asyncio.shield(fut)
+        self.stats["misses"] += 1
+        fut = asyncio.ensure_future(self._fetch(code))
+        fut.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._inflight[code] = fut
+        # shield: one cancelled guard must not cancel the lookup for the others
+        return await asyncio.shield(fut)
+
+    async def resolve_many(self, codes: Iterable[str]) -> Dict[str, Optional[InviteInfo]]:
+        uniq = list(dict.fromkeys(c for c in codes if c))
+        return dict(zip(uniq, await asyncio.gather(*(self.resolve(c) for c in uniq))))
+
+    async def _fetch(self, code: str) -> Optional[InviteInfo]:
+        try:
+            if self.bot is None:
+                return None
+            try:
+                inv = await self.bot.fetch_invite(code, with_counts=True)
+            except discord.NotFound:
+                info = InviteInfo(code, False, fetched_at=time.time())
+                self._store(info)
+                return info
+            except Exception as e:
+                self.stats["errors"] += 1
+                log.debug("[invite_resolver] %s not resolved: %r", code, e)
+                return None
+            info = _info_from_invite(code, inv)
+            self._store(info)
+            return info
+        finally:
+            self._inflight.pop(code, None)
+            self._maybe_save()
+
+    # --- warm-start file ---
+    def _load(self) -> None:
+        if self._loaded:
+            return
+        self._loaded = True
+        if self.path is None:
+            return
+        try:
+            rows = json.loads(self.path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            log.warning("[invite_resolver] %s unreadable: %r", self.path, e)
+            return
+        now = time.time()
+        for row in rows if isinstance(rows, list) else []:
+            try:
+                info = InviteInfo(*row)
+            except TypeError:
+                continue
+            if self._fresh(info, now):
+                self._items[info.code] = info
+        self._saved_at = time.monotonic()
+
+    def _maybe_save(self) -> None:
+        if self._dirty and time.monotonic() - self._saved_at >= self.save_every:
+            self.save()
+
+    def save(self) -> None:
+        if self.path is None:
+            return
+        now = time.time()
+        rows = [list(i) for i in self._items.values() if self._fresh(i, now)]
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+            tmp.write_text(json.dumps(rows, separators=(",", ":")), encoding="utf-8")
+            os.replace(tmp, self.path)
+            self._dirty = False
+        except Exception as e:
+            log.warning("[invite_resolver] %s not written: %r", self.path, e)
+        self._saved_at = time.monotonic()
+
+    def clear(self) -> None:
+        self._items.clear()
+        self._dirty = True
+
+
+_default: Optional[InviteResolver] = None
+
+
+def get_invite_resolver(bot: Any = None) -> InviteResolver:
+    global _default
+    if _default is None:
+        _default = InviteResolver(bot)
+    elif bot is not None and _default.bot is None:
+        _default.bot = bot
+    return _default
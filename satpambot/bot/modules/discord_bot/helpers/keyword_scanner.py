@@ -0,0 +1,293 @@
+"""
+helpers/keyword_scanner.py
+Every keyword list of the bot in one Aho-Corasick automaton, scanned in one pass.
+
+    sc = get_keyword_scanner()
+    sc.scan("FREE n1tro, claim now")     # -> {"phish": {"free", "nitro", "claim"}, "seed": {...}, ...}
+    "phish" in sc.scan(text)              # any hit of one category
+    sc.finditer(text, {"profanity"})      # -> [(start, end, term, category), ...] in the original text
+
+Sources (category: where the terms live):
+
+    phish         score_utils.KEYWORDS
+    ocr_phish     OCR_PHISH_WORDS below (ocr_guard)
+    soft          NSFW_SOFT_KEYWORDS (ocr_guard soft-NSFW policy)
+    ocr_block     ocr_check blockwords (OCR_BLOCKWORDS, config/ocr.json, scam defaults)
+    fast_bad      safety_utils.FAST_BAD_KEYWORDS (hostname keywords)
+    seed          ml.feature_extractor.SEED_WORDS
+    profanity     bot/utils/profanity.DEFAULT_WORDS (whole words, "motherf*" is a prefix)
+    emotion:<x>   emotion_model.EMOTION_WORDS
+
+Text and terms go through the same normalization: lowercase, zero-width and
+variation-selector characters dropped, leetspeak folded (0->o, 1->i, 3->e,
+4/@->a, 5/$->s, 7->t). A term with letters that contains a folded character
+("r18", "n1tro") only matches as a whole word; a folded fragment like "ri8"
+would otherwise hit inside unrelated tokens. Terms without letters (scam
+amounts "2500", "$2500") stay substring matches, so "claim 2500$" and
+"USD2500" still hit. Offsets from finditer() point into the original text.
+
+The automaton is built on first use. rebuild() re-reads every source (after a
+list changed); register() adds a term set from elsewhere. The default scanner
+also re-checks OCR_BLOCKWORDS, OCR_SCAM_STRICT, NSFW_SOFT_KEYWORDS and the
+config/ocr.json stat at most every KEYWORD_SOURCES_POLL seconds and rebuilds
+when one changed; the hotenv overlay calls rebuild() right after merging env.
+
+ENV:
+  NSFW_SOFT_KEYWORDS     soft-NSFW terms (default nsfw,18+,r18,lewd)
+  KEYWORD_SOURCES_POLL   seconds between source change checks (default 2)
+"""
+from __future__ import annotations
+
+import logging, os, threading, time
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+log = logging.getLogger(__name__)
+
+OCR_PHISH_WORDS = ("nitro", "airdrop", "bonus", "free", "verify", "steam", "robux", "wallet", "crypto")
+
+_ZERO_WIDTH = "\u200b\u200c\u200d\u2060\ufeff\u00ad\ufe0e\ufe0f"
+_LEET = {"0": "o", "1": "i", "3": "e", "4": "a", "@": "a", "5": "s", "$": "s", "7": "t"}
+_TABLE = str.maketrans({**_LEET, **{c: None for c in _ZERO_WIDTH}})
+_PLAIN = str.maketrans({})
+
+KEYWORD_SOURCES_POLL = float(os.getenv("KEYWORD_SOURCES_POLL", "2"))
+_WATCH_ENV = ("OCR_BLOCKWORDS", "OCR_SCAM_STRICT", "NSFW_SOFT_KEYWORDS")
+_WATCH_FILES = ("config/ocr.json",)
+
+
+class Term(NamedTuple):
+    category: str
+    term: str          # as written in the source list
+    word: bool         # both ends on a word boundary
+    prefix: bool       # "motherf*": start on a boundary, the match runs to the end of the word
+    size: int          # length of the normalized pattern
+
+
+def normalize(text: str, table: dict = _TABLE) -> str:
+    return (text or "").lower().translate(table)
+
+
+def _normalize_mapped(text: str, table: dict = _TABLE) -> Tuple[str, Optional[List[int]]]:
+    """Normalized text plus, when its length differs, the original index of every char."""
+    norm = normalize(text, table)
+    if len(norm) == len(text):
+        return norm, None
+    out, pos = [], []
+    for i, ch in enumerate(text):
+        for c in ch.lower().translate(table):
+            out.append(c)
+            pos.append(i)
+    return "".join(out), pos
+
+
+def _is_word(c: str) -> bool:
+    return c.isalnum() or c == "_"
+
+
+def _default_sources() -> List[Tuple[str, Iterable[str], bool]]:
+    out: List[Tuple[str, Iterable[str], bool]] = []
+
+    def _add(category: str, load: Callable[[], Iterable[str]], word: bool = False):
+        try:
+            out.append((category, list(load()), word))
+        except Exception as e:
+            log.debug("[keyword_scanner] source %s unavailable: %r", category, e)
+
+    def _phish():
+        from .score_utils import KEYWORDS
+        return KEYWORDS
+
+    def _ocr_block():
+        from . import ocr_check
+        return ocr_check.prohibited_keywords()
+
+    def _fast_bad():
+        from .safety_utils import FAST_BAD_KEYWORDS
+        return FAST_BAD_KEYWORDS
+
+    def _seed():
+        from satpambot.ml.feature_extractor import SEED_WORDS
+        return SEED_WORDS
+
+    def _profanity():
+        from satpambot.bot.utils.profanity import DEFAULT_WORDS
+        return DEFAULT_WORDS
+
+    _add("phish", _phish)
+    _add("ocr_phish", lambda: OCR_PHISH_WORDS)
+    _add("soft", lambda: [w.strip() for w in os.getenv("NSFW_SOFT_KEYWORDS", "nsfw,18+,r18,lewd").split(",")])
+    _add("ocr_block", _ocr_block)
+    _add("fast_bad", _fast_bad)
+    _add("seed", _seed)
+    _add("profanity", _profanity, word=True)
+    try:
+        from .emotion_model import EMOTION_WORDS
+        for mood, (words, emojis) in EMOTION_WORDS.items():
+            out.append((f"emotion:{mood}", list(words), True))
+            out.append((f"emotion:{mood}", list(emojis), False))
+    except Exception as e:
+        log.debug("[keyword_scanner] source emotion unavailable: %r", e)
+    return out
+
+
+def _default_sources_key() -> tuple:
+    """Changes when a source that can be edited at runtime does (env lists, config/ocr.json)."""
+    out: list = [os.getenv(k) for k in _WATCH_ENV]
+    for p in _WATCH_FILES:
+        try:
+            st = os.stat(p)
+            out.append((st.st_mtime_ns, st.st_size))
+        except OSError:
+            out.append(None)
+    return tuple(out)
+
+
+class KeywordScanner:
+    def __init__(self, sources: Optional[Callable[[], List[Tuple[str, Iterable[str], bool]]]] = None,
+                 fold: bool = True, sources_key: Optional[Callable[[], tuple]] = None):
+        """
+        fold=False: lowercase only (exact substrings, e.g. regex literals in pattern_matcher).
+        sources_key: polled every KEYWORD_SOURCES_POLL s, a new value rebuilds (default sources: env + config/ocr.json).
+        """
+        self._sources = sources or _default_sources
+        self._sources_key = sources_key or (_default_sources_key if sources is None else None)
+        self._table = _TABLE if fold else _PLAIN
+        self._extra: List[Tuple[str, List[str], bool]] = []
+        self._lock = threading.Lock()
+        self._built = False
+        self._key: Optional[tuple] = None
+        self._checked = 0.0
+        self.terms = 0
+
+    def register(self, category: str, terms: Iterable[str], word: bool = False) -> None:
+        """Add a term set; it survives rebuild()."""
+        with self._lock:
+            self._extra.append((category, list(terms), word))
+            self._built = False
+
+    def rebuild(self) -> None:
+        """Re-read every source on the next scan."""
+        self._built = False
+
+    def _build(self) -> None:
+        goto: List[Dict[str, int]] = [{}]
+        out: List[List[Term]] = [[]]
+        n = 0
+        for category, terms, word in list(self._sources()) + self._extra:
+            for raw in terms:
+                raw = str(raw).strip()
+                prefix = word and raw.endswith("*")
+                pat = normalize(raw.rstrip("*") if prefix else raw, self._table)
+                if not pat:
+                    continue
+                s = 0
+                for c in pat:
+                    nxt = goto[s].get(c)
+                    if nxt is None:
+                        nxt = goto[s][c] = len(goto)
+                        goto.append({})
+                        out.append([])
+                    s = nxt
+                # leet folding only risks false hits inside words; amounts like "$2500" stay substrings
+                folded = self._table is _TABLE and any(c in _LEET for c in raw.lower()) and any(c.isalpha() for c in raw)
+                t = Term(category, raw, word or folded, prefix, len(pat))
+                if t not in out[s]:
+                    out[s].append(t)
+                    n += 1
+        # breadth-first failure links; out[] then holds every term ending at a state
+        fail = [0] * len(goto)
+        queue = list(goto[0].values())
+        for s in queue:
+            for c, nxt in goto[s].items():
+                f = fail[s]
+                while f and c not in goto[f]:
+                    f = fail[f]
+                fail[nxt] = goto[f].get(c, 0)
+                out[nxt] = out[nxt] + [t for t in out[fail[nxt]] if t not in out[nxt]]
+                queue.append(nxt)
+        self._goto, self._fail, self._out = goto, fail, [tuple(o) for o in out]
+        self.terms = n
+        log.debug("[keyword_scanner] built: %d terms, %d states", n, len(goto))
+
+    def _ensure(self) -> None:
+        if self._built and self._sources_key is not None:
+            now = time.monotonic()
+            if now - self._checked >= KEYWORD_SOURCES_POLL:
+                self._checked = now
+                if self._sources_key() != self._key:
+                    log.info("[keyword_scanner] a keyword source changed; rebuilding")
+                    self._built = False
+        if not self._built:
+            with self._lock:
+                if not self._built:
+                    if self._sources_key is not None:
+                        self._key = self._sources_key()
+                        self._checked = time.monotonic()
+                    self._build()
+                    self._built = True
+
+    def _matches(self, norm: str):
+        """(start, end, Term) on the normalized text, word rules applied."""
+        self._ensure()
+        goto, fail, outs = self._goto, self._fail, self._out
+        root = goto[0]
+        s = 0
+        n = len(norm)
+        for i, c in enumerate(norm):
+            if s == 0 and c not in root:
+                continue
+            while s and c not in goto[s]:
+                s = fail[s]
+            s = goto[s].get(c, 0)
+            if not outs[s]:
+                continue
+            end = i + 1
+            for t in outs[s]:
+                start = end - t.size
+                if t.word:
+                    if start > 0 and _is_word(norm[start - 1]):
+                        continue
+                    if t.prefix:
+                        e = end
+                        while e < n and _is_word(norm[e]):
+                            e += 1
+                        yield start, e, t
+                        continue
+                    if end < n and _is_word(norm[end]):
+                        continue
+                yield start, end, t
+
+    def scan(self, text: str) -> Dict[str, Set[str]]:
+        """{category: {term as written, ...}} for every term found in text."""
+        hits: Dict[str, Set[str]] = {}
+        if not text:
+            return hits
+        for _, _, t in self._matches(normalize(text, self._table)):
+            hits.setdefault(t.category, set()).add(t.term)
+        return hits
+
+    def finditer(self, text: str, categories: Optional[Iterable[str]] = None) -> List[Tuple[int, int, str, str]]:
+        """(start, end, term, category) with offsets into the original text, sorted by start."""
+        if not text:
+            return []
+        cats = set(categories) if categories is not None else None
+        norm, pos = _normalize_mapped(text, self._table)
+        out = []
+        for start, end, t in self._matches(norm):
+            if cats is not None and t.category not in cats:
+                continue
+            if pos is not None:
+                start, end = pos[start], pos[end - 1] + 1
+            out.append((start, end, t.term, t.category))
+        out.sort()
+        return out
+
+
+_default: Optional[KeywordScanner] = None
+
+
+def get_keyword_scanner() -> KeywordScanner:
+    global _default
+    if _default is None:
+        _default = KeywordScanner()
+    return _default
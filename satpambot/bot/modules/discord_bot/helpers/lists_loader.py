@@ -7,15 +7,16 @@ helpers/lists_loader.py (FINAL compat)
 - Menulis ke:
     data/whitelist_domains.json   (list[str])
     data/blacklist_domains.json   (list[str])
-    data/url_whitelist.json       {"allow":[...]}
-    data/url_blocklist.json       {"domains":[...]}
+    data/url_whitelist.json       {"allow":[...], "patterns":[...]}
+    data/url_blocklist.json       {"domains":[...], "patterns":[...]}
+- patterns = regex dari `!wl add` / `!bl add` (lihat helpers/pattern_matcher.py)
 - Juga mempertahankan util lama: load_lists(), url_to_host()
 """
 from __future__ import annotations
 
 import os, json, re
 from pathlib import Path
-from typing import Set, Tuple, Dict
+from typing import List, Set, Tuple, Dict
 
 WL_FILE = Path(os.getenv("WHITELIST_DOMAINS_FILE", "data/whitelist_domains.json"))
 BL_FILE = Path(os.getenv("BLACKLIST_DOMAINS_FILE", "data/blacklist_domains.json"))
@@ -50,6 +51,14 @@ def _read_any(path: Path):
     except Exception:
         return []
 
+def _read_patterns(path: Path) -> List[str]:
+    try:
+        data = json.loads(path.read_text(encoding="utf-8", errors="ignore")) if path.exists() else {}
+        pats = data.get("patterns") if isinstance(data, dict) else None
+        return [str(p).strip() for p in (pats or []) if str(p).strip()]
+    except Exception:
+        return []
+
 def _write_json(path: Path, data):
     path.parent.mkdir(parents=True, exist_ok=True)
     path.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
@@ -57,8 +66,8 @@ def _write_json(path: Path, data):
 def load_whitelist_blacklist() -> Dict[str, Set[str]]:
     wl = set(_read_any(WL_FILE)) | set(_read_any(URL_WL_JSON))
     bl = set(_read_any(BL_FILE)) | set(_read_any(URL_BL_JSON))
-    wl_patterns: Set[str] = set()
-    bl_patterns: Set[str] = set()
+    wl_patterns: List[str] = _read_patterns(URL_WL_JSON)
+    bl_patterns: List[str] = _read_patterns(URL_BL_JSON)
     bl -= wl  # whitelist menang
     return {"wl_domains": wl, "wl_patterns": wl_patterns, "bl_domains": bl, "bl_patterns": bl_patterns}
 
@@ -69,8 +78,10 @@ def save_lists(wl_domains, wl_patterns, bl_domains, bl_patterns) -> bool:
         bl_sorted = [d for d in bl_sorted if d not in set(wl_sorted)]
         _write_json(WL_FILE, wl_sorted)
         _write_json(BL_FILE, bl_sorted)
-        _write_json(URL_WL_JSON, {"allow": wl_sorted})
-        _write_json(URL_BL_JSON, {"domains": bl_sorted})
+        _write_json(URL_WL_JSON, {"allow": wl_sorted, "patterns": list(dict.fromkeys(str(p) for p in wl_patterns))})
+        _write_json(URL_BL_JSON, {"domains": bl_sorted, "patterns": list(dict.fromkeys(str(p) for p in bl_patterns))})
+        from .domain_reputation import get_domain_reputation
+        get_domain_reputation().invalidate()
         return True
     except Exception:
         return False
@@ -0,0 +1,187 @@
+"""
+helpers/message_analysis.py
+URLs, domains, tokens, invites and mentions of a message, parsed once and shared by every guard.
+
+    a = analyze(message)            # same object for every listener of this message
+    a.urls, a.hosts, a.domains      # URLs as written, IDNA-decoded hosts, registrable domains
+    a.text_domains                  # URL hosts + bare "example.com" tokens (lists_sync)
+    a.words, a.features             # alnum runs; ml.feature_extractor.tokenize_text tokens
+    a.invite_codes                  # discord.gg/x, discord(app).com/invite/x, dis.gd/x
+    a.user_mentions, a.role_mentions, a.mention_everyone
+    a.keywords                      # keyword_scanner hits {category: {term}}
+    a.simhash                       # near_duplicate 64-bit SimHash (None for short texts; URLs do not count)
+    MessageAnalysis(ocr_text)       # same fields for text that is not a message
+
+Every field is computed on first access. discord.Message has __slots__ and
+takes no extra attributes, so analyses are kept in a small LRU keyed by
+(message id, content): every on_message listener of one message gets the same
+object, and an edited message gets a fresh one.
+
+ENV:
+  MSG_ANALYSIS_CACHE   messages kept (default 512)
+"""
+from __future__ import annotations
+
+import os, re
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Set
+
+URL_RE = re.compile(r"(https?://[\w\-\.\u00A1-\uFFFF/%#?=&+~:;,@!'$*\(\)\[\]\{\}]+)", re.I)
+INVITE_RE = re.compile(r"(?:https?://)?(?:discord(?:app)?\.com/invite/|discord\.gg/|dis\.gd/)([A-Za-z0-9-]+)", re.I)
+BARE_DOMAIN_RE = re.compile(r"\b([a-z0-9-]+(?:\.[a-z0-9-]+)+)\b", re.I)
+WORD_RE = re.compile(r"[^\W_]+")
+USER_MENTION_RE = re.compile(r"<@!?\d+>")
+ROLE_MENTION_RE = re.compile(r"<@&\d+>")
+
+_TRAILING = ".,;:!?'\""
+_UNSET = object()  # simhash may legitimately be None
+_PAIRS = {")": "(", "]": "[", "}": "{"}
+
+
+def _trim_url(u: str) -> str:
+    """Drop sentence punctuation and unbalanced closing brackets from the end of a URL."""
+    while u:
+        c = u[-1]
+        if c in _TRAILING or (c in _PAIRS and u.count(c) > u.count(_PAIRS[c])):
+            u = u[:-1]
+        else:
+            break
+    return u
+
+
+def extract_urls(text: str) -> List[str]:
+    return [u for u in (_trim_url(m.group(1)) for m in URL_RE.finditer(text or "")) if u]
+
+
+def url_host(url: str) -> str:
+    """Lowercase IDNA-decoded host of an http(s) URL, without credentials, port or trailing dot."""
+    rest = url.split("://", 1)[-1]
+    host = re.split(r"[/?#]", rest, 1)[0].rsplit("@", 1)[-1]
+    if host.startswith("["):
+        return host.split("]")[0].strip("[").lower()
+    host = host.split(":")[0].strip(".").lower()
+    if "xn--" in host:
+        try:
+            host = host.encode("ascii").decode("idna")
+        except Exception:
+            pass
+    return host
+
+
+def tokenize_words(text: str) -> List[str]:
+    """Lowercase runs of letters and digits."""
+    return WORD_RE.findall((text or "").lower())
+
+
+class MessageAnalysis:
+    __slots__ = ("text", "user_mentions", "role_mentions", "mention_everyone", "_urls", "_hosts", "_domains",
+                 "_text_domains", "_words", "_features", "_invites", "_keywords", "_simhash")
+
+    def __init__(self, text: str, message: Any = None):
+        self.text = text or ""
+        # counts are taken now so the cache does not keep Message objects alive
+        if message is not None:
+            self.user_mentions = len(getattr(message, "mentions", None) or [])
+            self.role_mentions = len(getattr(message, "role_mentions", None) or [])
+            self.mention_everyone = bool(getattr(message, "mention_everyone", False))
+        else:
+            self.user_mentions = len(USER_MENTION_RE.findall(self.text))
+            self.role_mentions = len(ROLE_MENTION_RE.findall(self.text))
+            self.mention_everyone = "@everyone" in self.text or "@here" in self.text
+        self._urls: Optional[List[str]] = None
+        self._hosts: Optional[List[str]] = None
+        self._domains: Optional[List[str]] = None
+        self._text_domains: Optional[Set[str]] = None
+        self._words: Optional[List[str]] = None
+        self._features: Optional[List[str]] = None
+        self._invites: Optional[List[str]] = None
+        self._keywords: Optional[Dict[str, Set[str]]] = None
+        self._simhash: Any = _UNSET
+
+    @property
+    def urls(self) -> List[str]:
+        if self._urls is None:
+            self._urls = extract_urls(self.text) if "://" in self.text else []
+        return self._urls
+
+    @property
+    def hosts(self) -> List[str]:
+        """One host per URL, same order (may repeat)."""
+        if self._hosts is None:
+            self._hosts = [url_host(u) for u in self.urls]
+        return self._hosts
+
+    @property
+    def domains(self) -> List[str]:
+        """Unique registrable domains of the URL hosts."""
+        if self._domains is None:
+            from .url_check import reg_domain
+            self._domains = list(dict.fromkeys(reg_domain(h[4:] if h.startswith("www.") else h) for h in self.hosts if h))
+        return self._domains
+
+    @property
+    def text_domains(self) -> Set[str]:
+        if self._text_domains is None:
+            out = {h for h in self.hosts if h}
+            if "." in self.text:
+                out |= {m.group(1).lower().strip(".-") for m in BARE_DOMAIN_RE.finditer(self.text)}
+            self._text_domains = {d for d in out if "." in d}
+        return self._text_domains
+
+    @property
+    def words(self) -> List[str]:
+        if self._words is None:
+            self._words = tokenize_words(self.text)
+        return self._words
+
+    @property
+    def features(self) -> List[str]:
+        if self._features is None:
+            from satpambot.ml.feature_extractor import tokenize_text
+            self._features = tokenize_text(self.text)
+        return self._features
+
+    @property
+    def invite_codes(self) -> List[str]:
+        if self._invites is None:
+            self._invites = [m.group(1) for m in INVITE_RE.finditer(self.text)] if "/" in self.text else []
+        return self._invites
+
+    @property
+    def keywords(self) -> Dict[str, Set[str]]:
+        if self._keywords is None:
+            from .keyword_scanner import get_keyword_scanner
+            self._keywords = get_keyword_scanner().scan(self.text)
+        return self._keywords
+
+    @property
+    def simhash(self) -> Optional[int]:
+        if self._simhash is _UNSET:
+            from .near_duplicate import simhash64
+            self._simhash = simhash64(self.text)
+        return self._simhash
+
+    @property
+    def mention_count(self) -> int:
+        return self.user_mentions + self.role_mentions + (1 if self.mention_everyone else 0)
+
+
+_cache: "OrderedDict[tuple, MessageAnalysis]" = OrderedDict()
+_CACHE_MAX = max(1, int(os.getenv("MSG_ANALYSIS_CACHE", "512")))
+
+
+def analyze(message: Any) -> MessageAnalysis:
+    """The shared analysis of message.content (plus the message's own mention lists)."""
+    text = getattr(message, "content", None) or ""
+    mid = getattr(message, "id", None)
+    if mid is None:
+        return MessageAnalysis(text, message)
+    key = (mid, text)
+    a = _cache.get(key)
+    if a is not None:
+        _cache.move_to_end(key)
+        return a
+    a = _cache[key] = MessageAnalysis(text, message)
+    while len(_cache) > _CACHE_MAX:
+        _cache.popitem(last=False)
+    return a
@@ -0,0 +1,304 @@
+"""
+helpers/near_duplicate.py
+Guild-wide near-duplicate message clusters: 64-bit SimHash + a time-bucketed LSH index.
+
+    det = get_near_duplicate_detector()
+    h = simhash64("FREE NITRO for everyone https://discord-gift.ru/abc")   # or analyze(message).simhash
+    v = det.add(guild_id, h, now, author_id, channel_id, message_id)
+    v.flagged, v.newly_flagged         # cluster crossed the threshold (newly_flagged: on this message)
+    v.size, v.authors, v.channels      # cluster stats inside the window
+    v.earlier                          # [(channel_id, message_id), ...] posted before the flag, for cleanup
+
+Scam waves repeat one text with small edits (other link path, emoji, a
+number) across channels within seconds. Text is normalized first:
+keyword_scanner folding (case, zero-width, leetspeak), URLs reduced to their
+host, digit runs to "#", punctuation and emoji dropped. Its 3-character
+shingles are hashed into a SimHash, so one edited word moves only a few of
+the 64 bits. Texts with fewer than NEARDUP_MIN_CHARS outside their URLs get
+no SimHash: a bare link would hash to its host alone, and different image
+or store links to one host would then cluster as copies.
+
+The index keeps the last NEARDUP_WINDOW_SEC per guild in NEARDUP_BUCKETS
+time buckets. Each bucket cuts the hash into NEARDUP_MAX_DISTANCE + 1 bands
+with one dict per band: a hash within that distance of a stored one equals
+it on at least one band (pigeonhole), so band hits are the only candidates.
+They are verified with the packed XOR + popcount of hash_index. A bucket is
+dropped whole when it leaves the window, and stops indexing at
+NEARDUP_BUCKET_MAX messages, so memory is bounded by time and by count.
+
+A message joins the cluster of its nearest neighbour in the newest bucket
+that has one. A cluster is
+flagged once it holds NEARDUP_MIN_COUNT messages inside the window from
+>= NEARDUP_MIN_CHANNELS channels or >= NEARDUP_MIN_AUTHORS authors.
+Cluster stats exist only for messages that have a neighbour and expire
+after a window without new members.
+
+ENV:
+  NEARDUP_WINDOW_SEC     window (default 300)
+  NEARDUP_BUCKETS        time buckets in the window (default 10)
+  NEARDUP_BUCKET_MAX     messages indexed per bucket and guild (default 2000)
+  NEARDUP_MAX_DISTANCE   SimHash Hamming distance of a near duplicate (default 7, max 15)
+  NEARDUP_MIN_CHARS      texts shorter than this, URLs not counted, are ignored (default 20)
+  NEARDUP_MIN_COUNT      messages in a flagged cluster (default 4)
+  NEARDUP_MIN_CHANNELS   distinct channels (default 2)
+  NEARDUP_MIN_AUTHORS    distinct authors (default 3)
+"""
+from __future__ import annotations
+
+import os, re
+from collections import OrderedDict
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from .hash_index import np, popcount64
+from .keyword_scanner import normalize
+
+NEARDUP_WINDOW_SEC = float(os.getenv("NEARDUP_WINDOW_SEC", "300"))
+NEARDUP_BUCKETS = max(1, int(os.getenv("NEARDUP_BUCKETS", "10")))
+NEARDUP_BUCKET_MAX = int(os.getenv("NEARDUP_BUCKET_MAX", "2000"))
+NEARDUP_MAX_DISTANCE = max(0, min(15, int(os.getenv("NEARDUP_MAX_DISTANCE", "7"))))
+NEARDUP_MIN_CHARS = int(os.getenv("NEARDUP_MIN_CHARS", "20"))
+NEARDUP_MIN_COUNT = int(os.getenv("NEARDUP_MIN_COUNT", "4"))
+NEARDUP_MIN_CHANNELS = int(os.getenv("NEARDUP_MIN_CHANNELS", "2"))
+NEARDUP_MIN_AUTHORS = int(os.getenv("NEARDUP_MIN_AUTHORS", "3"))
+SHINGLE = 3
+_KEPT = 32  # authors/channels/message ids remembered per cluster
+_PER_KEY = 8  # positions per band value: a wave of copies is represented, not indexed whole
+_GUILDS_MAX = 256
+_MASK64 = (1 << 64) - 1
+_MULT = (0x9E3779B97F4A7C15, 0xC2B2AE3D27D4EB4F, 0x165667B19E3779F9)  # one per shingle position
+
+_URL_RE = re.compile(r"https?://([^/\s]+)\S*", re.I)
+_DIGITS_RE = re.compile(r"\d+")
+_PUNCT_RE = re.compile(r"[^\w#.\s]+")
+_WS_RE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    t = _URL_RE.sub(lambda m: " " + m.group(1).lower() + " ", text or "")
+    t = _PUNCT_RE.sub(" ", _DIGITS_RE.sub("#", normalize(t)))
+    return _WS_RE.sub(" ", t).strip()
+
+
+def _mix(x: int) -> int:
+    """splitmix64 finalizer (the numpy path below computes the same values)."""
+    x &= _MASK64
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & _MASK64
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & _MASK64
+    return x ^ (x >> 31)
+
+
+def _mix_np(x):
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def simhash64(text: str, normalized: bool = False) -> Optional[int]:
+    """64-bit SimHash of the text's 3-char shingles; None when the text outside its URLs is too short."""
+    if not normalized and len(normalize_text(_URL_RE.sub(" ", text or ""))) < NEARDUP_MIN_CHARS:
+        return None
+    t = text if normalized else normalize_text(text)
+    if len(t) < max(NEARDUP_MIN_CHARS, SHINGLE):
+        return None
+    n = len(t) - SHINGLE + 1
+    if np is not None:
+        cps = np.frombuffer(t.encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+        x = cps[:n] * np.uint64(_MULT[0])
+        for j in range(1, SHINGLE):
+            x += cps[j:j + n] * np.uint64(_MULT[j])
+        ones = np.unpackbits(_mix_np(x).view(np.uint8), bitorder="little").reshape(n, 64).sum(axis=0)
+        return int.from_bytes(np.packbits(ones * 2 > n, bitorder="little").tobytes(), "little")
+    cps = [ord(c) for c in t]
+    counts = [0] * 64
+    for i in range(n):
+        h = _mix(sum(cps[i + j] * _MULT[j] for j in range(SHINGLE)))
+        for b in range(64):
+            counts[b] += (h >> b) & 1
+    return sum(1 << b for b in range(64) if counts[b] * 2 > n)
+
+
+def _bands(radius: int) -> Tuple[Tuple[int, int], ...]:
+    """radius + 1 disjoint (shift, mask) slices of the 64 bits: a hash within `radius` bits matches one exactly."""
+    k = radius + 1
+    edges = [64 * i // k for i in range(k + 1)]
+    return tuple((lo, (1 << (hi - lo)) - 1) for lo, hi in zip(edges, edges[1:]))
+
+
+class _Bucket:
+    __slots__ = ("epoch", "hashes", "entries", "slices", "bands")
+
+    def __init__(self, epoch: int, slices: Tuple[Tuple[int, int], ...]):
+        self.epoch = epoch
+        self.hashes: List[int] = []
+        self.entries: List[_Entry] = []
+        self.slices = slices
+        self.bands: List[Dict[int, List[int]]] = [{} for _ in slices]
+
+    def add(self, h: int, entry: "_Entry") -> None:
+        pos = len(self.hashes)
+        self.hashes.append(h)
+        self.entries.append(entry)
+        for band, (shift, mask) in zip(self.bands, self.slices):
+            hits = band.setdefault((h >> shift) & mask, [])
+            if len(hits) < _PER_KEY:
+                hits.append(pos)
+
+    def candidates(self, h: int) -> List[int]:
+        out = set()
+        for band, (shift, mask) in zip(self.bands, self.slices):
+            out.update(band.get((h >> shift) & mask, ()))
+        return list(out)
+
+
+class _Entry(NamedTuple):
+    cluster: int
+    ts: float
+    author_id: int
+    channel_id: int
+    message_id: int
+
+
+class _Cluster:
+    __slots__ = ("last", "times", "authors", "channels", "messages", "flagged")
+
+    def __init__(self):
+        self.last = 0.0
+        self.times: List[float] = []
+        self.authors: List[int] = []
+        self.channels: List[int] = []
+        self.messages: List[Tuple[int, int]] = []
+        self.flagged = False
+
+    def add(self, e: "_Entry", window: float) -> None:
+        self.last = max(self.last, e.ts)
+        self.times = [t for t in self.times if e.ts - t <= window][-(_KEPT - 1):] + [e.ts]
+        if e.author_id not in self.authors:
+            self.authors = (self.authors + [e.author_id])[-_KEPT:]
+        if e.channel_id not in self.channels:
+            self.channels = (self.channels + [e.channel_id])[-_KEPT:]
+        if not self.flagged:
+            self.messages = (self.messages + [(e.channel_id, e.message_id)])[-_KEPT:]
+
+
+class NearDupVerdict(NamedTuple):
+    cluster: int
+    size: int = 1
+    authors: int = 1
+    channels: int = 1
+    flagged: bool = False
+    newly_flagged: bool = False
+    earlier: Tuple[Tuple[int, int], ...] = ()
+
+
+class _GuildIndex:
+    __slots__ = ("buckets", "clusters", "next_id")
+
+    def __init__(self):
+        self.buckets: List[Optional[_Bucket]] = [None] * NEARDUP_BUCKETS
+        self.clusters: "OrderedDict[int, _Cluster]" = OrderedDict()
+        self.next_id = 1
+
+
+def _nearest(hashes: List[int], cand: List[int], h: int) -> Tuple[int, int]:
+    """(position, distance) of the closest candidate hash."""
+    if np is not None and len(cand) > 16:
+        d = popcount64(np.array([hashes[i] for i in cand], dtype=np.uint64) ^ np.uint64(h))
+        k = int(d.argmin())
+        return cand[k], int(d[k])
+    return min(((i, (hashes[i] ^ h).bit_count()) for i in cand), key=lambda p: p[1])
+
+
+class NearDuplicateDetector:
+    def __init__(self, window: float = NEARDUP_WINDOW_SEC, max_distance: int = NEARDUP_MAX_DISTANCE):
+        self.window = float(window)
+        self.width = self.window / NEARDUP_BUCKETS
+        self.max_distance = max(0, min(15, max_distance))
+        self.slices = _bands(self.max_distance)
+        self._guilds: "OrderedDict[int, _GuildIndex]" = OrderedDict()
+
+    def __len__(self) -> int:
+        """Messages currently indexed, all guilds."""
+        return sum(len(b.hashes) for g in self._guilds.values() for b in g.buckets if b is not None)
+
+    def _guild(self, guild_id: int) -> _GuildIndex:
+        g = self._guilds.get(guild_id)
+        if g is None:
+            g = self._guilds[guild_id] = _GuildIndex()
+            while len(self._guilds) > _GUILDS_MAX:
+                self._guilds.popitem(last=False)
+        else:
+            self._guilds.move_to_end(guild_id)
+        return g
+
+    def _expire(self, g: _GuildIndex, now: float) -> None:
+        # a touched cluster moves to the end, so the idle ones sit at the front
+        while g.clusters:
+            cid, c = next(iter(g.clusters.items()))
+            if now - c.last <= self.window:
+                break
+            del g.clusters[cid]
+
+    def _neighbour(self, g: _GuildIndex, h: int, epoch: int) -> Optional[_Entry]:
+        """Closest match in the newest bucket that has one (a wave is already in the recent buckets)."""
+        for age in range(NEARDUP_BUCKETS):
+            b = g.buckets[(epoch - age) % NEARDUP_BUCKETS]
+            if b is None or b.epoch != epoch - age:
+                continue
+            cand = b.candidates(h)
+            if cand:
+                pos, dist = _nearest(b.hashes, cand, h)
+                if dist <= self.max_distance:
+                    return b.entries[pos]
+        return None
+
+    def add(self, guild_id: int, h: Optional[int], now: float, author_id: int = 0, channel_id: int = 0,
+            message_id: int = 0) -> Optional[NearDupVerdict]:
+        """Index one message and return the stats of its cluster (None when the text had no SimHash)."""
+        if h is None:
+            return None
+        g = self._guild(guild_id)
+        epoch = int(now // self.width)
+        self._expire(g, now)
+        near = self._neighbour(g, h, epoch)
+        if near is None:
+            cid = g.next_id
+            g.next_id += 1
+        else:
+            cid = near.cluster
+        entry = _Entry(cid, now, author_id, channel_id, message_id)
+        slot = epoch % NEARDUP_BUCKETS
+        b = g.buckets[slot]
+        if b is None or b.epoch != epoch:
+            b = g.buckets[slot] = _Bucket(epoch, self.slices)  # replaces the bucket that left the window
+        if len(b.hashes) < NEARDUP_BUCKET_MAX:
+            b.add(h, entry)
+        if near is None:
+            return NearDupVerdict(cid)  # singletons get no stats until a neighbour shows up
+        c = g.clusters.get(cid)
+        if c is None:
+            c = g.clusters[cid] = _Cluster()
+            c.add(near, self.window)
+        g.clusters.move_to_end(cid)
+        c.add(entry, self.window)
+        earlier: Tuple[Tuple[int, int], ...] = ()
+        newly = False
+        size = len(c.times)
+        if not c.flagged and size >= NEARDUP_MIN_COUNT and (
+                len(c.channels) >= NEARDUP_MIN_CHANNELS or len(c.authors) >= NEARDUP_MIN_AUTHORS):
+            c.flagged = newly = True
+            earlier = tuple(m for m in c.messages if m != (channel_id, message_id))
+            c.messages = []
+        return NearDupVerdict(cid, size, len(c.authors), len(c.channels), c.flagged, newly, earlier)
+
+    def clear(self) -> None:
+        self._guilds.clear()
+
+
+_default: Optional[NearDuplicateDetector] = None
+
+
+def get_near_duplicate_detector() -> NearDuplicateDetector:
+    global _default
+    if _default is None:
+        _default = NearDuplicateDetector()
+    return _default
@@ -32,8 +32,13 @@ def _load_ocr_words() -> List[str]:
         pass
     return words
 
+def prohibited_keywords() -> List[str]:
+    """OCR_BLOCKWORDS + config/ocr.json + scam defaults, read now (keyword_scanner rebuilds on change)."""
+    strict = os.getenv("OCR_SCAM_STRICT","true").lower()=="true"
+    return list(dict.fromkeys(_load_ocr_words() + (SCAM_DEFAULT_WORDS if strict else [])))
+
 USE_SCAM_WORDS = (os.getenv("OCR_SCAM_STRICT","true").lower()=="true")
-PROHIBITED_KEYWORDS: List[str] = list(dict.fromkeys(_load_ocr_words() + (SCAM_DEFAULT_WORDS if USE_SCAM_WORDS else [])))
+PROHIBITED_KEYWORDS: List[str] = prohibited_keywords()
 
 def _preprocess(img):
     try:
@@ -58,5 +63,5 @@ def extract_text(image_bytes: bytes) -> str:
 def has_prohibited(text: str) -> bool:
     if not text:
         return False
-    t = text.lower()
-    return any(k in t for k in PROHIBITED_KEYWORDS)
+    from .keyword_scanner import get_keyword_scanner
+    return "ocr_block" in get_keyword_scanner().scan(text)
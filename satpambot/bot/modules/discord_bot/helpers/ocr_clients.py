@@ -39,6 +39,8 @@ async def ocr_via_api(bytes_data: bytes, filename: str = "image.jpg") -> Optiona
         return None
 
 # Local OCR (pytesseract), using OCR_LANG if available
+from .ocr_service import PRIORITY_NORMAL, get_ocr_service
+
 try:
     import pytesseract
     from PIL import Image
@@ -46,24 +48,23 @@ try:
 except Exception:
     HAVE_LOCAL = False
 
-async def ocr_via_local(bytes_data: bytes, lang: str = "") -> Optional[str]:
+async def ocr_via_local(bytes_data: bytes, lang: str = "", sha256: Optional[str] = None,
+                        priority: int = PRIORITY_NORMAL, deadline: Optional[float] = None) -> Optional[str]:
+    """
+    Tesseract via the shared OCRService (process pool + sha256 result cache).
+    """
     if not HAVE_LOCAL:
         return None
     try:
-        from io import BytesIO
-        img = Image.open(BytesIO(bytes_data)).convert("RGB")
-        cfg = {}
-        if lang:
-            cfg["lang"] = lang
-        text = pytesseract.image_to_string(img, **cfg)
-        return text
+        return await get_ocr_service().ocr(bytes_data, sha256=sha256, priority=priority, deadline=deadline, lang=lang)
     except Exception:
         return None
 
-async def smart_ocr(bytes_data: bytes, filename: str = "image.jpg") -> Optional[str]:
+async def smart_ocr(bytes_data: bytes, filename: str = "image.jpg", sha256: Optional[str] = None,
+                    priority: int = PRIORITY_NORMAL, deadline: Optional[float] = None) -> Optional[str]:
     # Try API first if configured, otherwise local
     txt = await ocr_via_api(bytes_data, filename=filename)
     if txt:
         return txt
     lang = os.getenv("OCR_LANG","")
-    return await ocr_via_local(bytes_data, lang=lang)
+    return await ocr_via_local(bytes_data, lang=lang, sha256=sha256, priority=priority, deadline=deadline)
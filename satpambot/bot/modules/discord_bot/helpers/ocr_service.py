@@ -0,0 +1,245 @@
+"""
+helpers/ocr_service.py
+Tesseract OCR off the event loop, cached on disk by content sha256.
+
+    svc = get_ocr_service()
+    text = await svc.ocr(data, priority=priority_for(message.author), deadline=4.0)
+
+- Results (including "no text") are stored in SQLite keyed by sha256, so a
+  reposted scam screenshot is answered from disk instead of re-running tesseract.
+  The table is capped at OCR_CACHE_MAX_ROWS and purged least-recently-used first.
+- Jobs go through a priority queue (PRIORITY_NEW_MEMBER first) into a bounded
+  process pool; identical images in flight share one job.
+- Every job carries a deadline: it is skipped if it expires while queued and
+  abandoned (None) if tesseract overruns it (pytesseract kills the tesseract
+  subprocess at the same deadline, so a worker is never wedged for long).
+
+ENV:
+  OCR_CACHE_DB          sqlite path                 (default data/ocr_cache.sqlite3)
+  OCR_CACHE_MAX_ROWS    cached results              (default 20000)
+  OCR_WORKERS           tesseract processes         (default 1)
+  OCR_MAX_QUEUE         queued jobs before rejecting (default 64)
+  OCR_DEADLINE_SEC      default per-image deadline  (default 8)
+  OCR_NEW_MEMBER_HOURS  "new member" window         (default 72)
+"""
+from __future__ import annotations
+
+import asyncio, hashlib, itertools, logging, multiprocessing, os, time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from .sqlite_util import open_db
+
+log = logging.getLogger(__name__)
+
+PRIORITY_NEW_MEMBER = 0
+PRIORITY_NORMAL = 10
+PRIORITY_BACKFILL = 20
+
+NEW_MEMBER_HOURS = float(os.getenv("OCR_NEW_MEMBER_HOURS", "72"))
+
+
+def priority_for(member: Any) -> int:
+    """PRIORITY_NEW_MEMBER for accounts/members younger than OCR_NEW_MEMBER_HOURS."""
+    now = datetime.now(timezone.utc)
+    for attr in ("joined_at", "created_at"):
+        ts = getattr(member, attr, None)
+        try:
+            if ts is not None and (now - ts).total_seconds() < NEW_MEMBER_HOURS * 3600:
+                return PRIORITY_NEW_MEMBER
+        except Exception:
+            continue
+    return PRIORITY_NORMAL
+
+
+def _tesseract(data: bytes, lang: str, timeout: float) -> str:
+    """Worker entry point: decode once (full resolution, grayscale) and OCR."""
+    import pytesseract
+    from satpambot.bot.modules.discord_bot.helpers.image_features import ImageFeatures
+    f = ImageFeatures.from_bytes(data, full=True)
+    if f is None:
+        return ""
+    cfg = {"lang": lang} if lang else {}
+    return pytesseract.image_to_string(f.image("L"), timeout=max(1, int(timeout)), **cfg) or ""
+
+
+class OCRCache:
+    """(sha256, lang) -> text in SQLite with an LRU row cap."""
+
+    def __init__(self, path: Optional[str] = None, max_rows: Optional[int] = None):
+        self.path = path or os.getenv("OCR_CACHE_DB", "data/ocr_cache.sqlite3")
+        self.max_rows = int(max_rows or os.getenv("OCR_CACHE_MAX_ROWS", "20000"))
+        self._conn = None
+        self._writes = 0
+
+    def _db(self):
+        if self._conn is None:
+            if self.path != ":memory:":
+                Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            self._conn = open_db(self.path)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS ocr_cache ("
+                " sha256 TEXT NOT NULL, lang TEXT NOT NULL DEFAULT '', text TEXT NOT NULL,"
+                " created REAL NOT NULL, used REAL NOT NULL, PRIMARY KEY (sha256, lang))"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS ocr_cache_used ON ocr_cache(used)")
+        return self._conn
+
+    def get(self, sha256: str, lang: str = "") -> Optional[str]:
+        key = (sha256, lang or "")
+        try:
+            row = self._db().execute("SELECT text FROM ocr_cache WHERE sha256=? AND lang=?", key).fetchone()
+            if row is None:
+                return None
+            self._db().execute("UPDATE ocr_cache SET used=? WHERE sha256=? AND lang=?", (time.time(),) + key)
+            return row[0]
+        except Exception:
+            log.debug("[ocr] cache read failed", exc_info=True)
+            return None
+
+    def put(self, sha256: str, text: str, lang: str = "") -> None:
+        now = time.time()
+        try:
+            self._db().execute(
+                "INSERT OR REPLACE INTO ocr_cache(sha256, lang, text, created, used) VALUES (?,?,?,?,?)",
+                (sha256, lang or "", text or "", now, now),
+            )
+            self._writes += 1
+            if self._writes % 100 == 0:
+                self.purge()
+        except Exception:
+            log.debug("[ocr] cache write failed", exc_info=True)
+
+    def purge(self) -> int:
+        """Drop least-recently-used rows above max_rows."""
+        db = self._db()
+        n = db.execute("SELECT COUNT(*) FROM ocr_cache").fetchone()[0]
+        extra = n - self.max_rows
+        if extra <= 0:
+            return 0
+        db.execute("DELETE FROM ocr_cache WHERE rowid IN (SELECT rowid FROM ocr_cache ORDER BY used ASC LIMIT ?)", (extra,))
+        return extra
+
+    def __len__(self) -> int:
+        return int(self._db().execute("SELECT COUNT(*) FROM ocr_cache").fetchone()[0])
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+class OCRService:
+    def __init__(self, cache: Optional[OCRCache] = None, workers: Optional[int] = None,
+                 max_queue: Optional[int] = None, default_deadline: Optional[float] = None, lang: Optional[str] = None):
+        self.cache = cache if cache is not None else OCRCache()
+        self.workers = int(workers or os.getenv("OCR_WORKERS", "1"))
+        self.max_queue = int(max_queue or os.getenv("OCR_MAX_QUEUE", "64"))
+        self.default_deadline = float(default_deadline or os.getenv("OCR_DEADLINE_SEC", "8"))
+        self.lang = os.getenv("OCR_LANG", "") if lang is None else lang
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._dispatchers: list = []
+        self._inflight: Dict[tuple, asyncio.Future] = {}
+        self._seq = itertools.count()
+        self.stats = {"cache_hits": 0, "ran": 0, "shared": 0, "expired": 0, "timeout": 0, "rejected": 0, "errors": 0}
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            ctx = multiprocessing.get_context(os.getenv("OCR_START_METHOD", "spawn"))
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=ctx)
+        return self._pool
+
+    def _ensure_started(self) -> None:
+        if self._queue is None:
+            self._queue = asyncio.PriorityQueue()
+        self._dispatchers = [t for t in self._dispatchers if not t.done()]
+        while len(self._dispatchers) < self.workers:
+            self._dispatchers.append(asyncio.ensure_future(self._dispatch()))
+
+    async def _dispatch(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            _prio, _seq, sha, data, lang, deadline, fut = await self._queue.get()
+            try:
+                if fut.done():
+                    continue
+                left = deadline - time.monotonic()
+                if left <= 0:
+                    self.stats["expired"] += 1
+                    fut.set_result(None)
+                    continue
+                try:
+                    cf = self._get_pool().submit(_tesseract, data, lang, left)
+                    text = await asyncio.wait_for(asyncio.wrap_future(cf, loop=loop), left + 1.0)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    # timeouts and failures are not cached: the next repost gets another try
+                    if isinstance(e, asyncio.TimeoutError) or "timeout" in str(e).lower():
+                        self.stats["timeout"] += 1
+                    else:
+                        self.stats["errors"] += 1
+                        log.debug("[ocr] tesseract failed", exc_info=True)
+                    if isinstance(e, BrokenProcessPool):
+                        self._pool = None
+                    if not fut.done():
+                        fut.set_result(None)
+                    continue
+                self.stats["ran"] += 1
+                self.cache.put(sha, text, lang)
+                if not fut.done():
+                    fut.set_result(text)
+            finally:
+                self._queue.task_done()
+
+    async def ocr(self, data: bytes, *, sha256: Optional[str] = None, priority: int = PRIORITY_NORMAL,
+                  deadline: Optional[float] = None, lang: Optional[str] = None) -> Optional[str]:
+        """
+        OCR text for data ("" when the image has no text), or None when the job
+        was rejected, expired in the queue or overran its deadline (seconds).
+        """
+        if not data:
+            return None
+        sha = sha256 or hashlib.sha256(data).hexdigest()
+        lang = self.lang if lang is None else lang
+        cached = self.cache.get(sha, lang)
+        if cached is not None:
+            self.stats["cache_hits"] += 1
+            return cached
+        fut = self._inflight.get((sha, lang))
+        if fut is None:
+            self._ensure_started()
+            if self._queue.qsize() >= self.max_queue:
+                self.stats["rejected"] += 1
+                return None
+            fut = asyncio.get_running_loop().create_future()
+            self._inflight[(sha, lang)] = fut
+            fut.add_done_callback(lambda _f, k=(sha, lang): self._inflight.pop(k, None))
+            until = time.monotonic() + (deadline or self.default_deadline)
+            self._queue.put_nowait((int(priority), next(self._seq), sha, data, lang, until, fut))
+        else:
+            self.stats["shared"] += 1
+        return await asyncio.shield(fut)
+
+    def shutdown(self) -> None:
+        for t in self._dispatchers:
+            t.cancel()
+        self._dispatchers = []
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+        self.cache.close()
+
+
+_default: Optional[OCRService] = None
+
+
+def get_ocr_service() -> OCRService:
+    global _default
+    if _default is None:
+        _default = OCRService()
+    return _default
@@ -0,0 +1,218 @@
+"""
+helpers/orb_store.py
+Binary ORB descriptor store + batched reference matching.
+
+Descriptors of every reference image live in one append-only ``uint8`` file
+(32 bytes per descriptor) that is memory-mapped for reads; an offsets table
+maps reference i to rows ``offsets[i]:offsets[i+1]``.
+
+    store = OrbStore("data/orb/refs")
+    store.add("scam_0193.png", orb_descriptors_array(data))
+    OrbMatcher(store).top_k(orb_descriptors_array(query_bytes), k=3)
+    # -> [("scam_0193.png", 41), ...]  (key, good matches after the ratio test)
+
+Files: <path>.desc.u8 (raw descriptors), <path>.offsets.npy, <path>.keys.json
+
+add() appends the descriptors, then replaces keys and finally offsets (each
+via tmp + rename), so offsets is the commit point. After a crash the files
+may disagree; opening the store keeps the longest prefix all three agree on.
+
+Matching computes query x all-references Hamming distances in one batch
+(packed uint64 XOR + popcount), then applies Lowe's ratio test per reference
+with segment reductions over the offsets table, which is equivalent to a
+``knnMatch(k=2)`` against each reference separately.
+``strategy="lsh"`` instead queries a prebuilt FLANN-LSH index over the whole
+store (approximate, for very large stores).
+
+ENV:
+  ORB_STORE_PATH   default store path prefix (default data/orb/orb_store)
+"""
+from __future__ import annotations
+
+import json, logging, os
+from pathlib import Path
+from typing import Any, List, Optional, Tuple
+
+from satpambot.bot.modules.discord_bot.helpers.hash_index import np, popcount64
+
+try:
+    import cv2  # type: ignore
+except Exception:  # pragma: no cover
+    cv2 = None  # type: ignore
+
+log = logging.getLogger(__name__)
+
+DESC_BYTES = 32
+# distance matrix cells computed per step (query rows x store rows)
+BLOCK_CELLS = 1 << 21
+_FAR = 1 << 16
+
+
+class OrbStore:
+    def __init__(self, path: Optional[str] = None):
+        self.path = str(path or os.getenv("ORB_STORE_PATH", "data/orb/orb_store"))
+        self._desc_file = Path(self.path + ".desc.u8")
+        self._offsets_file = Path(self.path + ".offsets.npy")
+        self._keys_file = Path(self.path + ".keys.json")
+        self._mm = None
+        try:
+            self.offsets = np.load(self._offsets_file).astype(np.int64)
+            self.keys: List[str] = json.loads(self._keys_file.read_text(encoding="utf-8"))
+        except Exception:
+            self.offsets = np.zeros(1, dtype=np.int64)
+            self.keys = []
+        self._recover()
+
+    def _recover(self) -> None:
+        """Cut keys/offsets to the references whose key, offsets entry and descriptor bytes all exist."""
+        try:
+            have = self._desc_file.stat().st_size // DESC_BYTES
+        except OSError:
+            have = 0
+        n = min(len(self.keys), len(self.offsets) - 1)
+        while n and self.offsets[n] > have:
+            n -= 1
+        if n != len(self.keys) or n != len(self.offsets) - 1:
+            log.warning("[orb_store] %s: keys/offsets out of sync (%d keys, %d offsets); keeping the first %d",
+                        self.path, len(self.keys), len(self.offsets) - 1, n)
+            self.keys = self.keys[:n]
+            self.offsets = self.offsets[: n + 1]
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    @property
+    def rows(self) -> int:
+        return int(self.offsets[-1])
+
+    @property
+    def nbytes(self) -> int:
+        return self.rows * DESC_BYTES + self.offsets.nbytes
+
+    def all(self) -> "np.ndarray":
+        """(rows, 32) uint8 view of every stored descriptor (memory-mapped)."""
+        if not self.rows:
+            return np.zeros((0, DESC_BYTES), dtype=np.uint8)
+        if self._mm is None or self._mm.shape[0] != self.rows:
+            self._mm = np.memmap(self._desc_file, dtype=np.uint8, mode="r", shape=(self.rows, DESC_BYTES))
+        return self._mm
+
+    def descriptors(self, i: int) -> "np.ndarray":
+        return self.all()[self.offsets[i] : self.offsets[i + 1]]
+
+    def add(self, key: str, descriptors: Any) -> int:
+        """Append one reference image's descriptors; returns its index."""
+        d = np.ascontiguousarray(np.asarray(descriptors, dtype=np.uint8).reshape(-1, DESC_BYTES))
+        self._desc_file.parent.mkdir(parents=True, exist_ok=True)
+        with open(self._desc_file, "ab") as f:
+            if f.tell() != self.rows * DESC_BYTES:  # drop bytes of an interrupted append
+                f.truncate(self.rows * DESC_BYTES)
+            f.write(d.tobytes())
+        self.offsets = np.append(self.offsets, self.rows + len(d))
+        self.keys.append(str(key))
+        tmp = self._keys_file.with_suffix(".tmp")
+        tmp.write_text(json.dumps(self.keys, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, self._keys_file)
+        tmp = self._offsets_file.with_suffix(".tmp")
+        with open(tmp, "wb") as f:
+            np.save(f, self.offsets)
+        os.replace(tmp, self._offsets_file)  # last: this commits the new reference
+        self._mm = None
+        return len(self.keys) - 1
+
+
+def _distances(q: "np.ndarray", train: "np.ndarray") -> "np.ndarray":
+    """(len(q), len(train)) Hamming distances between uint8 descriptor rows."""
+    qw = q.view(np.uint64)
+    tw = np.ascontiguousarray(train).view(np.uint64)
+    dist = np.zeros((len(qw), len(tw)), dtype=np.int32)
+    for w in range(qw.shape[1]):  # one 64-bit word at a time keeps the scratch at Q x M
+        dist += popcount64(qw[:, w, None] ^ tw[None, :, w])
+    return dist
+
+
+def good_matches_per_segment(dist: "np.ndarray", starts: "np.ndarray", ratio: float) -> "np.ndarray":
+    """
+    dist: (Q, M) distances; starts: first column of each non-empty segment.
+    Per segment, count query rows whose best < ratio * second best.
+    """
+    best = np.minimum.reduceat(dist, starts, axis=1)
+    seg = np.repeat(np.arange(len(starts)), np.diff(np.append(starts, dist.shape[1])))
+    at_best = dist == best[:, seg]
+    ties = np.add.reduceat(at_best, starts, axis=1) > 1
+    second = np.minimum.reduceat(np.where(at_best, _FAR, dist), starts, axis=1)
+    second = np.where(ties, best, second)  # two equally close train rows never pass the test
+    return ((best < ratio * second) & (second < _FAR)).sum(axis=0)
+
+
+class OrbMatcher:
+    def __init__(self, store: OrbStore, ratio: float = 0.75, strategy: str = "exact"):
+        if strategy not in ("exact", "lsh"):
+            raise ValueError(f"unknown strategy {strategy!r}")
+        if strategy == "lsh" and cv2 is None:
+            raise RuntimeError("strategy='lsh' requires opencv")
+        self.store = store
+        self.ratio = ratio
+        self.strategy = strategy
+        self._flann = None
+        self._flann_rows = -1
+
+    def good_counts(self, query: Any) -> "np.ndarray":
+        """(len(store),) good-match count of query against every reference."""
+        n = len(self.store)
+        q = np.ascontiguousarray(np.asarray(query, dtype=np.uint8).reshape(-1, DESC_BYTES))
+        if not n or not len(q):
+            return np.zeros(n, dtype=np.int64)
+        if self.strategy == "lsh":
+            return self._good_counts_lsh(q)
+        out = np.zeros(n, dtype=np.int64)
+        offs = self.store.offsets
+        train = self.store.all()
+        # whole references per block so every ratio test sees its full segment
+        step = max(1, BLOCK_CELLS // len(q))
+        i = 0
+        while i < n:
+            j = i + 1
+            while j < n and offs[j + 1] - offs[i] <= step:
+                j += 1
+            nonempty = np.flatnonzero(offs[i + 1 : j + 1] > offs[i:j]) + i
+            if len(nonempty):
+                dist = _distances(q, train[offs[i] : offs[j]])
+                out[nonempty] = good_matches_per_segment(dist, offs[nonempty] - offs[i], self.ratio)
+            i = j
+        return out
+
+    def _build_flann(self) -> None:
+        if self._flann is None or self._flann_rows != self.store.rows:
+            params = dict(algorithm=6, table_number=6, key_size=12, multi_probe_level=1)  # FLANN_INDEX_LSH
+            self._flann = cv2.FlannBasedMatcher(params, dict(checks=50))
+            self._flann.add([np.ascontiguousarray(self.store.all())])
+            self._flann.train()
+            self._flann_rows = self.store.rows
+
+    def _good_counts_lsh(self, q: "np.ndarray", knn: int = 8) -> "np.ndarray":
+        """Approximate: per-reference best/second best among the knn global LSH neighbours."""
+        self._build_flann()
+        out = np.zeros(len(self.store), dtype=np.int64)
+        offs = self.store.offsets
+        for ms in self._flann.knnMatch(q, k=knn):
+            if not ms:
+                continue
+            floor = ms[-1].distance if len(ms) == knn else _FAR  # unseen rows are at least this far
+            seen = {}
+            for m in ms:
+                ref = int(np.searchsorted(offs, m.trainIdx, side="right")) - 1
+                seen.setdefault(ref, []).append(m.distance)
+            for ref, ds in seen.items():
+                second = ds[1] if len(ds) > 1 else floor
+                if ds[0] < self.ratio * second:
+                    out[ref] += 1
+        return out
+
+    def top_k(self, query: Any, k: int = 5, min_good: int = 1) -> List[Tuple[str, int]]:
+        """Best k references as (key, good matches), strongest first."""
+        counts = self.good_counts(query)
+        if not len(counts):
+            return []
+        order = np.argsort(-counts, kind="stable")[:k]
+        return [(self.store.keys[i], int(counts[i])) for i in order if counts[i] >= min_good]
@@ -0,0 +1,402 @@
+"""
+helpers/pattern_matcher.py
+Moderator regex entries (`!wl add <regex>` / `!bl add <regex>`) compiled into one matcher.
+
+    err = validate_pattern(r"discord-?nitro\\.")       # None or a reason for the moderator
+    ps = PatternSet([r"discord-?nitro\\.", r"/gift/[a-z0-9]{16}"])
+    ps.match("https://discord-nitro.ru/gift/x")        # -> r"discord-?nitro\\." | None
+
+Entries are matched case-insensitively. With `hyperscan` installed they go
+into one Hyperscan database (automaton-based, no backtracking). Otherwise,
+and for entries Hyperscan cannot compile, each entry's longest required
+literal ("nitro." in "discord-?nitro\\.") goes into one keyword_scanner
+Aho-Corasick automaton. A URL is scanned once and only the entries whose
+literal occurs in it are run. Entries without such a literal form one named
+alternation, searched once. The cost per URL therefore stays flat as
+moderators add entries, instead of one regex per entry.
+
+Backtracking protection, since stdlib `re` cannot be interrupted:
+  - entries longer than PATTERN_MAX_LEN, with backreferences, named groups,
+    global inline flags or a repeat nested in a repeat without a delimiter
+    ("(a+)+", "(\\w*x)*"; "([a-z0-9-]+\\.)+" is fine) are rejected;
+  - so are repeats around an alternation whose branches can start with the
+    same character or match nothing ("(a|aa)+", "(.|.)*", "(\\w|\\d)+"),
+    and repeats of something optional ("(a?){25}"): every way of splitting
+    the input between the branches / iterations is tried;
+  - so are two unbounded runs over overlapping characters without a char
+    between them that the first cannot consume ("(.*)(.*)x", ".*a.*b";
+    "[a-z]+\\.[a-z]+" is fine): each tries every length of the input, so the
+    cost is polynomial in the URL length; bounded runs (".{0,40}") are fine;
+  - input is cut to PATTERN_INPUT_MAX chars;
+  - every search runs under PATTERN_TIMEOUT_MS with the `regex` module (in
+    requirements.txt) and a timeout counts as no match; without it stdlib
+    `re` runs unbounded, so the checks above are all that protect the loop.
+
+ENV:
+  PATTERN_MAX_LEN      longest accepted entry (default 200)
+  PATTERN_MAX_COUNT    entries kept per list (default 500)
+  PATTERN_INPUT_MAX    chars of a URL that are matched (default 2048)
+  PATTERN_TIMEOUT_MS   per-match timeout with the regex module (default 50)
+"""
+from __future__ import annotations
+
+import logging, os, re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .keyword_scanner import KeywordScanner
+
+try:
+    import re._parser as _sre_parse  # Python 3.11+
+    import re._constants as _sre_c
+except Exception:  # Python < 3.11
+    import sre_parse as _sre_parse  # type: ignore
+    import sre_constants as _sre_c  # type: ignore
+
+try:
+    import regex as _regex  # optional: supports a match timeout
+except Exception:
+    _regex = None
+
+try:
+    import hyperscan  # optional: multi-pattern automaton
+except Exception:
+    hyperscan = None
+
+log = logging.getLogger(__name__)
+
+PATTERN_MAX_LEN = int(os.getenv("PATTERN_MAX_LEN", "200"))
+PATTERN_MAX_COUNT = int(os.getenv("PATTERN_MAX_COUNT", "500"))
+PATTERN_INPUT_MAX = int(os.getenv("PATTERN_INPUT_MAX", "2048"))
+PATTERN_TIMEOUT_MS = float(os.getenv("PATTERN_TIMEOUT_MS", "50"))
+MIN_LITERAL = 3
+# repeats allowing more iterations than this count as unbounded runs
+LONG_REPEAT = 40
+
+_CATEGORIES = {
+    _sre_c.CATEGORY_DIGIT: str.isdigit,
+    _sre_c.CATEGORY_NOT_DIGIT: lambda c: not c.isdigit(),
+    _sre_c.CATEGORY_WORD: lambda c: c.isalnum() or c == "_",
+    _sre_c.CATEGORY_NOT_WORD: lambda c: not (c.isalnum() or c == "_"),
+    _sre_c.CATEGORY_SPACE: str.isspace,
+    _sre_c.CATEGORY_NOT_SPACE: lambda c: not c.isspace(),
+}
+
+
+def _char_test(items):
+    """Predicate for a one-character item list ("a", "[a-z]", "\\w", "."), None for anything longer."""
+    if len(items) != 1:
+        return None
+    op, av = items[0]
+    if op is _sre_c.LITERAL:
+        return lambda c: ord(c) == av
+    if op is _sre_c.NOT_LITERAL:
+        return lambda c: ord(c) != av
+    if op is _sre_c.ANY:
+        return lambda c: c != "\n"
+    if op is _sre_c.IN:
+        def test(c):
+            neg = hit = False
+            for o, a in av:
+                if o is _sre_c.NEGATE:
+                    neg = True
+                elif o is _sre_c.LITERAL:
+                    hit = hit or ord(c) == a
+                elif o is _sre_c.RANGE:
+                    hit = hit or a[0] <= ord(c) <= a[1]
+                elif o is _sre_c.CATEGORY:
+                    hit = hit or _CATEGORIES.get(a, lambda _c: True)(c)
+            return hit != neg
+        return test
+    return None
+
+
+def _children(op, av):
+    if op in (_sre_c.MAX_REPEAT, _sre_c.MIN_REPEAT):
+        return [av[2]]
+    if op is _sre_c.SUBPATTERN:
+        return [av[-1]]
+    if op is _sre_c.BRANCH:
+        return list(av[1])
+    if op in (_sre_c.ASSERT, _sre_c.ASSERT_NOT):
+        return [av[1]]
+    return []
+
+
+def _inner_repeats(items):
+    """Char predicates of every repeat (max > 1) inside items; complex bodies match anything."""
+    out = []
+    for op, av in items:
+        if op in (_sre_c.MAX_REPEAT, _sre_c.MIN_REPEAT) and av[1] > 1:
+            out.append(_char_test(av[2]) or (lambda c: True))
+        for sub in _children(op, av):
+            out += _inner_repeats(sub)
+    return out
+
+
+def _first_chars(items):
+    """(predicates for the first character of a match, whether items can match the empty string)."""
+    tests = []
+    for op, av in items:
+        t = _char_test([(op, av)])
+        if t is not None:
+            return tests + [t], False
+        if op is _sre_c.SUBPATTERN:
+            sub, nullable = _first_chars(av[-1])
+        elif op is _sre_c.BRANCH:
+            parts = [_first_chars(b) for b in av[1]]
+            sub, nullable = [t for p in parts for t in p[0]], any(p[1] for p in parts)
+        elif op in (_sre_c.MAX_REPEAT, _sre_c.MIN_REPEAT):
+            sub, nullable = _first_chars(av[2])
+            nullable = nullable or av[0] == 0
+        elif op in (_sre_c.AT, _sre_c.ASSERT, _sre_c.ASSERT_NOT):
+            continue  # zero width
+        else:
+            return tests + [lambda c: True], False
+        tests += sub
+        if not nullable:
+            return tests, False
+    return tests, True
+
+
+# chars used to decide whether two character tests overlap
+_PROBE = [chr(c) for c in range(128)] + list("éßÿıſ٣中")
+
+
+def _overlap(a, b) -> bool:
+    return any(any(t(c) for t in a) and any(t(c) for t in b) for c in _PROBE)
+
+
+def _ambiguous(items) -> bool:
+    """An alternation (or a class folded from one) whose branches overlap on the first char or match nothing."""
+    for op, av in items:
+        if op is _sre_c.BRANCH:
+            firsts = [_first_chars(b) for b in av[1]]
+            if any(nullable for _, nullable in firsts):
+                return True
+            if any(_overlap(firsts[i][0], firsts[j][0]) for i in range(len(firsts)) for j in range(i)):
+                return True
+        elif op is _sre_c.IN and not any(o is _sre_c.NEGATE for o, _ in av):
+            # sre turns "(\w|\d)" into "[\w\d]"; overlapping members only come from such folds
+            tests = [_char_test([(_sre_c.IN, [x])]) for x in av]
+            if any(_overlap([tests[i]], [tests[j]]) for i in range(len(tests)) for j in range(i)):
+                return True
+        if any(_ambiguous(sub) for sub in _children(op, av)):
+            return True
+    return False
+
+
+def _char_tests(items):
+    """Predicates of every single character items can consume."""
+    out = []
+    for op, av in items:
+        t = _char_test([(op, av)])
+        if t is not None:
+            out.append(t)
+        for sub in _children(op, av):
+            out += _char_tests(sub)
+    return out
+
+
+def _open_runs(items, runs):
+    """
+    Walk items in match order, tracking the unbounded runs (char predicate lists)
+    a backtracking engine could still shorten. A mandatory char a run cannot
+    consume closes it; a new run overlapping an open one returns None.
+    """
+    for op, av in items:
+        t = _char_test([(op, av)])
+        if t is not None:
+            runs = [r for r in runs if _overlap(r, [t])]
+        elif op in (_sre_c.MAX_REPEAT, _sre_c.MIN_REPEAT):
+            lo, hi, body = av
+            if hi > LONG_REPEAT:
+                run = _char_tests(body) or [lambda c: True]
+                if any(_overlap(r, run) for r in runs):
+                    return None
+                runs = runs + [run]
+                continue
+            once = _open_runs(body, runs)
+            twice = _open_runs(body, once) if once is not None and hi > 1 else once
+            if twice is None:
+                return None
+            runs = twice if lo >= 1 else _union(runs, once, twice)
+        elif op is _sre_c.SUBPATTERN:
+            runs = _open_runs(av[-1], runs)
+            if runs is None:
+                return None
+        elif op is _sre_c.BRANCH:
+            ends = [_open_runs(b, runs) for b in av[1]]
+            if any(e is None for e in ends):
+                return None
+            runs = _union(*ends)
+    return runs
+
+
+def _union(*lists):
+    seen, out = set(), []
+    for lst in lists:
+        for r in lst:
+            if id(r) not in seen:
+                seen.add(id(r))
+                out.append(r)
+    return out
+
+
+def _sequential_runs(items) -> bool:
+    """Two unbounded runs that can share characters with nothing mandatory between them ("(.*)(.*)x", ".*a.*b")."""
+    return _open_runs(list(items), []) is None
+
+
+def _mandatory_literals(items):
+    out = []
+    for op, av in items:
+        if op is _sre_c.LITERAL:
+            out.append(chr(av))
+        elif op is _sre_c.SUBPATTERN:
+            out += _mandatory_literals(av[-1])
+    return out
+
+
+def _backtracking_risk(items) -> bool:
+    """Backreferences, a repeat around another repeat that no literal in between can stop, or a
+    repeat around an ambiguous alternation or around something that can match nothing.
+
+    "([a-z0-9-]+\\.)+" is fine (the inner run cannot eat the "."), "(a+)+", "(\\w*x)*" and "(a|aa)+" are not.
+    """
+    for op, av in items:
+        if op in (_sre_c.GROUPREF, _sre_c.GROUPREF_EXISTS):
+            return True
+        if op in (_sre_c.MAX_REPEAT, _sre_c.MIN_REPEAT) and av[1] > 1:
+            inner = _inner_repeats(av[2])
+            if inner and not any(all(not t(c) for t in inner) for c in _mandatory_literals(av[2])):
+                return True
+            if _ambiguous(av[2]) or _first_chars(av[2])[1]:
+                return True
+        if any(_backtracking_risk(sub) for sub in _children(op, av)):
+            return True
+    return False
+
+
+def required_literal(pattern: str) -> str:
+    """Longest run of plain characters every match must contain (lowercase), "" if none."""
+    try:
+        items = list(_sre_parse.parse(pattern))
+    except re.error:
+        return ""
+    best, cur = "", ""
+    for op, av in items:
+        if op is _sre_c.LITERAL:
+            cur += chr(av)
+            best = max(best, cur, key=len)
+        else:
+            cur = ""
+    return best.lower()
+
+
+def validate_pattern(pattern: str) -> Optional[str]:
+    """None when the entry can go into the combined matcher, else a short reason."""
+    p = (pattern or "").strip()
+    if not p:
+        return "empty pattern"
+    if len(p) > PATTERN_MAX_LEN:
+        return f"longer than {PATTERN_MAX_LEN} chars"
+    try:
+        parsed = _sre_parse.parse(p)
+        re.compile(f"(?:{p})")  # a global flag like (?i) is an error once wrapped
+    except re.error as e:
+        return f"invalid regex: {e}"
+    if parsed.state.groupdict:
+        return "named groups are not allowed"
+    if _backtracking_risk(parsed):
+        return "nested or optional repeats, overlapping alternatives in a repeat or backreferences (catastrophic backtracking)"
+    if _sequential_runs(parsed):
+        return f"more than one unbounded run over the same characters; bound them, e.g. .{{0,{LONG_REPEAT}}}"
+    return None
+
+
+class PatternSet:
+    def __init__(self, patterns: Iterable[str] = ()):
+        self.patterns: List[str] = []
+        self.rejected: List[Tuple[str, str]] = []
+        for p in dict.fromkeys(str(x).strip() for x in patterns):
+            err = validate_pattern(p)
+            if err is None and len(self.patterns) >= PATTERN_MAX_COUNT:
+                err = f"more than {PATTERN_MAX_COUNT} patterns"
+            if err is None:
+                self.patterns.append(p)
+            elif p:
+                self.rejected.append((p, err))
+        if self.rejected:
+            log.warning("[pattern_matcher] %d pattern(s) rejected: %s", len(self.rejected), self.rejected[:5])
+        self._hs = self._hs_compile(self.patterns) if hyperscan is not None else None
+        rest = [i for i in range(len(self.patterns)) if self._hs is None or i not in self._hs[1]]
+        # literal prefilter: one automaton pass picks the few entries worth running
+        self._one: Dict[int, "re.Pattern"] = {}
+        literals = []
+        for i in rest:
+            lit = required_literal(self.patterns[i])
+            if len(lit) >= MIN_LITERAL:
+                self._one[i] = (_regex or re).compile(self.patterns[i], re.IGNORECASE)
+                literals.append((str(i), [lit], False))
+        self._prefilter = KeywordScanner(lambda: literals, fold=False) if literals else None
+        source = "|".join(f"(?P<p{i}>{self.patterns[i]})" for i in rest if i not in self._one)
+        self._rx = (_regex or re).compile(source, re.IGNORECASE) if source else None
+
+    def __len__(self) -> int:
+        return len(self.patterns)
+
+    @staticmethod
+    def _hs_compile(patterns: List[str]):
+        """(database, ids it holds) or None; entries hyperscan rejects are left to the alternation."""
+        ok = []
+        for i, p in enumerate(patterns):
+            try:
+                db = hyperscan.Database()
+                db.compile(expressions=[p.encode("utf-8")], ids=[i], elements=1,
+                           flags=[hyperscan.HS_FLAG_CASELESS | hyperscan.HS_FLAG_SINGLEMATCH | hyperscan.HS_FLAG_UTF8])
+                ok.append(i)
+            except Exception:
+                continue
+        if not ok:
+            return None
+        try:
+            db = hyperscan.Database()
+            db.compile(expressions=[patterns[i].encode("utf-8") for i in ok], ids=ok, elements=len(ok),
+                       flags=[hyperscan.HS_FLAG_CASELESS | hyperscan.HS_FLAG_SINGLEMATCH | hyperscan.HS_FLAG_UTF8] * len(ok))
+            return db, set(ok)
+        except Exception as e:
+            log.debug("[pattern_matcher] hyperscan compile failed: %r", e)
+            return None
+
+    def match(self, text: str) -> Optional[str]:
+        """The first entry found anywhere in text, or None."""
+        if not self.patterns or not text:
+            return None
+        t = text[:PATTERN_INPUT_MAX]
+        if self._hs is not None:
+            found: List[int] = []
+
+            def _on_match(pid, start, end, flags, ctx):
+                found.append(pid)
+                return True  # stop at the first hit
+
+            try:
+                self._hs[0].scan(t.encode("utf-8"), match_event_handler=_on_match)
+            except Exception:
+                pass  # hyperscan raises when the handler stops the scan
+            if found:
+                return self.patterns[found[0]]
+        if self._prefilter is not None:
+            for i in sorted(int(c) for c in self._prefilter.scan(t)):
+                if _search(self._one[i], t):
+                    return self.patterns[i]
+        m = _search(self._rx, t) if self._rx is not None else None
+        return self.patterns[int(m.lastgroup[1:])] if m else None
+
+
+def _search(rx, text: str):
+    try:
+        return rx.search(text, timeout=PATTERN_TIMEOUT_MS / 1000.0) if _regex is not None else rx.search(text)
+    except TimeoutError:
+        log.warning("[pattern_matcher] match timed out on %r", text[:120])
+        return None
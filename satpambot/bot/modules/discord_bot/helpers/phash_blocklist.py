@@ -0,0 +1,308 @@
+"""
+helpers/phash_blocklist.py
+The one pHash blocklist shared by the dashboard (writer) and the bot (reader).
+
+On disk (PHASH_BLOCKLIST_PATH, default data/phash/blocklist.u64):
+
+    offset 0   8s   magic b"SPHBL001"
+    offset 8   <Q   generation (bumped on every publish)
+    offset 16  <Q   count
+    offset 24  8x   reserved
+    offset 32  <Q * count   sorted, unique 64-bit pHashes (imagehash.phash convention)
+
+Writers replace the file atomically (tmp + fsync + rename) under an exclusive
+lock file; readers memory-map the hash array, so every process shares the
+same page-cache copy.
+
+    publish_hashes(["f0e1d2c3b4a59687"], source="dashboard")   # dashboard side
+    bl = get_blocklist()                                        # bot side
+    bl.first_within(phash_list, max_distance=6)                 # -> (qi, hash, dist) | None
+
+Readers poll the file's (inode, mtime, size) at most every
+PHASH_BLOCKLIST_POLL seconds; when the generation changed the new snapshot
+(memmap + HashIndex) is built first and then swapped in with one assignment,
+so lookups never see a half-loaded list and no restart is needed.
+
+The legacy per-feature files (data/phish/phash.json, data/phish_phash.json,
+data/phish_lab/phash_blocklist.json, phash_static/) are folded in by
+rebuild_from_legacy() and whenever the file does not exist yet.
+
+ENV:
+  PHASH_BLOCKLIST_PATH   blocklist file           (default data/phash/blocklist.u64)
+  PHASH_BLOCKLIST_POLL   reader stat interval, s  (default 2)
+"""
+from __future__ import annotations
+
+import json, logging, os, struct, threading, time
+from pathlib import Path
+from typing import Any, Iterable, List, Optional, Tuple
+
+from satpambot.bot.modules.discord_bot.helpers.hash_index import HashIndex, np, parse_hash
+
+try:
+    import fcntl  # type: ignore
+except Exception:  # pragma: no cover (windows dev boxes)
+    fcntl = None  # type: ignore
+
+log = logging.getLogger(__name__)
+
+MAGIC = b"SPHBL001"
+_HEADER = struct.Struct("<8sQQ8x")
+HEADER_SIZE = _HEADER.size  # 32
+
+LEGACY_SOURCES = (
+    "data/phish/phash.json",              # dashboard/live_store
+    "data/phish_phash.json",              # dashboard/phish_api + live_routes
+    "data/phish_lab/phash_blocklist.json",  # dashboard/webui + merged_endpoints
+    "data/phash_static/SATPAMBOT_PHASH_DB_V1.json",
+    "phash_static/SATPAMBOT_PHASH_DB_V1.json",
+)
+
+_write_lock = threading.Lock()
+
+
+def blocklist_path() -> Path:
+    return Path(os.getenv("PHASH_BLOCKLIST_PATH", "data/phash/blocklist.u64"))
+
+
+# ---------- file format ----------
+def read_header(path: Path) -> Optional[Tuple[int, int]]:
+    """(generation, count) or None if the file is missing/not a blocklist."""
+    try:
+        with open(path, "rb") as f:
+            raw = f.read(HEADER_SIZE)
+    except OSError:
+        return None
+    if len(raw) < HEADER_SIZE:
+        return None
+    magic, gen, count = _HEADER.unpack(raw)
+    return (gen, count) if magic == MAGIC else None
+
+
+def read_hashes(path: Path, mmap: bool = True) -> Tuple[int, "np.ndarray"]:
+    """(generation, uint64 array); the array is a read-only memmap unless mmap=False."""
+    hdr = read_header(path)
+    if hdr is None:
+        return 0, np.zeros(0, dtype=np.uint64)
+    gen, count = hdr
+    if not count:
+        return gen, np.zeros(0, dtype=np.uint64)
+    if mmap:
+        arr = np.memmap(path, dtype="<u8", mode="r", offset=HEADER_SIZE, shape=(count,))
+    else:
+        arr = np.fromfile(path, dtype="<u8", count=count, offset=HEADER_SIZE)
+    return gen, arr
+
+
+def _write(path: Path, hashes: "np.ndarray", generation: int) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, generation, len(hashes)))
+        f.write(np.ascontiguousarray(hashes, dtype="<u8").tobytes())
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class _FileLock:
+    """Exclusive lock across processes (web + bot) on <path>.lock; no-op without fcntl."""
+
+    def __init__(self, path: Path):
+        self.path = path.with_name(path.name + ".lock")
+        self._f = None
+
+    def __enter__(self):
+        _write_lock.acquire()
+        if fcntl is not None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._f = open(self.path, "a+b")
+            fcntl.flock(self._f.fileno(), fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        try:
+            if self._f is not None:
+                fcntl.flock(self._f.fileno(), fcntl.LOCK_UN)
+                self._f.close()
+        finally:
+            _write_lock.release()
+
+
+def _to_u64(hashes: Iterable[Any]) -> "np.ndarray":
+    vals = []
+    for h in hashes:
+        v = parse_hash(h)
+        if v is not None and v < (1 << 64):
+            vals.append(v)
+    return np.unique(np.array(vals, dtype=np.uint64)) if vals else np.zeros(0, dtype=np.uint64)
+
+
+# ---------- legacy sources ----------
+def _hashes_in(obj: Any) -> List[str]:
+    """Every pHash in one of the legacy JSON shapes."""
+    if isinstance(obj, list):
+        out = []
+        for x in obj:
+            if isinstance(x, dict):
+                x = x.get("hash") or x.get("phash")
+            if x:
+                out.append(str(x))
+        return out
+    if isinstance(obj, dict):
+        for k in ("phash", "hashes", "items"):
+            if k in obj:
+                return _hashes_in(obj[k])
+        # live_routes: {"<hash>": {"source": ..., "ts": ...}}
+        return [k for k, v in obj.items() if isinstance(v, dict) and parse_hash(k) is not None]
+    return []
+
+
+def legacy_hashes(root: Optional[str] = None) -> List[str]:
+    base = Path(root or ".")
+    out: List[str] = []
+    for rel in LEGACY_SOURCES:
+        p = base / rel
+        try:
+            out.extend(_hashes_in(json.loads(p.read_text(encoding="utf-8"))))
+        except Exception:
+            pass
+        # pending records of helpers/phash_store logs next to the snapshot
+        try:
+            for line in (p.with_name(p.name + ".log")).read_text(encoding="utf-8").splitlines():
+                rec = json.loads(line)
+                if rec.get("op") == "add":
+                    out.extend(_hashes_in([rec.get("item")]))
+        except Exception:
+            pass
+    return out
+
+
+# ---------- writer API (dashboard) ----------
+def publish_hashes(hashes: Iterable[Any], source: str = "", path: Optional[Path] = None) -> int:
+    """Merge hashes into the blocklist; returns the new generation (unchanged if nothing was new)."""
+    path = path or blocklist_path()
+    new = _to_u64(hashes)
+    with _FileLock(path):
+        hdr = read_header(path)
+        if hdr is None:
+            gen, cur = 0, _to_u64(legacy_hashes())
+        else:
+            gen, cur = read_hashes(path, mmap=False)
+        merged = np.union1d(cur, new)
+        if hdr is not None and len(merged) == len(cur):
+            return gen
+        _write(path, merged, gen + 1)
+    log.info("[phash_blocklist] +%d hashes from %s (generation %d, total %d)", len(merged) - len(cur), source or "?", gen + 1, len(merged))
+    return gen + 1
+
+
+def replace_hashes(hashes: Iterable[Any], path: Optional[Path] = None) -> int:
+    """Overwrite the blocklist (removals); returns the new generation."""
+    path = path or blocklist_path()
+    arr = _to_u64(hashes)
+    with _FileLock(path):
+        gen = (read_header(path) or (0, 0))[0] + 1
+        _write(path, arr, gen)
+    return gen
+
+
+def rebuild_from_legacy(root: Optional[str] = None, path: Optional[Path] = None) -> int:
+    return publish_hashes(legacy_hashes(root), source="legacy", path=path)
+
+
+# ---------- reader API (bot) ----------
+class BlocklistSnapshot:
+    """One immutable generation: memmapped hashes + a HashIndex over them."""
+
+    def __init__(self, generation: int, hashes: "np.ndarray"):
+        self.generation = generation
+        self.hashes = hashes
+        self.index = HashIndex.from_sorted(hashes)  # no copy: probes the shared pages
+
+    def __len__(self) -> int:
+        return len(self.hashes)
+
+
+class PhashBlocklist:
+    def __init__(self, path: Optional[Path] = None, poll: Optional[float] = None):
+        self.path = Path(path or blocklist_path())
+        self.poll = float(poll if poll is not None else os.getenv("PHASH_BLOCKLIST_POLL", "2"))
+        self._snap = BlocklistSnapshot(0, np.zeros(0, dtype=np.uint64))
+        self._stat: Tuple = ()
+        self._checked = 0.0
+        self._reload_lock = threading.Lock()
+        self._bootstrapped = False
+        self.swaps = 0
+
+    def _file_stat(self) -> Tuple:
+        try:
+            st = self.path.stat()
+            return (st.st_ino, st.st_mtime_ns, st.st_size)
+        except OSError:
+            return ()
+
+    def snapshot(self, force: bool = False) -> BlocklistSnapshot:
+        """Current generation; re-checks the file at most every `poll` seconds."""
+        now = time.monotonic()
+        if not force and now - self._checked < self.poll:
+            return self._snap
+        self._checked = now
+        st = self._file_stat()
+        if not st and not self._bootstrapped:
+            # first run after upgrade: fold the legacy lists in so they keep working
+            self._bootstrapped = True
+            try:
+                publish_hashes((), source="bootstrap", path=self.path)
+                st = self._file_stat()
+            except Exception:
+                log.warning("[phash_blocklist] could not create %s", self.path, exc_info=True)
+        if st == self._stat:
+            return self._snap
+        if not self._reload_lock.acquire(blocking=False):
+            return self._snap  # another thread is already loading the new generation
+        try:
+            if not st and not self._stat:
+                return self._snap
+            gen, arr = read_hashes(self.path)
+            if gen != self._snap.generation or len(arr) != len(self._snap):
+                self._snap = BlocklistSnapshot(gen, arr)  # built fully, then swapped in one step
+                self.swaps += 1
+                log.info("[phash_blocklist] loaded generation %d (%d hashes)", gen, len(arr))
+            self._stat = st
+        except Exception:
+            log.warning("[phash_blocklist] reload of %s failed; keeping generation %d", self.path, self._snap.generation, exc_info=True)
+        finally:
+            self._reload_lock.release()
+        return self._snap
+
+    @property
+    def generation(self) -> int:
+        return self.snapshot().generation
+
+    def __len__(self) -> int:
+        return len(self.snapshot())
+
+    def __contains__(self, h: Any) -> bool:
+        return h in self.snapshot().index
+
+    def first_within(self, hashes: Iterable[Any], max_distance: int = 0) -> Optional[Tuple[int, str, int]]:
+        """(query index, matching blocklist hash as hex, distance) or None."""
+        snap = self.snapshot()
+        if not len(snap):
+            return None
+        hit = snap.index.first_within(list(hashes), max_distance=max_distance)
+        if hit is None:
+            return None
+        qi, pos, dist = hit
+        return qi, f"{int(snap.hashes[pos]):016x}", dist
+
+
+_default: Optional[PhashBlocklist] = None
+
+
+def get_blocklist() -> PhashBlocklist:
+    global _default
+    if _default is None:
+        _default = PhashBlocklist()
+    return _default
@@ -0,0 +1,343 @@
+"""
+helpers/phash_store.py
+Append-only hash store: JSON snapshot + JSONL change log.
+
+    store = AppendOnlyStore("data/phish/phash.json",
+                            read_snapshot=lambda obj: (obj or {}).get("phash", []),
+                            write_snapshot=lambda items: {"phash": items},
+                            keys=lambda v: (v,))
+    store.add("f0e1d2c3b4a59687")        # -> (item, created); one JSONL line written
+    "f0e1d2c3b4a59687" in store            # O(1) via the key map
+
+The snapshot stays in the file's existing JSON format, so the legacy files are
+migrated simply by opening them: the first open reads the JSON as the base and
+every later change is appended as one line to ``<path>.log``. Once the log
+holds ``compact_every`` records a background thread folds it into a fresh
+snapshot (tmp file + fsync + rename).
+
+Crash safety: the first log line records the sha1 of the snapshot it applies
+to. If a crash lands between the snapshot rename and the log reset, the
+leftover log no longer matches the snapshot and is discarded (its records are
+already in the snapshot). A torn last line is dropped and truncated on open.
+All records are idempotent ("add" is skipped if its key exists, "set" writes
+absolute values), so replaying a log twice is harmless.
+
+Several processes (web + bot) may share a store. Every write (add, extend,
+update, compact) holds an exclusive flock on ``<path>.lock`` and first
+refresh()es, so it appends to, or compacts, the current state rather than a
+stale copy; readers take no lock and refresh() on a cheap stat check. Only a
+lock holder rewrites or truncates the log. "set" records name the item by its
+first key, not by its position, so they mean the same item in every process.
+Without fcntl (Windows) the lock is a no-op: one writing process only.
+
+ENV:
+  PHASH_LOG_COMPACT_EVERY   log records before background compaction (default 2000)
+  PHASH_LOG_FSYNC           fsync after each append (default 0)
+"""
+from __future__ import annotations
+
+import hashlib, json, logging, os, threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Sequence, Tuple
+
+try:
+    import fcntl
+except Exception:  # Windows
+    fcntl = None
+
+log = logging.getLogger(__name__)
+
+COMPACT_EVERY = int(os.getenv("PHASH_LOG_COMPACT_EVERY", "2000"))
+FSYNC = os.getenv("PHASH_LOG_FSYNC", "0").lower() in {"1", "true", "yes"}
+
+
+def _sha1(b: bytes) -> str:
+    return hashlib.sha1(b).hexdigest()
+
+
+def _fsync_write(path: Path, data: bytes) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class _FileLock:
+    """Exclusive lock across processes on <path>.lock, re-entrant within the holder; no-op without fcntl.
+
+    Callers serialize threads themselves (AppendOnlyStore takes its RLock first)."""
+
+    def __init__(self, path: Path):
+        self.path = path.with_name(path.name + ".lock")
+        self._f = None
+        self.depth = 0
+
+    def __enter__(self):
+        if self.depth == 0 and fcntl is not None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._f = open(self.path, "a+b")
+            fcntl.flock(self._f.fileno(), fcntl.LOCK_EX)
+        self.depth += 1
+        return self
+
+    def __exit__(self, *exc):
+        self.depth -= 1
+        if self.depth == 0 and self._f is not None:
+            try:
+                fcntl.flock(self._f.fileno(), fcntl.LOCK_UN)
+            finally:
+                self._f.close()
+                self._f = None
+
+
+def _json_key(k: Hashable) -> Any:
+    return list(k) if isinstance(k, tuple) else k
+
+
+def _key_from_json(k: Any) -> Hashable:
+    return tuple(k) if isinstance(k, list) else k
+
+
+class AppendOnlyStore:
+    def __init__(self, path: str, *,
+                 read_snapshot: Callable[[Any], Iterable[Any]],
+                 write_snapshot: Callable[[List[Any]], Any],
+                 keys: Callable[[Any], Sequence[Hashable]] = lambda item: (),
+                 compact_every: Optional[int] = None,
+                 indent: Optional[int] = None):
+        self.path = Path(path)
+        self.log_path = self.path.with_name(self.path.name + ".log")
+        self._read_snapshot = read_snapshot
+        self._write_snapshot = write_snapshot
+        self._keys = keys
+        self.compact_every = int(compact_every or COMPACT_EVERY)
+        self.indent = indent
+        self._lock = threading.RLock()
+        self._flock = _FileLock(self.path)
+        self._compacting: Optional[threading.Thread] = None
+        self.version = 0  # bumped on every change/reload; cheap cache key for derived indexes
+        self._load()
+
+    # ---------- loading / recovery ----------
+    def _stat(self, p: Path) -> Tuple:
+        try:
+            st = p.stat()
+            return (st.st_ino, st.st_mtime_ns, st.st_size)
+        except OSError:
+            return ()
+
+    def _load(self) -> None:
+        with self._lock:
+            try:
+                raw = self.path.read_bytes()
+            except OSError:
+                raw = b""
+            try:
+                obj = json.loads(raw.decode("utf-8")) if raw.strip() else None
+            except Exception:
+                log.warning("[phash_store] %s is not valid JSON; starting empty", self.path)
+                obj = None
+            self.items: List[Any] = list(self._read_snapshot(obj) or [])
+            self._index: Dict[Hashable, int] = {}
+            for i, it in enumerate(self.items):
+                self._index_item(it, i)
+            self._base = _sha1(raw)
+            self._snap_stat = self._stat(self.path)
+            self._log_pos = 0
+            self._records = 0
+            self._log_ok = True  # log header matches the snapshot
+            self._replay()
+            self.version += 1
+
+    def _replay(self) -> None:
+        """Apply log lines from self._log_pos on; drop a torn tail."""
+        try:
+            f = open(self.log_path, "rb")
+        except OSError:
+            self._log_stat = ()
+            return
+        with f:
+            f.seek(self._log_pos)
+            good = self._log_pos
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    rec = json.loads(line)
+                except Exception:
+                    break
+                if good == 0:
+                    if rec.get("op") != "base" or rec.get("sha1") != self._base:
+                        # already compacted into the snapshot; the next write starts a new log
+                        log.info("[phash_store] %s does not match the snapshot (already compacted); ignoring", self.log_path)
+                        self._log_ok = False
+                        self._log_stat = self._stat(self.log_path)
+                        return
+                else:
+                    self._apply(rec)
+                    self._records += 1
+                good += len(line)
+            size = f.seek(0, os.SEEK_END)
+        if good < size and self._flock.depth:
+            # only a lock holder truncates: without the lock the tail may be a write still in progress
+            log.warning("[phash_store] dropping %d torn bytes at the end of %s", size - good, self.log_path)
+            with open(self.log_path, "r+b") as f:
+                f.truncate(good)
+        self._log_pos = good
+        self._log_stat = self._stat(self.log_path)
+
+    def refresh(self) -> None:
+        """Pick up changes written by another process."""
+        with self._lock:
+            if self._stat(self.path) != self._snap_stat:
+                self._load()
+                return
+            st = self._stat(self.log_path)
+            if st != self._log_stat:
+                if not st or (self._log_stat and st[0] != self._log_stat[0]) or st[2] < self._log_pos:
+                    self._load()  # log replaced/shrunk: reload from scratch
+                else:
+                    self._replay()
+                    self.version += 1
+
+    @contextmanager
+    def _writing(self):
+        """Thread + process lock, with the in-memory state brought up to date inside it."""
+        with self._lock, self._flock:
+            self.refresh()
+            yield
+
+    # ---------- records ----------
+    def _index_item(self, item: Any, pos: int) -> None:
+        for k in self._keys(item) or ():
+            if k is not None:
+                self._index.setdefault(k, pos)
+
+    def _find(self, item: Any) -> Optional[int]:
+        for k in self._keys(item) or ():
+            pos = self._index.get(k)
+            if pos is not None:
+                return pos
+        return None
+
+    def _apply(self, rec: Dict[str, Any]) -> None:
+        op = rec.get("op")
+        if op == "add":
+            item = rec.get("item")
+            if self._find(item) is None:
+                self.items.append(item)
+                self._index_item(item, len(self.items) - 1)
+        elif op == "set":
+            pos = self._index.get(_key_from_json(rec["key"]), -1) if "key" in rec else int(rec.get("pos", -1))
+            if 0 <= pos < len(self.items) and isinstance(self.items[pos], dict):
+                self.items[pos].update(rec.get("fields") or {})
+
+    def _reset_log(self) -> None:
+        header = json.dumps({"op": "base", "sha1": self._base}).encode("utf-8") + b"\n"
+        _fsync_write(self.log_path, header)
+        self._log_ok = True
+        self._log_pos = len(header)
+        self._records = 0
+        self._log_stat = self._stat(self.log_path)
+
+    def _append(self, recs: List[Dict[str, Any]]) -> None:
+        if not self._log_ok or not self.log_path.exists():
+            self._reset_log()
+        elif self._stat(self.log_path)[2] > self._log_pos:
+            with open(self.log_path, "r+b") as f:  # torn tail left by a crashed writer
+                f.truncate(self._log_pos)
+        data = b"".join(json.dumps(r, ensure_ascii=False).encode("utf-8") + b"\n" for r in recs)
+        with open(self.log_path, "ab") as f:
+            f.write(data)
+            f.flush()
+            if FSYNC:
+                os.fsync(f.fileno())
+        self._log_pos += len(data)
+        self._log_stat = self._stat(self.log_path)
+        self._records += len(recs)
+        self.version += 1
+        if self._records >= self.compact_every:
+            self.compact_async()
+
+    # ---------- public API ----------
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._index
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        pos = self._index.get(key)
+        return None if pos is None else self.items[pos]
+
+    def position(self, key: Hashable) -> Optional[int]:
+        return self._index.get(key)
+
+    def add(self, item: Any) -> Tuple[Any, bool]:
+        """Append item unless one of its keys is already present; returns (stored item, created)."""
+        with self._writing():
+            pos = self._find(item)
+            if pos is not None:
+                return self.items[pos], False
+            self._append([{"op": "add", "item": item}])
+            self.items.append(item)
+            self._index_item(item, len(self.items) - 1)
+            return item, True
+
+    def extend(self, items: Iterable[Any]) -> List[Any]:
+        """Append many items with one write; returns the ones that were new."""
+        with self._writing():
+            fresh, seen = [], set()
+            for it in items:
+                ks = [k for k in (self._keys(it) or ()) if k is not None]
+                if self._find(it) is not None or any(k in seen for k in ks):
+                    continue
+                seen.update(ks)
+                fresh.append(it)
+            if fresh:
+                self._append([{"op": "add", "item": it} for it in fresh])
+                for it in fresh:
+                    self.items.append(it)
+                    self._index_item(it, len(self.items) - 1)
+            return fresh
+
+    def update(self, pos: int, **fields: Any) -> Any:
+        """Set fields on the dict item at pos (absolute values, so replays are idempotent).
+
+        pos is this process's position; the record names the item by its first key."""
+        with self._lock:
+            item = self.items[pos]
+            key = next((k for k in (self._keys(item) or ()) if k is not None), None)
+            if key is None:
+                raise ValueError("update() needs an item with a key")
+            with self._writing():
+                pos = self._index[key]  # refresh() may have reloaded the items
+                self._append([{"op": "set", "key": _json_key(key), "fields": fields}])
+                self.items[pos].update(fields)
+                return self.items[pos]
+
+    def compact(self) -> None:
+        """Fold the log into a fresh snapshot and start a new log."""
+        with self._writing():
+            data = json.dumps(self._write_snapshot(self.items), ensure_ascii=False, indent=self.indent).encode("utf-8")
+            _fsync_write(self.path, data)
+            # crash here: the old log's base sha1 no longer matches and is discarded on open
+            self._base = _sha1(data)
+            self._snap_stat = self._stat(self.path)
+            self._reset_log()
+            self.version += 1
+
+    def compact_async(self) -> None:
+        if self._compacting is not None and self._compacting.is_alive():
+            return
+        def run():
+            try:
+                self.compact()
+            except Exception:
+                log.exception("[phash_store] compaction of %s failed", self.path)
+        self._compacting = threading.Thread(target=run, name="phash-compact", daemon=True)
+        self._compacting.start()
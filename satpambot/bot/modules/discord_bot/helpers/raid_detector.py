@@ -0,0 +1,322 @@
+"""
+helpers/raid_detector.py
+Streaming raid detection: per-guild sliding-window counters fed by joins and messages.
+
+    det = get_raid_detector()
+    v = det.on_join(guild_id, member_id, now, created_at=ts, name="raider_123")
+    v = det.on_message(guild_id, author_id, channel_id, now, content, attachments=[("a.png", 123)])
+    if v.started: ...               # the guild just entered raid mode (once per raid)
+    v.suspects                      # member ids to act on (new ones only)
+
+No discord objects in here: timestamps are passed in, so a recorded event
+stream replays exactly (benchmarks/raid_replay.py).
+
+Every signal is a RingCounter: a fixed number of time slots covering the
+window, advanced lazily, so adding an event and reading the window total
+are O(1). Per guild it counts, over RAID_WINDOW_SEC:
+
+    joins      member joins
+    young      joins of accounts younger than RAID_YOUNG_DAYS
+    cluster    joins whose name stem ("raider_123" -> "raider") or account
+               creation hour is shared by >= RAID_CLUSTER_MIN recent joiners
+    fast       first messages sent < RAID_FAST_FIRST_SEC after joining
+    dup        messages whose normalized content (or attachment name+size) was
+               already posted by >= RAID_DUP_AUTHORS distinct accounts
+    dup_links  the dup messages that carry a link, invite or attachment
+
+A raid starts when joins >= RAID_JOIN_RATE and one more signal reaches its
+threshold, or when dup_links reaches 2*RAID_DUP_AUTHORS (a message raid by
+accounts that joined earlier; repeated greetings alone never trigger). It
+ends RAID_COOLDOWN_SEC after the last triggering event. While a raid is
+active, joiners that are young, clustered or posted a duplicate, and authors
+of duplicated link messages, are reported as suspects (joiners once each).
+
+Memory is bounded per guild: recent joiners, name stems, creation hours and
+content fingerprints live in LRU maps of RAID_TRACK_MAX entries (the
+fingerprint map holds a quarter of that), and the guild map itself is capped.
+
+ENV:
+  RAID_WINDOW_SEC        sliding window                          (default 60)
+  RAID_JOIN_RATE         joins per window                        (default 10)
+  RAID_YOUNG_DAYS        "young" account age                     (default 7)
+  RAID_YOUNG_RATE        young joins per window                  (default 6)
+  RAID_CLUSTER_MIN       joiners sharing a stem / creation hour  (default 4)
+  RAID_CLUSTER_RATE      clustered joins per window              (default 4)
+  RAID_FAST_FIRST_SEC    "fast" first message after joining      (default 30)
+  RAID_FAST_RATE         fast first messages per window          (default 5)
+  RAID_DUP_AUTHORS       distinct authors of one content         (default 4)
+  RAID_COOLDOWN_SEC      raid mode ends this long after the last trigger (default 300)
+  RAID_TRACK_MAX         tracked joiners per guild               (default 5000)
+"""
+from __future__ import annotations
+
+import hashlib, os, re, unicodedata
+from collections import OrderedDict
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+RAID_WINDOW_SEC = float(os.getenv("RAID_WINDOW_SEC", "60"))
+RAID_JOIN_RATE = int(os.getenv("RAID_JOIN_RATE", "10"))
+RAID_YOUNG_DAYS = float(os.getenv("RAID_YOUNG_DAYS", "7"))
+RAID_YOUNG_RATE = int(os.getenv("RAID_YOUNG_RATE", "6"))
+RAID_CLUSTER_MIN = int(os.getenv("RAID_CLUSTER_MIN", "4"))
+RAID_CLUSTER_RATE = int(os.getenv("RAID_CLUSTER_RATE", "4"))
+RAID_FAST_FIRST_SEC = float(os.getenv("RAID_FAST_FIRST_SEC", "30"))
+RAID_FAST_RATE = int(os.getenv("RAID_FAST_RATE", "5"))
+RAID_DUP_AUTHORS = int(os.getenv("RAID_DUP_AUTHORS", "4"))
+RAID_COOLDOWN_SEC = float(os.getenv("RAID_COOLDOWN_SEC", "300"))
+RAID_TRACK_MAX = int(os.getenv("RAID_TRACK_MAX", "5000"))
+RAID_GUILDS_MAX = 256
+SLOTS = 30
+_DUP_AUTHORS_KEPT = 16  # authors remembered per fingerprint; only "reached the threshold" matters
+
+
+class RingCounter:
+    """Events in the last `window` seconds, kept in `slots` fixed time slots (resolution window/slots)."""
+
+    __slots__ = ("width", "slots", "counts", "head", "total")
+
+    def __init__(self, window: float, slots: int = SLOTS):
+        self.width = window / slots
+        self.slots = slots
+        self.counts = [0] * slots
+        self.head = -1      # absolute index of the newest slot
+        self.total = 0
+
+    def _advance(self, now: float) -> int:
+        idx = int(now // self.width)
+        if idx > self.head:
+            # clear the slots that fell out of the window; at most `slots` of them
+            for k in range(max(self.head + 1, idx - self.slots + 1), idx + 1):
+                s = k % self.slots
+                self.total -= self.counts[s]
+                self.counts[s] = 0
+            self.head = idx
+        return idx
+
+    def add(self, now: float, n: int = 1) -> int:
+        idx = self._advance(now)
+        if idx > self.head - self.slots:  # late events older than the window are dropped
+            self.counts[idx % self.slots] += n
+            self.total += n
+        return self.total
+
+    def count(self, now: float) -> int:
+        self._advance(now)
+        return self.total
+
+
+class _Bounded(OrderedDict):
+    """LRU map: get_or_create() refreshes, the oldest entry goes past maxlen."""
+
+    def __init__(self, maxlen: int):
+        super().__init__()
+        self.maxlen = maxlen
+
+    def get_or_create(self, key, factory):
+        v = self.get(key)
+        if v is None:
+            v = self[key] = factory()
+            if len(self) > self.maxlen:
+                self.popitem(last=False)
+        else:
+            self.move_to_end(key)
+        return v
+
+
+class _Joiner:
+    __slots__ = ("joined", "young", "clustered", "first_msg", "dup", "reported")
+
+    def __init__(self, joined: float, young: bool):
+        self.joined = joined
+        self.young = young
+        self.clustered = False
+        self.first_msg = False
+        self.dup = False
+        self.reported = False
+
+    @property
+    def suspicious(self) -> bool:
+        return self.young or self.clustered or self.dup
+
+
+class _Fingerprint:
+    __slots__ = ("authors", "last")
+
+    def __init__(self):
+        self.authors: List[int] = []
+        self.last = 0.0
+
+
+class RaidVerdict(NamedTuple):
+    active: bool
+    started: bool = False
+    reasons: Tuple[str, ...] = ()
+    suspects: Tuple[int, ...] = ()
+
+
+NO_RAID = RaidVerdict(False)
+
+
+def name_stem(name: str) -> str:
+    """Letters of a display name, lowercased and accent-free; "" when under 3 letters."""
+    n = unicodedata.normalize("NFKD", (name or "").lower())
+    n = "".join(c for c in n if c.isalpha() and not unicodedata.combining(c))
+    return n if len(n) >= 3 else ""
+
+
+_WS_RE = re.compile(r"\s+")
+
+
+def content_fingerprint(content: str) -> Optional[str]:
+    t = _WS_RE.sub(" ", (content or "").lower()).strip()
+    if len(t) < 8:  # "hi", "lol" and emoji-only replies repeat naturally
+        return None
+    return hashlib.blake2b(t.encode("utf-8"), digest_size=8).hexdigest()
+
+
+class GuildRaidState:
+    def __init__(self, window: float, track_max: int):
+        self.window = window
+        self.joins = RingCounter(window)
+        self.young = RingCounter(window)
+        self.cluster = RingCounter(window)
+        self.fast = RingCounter(window)
+        self.dup = RingCounter(window)
+        self.dup_links = RingCounter(window)
+        self.joiners: "_Bounded[int, _Joiner]" = _Bounded(track_max)
+        self.stems: "_Bounded[str, RingCounter]" = _Bounded(track_max)
+        self.created: "_Bounded[int, RingCounter]" = _Bounded(track_max)
+        self.fps: "_Bounded[str, _Fingerprint]" = _Bounded(max(64, track_max // 4))
+        self.raid_until = 0.0
+        self.channels: "_Bounded[int, float]" = _Bounded(64)  # channels with recent messages
+
+    def counts(self, now: float) -> Dict[str, int]:
+        return {"joins": self.joins.count(now), "young": self.young.count(now), "cluster": self.cluster.count(now),
+                "fast": self.fast.count(now), "dup": self.dup.count(now), "dup_links": self.dup_links.count(now)}
+
+
+class RaidDetector:
+    def __init__(self, window: float = RAID_WINDOW_SEC, track_max: int = RAID_TRACK_MAX):
+        self.window = window
+        self.track_max = track_max
+        self._guilds: "_Bounded[int, GuildRaidState]" = _Bounded(RAID_GUILDS_MAX)
+
+    def guild(self, guild_id: int) -> GuildRaidState:
+        return self._guilds.get_or_create(guild_id, lambda: GuildRaidState(self.window, self.track_max))
+
+    def is_active(self, guild_id: int, now: float) -> bool:
+        g = self._guilds.get(guild_id)
+        return g is not None and now < g.raid_until
+
+    def recent_channels(self, guild_id: int, now: float) -> List[int]:
+        g = self._guilds.get(guild_id)
+        return [c for c, t in g.channels.items() if now - t < self.window] if g is not None else []
+
+    # --- events ---
+    def on_join(self, guild_id: int, member_id: int, now: float, created_at: Optional[float] = None,
+                name: str = "") -> RaidVerdict:
+        g = self.guild(guild_id)
+        g.joins.add(now)
+        young = created_at is not None and now - created_at < RAID_YOUNG_DAYS * 86400
+        if young:
+            g.young.add(now)
+        j = _Joiner(now, young)
+        g.joiners.pop(member_id, None)
+        g.joiners.get_or_create(member_id, lambda: j)
+        cluster = 0
+        stem = name_stem(name)
+        if stem:
+            cluster = g.stems.get_or_create(stem, lambda: RingCounter(self.window)).add(now)
+        if created_at is not None and young:
+            hour = int(created_at // 3600)
+            cluster = max(cluster, g.created.get_or_create(hour, lambda: RingCounter(self.window)).add(now))
+        if cluster >= RAID_CLUSTER_MIN:
+            j.clustered = True
+            g.cluster.add(now)
+        return self._verdict(g, now, member_id if j.suspicious else None)
+
+    def on_message(self, guild_id: int, author_id: int, channel_id: int, now: float, content: str = "",
+                   attachments: Iterable[Tuple[str, int]] = ()) -> RaidVerdict:
+        g = self._guilds.get(guild_id)
+        if g is None and not content and not attachments:
+            return NO_RAID
+        g = g or self.guild(guild_id)
+        g.channels[channel_id] = now
+        g.channels.move_to_end(channel_id)
+        if len(g.channels) > g.channels.maxlen:
+            g.channels.popitem(last=False)
+        j = g.joiners.get(author_id)
+        if j is not None and not j.first_msg:
+            j.first_msg = True
+            if now - j.joined < RAID_FAST_FIRST_SEC:
+                g.fast.add(now)
+        keys = [content_fingerprint(content)] + [f"att:{n.lower()}:{s}" for n, s in attachments]
+        dup = False
+        for key in keys:
+            if key is None:
+                continue
+            fp = g.fps.get_or_create(key, _Fingerprint)
+            if now - fp.last > self.window:
+                fp.authors.clear()
+            fp.last = now
+            if author_id not in fp.authors and len(fp.authors) < _DUP_AUTHORS_KEPT:
+                fp.authors.append(author_id)
+            if len(fp.authors) >= RAID_DUP_AUTHORS:
+                dup = True
+        linked = bool(keys[1:]) or "://" in content or "discord.gg/" in content
+        if dup:
+            g.dup.add(now)
+            if linked:
+                g.dup_links.add(now)
+            if j is not None:
+                j.dup = True
+        suspect = (dup and linked) or (j is not None and j.suspicious)
+        return self._verdict(g, now, author_id if suspect else None)
+
+    # --- decision ---
+    def _verdict(self, g: GuildRaidState, now: float, suspect: Optional[int]) -> RaidVerdict:
+        c = g.counts(now)
+        reasons = []
+        if c["young"] >= RAID_YOUNG_RATE:
+            reasons.append(f"young_joins={c['young']}")
+        if c["cluster"] >= RAID_CLUSTER_RATE:
+            reasons.append(f"clustered_joins={c['cluster']}")
+        if c["fast"] >= RAID_FAST_RATE:
+            reasons.append(f"fast_first_msgs={c['fast']}")
+        if c["dup"] >= RAID_DUP_AUTHORS:
+            reasons.append(f"dup_msgs={c['dup']}")
+        if c["dup_links"] >= 2 * RAID_DUP_AUTHORS:
+            reasons.append(f"dup_link_msgs={c['dup_links']}")
+        triggered = (c["joins"] >= RAID_JOIN_RATE and reasons) or c["dup_links"] >= 2 * RAID_DUP_AUTHORS
+        started = False
+        if triggered:
+            reasons.insert(0, f"joins={c['joins']}/{int(self.window)}s")
+            started = now >= g.raid_until
+            g.raid_until = now + RAID_COOLDOWN_SEC
+        if now >= g.raid_until:
+            return NO_RAID
+        suspects: List[int] = []
+        if started:
+            # everyone flagged in the window so far, not just the event that tipped it
+            for mid, j in g.joiners.items():
+                if now - j.joined < self.window and j.suspicious and not j.reported:
+                    j.reported = True
+                    suspects.append(mid)
+        if suspect is not None:
+            j = g.joiners.get(suspect)
+            if j is None or not j.reported:
+                if j is not None:
+                    j.reported = True
+                if suspect not in suspects:
+                    suspects.append(suspect)
+        return RaidVerdict(True, started, tuple(reasons), tuple(suspects))
+
+
+_default: Optional[RaidDetector] = None
+
+
+def get_raid_detector() -> RaidDetector:
+    global _default
+    if _default is None:
+        _default = RaidDetector()
+    return _default
@@ -4,7 +4,9 @@ import os, re
 from urllib.parse import urlparse
 from typing import Iterable, List, Set
 
-URL_RE = re.compile(r'(https?://[\w\-\.\u00A1-\uFFFF/%#?=&+~:;,@!\(\)\[\]\{\}]+)', re.I)
+from .domain_reputation import DomainTrie
+from .keyword_scanner import get_keyword_scanner
+from .message_analysis import URL_RE, extract_urls
 
 # from ENV
 def _env_set(key: str) -> Set[str]:
@@ -19,15 +21,14 @@ def _env_set(key: str) -> Set[str]:
 FAST_BAD_DOMAINS = _env_set("FAST_BAD_DOMAINS")
 FAST_BAD_KEYWORDS = _env_set("FAST_BAD_KEYWORDS")
 LINK_WHITELIST = _env_set("LINK_WHITELIST")
+# exact domains, "evil.com" (+ subdomains) and ".tk" suffix rules; one O(labels) lookup
+_FAST_BAD_TRIE = DomainTrie.from_rules(FAST_BAD_DOMAINS, "black")
 FLAG_PUNY = os.getenv("LINK_FLAG_PUNYCODE","1") not in {"0","false","no"}
 
 SHORTENERS = {
     "bit.ly","t.co","tinyurl.com","goo.gl","is.gd","buff.ly","cutt.ly","s.id","adf.ly","rebrand.ly","lnkd.in","trib.al","t.ly"
 }
 
-def extract_urls(text: str) -> List[str]:
-    return [m.group(1) for m in URL_RE.finditer(text or "")]
-
 def norm_domain(host: str) -> str:
     host = (host or "").strip().strip(".").lower()
     try:
@@ -41,15 +42,8 @@ def is_suspicious_domain(host: str, allowlist: Iterable[str]) -> bool:
     if not h or h in allowlist:
         return False
     # explicit denylist wins
-    if h in FAST_BAD_DOMAINS:
+    if _FAST_BAD_TRIE.match(h) is not None:
         return True
     if FLAG_PUNY and 'xn--' in h:
         return True
-    for kw in FAST_BAD_KEYWORDS:
-        if kw and kw in h:
-            return True
-    # lightweight TLD heuristic based on FAST_BAD_DOMAINS suffixes
-    for d in list(FAST_BAD_DOMAINS):
-        if d.startswith(".") and h.endswith(d):
-            return True
-    return False
+    return "fast_bad" in get_keyword_scanner().scan(h)
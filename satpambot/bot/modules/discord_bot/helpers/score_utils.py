@@ -5,10 +5,12 @@ from typing import Optional, Tuple
 
 try:
     from PIL import Image
-    import imagehash
 except Exception:
     Image = None
-    imagehash = None
+
+from .image_features import ImageFeatures
+from .keyword_scanner import get_keyword_scanner
+from .message_analysis import extract_urls
 
 try:
     import pytesseract  # optional
@@ -21,38 +23,27 @@ KEYWORDS = [
 ]
 
 def calc_hashes_from_bytes(b: bytes) -> Tuple[Optional[int], Optional[int]]:
-    if Image is None or imagehash is None:
-        return (None, None)
-    try:
-        with Image.open(io.BytesIO(b)) as im:
-            im = im.convert("RGB")
-            ph = imagehash.phash(im, hash_size=8)
-            dh = imagehash.dhash(im, hash_size=8)
-            return (int(str(ph), 16), int(str(dh), 16))
-    except Exception:
+    f = ImageFeatures.from_bytes(b)
+    if f is None:
         return (None, None)
+    return (f.phash, f.dhash)
 
 def hamming64(a: int, b: int) -> int:
     return (a ^ b).bit_count()
 
-def extract_text_ocr(b: bytes) -> str:
+def extract_text_ocr(b: bytes, features: Optional[ImageFeatures] = None) -> str:
     if pytesseract is None or Image is None:
         return ""
     try:
-        with Image.open(io.BytesIO(b)) as im:
-            im = im.convert("L")
-            return pytesseract.image_to_string(im) or ""
+        f = features or ImageFeatures.from_bytes(b, full=True)
+        if f is None:
+            return ""
+        return pytesseract.image_to_string(f.image("L")) or ""
     except Exception:
         return ""
 
 def contains_phish_keywords(text: str) -> bool:
-    t = text.lower()
-    return any(k in t for k in KEYWORDS)
-
-_url_re = re.compile(r'https?://[^\s)>\]]+', re.IGNORECASE)
-
-def extract_urls(text: str) -> list[str]:
-    return _url_re.findall(text or "")
+    return "phish" in get_keyword_scanner().scan(text)
 
 BAD_TLDS = {".ru",".tk",".gq",".ml",".cf"}
 SUS_WORDS = {"nitro","free","gift","steam","bonus","airdrop"}
@@ -0,0 +1,135 @@
+"""
+helpers/tile_index.py
+Tile-signature matrix for crop/collage matching (img_hashing tile pHash).
+
+A tile signature ``'h1|h2|...|h9'`` (grid*grid hex pHashes, row-major) is stored
+as one row of an ``(N, grid*grid)`` uint64 matrix. Matching candidates is a
+broadcasted XOR + popcount per block of rows giving per-row tile-hit counts,
+stopping as soon as some row reaches ``min_tiles``.
+
+    idx = TileIndex(db_sigs)                   # or TileIndex.load("tiles.npy")
+    idx.best(candidate_sigs, min_tiles=5, per_tile_max_distance=10)
+    idx.save("tiles.npy")
+
+Signatures with an unparsable tile or a different tile count are skipped.
+"""
+from __future__ import annotations
+
+from typing import Iterable, List, Optional, Sequence
+
+from satpambot.bot.modules.discord_bot.helpers.hash_index import np, parse_hash, popcount64
+
+# XOR scratch per block is (candidates x rows x tiles) uint64 elements
+BLOCK_ELEMS = 1 << 20
+
+
+def parse_sig(sig: str) -> Optional[List[int]]:
+    """'h1|h2|...' -> [int, ...], or None if any tile is unparsable."""
+    out = []
+    for part in str(sig or "").split("|"):
+        if not part:
+            continue
+        v = parse_hash(part)
+        if v is None or v >> 64:
+            return None
+        out.append(v)
+    return out or None
+
+
+class TileIndex:
+    """Append-only (N, tiles) uint64 matrix of tile signatures."""
+
+    def __init__(self, sigs: Iterable[str] = (), tiles: Optional[int] = None):
+        self.tiles = tiles
+        self._n = 0
+        self._arr = np.zeros((0, tiles or 0), dtype=np.uint64)
+        self.skipped = 0
+        self.extend(sigs)
+
+    def __len__(self) -> int:
+        return self._n
+
+    @property
+    def matrix(self) -> "np.ndarray":
+        return self._arr[: self._n]
+
+    def _reserve(self, extra: int) -> None:
+        need = self._n + extra
+        cap = self._arr.shape[0]
+        if need <= cap and self._arr.flags.writeable:
+            return
+        grown = np.zeros((max(need, cap * 2, 64), self.tiles), dtype=np.uint64)
+        grown[: self._n] = self._arr[: self._n]
+        self._arr = grown
+
+    def _rows(self, sigs: Iterable[str]) -> List[List[int]]:
+        rows = []
+        for s in sigs:
+            r = s if isinstance(s, (list, tuple)) else parse_sig(s)
+            if r and self.tiles is None:
+                self.tiles = len(r)
+                self._arr = np.zeros((0, self.tiles), dtype=np.uint64)
+            if not r or len(r) != self.tiles:
+                self.skipped += 1
+                continue
+            rows.append(list(r))
+        return rows
+
+    def add(self, sig: str) -> Optional[int]:
+        """Append one signature; returns its row or None if it was skipped."""
+        return self._n - 1 if self.extend([sig]) else None
+
+    def extend(self, sigs: Iterable[str]) -> int:
+        rows = self._rows(sigs)
+        if not rows:
+            return 0
+        self._reserve(len(rows))
+        self._arr[self._n : self._n + len(rows)] = np.array(rows, dtype=np.uint64)
+        self._n += len(rows)
+        return len(rows)
+
+    def hit_counts(self, candidates: Sequence[str], per_tile_max_distance: int) -> "np.ndarray":
+        """(len(parsable candidates), N) tiles within per_tile_max_distance."""
+        q = self._queries(candidates)
+        if q is None or not self._n:
+            return np.zeros((0 if q is None else len(q), self._n), dtype=np.int64)
+        return (popcount64(q[:, None, :] ^ self.matrix[None, :, :]) <= per_tile_max_distance).sum(axis=-1)
+
+    def _queries(self, candidates: Sequence[str]) -> Optional["np.ndarray"]:
+        if isinstance(candidates, str):
+            candidates = [candidates]
+        rows = [r for r in (parse_sig(c) for c in candidates) if r and len(r) == self.tiles]
+        return np.array(rows, dtype=np.uint64) if rows else None
+
+    def best(self, candidates: Sequence[str], min_tiles: int, per_tile_max_distance: int) -> int:
+        """
+        Highest tile-hit count of any (candidate, row) pair. Returns as soon as
+        a block contains a pair with at least min_tiles hits.
+        """
+        q = self._queries(candidates)
+        if q is None or not self._n:
+            return 0
+        m = self.matrix
+        step = max(256, BLOCK_ELEMS // (len(q) * self.tiles))
+        best = 0
+        for start in range(0, self._n, step):
+            d = popcount64(q[:, None, :] ^ m[None, start : start + step, :])
+            best = max(best, int((d <= per_tile_max_distance).sum(axis=-1).max()))
+            if best >= min_tiles:
+                break
+        return best
+
+    # ---------- persistence ----------
+    def save(self, path: str) -> None:
+        np.save(path, np.ascontiguousarray(self.matrix))
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> "TileIndex":
+        """Load a saved matrix (memory-mapped read-only by default; copied on first append)."""
+        arr = np.load(path, mmap_mode="r" if mmap else None)
+        if arr.ndim != 2:
+            raise ValueError(f"{path}: expected an (N, tiles) matrix, got shape {arr.shape}")
+        idx = cls(tiles=int(arr.shape[1]))
+        idx._arr = arr if arr.dtype == np.uint64 else arr.astype(np.uint64)
+        idx._n = int(arr.shape[0])
+        return idx
@@ -1,7 +1,10 @@
 # Smart URL reputation helper (auto)
 import os, json, re, socket
 from urllib.parse import urlparse
-import idna
+try:
+    import idna
+except Exception:  # normalize_domain falls back to the plain lowercase host
+    idna = None
 
 DATA_DIR = "data"
 WL_FILE = os.getenv("WHITELIST_DOMAINS_FILE", os.path.join(DATA_DIR, "whitelist_domains.json"))
@@ -20,18 +23,19 @@ def _load_list(path, default):
     except Exception:
         return list(default)
 
+DEFAULT_WHITELIST = CRITICAL_BRANDS + [
+    "reddit.com","bilibili.com","github.com","gitlab.com","wikipedia.org","stackoverflow.com","medium.com","t.me","telegram.me","discordapp.com","googleusercontent.com","gstatic.com"
+]
+
 def load_whitelist():
-    return set(_load_list(WL_FILE, CRITICAL_BRANDS + [
-        "reddit.com","bilibili.com","github.com","gitlab.com","wikipedia.org","stackoverflow.com","medium.com","t.me","telegram.me","discordapp.com","googleusercontent.com","gstatic.com"
-    ]))
+    return set(_load_list(WL_FILE, DEFAULT_WHITELIST))
 
 def load_blacklist():
     return set(_load_list(BL_FILE, []))
 
 def extract_urls(text: str):
-    if not text: return []
-    rx = re.compile(r"(https?://[\w\-\._~:/%\?#[\]@!$&'()*+,;=]+)", re.I)
-    return rx.findall(text)
+    from .message_analysis import extract_urls as _extract
+    return _extract(text)
 
 def normalize_domain(host: str) -> str:
     if not host: return ""
@@ -77,15 +81,6 @@ def is_shortener(domain: str) -> bool:
     return reg_domain(domain) in SHORTENERS
 
 def check_domain_reputation(domain: str):
-    d = normalize_domain(domain)
-    wl = load_whitelist()
-    bl = load_blacklist()
-    regd = reg_domain(d)
-    if d in bl or regd in bl:
-        return "black"
-    if any(looks_typosquat(regd, legit) for legit in CRITICAL_BRANDS):
-        if not (regd in wl or d in wl):
-            return "sus"
-    if d in wl or regd in wl:
-        return "white"
-    return "unknown"
+    """white / black / sus / unknown from the shared, compiled list trie (no file reads per call)."""
+    from .domain_reputation import get_domain_reputation
+    return get_domain_reputation().check(domain)
@@ -8,8 +8,18 @@ except Exception:
     Image = None
     imagehash = None
 
+from satpambot.bot.modules.discord_bot.helpers.hash_index import HashIndex
+from satpambot.bot.modules.discord_bot.helpers.phash_store import AppendOnlyStore
+
 DEFAULT_PATH = "data/phash/SATPAMBOT_PHASH_DB_V1.json"
 
+# id(items list) -> [items list, HashIndex over items' phash, items indexed so far]
+_INDEX_CACHE: dict = {}
+# id(items list) -> [items list, {("sha256"|"phash", value): item}, items mapped so far]
+_KEY_CACHE: dict = {}
+# path -> AppendOnlyStore
+_STORES: dict = {}
+
 def _ensure_dir(p: Path):
     p.parent.mkdir(parents=True, exist_ok=True)
 
@@ -19,14 +29,8 @@ def _atomic_write(path: Path, data: dict):
     tmp.write_text(json.dumps(data, ensure_ascii=False, indent=2))
     tmp.replace(path)
 
-def load_db(path: str = DEFAULT_PATH) -> dict:
-    p = Path(path)
-    if not p.exists():
-        return {"version": "1", "items": []}
-    txt = p.read_text(encoding="utf-8")
-    try:
-        data = json.loads(txt) if txt.strip() else {"version":"1","items":[]}
-    except Exception:
+def _normalize(data) -> dict:
+    if not isinstance(data, dict):
         data = {"version":"1","items":[]}
     if isinstance(data, dict) and "phash" in data and "items" not in data:
         items = []
@@ -37,6 +41,38 @@ def load_db(path: str = DEFAULT_PATH) -> dict:
         data["items"] = []
     return data
 
+def load_db(path: str = DEFAULT_PATH) -> dict:
+    p = Path(path)
+    if Path(path + ".log").exists():  # store in use: snapshot + pending log records
+        store = open_store(path); store.refresh()
+        return {"version": "1", "items": [dict(it) for it in store.items]}
+    if not p.exists():
+        return {"version": "1", "items": []}
+    txt = p.read_text(encoding="utf-8")
+    try:
+        data = json.loads(txt) if txt.strip() else {"version":"1","items":[]}
+    except Exception:
+        data = {"version":"1","items":[]}
+    return _normalize(data)
+
+def _item_keys(it: dict):
+    return (("sha256", it.get("sha256")) if it.get("sha256") else None,
+            ("phash", it.get("phash")) if it.get("phash") else None)
+
+def open_store(path: str = DEFAULT_PATH) -> AppendOnlyStore:
+    """
+    Append-only store over the same JSON file (shared per path). Opening an
+    existing SATPAMBOT_PHASH_DB_V1.json migrates it in place: the JSON becomes
+    the snapshot and later upserts are appended to <path>.log.
+    """
+    store = _STORES.get(path)
+    if store is None:
+        store = AppendOnlyStore(path, read_snapshot=lambda obj: _normalize(obj)["items"],
+                                write_snapshot=lambda items: {"version": "1", "items": items},
+                                keys=_item_keys)
+        _STORES[path] = store
+    return store
+
 def save_db(db: dict, path: str = DEFAULT_PATH):
     _atomic_write(Path(path), db)
 
@@ -57,28 +93,61 @@ def hamming(a: str, b: str) -> int:
         x = int(a, 16); y = int(b, 16)
         return bin(x ^ y).count("1")
 
-def upsert_item(db: dict, *, phash: str, sha256: str, channel_id: int, message_id: int, user_id: int, label: str = "unknown", meta: dict | None = None) -> tuple[dict,bool]:
-    now = int(time.time())
+def _keymap_for(db: dict) -> dict:
+    """(kind, value) -> item over db["items"], extended incrementally like _index_for."""
     items = db.setdefault("items", [])
-    for it in items:
-        if it.get("sha256") == sha256 or it.get("phash") == phash:
-            it["last_seen_ts"] = now
-            it.setdefault("seen", 1)
-            it["seen"] += 1
-            return it, False
+    cached = _KEY_CACHE.get(id(items))
+    if cached is None or cached[0] is not items or cached[2] > len(items):
+        _KEY_CACHE.clear()
+        cached = [items, {}, 0]
+        _KEY_CACHE[id(items)] = cached
+    for it in items[cached[2]:]:
+        for k in _item_keys(it):
+            if k is not None:
+                cached[1].setdefault(k, it)
+    cached[2] = len(items)
+    return cached[1]
+
+def upsert_item(db, *, phash: str, sha256: str, channel_id: int, message_id: int, user_id: int, label: str = "unknown", meta: dict | None = None) -> tuple[dict,bool]:
+    """db: dict from load_db (saved later with save_db) or an open_store() store (persisted immediately)."""
+    now = int(time.time())
     it = {"phash": phash, "sha256": sha256, "channel_id": int(channel_id), "message_id": int(message_id), "user_id": int(user_id), "label": label, "ts": now, "meta": meta or {}}
-    items.append(it)
+    if isinstance(db, AppendOnlyStore):
+        db.refresh()  # "seen" below must count what other processes recorded
+        pos = db.position(("sha256", sha256)) if sha256 else None
+        if pos is None and phash:
+            pos = db.position(("phash", phash))
+        if pos is not None:
+            return db.update(pos, last_seen_ts=now, seen=int(db.items[pos].get("seen", 1)) + 1), False
+        return db.add(it)
+    keymap = _keymap_for(db)
+    found = keymap.get(("sha256", sha256)) if sha256 else None
+    if found is None and phash:
+        found = keymap.get(("phash", phash))
+    if found is not None:
+        found["last_seen_ts"] = now
+        found.setdefault("seen", 1)
+        found["seen"] += 1
+        return found, False
+    db["items"].append(it)
     return it, True
 
-def find_duplicates(db: dict, *, phash: str, max_distance: int = 8):
-    items = db.get("items", [])
-    dups = []
-    for it in items:
-        try:
-            dist = hamming(phash, it.get("phash",""))
-        except Exception:
-            continue
-        if dist <= max_distance:
-            dups.append((dist, it))
+def _index_for(db) -> HashIndex:
+    """HashIndex over db["items"], extended incrementally as upsert_item appends."""
+    items = db.items if isinstance(db, AppendOnlyStore) else db.setdefault("items", [])
+    cached = _INDEX_CACHE.get(id(items))
+    if cached is None or cached[0] is not items or cached[2] > len(items):
+        _INDEX_CACHE.clear()
+        cached = [items, HashIndex(), 0]
+        _INDEX_CACHE[id(items)] = cached
+    if cached[2] < len(items):
+        fresh = items[cached[2]:]
+        cached[1].extend((it.get("phash", "") for it in fresh), payloads=fresh)
+        cached[2] = len(items)
+    return cached[1]
+
+def find_duplicates(db, *, phash: str, max_distance: int = 8):
+    idx = _index_for(db)
+    dups = [(dist, idx.payload(pos)) for _, pos, dist in idx.all_within([phash], max_distance)]
     dups.sort(key=lambda x: x[0])
     return dups
@@ -1,13 +1,12 @@
-import os, re, logging
+import os, logging
 
 log = logging.getLogger(__name__)
 
-# Minimal profanity lexicon; extend as needed
+# Minimal profanity lexicon; extend as needed (whole words, "x*" = any word starting with x)
 DEFAULT_WORDS = [
-    r"fuck", r"shit", r"bitch", r"asshole", r"bastard",
-    r"motherf\w+", r"dick", r"cunt"
+    "fuck", "shit", "bitch", "asshole", "bastard",
+    "motherf*", "dick", "cunt"
 ]
-_WORD_RE = re.compile(r"(?i)\b(" + "|".join(DEFAULT_WORDS) + r")\b")
 
 def _filter_on(bot) -> bool:
     cfg = getattr(bot, "local_cfg", {})
@@ -35,8 +34,15 @@ def sanitize(bot, text: str) -> str:
         return text
     if not _filter_on(bot):
         return text
+    from satpambot.bot.modules.discord_bot.helpers.keyword_scanner import get_keyword_scanner
     tok = _token(bot)
-    result = _WORD_RE.sub(tok, text)
+    parts, last = [], 0
+    for start, end, _, _ in get_keyword_scanner().finditer(text, ("profanity",)):
+        if start < last:
+            continue
+        parts += [text[last:start], tok]
+        last = end
+    result = "".join(parts) + text[last:]
     if result != text:
         log.debug("[profanity] sanitized text")
     return result
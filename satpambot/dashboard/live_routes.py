@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-import os, io, json, time
+import os, io, time
 from flask import Blueprint, request, jsonify
 from PIL import Image
 
@@ -21,17 +21,13 @@ def _json_path() -> str:
         os.makedirs(dirp, exist_ok=True)
     return p
 
-def _load_json() -> dict:
-    p = _json_path()
-    if os.path.exists(p):
-        with open(p, "r", encoding="utf-8") as f:
-            try: return json.load(f)
-            except Exception: return {}
-    return {}
+def _store():
+    # same append-only store (and file format) as phish_api; never rewrite the snapshot here
+    from satpambot.dashboard.phish_api import open_phash_store
+    return open_phash_store(_json_path())
 
-def _save_json(d: dict) -> None:
-    with open(_json_path(), "w", encoding="utf-8") as f:
-        json.dump(d, f, indent=2, ensure_ascii=False)
+def _load_json() -> dict:
+    return {it["hash"]: {k: v for k, v in it.items() if k != "hash"} for it in _store().items if isinstance(it, dict)}
 
 @api_bp.post("/phish/phash")
 def add_phash():
@@ -55,17 +51,16 @@ def add_phash():
         src = file.filename
 
     h = str(imagehash.phash(img))
-    data = _load_json()
-    data[h] = {"source": src, "ts": int(time.time())}
-    _save_json(data)
+    store = _store()
+    store.add({"hash": h, "source": src, "ts": int(time.time())})
 
     try:
-        from satpambot.bot.modules.discord_bot.helpers.image_hashing import refresh_external_phash_store  # type: ignore
-        refresh_external_phash_store(_json_path())
+        from satpambot.bot.modules.discord_bot.helpers.phash_blocklist import publish_hashes
+        publish_hashes([h], source="live_routes")
     except Exception:
         pass
 
-    return jsonify({"ok": True, "hash": h, "count": len(data)})
+    return jsonify({"ok": True, "hash": h, "count": len(store)})
 
 @api_bp.get("/phish/phash")
 def list_phash():
@@ -3,56 +3,61 @@ from __future__ import annotations
 """
 live_store.py
 - Persistent pHash store for phishing images
-- In-memory cache with safe file-backed JSON: data/phish/phash.json
+- In-memory cache over data/phish/phash.json + append-only .log (helpers/phash_store)
 - Optional bot notify hook if present
 """
 import os, json, threading
 from pathlib import Path
 
+from satpambot.bot.modules.discord_bot.helpers.phash_store import AppendOnlyStore
+
 _lock = threading.RLock()
-_cache = None
 _store_path = Path("data/phish/phash.json")  # shared between web & bot
+_store = None  # AppendOnlyStore over _store_path (JSON snapshot + .log)
 
-def _ensure_dir():
-    _store_path.parent.mkdir(parents=True, exist_ok=True)
+def _read(obj) -> list[str]:
+    return [str(x) for x in ((obj.get("phash") if isinstance(obj, dict) else obj) or [])]
 
-def _load() -> list[str]:
-    global _cache
+def _get_store() -> AppendOnlyStore:
+    global _store
     with _lock:
-        if _cache is not None:
-            return list(_cache)
-        try:
-            if _store_path.exists():
-                data = json.loads(_store_path.read_text("utf-8"))
-                _cache = [str(x) for x in (data.get("phash") if isinstance(data, dict) else data) or []]
-            else:
-                _cache = []
-        except Exception:
-            _cache = []
-        return list(_cache)
+        if _store is None:
+            _store = AppendOnlyStore(str(_store_path), read_snapshot=_read,
+                                     write_snapshot=lambda lst: {"phash": lst}, keys=lambda v: (v,), indent=2)
+        return _store
 
-def _save(lst: list[str]) -> None:
+def get_phash() -> list[str]:
     with _lock:
-        _ensure_dir()
         try:
-            _store_path.write_text(json.dumps({"phash": lst}, ensure_ascii=False, indent=2), encoding="utf-8")
+            st = _get_store()
+            st.refresh()  # the other process (web/bot) may have appended
+            return list(st.items)
         except Exception:
-            pass
-
-def get_phash() -> list[str]:
-    return _load()
+            return []
 
 def add_phash(v: str) -> list[str]:
     v = str(v).strip()
     if not v:
         return get_phash()
     with _lock:
-        cur = _load()
-        if v not in cur:
-            cur.append(v)
-            _save(cur)
-            _notify_bot_phash_updated(cur)
-        return list(cur)
+        st = _get_store()
+        st.refresh()
+        try:
+            _, created = st.add(v)
+        except Exception:
+            created = False
+        if created:
+            _publish(v)
+            _notify_bot_phash_updated(list(st.items))
+        return list(st.items)
+
+def _publish(v: str) -> None:
+    """Merge into the shared blocklist the bot memory-maps (picked up within seconds)."""
+    try:
+        from satpambot.bot.modules.discord_bot.helpers.phash_blocklist import publish_hashes
+        publish_hashes([v], source="live_store")
+    except Exception:
+        pass
 
 def _notify_bot_phash_updated(cur: list[str]) -> None:
     """Best-effort notify running bot process (optional)."""
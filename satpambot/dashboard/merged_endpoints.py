@@ -60,6 +60,11 @@ def _blocklist_append(val):
     if val and val not in arr:
         _ensure_dir(os.path.dirname(_blocklist_file()))
         json.dump(arr + [val], open(_blocklist_file(), "w", encoding="utf-8"), indent=2)
+        try:
+            from satpambot.bot.modules.discord_bot.helpers.phash_blocklist import publish_hashes
+            publish_hashes([val], source="merged_endpoints")
+        except Exception:
+            pass
         return len(arr) + 1
     return len(arr)
 
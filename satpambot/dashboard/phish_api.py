@@ -1,6 +1,7 @@
 import os, json, time
 from flask import Blueprint, request, jsonify
 from PIL import Image
+from satpambot.bot.modules.discord_bot.helpers.phash_store import AppendOnlyStore
 # v20: try import imagehash; fallback to Pillow-only aHash to avoid ImportError during smoketests
 try:
     import imagehash as _imagehash_mod  # pip install ImageHash
@@ -35,18 +36,36 @@ def _ensure_files():
     if not os.path.exists(HASH_TXT):
         open(HASH_TXT, "a", encoding="utf-8").close()
 
-def _load():
+_stores = {}
+
+def _hash_of(it):
+    return it["hash"] if isinstance(it, dict) else str(it)
+
+def _read_snapshot(obj):
+    # {"hashes": [...]}; live_routes used to write {"<hash>": {"source": ..., "ts": ...}}
+    if not isinstance(obj, dict):
+        return []
+    if "hashes" in obj:
+        return obj.get("hashes") or []
+    return [{"hash": k, **v} for k, v in obj.items() if isinstance(v, dict)]
+
+def open_phash_store(path: str) -> AppendOnlyStore:
+    """The pHash store at path (snapshot + path.log), shared by phish_api and live_routes; refreshed."""
+    key = os.path.abspath(path)
+    store = _stores.get(key)
+    if store is None:
+        store = _stores[key] = AppendOnlyStore(path, read_snapshot=_read_snapshot, write_snapshot=lambda items: {"hashes": items},
+                                               keys=lambda it: (_hash_of(it),), indent=2)
+    store.refresh()
+    return store
+
+def _get_store() -> AppendOnlyStore:
+    # PHASH_JSON is the snapshot; uploads append to PHASH_JSON + ".log"
     _ensure_files()
-    with open(PHASH_JSON, "r", encoding="utf-8") as f:
-        try:
-            data = json.load(f)
-        except json.JSONDecodeError:
-            data = {"hashes": []}
-    return data
+    return open_phash_store(PHASH_JSON)
 
-def _save(data):
-    with open(PHASH_JSON, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+def _load():
+    return {"hashes": list(_get_store().items)}
 
 @phish_api.route("/dashboard/api/phash/list", methods=["GET"])
 def phash_list():
@@ -64,35 +83,42 @@ def phash_upload():
     if not files:
         return jsonify({"error": "no files"}), 400
 
-    data = _load()
-    known = set([h["hash"] if isinstance(h, dict) else h for h in data.get("hashes", [])])
+    store = _get_store()
+    known = set()
     added, skipped = [], []
 
     for f in files:
         try:
             img = Image.open(f.stream).convert("RGB")
             ph = str(compute_hash(img))
-            if ph in known:
+            if ph in known or ph in store:
                 skipped.append(ph)
                 continue
             item = {"hash": ph, "filename": f.filename, "ts": int(time.time())}
-            data.setdefault("hashes", []).append(item)
             known.add(ph)
             added.append(item)
         except Exception:
             skipped.append(f"{f.filename or 'file'}:error")
             continue
 
-    _save(data)
+    store.extend(added)
+    if added:
+        try:
+            from satpambot.bot.modules.discord_bot.helpers.phash_blocklist import publish_hashes
+            publish_hashes([it["hash"] for it in added], source="phish_api")
+        except Exception:
+            pass
 
     try:
-        with open(HASH_TXT, "w", encoding="utf-8") as out:
-            for it in data["hashes"]:
-                out.write((it["hash"] if isinstance(it, dict) else str(it)) + "\n")
+        # the txt mirror is append-only too; rebuilt in full only when missing/out of sync
+        in_sync = os.path.getsize(HASH_TXT) > 0 or len(store) == len(added)
+        with open(HASH_TXT, "a" if in_sync else "w", encoding="utf-8") as out:
+            for it in (added if in_sync else store.items):
+                out.write(_hash_of(it) + "\n")
     except Exception:
         pass
 
-    return jsonify({"added": added, "skipped": skipped, "total": len(data.get("hashes", []))})
+    return jsonify({"added": added, "skipped": skipped, "total": len(store)})
 
 def register_phish_routes(app):
     app.register_blueprint(phish_api)
@@ -525,6 +525,11 @@ def _phash_blocklist_append(val: Optional[str]) -> int:
     arr = _phash_blocklist_read()
     if val and val not in arr:
         (_phash_blocklist_file()).write_text(json.dumps(arr + [val], indent=2), encoding="utf-8")
+        try:
+            from satpambot.bot.modules.discord_bot.helpers.phash_blocklist import publish_hashes
+            publish_hashes([val], source="webui")
+        except Exception:
+            pass
         return len(arr) + 1
     return len(arr)
 
@@ -62,6 +62,14 @@ except Exception:
 
 
 
+from satpambot.bot.modules.discord_bot.helpers.image_features import ImageFeatures
+
+
+
+
+
+
+
 PHISHY_TLDS = {"ru","tk","ml","ga","cf","gq","top","icu","click","xyz","cn","rest"}
 
 
@@ -206,7 +214,7 @@ def tokenize_text(s: str) -> List[str]:
 
 
 
-    for w in SEED_WORDS:
+    from satpambot.bot.modules.discord_bot.helpers.keyword_scanner import get_keyword_scanner
 
 
 
@@ -214,7 +222,7 @@ def tokenize_text(s: str) -> List[str]:
 
 
 
-        if w in s:
+    for w in sorted(get_keyword_scanner().scan(s).get("seed", ())):
 
 
 
@@ -222,7 +230,7 @@ def tokenize_text(s: str) -> List[str]:
 
 
 
-            out.append("seed:"+w)
+        out.append("seed:"+w)
 
 
 
@@ -247,142 +255,8 @@ def tokenize_text(s: str) -> List[str]:
 
 
 def dhash64(b: bytes) -> Optional[str]:
-
-
-
-
-
-
-
-    if Image is None:
-
-
-
-
-
-
-
-        return None
-
-
-
-
-
-
-
-    try:
-
-
-
-
-
-
-
-        with Image.open(io.BytesIO(b)) as im:
-
-
-
-
-
-
-
-            im = im.convert("L").resize((9,8))
-
-
-
-
-
-
-
-            px = list(im.getdata())
-
-
-
-
-
-
-
-            rows = [px[i*9:(i+1)*9] for i in range(8)]
-
-
-
-
-
-
-
-            bits = 0
-
-
-
-
-
-
-
-            for r in range(8):
-
-
-
-
-
-
-
-                for c in range(8):
-
-
-
-
-
-
-
-                    left = rows[r][c]
-
-
-
-
-
-
-
-                    right = rows[r][c+1]
-
-
-
-
-
-
-
-                    bits = (bits<<1) | (1 if left > right else 0)
-
-
-
-
-
-
-
-            return f"{bits:016x}"
-
-
-
-
-
-
-
-    except Exception:
-
-
-
-
-
-
-
-        return None
-
-
-
-
-
-
-
-
+    f = ImageFeatures.from_bytes(b)
+    return f.dhash64_hex if f is not None else None
 
 
 
@@ -22,7 +22,33 @@ from .state_store_discord import MLState
 
 
 
-from .feature_extractor import extract_tokens, dhash64, sha1k
+from .feature_extractor import dhash64, sha1k
+
+
+
+
+
+
+
+from satpambot.bot.modules.discord_bot.helpers.message_analysis import analyze
+
+
+
+
+
+
+
+
+from satpambot.bot.modules.discord_bot.helpers.image_hash_executor import get_image_hash_executor
+
+
+
+
+
+
+
+
+from satpambot.bot.modules.discord_bot.helpers.attachment_cache import get_attachment_cache
 
 
 
@@ -302,7 +328,7 @@ class GuardAdvisor:
 
 
 
-                    b = await a.read()
+                    entry = await get_attachment_cache().get(a)
 
 
 
@@ -326,7 +352,7 @@ class GuardAdvisor:
 
 
 
-                h1 = dhash64(b)
+                if entry.sha1k in set(wl.get("sha1k", [])):
 
 
 
@@ -334,7 +360,7 @@ class GuardAdvisor:
 
 
 
-                if h1 and h1 in set(wl.get("dhash64", [])):
+                    return True
 
 
 
@@ -342,7 +368,7 @@ class GuardAdvisor:
 
 
 
-                    return True
+                h1 = (await get_image_hash_executor().hash_bytes(entry.data, ("dhash64",))).get("dhash64")
 
 
 
@@ -350,7 +376,7 @@ class GuardAdvisor:
 
 
 
-                if sha1k(b) in set(wl.get("sha1k", [])):
+                if h1 and h1 in set(wl.get("dhash64", [])):
 
 
 
@@ -398,7 +424,7 @@ class GuardAdvisor:
 
 
 
-        tokens = extract_tokens(message.content or "", None)
+        tokens = analyze(message).features
 
 
 
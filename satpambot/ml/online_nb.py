@@ -6,7 +6,6 @@ from __future__ import annotations
 
 
 
-import math
 
 
 
@@ -14,15 +13,336 @@ import math
 
 
 
-from collections import defaultdict
 
+import base64, logging, math, os, sys, zlib
 
 
 
 
 
 
-from typing import Dict, Iterable
+
+from array import array
+
+
+
+
+
+
+
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+try:
+
+
+
+
+
+
+
+    import numpy as np  # optional: vectorized predict_proba_batch
+
+
+
+
+
+
+
+except Exception:
+
+
+
+
+
+
+
+    np = None
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+log = logging.getLogger(__name__)
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+# >0: hashing-trick mode with 2**ML_NB_HASH_BITS buckets (bounded memory, constant-size snapshot)
+
+
+
+
+
+
+
+HASH_BITS = int(os.getenv("ML_NB_HASH_BITS", "0"))
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+def _bucket(t: str, mask: int) -> int:
+
+
+
+
+
+
+
+    # crc32 is stable across processes (str hash() is salted), so buckets survive a snapshot
+
+
+
+
+
+
+
+    return zlib.crc32(t.encode("utf-8", "surrogatepass")) & mask
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+def _pack(counts: array) -> str:
+
+
+
+
+
+
+
+    a = array("i", counts)
+
+
+
+
+
+
+
+    if sys.byteorder == "big":
+
+
+
+
+
+
+
+        a.byteswap()
+
+
+
+
+
+
+
+    return base64.b64encode(a.tobytes()).decode("ascii")
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+def _unpack(s: str) -> array:
+
+
+
+
+
+
+
+    a = array("i")
+
+
+
+
+
+
+
+    a.frombytes(base64.b64decode(s))
+
+
+
+
+
+
+
+    if sys.byteorder == "big":
+
+
+
+
+
+
+
+        a.byteswap()
+
+
+
+
+
+
+
+    return array("l", a)
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+def _increments(cur: array, old: array, n_old: int) -> List[tuple]:
+
+
+
+
+
+
+
+    """(index, cur - old) for every changed slot; slots past n_old count from 0."""
+
+
+
+
+
+
+
+    if np is not None:
+
+
+
+
+
+
+
+        dt = np.dtype(f"i{cur.itemsize}")
+
+
+
+
+
+
+
+        c = np.frombuffer(cur, dtype=dt)
+
+
+
+
+
+
+
+        o = np.zeros(len(c), dtype=dt)
+
+
+
+
+
+
+
+        o[:n_old] = np.frombuffer(old, dtype=dt, count=n_old)
+
+
+
+
+
+
+
+        diff = c - o
+
+
+
+
+
+
+
+        idx = np.flatnonzero(diff)
+
+
+
+
+
+
+
+        return list(zip(idx.tolist(), diff[idx].tolist()))
+
+
+
+
+
+
+
+    return [(i, c - (old[i] if i < n_old else 0)) for i, c in enumerate(cur) if c != (old[i] if i < n_old else 0)]
 
 
 
@@ -46,77 +366,1543 @@ class OnlineNB:
 
 
 
-    def __init__(self, alpha: float = 1.0):
+    """Multinomial naive Bayes, learned one message at a time.
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+    Tokens are interned to integer ids. Per-class counts live in array('l')
+
+
+
+
+
+
+
+    indexed by id, with log(count + alpha) next to them in array('d'), updated
+
+
+
+
+
+
+
+    only for the tokens a learn() touches. log(total + alpha*V) and the log
+
+
+
+
+
+
+
+    priors are cached until the next learn(), so a prediction is one dict
+
+
+
+
+
+
+
+    lookup and two array reads per token. to_dict()/from_dict() keep the
+
+
+
+
+
+
+
+    string-keyed snapshot format.
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+    With hash_bits=k (default ML_NB_HASH_BITS) tokens are hashed into 2**k
+
+
+
+
+
+
+
+    fixed buckets instead of interned: memory and snapshot size stop growing
+
+
+
+
+
+
+
+    with every random string a spammer posts, and colliding tokens share a
+
+
+
+
+
+
+
+    count. V (smoothing) is then the number of non-empty buckets.
+
+
+
+
+
+
+
+    benchmarks/nb_hashing_eval.py measures what a given k costs.
+
+
+
+
+
+
+
+    """
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+    def __init__(self, alpha: float = 1.0, hash_bits: Optional[int] = None):
+
+
+
+
+
+
+
+        self.alpha = alpha
+
+
+
+
+
+
+
+        self.hash_bits = HASH_BITS if hash_bits is None else int(hash_bits)
+
+
+
+
+
+
+
+        self._ids: Dict[str, int] = {}
+
+
+
+
+
+
+
+        self._vocab: List[str] = []  # id -> token
+
+
+
+
+
+
+
+        if self.hash_bits:
+
+
+
+
+
+
+
+            n = 1 << self.hash_bits
+
+
+
+
+
+
+
+            self._mask = n - 1
+
+
+
+
+
+
+
+            self._pos = array("l", bytes(n * array("l").itemsize))
+
+
+
+
+
+
+
+            self._neg = array("l", bytes(n * array("l").itemsize))
+
+
+
+
+
+
+
+            self._lpos = array("d", [self._log_a]) * n
+
+
+
+
+
+
+
+            self._lneg = array("d", [self._log_a]) * n
+
+
+
+
+
+
+
+        else:
+
+
+
+
+
+
+
+            self._mask = 0
+
+
+
+
+
+
+
+            self._pos = array("l")
+
+
+
+
+
+
+
+            self._neg = array("l")
+
+
+
+
+
+
+
+            self._lpos = array("d")  # log(pos count + alpha)
+
+
+
+
+
+
+
+            self._lneg = array("d")
+
+
+
+
+
+
+
+        self._used = 0  # non-empty buckets (hash mode)
+
+
+
+
+
+
+
+        self.pos_total = 0
+
+
+
+
+
+
+
+        self.neg_total = 0
+
+
+
+
+
+
+
+        self.pos_docs = 0
+
+
+
+
+
+
+
+        self.neg_docs = 0
+
+
+
+
+
+
+
+        self._cache: Optional[tuple] = None  # (log prior pos, log prior neg, log denom pos, log denom neg)
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+    @property
+
+
+
+
+
+
+
+    def vocab_size(self) -> int:
+
+
+
+
+
+
+
+        return self._used if self.hash_bits else len(self._ids)
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+    def _intern(self, t: str) -> int:
+
+
+
+
+
+
+
+        if self.hash_bits:
+
+
+
+
+
+
+
+            return _bucket(t, self._mask)
+
+
+
+
+
+
+
+        i = self._ids.get(t)
+
+
+
+
+
+
+
+        if i is None:
+
+
+
+
+
+
+
+            i = self._ids[t] = len(self._ids)
+
+
+
+
+
+
+
+            self._vocab.append(t)
+
+
+
+
+
+
+
+            self._pos.append(0)
+
+
+
+
+
+
+
+            self._neg.append(0)
+
+
+
+
+
+
+
+            self._lpos.append(self._log_a)
+
+
+
+
+
+
+
+            self._lneg.append(self._log_a)
+
+
+
+
+
+
+
+        return i
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+    @property
+
+
+
+
+
+
+
+    def _log_a(self) -> float:
+
+
+
+
+
+
+
+        return math.log(self.alpha)
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+    def learn(self, tokens: Iterable[str], label: str):
+
+
+
+
+
+
+
+        tokens = [t for t in tokens if t]
+
+
+
+
+
+
+
+        if not tokens:
+
+
+
+
+
+
+
+            return
+
+
+
+
+
+
+
+        counts, logs = (self._pos, self._lpos) if label == "phish" else (self._neg, self._lneg)
+
+
+
+
+
+
+
+        self._add_counts(((self._intern(t), 1) for t in tokens), counts, logs)
+
+
+
+
+
+
+
+        if label == "phish":
+
+
+
+
+
+
+
+            self.pos_total += len(tokens)
+
+
+
+
+
+
+
+            self.pos_docs += 1
+
+
+
+
+
+
+
+        else:
+
+
+
+
+
+
+
+            self.neg_total += len(tokens)
+
+
+
+
+
+
+
+            self.neg_docs += 1
+
+
+
+
+
+
+
+        self._cache = None
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+    def _add_counts(self, pairs: Iterable[tuple], counts: array, logs: array) -> None:
+
+
+
+
+
+
+
+        a = self.alpha
+
+
+
+
+
+
+
+        other = self._neg if counts is self._pos else self._pos
+
+
+
+
+
+
+
+        hashed = bool(self.hash_bits)
+
+
+
+
+
+
+
+        for i, c in pairs:
+
+
+
+
+
+
+
+            if hashed and not counts[i] and not other[i]:
+
+
+
+
+
+
+
+                self._used += 1
+
+
+
+
+
+
+
+            counts[i] += c
+
+
+
+
+
+
+
+            logs[i] = math.log(counts[i] + a)
+
+
+
+
+
+
+
+        self._cache = None
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+    def _constants(self) -> tuple:
+
+
+
+
+
+
+
+        if self._cache is None:
+
+
+
+
+
+
+
+            total_docs = self.pos_docs + self.neg_docs
+
+
+
+
+
+
+
+            prior_pos = 0.5 if total_docs == 0 else self.pos_docs / total_docs
+
+
+
+
+
+
+
+            prior_neg = 0.5 if total_docs == 0 else self.neg_docs / total_docs
+
+
+
+
+
+
+
+            V = max(1, self.vocab_size)
+
+
+
+
+
+
+
+            a = self.alpha
+
+
+
+
+
+
+
+            self._cache = (
+
+
+
+
+
+
+
+                math.log(prior_pos if prior_pos > 0 else 1e-9),
+
+
+
+
+
+
+
+                math.log(prior_neg if prior_neg > 0 else 1e-9),
+
+
+
+
+
+
+
+                math.log(self.pos_total + a * V),
+
+
+
+
+
+
+
+                math.log(self.neg_total + a * V),
+
+
+
+
+
+
+
+            )
+
+
+
+
+
+
+
+        return self._cache
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+    def _log_prob(self, tokens: Iterable[str], label: str) -> float:
+
+
+
+
+
+
+
+        lp_pos, lp_neg = self._log_probs([t for t in tokens if t])
+
+
+
+
+
+
+
+        return lp_pos if label == "phish" else lp_neg
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+    def _log_probs(self, tokens: Sequence[str]) -> tuple:
+
+
+
+
+
+
+
+        prior_pos, prior_neg, den_pos, den_neg = self._constants()
+
+
+
+
+
+
+
+        ids, lpos, lneg = self._ids, self._lpos, self._lneg
+
+
+
+
+
+
+
+        lp_pos = prior_pos - den_pos * len(tokens)
+
+
+
+
+
+
+
+        lp_neg = prior_neg - den_neg * len(tokens)
+
+
+
+
+
+
+
+        if self.hash_bits:
+
+
+
+
+
+
+
+            mask = self._mask
+
+
+
+
+
+
+
+            for t in tokens:
+
+
+
+
+
+
+
+                i = _bucket(t, mask)
+
+
+
+
+
+
+
+                lp_pos += lpos[i]
+
+
+
+
+
+
+
+                lp_neg += lneg[i]
+
+
+
+
+
+
+
+            return lp_pos, lp_neg
+
+
+
+
+
+
+
+        unseen = 0
+
+
+
+
+
+
+
+        for t in tokens:
+
+
+
+
+
+
+
+            i = ids.get(t)
+
+
+
+
+
+
+
+            if i is None:
+
+
+
+
+
+
+
+                unseen += 1
+
+
+
+
+
+
+
+            else:
+
+
+
+
+
+
+
+                lp_pos += lpos[i]
+
+
+
+
+
+
+
+                lp_neg += lneg[i]
+
+
+
+
+
+
+
+        if unseen:
+
+
+
+
+
+
+
+            lp_pos += unseen * self._log_a
+
+
+
+
+
+
+
+            lp_neg += unseen * self._log_a
+
+
+
+
+
+
+
+        return lp_pos, lp_neg
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+    @staticmethod
+
+
+
+
+
+
+
+    def _normalize(lp_pos: float, lp_neg: float) -> Dict[str, float]:
+
+
+
+
+
+
+
+        m = max(lp_pos, lp_neg)
+
+
+
+
+
+
+
+        p_pos = math.exp(lp_pos - m)
+
+
+
+
+
+
+
+        p_neg = math.exp(lp_neg - m)
+
+
+
+
+
+
+
+        Z = p_pos + p_neg
+
+
+
+
+
+
+
+        return {"phish": p_pos / Z, "safe": p_neg / Z}
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+    def predict_proba(self, tokens: Iterable[str]) -> Dict[str, float]:
+
+
+
+
+
+
+
+        tokens = [t for t in tokens if t]
+
+
+
+
+
+
+
+        if not tokens:
+
+
+
+
+
+
+
+            return {"phish": 0.5, "safe": 0.5}
+
+
+
+
+
+
+
+        return self._normalize(*self._log_probs(tokens))
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+    def predict_proba_batch(self, docs: Iterable[Iterable[str]]) -> List[Dict[str, float]]:
+
+
+
+
+
+
+
+        """predict_proba for many token lists; one vectorized pass when numpy is available."""
+
+
+
+
+
+
+
+        docs = [[t for t in d if t] for d in docs]
+
+
+
+
+
+
+
+        if np is None or len(docs) < 8:
+
+
+
+
+
+
+
+            return [self.predict_proba(d) for d in docs]
+
+
+
+
+
+
+
+        prior_pos, prior_neg, den_pos, den_neg = self._constants()
+
+
+
+
+
+
+
+        V = len(self._pos)
+
+
+
+
+
+
+
+        # log(count + alpha) tables; slot V stands for unseen tokens
+
+
+
+
+
+
+
+        tab_pos = np.append(np.frombuffer(self._lpos, dtype=np.float64, count=V), self._log_a)
+
+
+
+
+
+
+
+        tab_neg = np.append(np.frombuffer(self._lneg, dtype=np.float64, count=V), self._log_a)
+
+
+
+
+
+
+
+        if self.hash_bits:
+
+
+
+
+
+
+
+            mask = self._mask
+
+
+
+
+
+
+
+            index = lambda t: _bucket(t, mask)
+
+
+
+
+
+
+
+        else:
+
+
+
+
+
+
+
+            get = self._ids.get
+
+
+
+
+
+
+
+            index = lambda t: get(t, V)
+
+
+
+
+
+
+
+        lens = np.array([len(d) for d in docs], dtype=np.int64)
+
+
+
+
+
+
+
+        flat = np.array([index(t) for d in docs for t in d], dtype=np.int64)
+
+
+
+
+
+
+
+        doc_of = np.repeat(np.arange(len(docs)), lens)
+
+
+
+
+
+
+
+        lp_pos = np.bincount(doc_of, weights=tab_pos[flat], minlength=len(docs)) + prior_pos - den_pos * lens
+
+
+
+
+
+
+
+        lp_neg = np.bincount(doc_of, weights=tab_neg[flat], minlength=len(docs)) + prior_neg - den_neg * lens
+
+
+
+
+
+
+
+        return [self._normalize(p, n) if k else {"phish": 0.5, "safe": 0.5}
+
+
+
+
+
+
+
+                for p, n, k in zip(lp_pos.tolist(), lp_neg.tolist(), lens.tolist())]
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+    # --- delta helpers (state_store_discord uploads only what changed) ---
+
+
+
+
+
+
+
+    def mark(self) -> tuple:
+
+
+
+
+
+
+
+        """Opaque copy of the counters; delta_since(mark) lists what was learned after it."""
+
+
+
+
+
+
+
+        return (len(self._pos), array("l", self._pos), array("l", self._neg),
+
+
+
+
+
+
+
+                self.pos_total, self.neg_total, self.pos_docs, self.neg_docs)
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+    def delta_since(self, mark: tuple) -> Optional[Dict[str, Any]]:
+
+
+
+
+
+
+
+        """New tokens and count increments since mark ({} when nothing changed), None if counts went down.
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+        Hash mode keys the increments by bucket number instead of token."""
+
+
+
+
+
+
+
+        V0, pos0, neg0, pos_total, neg_total, pos_docs, neg_docs = mark
+
+
+
+
+
+
+
+        out: Dict[str, Any] = {}
+
+
+
+
+
+
+
+        key_of = str if self.hash_bits else self._vocab.__getitem__
+
+
+
+
+
+
+
+        for key, cur, old in (("pos_counts", self._pos, pos0), ("neg_counts", self._neg, neg0)):
+
+
+
+
+
+
+
+            inc = {}
+
 
 
 
 
 
 
+            for i, d in _increments(cur, old, V0):
 
-        self.alpha = alpha
 
 
 
 
 
 
+                if d < 0:
 
-        self.pos_counts = defaultdict(int)
 
 
 
 
 
 
+                    return None
 
-        self.neg_counts = defaultdict(int)
 
 
 
 
 
 
+                inc[key_of(i)] = d
 
-        self.pos_total = 0
 
 
 
 
 
 
+            if inc:
 
-        self.neg_total = 0
 
 
 
 
 
 
+                out[key] = inc
 
-        self.pos_docs = 0
 
 
 
 
 
 
+        if len(self._pos) > V0:
 
-        self.neg_docs = 0
 
 
 
 
 
 
+            out["vocab"] = self._vocab[V0:]
 
-        self.vocab = set()
 
 
 
 
 
 
+        for key, old in (("pos_total", pos_total), ("neg_total", neg_total), ("pos_docs", pos_docs), ("neg_docs", neg_docs)):
 
 
 
@@ -124,38 +1910,39 @@ class OnlineNB:
 
 
 
+            d = getattr(self, key) - old
 
 
-    def _update_vocab(self, tokens: Iterable[str]):
 
 
 
 
 
+            if d < 0:
 
 
-        for t in tokens:
 
 
 
 
 
+                return None
 
 
-            if t:
 
 
 
 
 
+            if d:
 
 
-                self.vocab.add(t)
 
 
 
 
 
+                out[key] = d
 
 
 
@@ -163,26 +1950,26 @@ class OnlineNB:
 
 
 
+        if out and self.hash_bits:
 
 
 
-    def learn(self, tokens: Iterable[str], label: str):
 
 
 
 
+            out["hash_bits"] = self.hash_bits
 
 
 
-        tokens = [t for t in tokens if t]
 
 
 
 
+        return out
 
 
 
-        if not tokens:
 
 
 
@@ -190,95 +1977,94 @@ class OnlineNB:
 
 
 
-            return
 
 
 
 
 
+    def apply_delta(self, d: Dict[str, Any]) -> None:
 
 
-        self._update_vocab(tokens)
 
 
 
 
 
+        if d and int(d.get("hash_bits", 0)) != self.hash_bits:
 
 
-        if label == "phish":
 
 
 
 
 
+            raise ValueError(f"delta for hash_bits={d.get('hash_bits', 0)}, model has hash_bits={self.hash_bits}")
 
 
-            for t in tokens:
 
 
 
 
 
+        for t in d.get("vocab", []):
 
 
-                self.pos_counts[t] += 1
 
 
 
 
 
+            self._intern(t)
 
 
-                self.pos_total += 1
 
 
 
 
 
+        index = int if self.hash_bits else self._intern
 
 
-            self.pos_docs += 1
 
 
 
 
 
+        for key, counts, logs in (("pos_counts", self._pos, self._lpos), ("neg_counts", self._neg, self._lneg)):
 
 
-        else:
 
 
 
 
 
+            self._add_counts(((index(t), int(c)) for t, c in (d.get(key) or {}).items()), counts, logs)
 
 
-            for t in tokens:
 
 
 
 
 
+        for key in ("pos_total", "neg_total", "pos_docs", "neg_docs"):
 
 
-                self.neg_counts[t] += 1
 
 
 
 
 
+            setattr(self, key, getattr(self, key) + int(d.get(key, 0)))
 
 
-                self.neg_total += 1
 
 
 
 
 
+        self._cache = None
 
 
-            self.neg_docs += 1
 
 
 
@@ -292,94 +2078,95 @@ class OnlineNB:
 
 
 
+    # --- snapshot helpers (string-keyed, same format as before) ---
 
 
-    def _log_prob(self, tokens: Iterable[str], label: str) -> float:
 
 
 
 
 
+    def to_dict(self) -> Dict:
 
 
-        total_docs = self.pos_docs + self.neg_docs
 
 
 
 
 
+        if self.hash_bits:
 
 
-        prior = 0.5 if total_docs == 0 else ((self.pos_docs if label=='phish' else self.neg_docs) / total_docs)
 
 
 
 
 
+            # dense int32 buckets: the size depends on hash_bits only
 
 
-        counts, total = (self.pos_counts, self.pos_total) if label=='phish' else (self.neg_counts, self.neg_total)
 
 
 
 
 
+            return {
 
 
-        V = max(1, len(self.vocab))
 
 
 
 
 
+                "alpha": self.alpha,
 
 
-        a = self.alpha
 
 
 
 
 
+                "hash_bits": self.hash_bits,
 
 
-        logp = math.log(prior if prior>0 else 1e-9)
 
 
 
 
 
+                "pos_buckets": _pack(self._pos),
 
 
-        for t in tokens:
 
 
 
 
 
+                "neg_buckets": _pack(self._neg),
 
 
-            c = counts.get(t, 0)
 
 
 
 
 
+                "pos_total": self.pos_total,
 
 
-            logp += math.log((c + a) / (total + a * V))
 
 
 
 
 
+                "neg_total": self.neg_total,
 
 
-        return logp
 
 
 
 
 
+                "pos_docs": self.pos_docs,
 
 
 
@@ -387,82 +2174,343 @@ class OnlineNB:
 
 
 
+                "neg_docs": self.neg_docs,
 
 
 
-    def predict_proba(self, tokens: Iterable[str]) -> Dict[str, float]:
 
 
 
 
+            }
 
 
 
-        tokens = [t for t in tokens if t]
 
 
 
 
+        toks = list(self._vocab)
 
 
 
-        if not tokens:
 
 
 
 
+        return {
 
 
 
-            return {'phish': 0.5, 'safe': 0.5}
 
 
 
 
+            "alpha": self.alpha,
 
 
 
-        lp_pos = self._log_prob(tokens, 'phish')
 
 
 
 
+            "pos_counts": {t: c for t, c in zip(toks, self._pos) if c},
 
 
 
-        lp_neg = self._log_prob(tokens, 'safe')
 
 
 
 
+            "neg_counts": {t: c for t, c in zip(toks, self._neg) if c},
 
 
 
-        m = max(lp_pos, lp_neg)
 
 
 
 
+            "pos_total": self.pos_total,
 
 
 
-        p_pos = math.exp(lp_pos - m)
 
 
 
 
+            "neg_total": self.neg_total,
 
 
 
-        p_neg = math.exp(lp_neg - m)
 
 
 
 
+            "pos_docs": self.pos_docs,
 
 
 
-        Z = p_pos + p_neg
+
+
+
+
+            "neg_docs": self.neg_docs,
+
+
+
+
+
+
+
+            "vocab": toks,
+
+
+
+
+
+
+
+        }
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+    @classmethod
+
+
+
+
+
+
+
+    def from_dict(cls, d: Dict, hash_bits: Optional[int] = None) -> "OnlineNB":
+
+
+
+
+
+
+
+        """A hashed snapshot stays hashed. A token snapshot is hashed into buckets when hash_bits
+
+
+
+
+
+
+
+        (default ML_NB_HASH_BITS) is set, giving the same counts hash mode would have learned."""
+
+
+
+
+
+
+
+        if d.get("hash_bits"):
+
+
+
+
+
+
+
+            bits = int(d["hash_bits"])
+
+
+
+
+
+
+
+            arrays = {key: _unpack(d.get(key) or "") for key in ("pos_buckets", "neg_buckets")}
+
+
+
+
+
+
+
+            sizes = {len(b) for b in arrays.values() if len(b)}
+
+
+
+
+
+
+
+            if sizes and sizes != {1 << bits}:
+
+
+
+
+
+
+
+                n = sizes.pop()
+
+
+
+
+
+
+
+                if sizes or n & (n - 1):
+
+
+
+
+
+
+
+                    raise ValueError(f"hashed snapshot: bucket arrays of {sorted(sizes | {n})} for hash_bits={bits}")
+
+
+
+
+
+
+
+                # the arrays are what was learned: keep their bucket count rather than drop them
+
+
+
+
+
+
+
+                log.warning("[online_nb] snapshot says hash_bits=%d but holds %d buckets; loading it with hash_bits=%d",
+
+
+
+
+
+
+
+                            bits, n, n.bit_length() - 1)
+
+
+
+
+
+
+
+                bits = n.bit_length() - 1
+
+
+
+
+
+
+
+            m = cls(alpha=d.get("alpha", 1.0), hash_bits=bits)
+
+
+
+
+
+
+
+            for key, counts, logs in (("pos_buckets", m._pos, m._lpos), ("neg_buckets", m._neg, m._lneg)):
+
+
+
+
+
+
+
+                m._add_counts(((i, c) for i, c in enumerate(arrays[key]) if c), counts, logs)
+
+
+
+
+
+
+
+        else:
+
+
+
+
+
+
+
+            m = cls(alpha=d.get("alpha", 1.0), hash_bits=hash_bits)
+
+
+
+
+
+
+
+            for t in d.get("vocab", []):
+
+
+
+
+
+
+
+                m._intern(t)
+
+
+
+
+
+
+
+            m._add_counts(((m._intern(t), int(c)) for t, c in (d.get("pos_counts") or {}).items()), m._pos, m._lpos)
+
+
+
+
+
+
+
+            m._add_counts(((m._intern(t), int(c)) for t, c in (d.get("neg_counts") or {}).items()), m._neg, m._lneg)
+
+
+
+
+
+
+
+        m.pos_total = d.get("pos_total", 0)
+
+
+
+
+
+
+
+        m.neg_total = d.get("neg_total", 0)
+
+
+
+
+
+
+
+        m.pos_docs = d.get("pos_docs", 0)
+
+
+
+
+
+
+
+        m.neg_docs = d.get("neg_docs", 0)
 
 
 
@@ -470,7 +2518,7 @@ class OnlineNB:
 
 
 
-        return {'phish': p_pos / Z, 'safe': p_neg / Z}
+        return m
 
 
 
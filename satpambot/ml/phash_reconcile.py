@@ -38,6 +38,23 @@ from .feature_extractor import dhash64
 
 
 
+from satpambot.bot.modules.discord_bot.helpers.hash_index import HashIndex
+
+
+
+
+
+
+
+
+from satpambot.bot.modules.discord_bot.helpers.image_hash_executor import get_image_hash_executor
+
+
+
+
+
+
+
 
 
 
@@ -398,7 +415,7 @@ async def collect_image_hashes_from_thread(th: discord.Thread, limit_msgs: int =
 
 
 
-                h = dhash64(b)
+                h = (await get_image_hash_executor().hash_bytes(b, ("dhash64",))).get("dhash64")
 
 
 
@@ -439,98 +456,10 @@ async def collect_image_hashes_from_thread(th: discord.Thread, limit_msgs: int =
 
 
 def split_false_positives(log_hashes: Set[str], phish_hashes: Set[str], ham_thr: int = 6) -> Tuple[Set[str], Set[str]]:
-
-
-
-
-
-
-
     tps: Set[str] = set()
-
-
-
-
-
-
-
     fps: Set[str] = set()
-
-
-
-
-
-
-
-    for h in log_hashes:
-
-
-
-
-
-
-
-        matched = False
-
-
-
-
-
-
-
-        for p in phish_hashes:
-
-
-
-
-
-
-
-            dv = hamming_hex(h, p)
-
-
-
-
-
-
-
-            if dv is not None and dv <= ham_thr:
-
-
-
-
-
-
-
-                matched = True
-
-
-
-
-
-
-
-                break
-
-
-
-
-
-
-
+    queries = list(log_hashes)
+    hits = HashIndex(phish_hashes).hits(queries, max_distance=ham_thr)
+    for h, matched in zip(queries, hits):
         (tps if matched else fps).add(h)
-
-
-
-
-
-
-
     return tps, fps
-
-
-
-
-
-
-
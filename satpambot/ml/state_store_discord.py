@@ -6,7 +6,7 @@ from __future__ import annotations
 
 
 
-import asyncio, io, gzip, json, datetime
+import asyncio, io, gzip, hashlib, json, datetime, logging, os
 
 
 
@@ -14,7 +14,15 @@ import asyncio, io, gzip, json, datetime
 
 
 
-from typing import Optional, Dict, Any, List
+from pathlib import Path
+
+
+
+
+
+
+
+from typing import Optional, Dict, Any, List, Tuple
 
 
 
@@ -38,6 +46,22 @@ import discord
 
 
 
+log = logging.getLogger(__name__)
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
 SNAPSHOT_PREFIX = "mlsnap_"
 
 
@@ -46,6 +70,22 @@ SNAPSHOT_PREFIX = "mlsnap_"
 
 
 
+DELTA_PREFIX = "mldelta_"
+
+
+
+
+
+
+
+MANIFEST_HEADER = "ML state manifest"
+
+
+
+
+
+
+
 MAX_MESSAGES_SCAN = 250
 
 
@@ -70,7 +110,7 @@ MAX_ATTACH_PER_MSG = 2
 
 
 
-CHAN_CANDIDATES = ["log-botphising","log-botphishing","log-satpam","log-satpam-bot"]
+# Snapshot engine: one full base + a chain of small deltas, indexed by a pinned manifest message.
 
 
 
@@ -78,7 +118,7 @@ CHAN_CANDIDATES = ["log-botphising","log-botphishing","log-satpam","log-satpam-b
 
 
 
-THREAD_PHISH = ["imagephising","image-phising","imagephishing","image-phishing"]
+#   base   mlsnap_<ts>.json.gz   whole CombinedState; also cached in ML_STATE_DIR/base.json.gz
 
 
 
@@ -86,7 +126,7 @@ THREAD_PHISH = ["imagephising","image-phising","imagephishing","image-phishing"]
 
 
 
-THREAD_WL = ["whitelist","white-list","wl-"]
+#   delta  mldelta_<id>.json.gz  new tokens + count increments, added whitelist hashes, changed exempt lists
 
 
 
@@ -94,7 +134,7 @@ THREAD_WL = ["whitelist","white-list","wl-"]
 
 
 
-THREAD_BANLOG = ["ban-log","log-ban","banlog"]
+#   manifest (pinned, edited in place): {"base": [msg_id, base_id], "deltas": [[msg_id, delta_id], ...]}
 
 
 
@@ -102,7 +142,7 @@ THREAD_BANLOG = ["ban-log","log-ban","banlog"]
 
 
 
-THREAD_BLACKLIST = ["blacklist","black-list"]
+# ids are content hashes, so an identical delta is never uploaded twice and a base that matches the local
 
 
 
@@ -110,7 +150,7 @@ THREAD_BLACKLIST = ["blacklist","black-list"]
 
 
 
-THREAD_STATE = ["ml-state"]
+# cache is not downloaded. After ML_DELTA_COMPACT deltas (or a change a delta cannot express, e.g. a removed
 
 
 
@@ -118,6 +158,7 @@ THREAD_STATE = ["ml-state"]
 
 
 
+# whitelist hash) the next save uploads a fresh base. Boot = pins() + base (usually local) + a few deltas;
 
 
 
@@ -125,32 +166,32 @@ THREAD_STATE = ["ml-state"]
 
 
 
+# threads without a manifest fall back to the old history scan.
 
-class CombinedState:
 
 
 
 
 
 
+ML_STATE_DIR = Path(os.getenv("ML_STATE_DIR", "data/ml_state"))
 
-    def __init__(self):
 
 
 
 
 
 
+ML_DELTA_COMPACT = int(os.getenv("ML_DELTA_COMPACT", "20"))
 
-        self.model_dict: Dict[str, Any] = {}
 
 
 
 
 
 
+ML_LOAD_RETRIES = max(1, int(os.getenv("ML_LOAD_RETRIES", "3")))  # manifest loads retried on transient errors
 
-        self.whitelist = {"dhash64": [], "sha1k": []}
 
 
 
@@ -158,7 +199,6 @@ class CombinedState:
 
 
 
-        self.exempt = {"threads": [], "channels": []}
 
 
 
@@ -166,6 +206,7 @@ class CombinedState:
 
 
 
+def _content_id(obj: Any) -> str:
 
 
 
@@ -173,8 +214,8 @@ class CombinedState:
 
 
 
+    return hashlib.sha256(json.dumps(obj, sort_keys=True, separators=(",", ":")).encode("utf-8")).hexdigest()[:16]
 
-    def to_json_bytes(self) -> bytes:
 
 
 
@@ -182,7 +223,6 @@ class CombinedState:
 
 
 
-        data = {"version": 4, "model": self.model_dict, "whitelist": self.whitelist, "exempt": self.exempt}
 
 
 
@@ -190,7 +230,7 @@ class CombinedState:
 
 
 
-        js = json.dumps(data).encode("utf-8")
+def _gz(obj: Any) -> bytes:
 
 
 
@@ -198,7 +238,7 @@ class CombinedState:
 
 
 
-        return gzip.compress(js)
+    return gzip.compress(json.dumps(obj, separators=(",", ":")).encode("utf-8"), mtime=0)
 
 
 
@@ -214,7 +254,7 @@ class CombinedState:
 
 
 
-    @classmethod
+CHAN_CANDIDATES = ["log-botphising","log-botphishing","log-satpam","log-satpam-bot"]
 
 
 
@@ -222,7 +262,7 @@ class CombinedState:
 
 
 
-    def from_json_bytes(cls, b: bytes) -> "CombinedState":
+THREAD_PHISH = ["imagephising","image-phising","imagephishing","image-phishing"]
 
 
 
@@ -230,7 +270,7 @@ class CombinedState:
 
 
 
-        d = json.loads(gzip.decompress(b).decode("utf-8"))
+THREAD_WL = ["whitelist","white-list","wl-"]
 
 
 
@@ -238,7 +278,7 @@ class CombinedState:
 
 
 
-        cs = cls()
+THREAD_BANLOG = ["ban-log","log-ban","banlog"]
 
 
 
@@ -246,7 +286,7 @@ class CombinedState:
 
 
 
-        cs.model_dict = d.get("model", {})
+THREAD_BLACKLIST = ["blacklist","black-list"]
 
 
 
@@ -254,7 +294,7 @@ class CombinedState:
 
 
 
-        cs.whitelist = d.get("whitelist", {"dhash64": [], "sha1k": []})
+THREAD_STATE = ["ml-state"]
 
 
 
@@ -262,7 +302,6 @@ class CombinedState:
 
 
 
-        cs.exempt = d.get("exempt", {"threads": [], "channels": []})
 
 
 
@@ -270,7 +309,8 @@ class CombinedState:
 
 
 
-        return cs
+
+class CombinedState:
 
 
 
@@ -278,6 +318,7 @@ class CombinedState:
 
 
 
+    def __init__(self):
 
 
 
@@ -285,24 +326,24 @@ class CombinedState:
 
 
 
+        self.model_dict: Dict[str, Any] = {}
 
-class MLState:
 
 
 
 
 
 
+        self.whitelist = {"dhash64": [], "sha1k": []}
 
-    def __init__(self, bot: discord.Client):
 
 
 
 
 
 
+        self.exempt = {"threads": [], "channels": []}
 
-        self.bot = bot
 
 
 
@@ -310,7 +351,6 @@ class MLState:
 
 
 
-        self.parent_channel_id: Optional[int] = None
 
 
 
@@ -318,7 +358,7 @@ class MLState:
 
 
 
-        self.thread_id: Optional[int] = None
+    def to_data(self) -> Dict[str, Any]:
 
 
 
@@ -326,7 +366,7 @@ class MLState:
 
 
 
-        self.combined = CombinedState()
+        return {"version": 4, "model": self.model_dict, "whitelist": self.whitelist, "exempt": self.exempt}
 
 
 
@@ -334,7 +374,6 @@ class MLState:
 
 
 
-        self.model = None  # OnlineNB
 
 
 
@@ -343,6 +382,7 @@ class MLState:
 
 
 
+    def to_json_bytes(self) -> bytes:
 
 
 
@@ -350,7 +390,7 @@ class MLState:
 
 
 
-    def _name_has_any(self, name: str, keys: List[str]) -> bool:
+        return _gz(self.to_data())
 
 
 
@@ -358,7 +398,6 @@ class MLState:
 
 
 
-        n = (name or "").lower()
 
 
 
@@ -366,8 +405,8 @@ class MLState:
 
 
 
-        return any(k in n for k in keys)
 
+    @classmethod
 
 
 
@@ -375,6 +414,7 @@ class MLState:
 
 
 
+    def from_json_bytes(cls, b: bytes) -> "CombinedState":
 
 
 
@@ -382,7 +422,7 @@ class MLState:
 
 
 
-    def find_log_channel(self) -> Optional[discord.TextChannel]:
+        d = json.loads(gzip.decompress(b).decode("utf-8"))
 
 
 
@@ -390,7 +430,7 @@ class MLState:
 
 
 
-        for ch in self.bot.get_all_channels():
+        cs = cls()
 
 
 
@@ -398,7 +438,7 @@ class MLState:
 
 
 
-            if isinstance(ch, discord.TextChannel):
+        cs.model_dict = d.get("model", {})
 
 
 
@@ -406,7 +446,7 @@ class MLState:
 
 
 
-                if self._name_has_any(ch.name, CHAN_CANDIDATES):
+        cs.whitelist = d.get("whitelist", {"dhash64": [], "sha1k": []})
 
 
 
@@ -414,7 +454,7 @@ class MLState:
 
 
 
-                    return ch
+        cs.exempt = d.get("exempt", {"threads": [], "channels": []})
 
 
 
@@ -422,7 +462,7 @@ class MLState:
 
 
 
-        return None
+        return cs
 
 
 
@@ -438,7 +478,7 @@ class MLState:
 
 
 
-    def all_active_threads(self) -> List[discord.Thread]:
+    def mark(self) -> Dict[str, Any]:
 
 
 
@@ -446,7 +486,7 @@ class MLState:
 
 
 
-        ths = []
+        return {"whitelist": {k: set(v) for k, v in self.whitelist.items()}, "exempt": json.dumps(self.exempt, sort_keys=True)}
 
 
 
@@ -454,7 +494,6 @@ class MLState:
 
 
 
-        for ch in self.bot.get_all_channels():
 
 
 
@@ -462,48 +501,48 @@ class MLState:
 
 
 
-            if isinstance(ch, discord.TextChannel):
 
+    def delta_since(self, mark: Dict[str, Any]) -> Optional[Dict[str, Any]]:
 
 
 
 
 
 
-                try:
 
+        """Added whitelist hashes and the exempt lists if they changed; None if a hash was removed."""
 
 
 
 
 
 
-                    ths.extend(getattr(ch, "threads", []))
 
+        out: Dict[str, Any] = {}
 
 
 
 
 
 
-                except Exception:
 
+        wl_added = {}
 
 
 
 
 
 
-                    pass
 
+        for k, v in self.whitelist.items():
 
 
 
 
 
 
-        return ths
 
+            old = mark["whitelist"].get(k, set())
 
 
 
@@ -511,6 +550,7 @@ class MLState:
 
 
 
+            if not old <= set(v):
 
 
 
@@ -518,7 +558,7 @@ class MLState:
 
 
 
-    def classify_threads(self):
+                return None
 
 
 
@@ -526,7 +566,7 @@ class MLState:
 
 
 
-        phish = []
+            new = [h for h in v if h not in old]
 
 
 
@@ -534,7 +574,7 @@ class MLState:
 
 
 
-        wl = []
+            if new:
 
 
 
@@ -542,7 +582,7 @@ class MLState:
 
 
 
-        banlog = []
+                wl_added[k] = new
 
 
 
@@ -550,7 +590,7 @@ class MLState:
 
 
 
-        bl = []
+        if wl_added:
 
 
 
@@ -558,7 +598,7 @@ class MLState:
 
 
 
-        state = []
+            out["whitelist"] = wl_added
 
 
 
@@ -566,7 +606,7 @@ class MLState:
 
 
 
-        for th in self.all_active_threads():
+        if json.dumps(self.exempt, sort_keys=True) != mark["exempt"]:
 
 
 
@@ -574,7 +614,7 @@ class MLState:
 
 
 
-            n = (th.name or "").lower()
+            out["exempt"] = self.exempt
 
 
 
@@ -582,7 +622,7 @@ class MLState:
 
 
 
-            if self._name_has_any(n, THREAD_STATE):
+        return out
 
 
 
@@ -590,7 +630,6 @@ class MLState:
 
 
 
-                state.append(th)
 
 
 
@@ -598,63 +637,62 @@ class MLState:
 
 
 
-            if self._name_has_any(n, THREAD_PHISH):
 
+    def apply_delta(self, d: Dict[str, Any]) -> None:
 
 
 
 
 
 
-                phish.append(th)
 
+        for k, v in (d.get("whitelist") or {}).items():
 
 
 
 
 
 
-            if self._name_has_any(n, THREAD_WL):
 
+            cur = self.whitelist.setdefault(k, [])
 
 
 
 
 
 
-                wl.append(th)
 
+            seen = set(cur)
 
 
 
 
 
 
-            if self._name_has_any(n, THREAD_BANLOG):
 
+            cur.extend(h for h in v if h not in seen)
 
 
 
 
 
 
-                banlog.append(th)
 
+        if d.get("exempt") is not None:
 
 
 
 
 
 
-            if self._name_has_any(n, THREAD_BLACKLIST):
 
+            self.exempt = d["exempt"]
 
 
 
 
 
 
-                bl.append(th)
 
 
 
@@ -662,9 +700,9 @@ class MLState:
 
 
 
-        return phish, wl, banlog, bl, state
 
 
+class MLState:
 
 
 
@@ -672,77 +710,77 @@ class MLState:
 
 
 
+    def __init__(self, bot: discord.Client):
 
 
 
 
 
 
-    async def _ensure_thread(self) -> Optional[discord.Thread]:
 
+        self.bot = bot
 
 
 
 
 
 
-        parent = None
 
+        self.parent_channel_id: Optional[int] = None
 
 
 
 
 
 
-        if self.parent_channel_id:
 
+        self.thread_id: Optional[int] = None
 
 
 
 
 
 
-            ch = self.bot.get_channel(self.parent_channel_id)
 
+        self.combined = CombinedState()
 
 
 
 
 
 
-            if isinstance(ch, discord.TextChannel):
 
+        self.model = None  # OnlineNB
 
 
 
 
 
 
-                parent = ch
 
+        self.manifest: Dict[str, Any] = {}
 
 
 
 
 
 
-        if parent is None:
 
+        self._manifest_msg: Optional[discord.Message] = None
 
 
 
 
 
 
-            parent = self.find_log_channel()
 
+        self._marks: Optional[Tuple[tuple, Dict[str, Any]]] = None  # (model mark, combined mark) at last sync
 
 
 
 
 
 
-        if parent is None:
 
 
 
@@ -750,9 +788,9 @@ class MLState:
 
 
 
-            return None
 
 
+    def _name_has_any(self, name: str, keys: List[str]) -> bool:
 
 
 
@@ -760,21 +798,21 @@ class MLState:
 
 
 
+        n = (name or "").lower()
 
 
 
 
 
 
-        if self.thread_id:
 
+        return any(k in n for k in keys)
 
 
 
 
 
 
-            t = self.bot.get_channel(self.thread_id)
 
 
 
@@ -782,55 +820,55 @@ class MLState:
 
 
 
-            if isinstance(t, discord.Thread):
 
 
+    def find_log_channel(self) -> Optional[discord.TextChannel]:
 
 
 
 
 
-                return t
 
 
+        for ch in self.bot.get_all_channels():
 
 
 
 
 
-        for th in getattr(parent, "threads", []):
 
 
+            if isinstance(ch, discord.TextChannel):
 
 
 
 
 
-            if (th.name or "").lower() == "ml-state":
 
 
+                if self._name_has_any(ch.name, CHAN_CANDIDATES):
 
 
 
 
 
-                self.thread_id = th.id
 
 
+                    return ch
 
 
 
 
 
-                return th
 
 
+        return None
+
 
 
 
 
 
-        try:
 
 
 
@@ -838,41 +876,41 @@ class MLState:
 
 
 
-            th = await parent.create_thread(name="ml-state", type=discord.ChannelType.public_thread)
 
 
+    def all_active_threads(self) -> List[discord.Thread]:
 
 
 
 
 
-            self.thread_id = th.id
 
 
+        ths = []
 
 
 
 
 
-            return th
 
 
+        for ch in self.bot.get_all_channels():
 
 
 
 
 
-        except Exception:
 
 
+            if isinstance(ch, discord.TextChannel):
 
 
 
 
 
-            return None
 
 
+                try:
 
 
 
@@ -880,37 +918,37 @@ class MLState:
 
 
 
+                    ths.extend(getattr(ch, "threads", []))
 
 
 
 
 
 
-    async def load_latest(self) -> bool:
 
+                except Exception:
 
 
 
 
 
 
-        from .online_nb import OnlineNB
 
+                    pass
 
 
 
 
 
 
-        th = await self._ensure_thread()
 
+        return ths
 
 
 
 
 
 
-        if th is None:
 
 
 
@@ -918,121 +956,121 @@ class MLState:
 
 
 
-            self.model = OnlineNB()
 
 
+    def classify_threads(self):
 
 
 
 
 
-            return False
 
 
+        phish = []
 
 
 
 
 
-        try:
 
 
+        wl = []
 
 
 
 
 
-            async for msg in th.history(limit=50, oldest_first=False):
 
 
+        banlog = []
 
 
 
 
 
-                for a in msg.attachments:
 
 
+        bl = []
 
 
 
 
 
-                    if a.filename.startswith(SNAPSHOT_PREFIX) and a.filename.endswith(".json.gz"):
 
 
+        state = []
 
 
 
 
 
-                        b = await a.read()
 
 
+        for th in self.all_active_threads():
 
 
 
 
 
-                        cs = CombinedState.from_json_bytes(b)
 
 
+            n = (th.name or "").lower()
 
 
 
 
 
-                        self.combined = cs
 
 
+            if self._name_has_any(n, THREAD_STATE):
 
 
 
 
 
-                        self.model = OnlineNB.from_dict(cs.model_dict) if cs.model_dict else OnlineNB()
 
 
+                state.append(th)
 
 
 
 
 
-                        return True
 
 
+            if self._name_has_any(n, THREAD_PHISH):
 
 
 
 
 
-        except Exception:
 
 
+                phish.append(th)
 
 
 
 
 
-            pass
 
 
+            if self._name_has_any(n, THREAD_WL):
 
 
 
 
 
-        self.model = OnlineNB()
 
 
+                wl.append(th)
 
 
 
 
 
-        return False
 
 
+            if self._name_has_any(n, THREAD_BANLOG):
 
 
 
@@ -1040,29 +1078,31 @@ class MLState:
 
 
 
+                banlog.append(th)
 
 
 
 
 
 
-    async def save_snapshot(self) -> bool:
 
+            if self._name_has_any(n, THREAD_BLACKLIST):
 
 
 
 
 
 
-        if self.model is None:
 
+                bl.append(th)
 
 
 
 
 
 
-            return False
+
+        return phish, wl, banlog, bl, state
 
 
 
@@ -1070,7 +1110,6 @@ class MLState:
 
 
 
-        from .online_nb import OnlineNB
 
 
 
@@ -1078,39 +1117,1688 @@ class MLState:
 
 
 
-        self.combined.model_dict = self.model.to_dict()
 
+    async def _ensure_thread(self) -> Optional[discord.Thread]:
 
 
 
 
 
 
-        th = await self._ensure_thread()
 
+        parent = None
 
 
 
 
 
 
-        if th is None:
 
+        if self.parent_channel_id:
 
 
 
 
 
 
-            return False
 
+            ch = self.bot.get_channel(self.parent_channel_id)
 
 
 
 
 
 
-        ts = datetime.datetime.utcnow().strftime("%Y%m%d_%H%M%S")
+
+            if isinstance(ch, discord.TextChannel):
+
+
+
+
+
+
+
+                parent = ch
+
+
+
+
+
+
+
+        if parent is None:
+
+
+
+
+
+
+
+            parent = self.find_log_channel()
+
+
+
+
+
+
+
+        if parent is None:
+
+
+
+
+
+
+
+            return None
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+        if self.thread_id:
+
+
+
+
+
+
+
+            t = self.bot.get_channel(self.thread_id)
+
+
+
+
+
+
+
+            if isinstance(t, discord.Thread):
+
+
+
+
+
+
+
+                return t
+
+
+
+
+
+
+
+        for th in getattr(parent, "threads", []):
+
+
+
+
+
+
+
+            if (th.name or "").lower() == "ml-state":
+
+
+
+
+
+
+
+                self.thread_id = th.id
+
+
+
+
+
+
+
+                return th
+
+
+
+
+
+
+
+        try:
+
+
+
+
+
+
+
+            th = await parent.create_thread(name="ml-state", type=discord.ChannelType.public_thread)
+
+
+
+
+
+
+
+            self.thread_id = th.id
+
+
+
+
+
+
+
+            return th
+
+
+
+
+
+
+
+        except Exception:
+
+
+
+
+
+
+
+            return None
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+    # --- local base cache ---
+
+
+
+
+
+
+
+    def _read_local_base(self) -> Optional[Tuple[str, bytes]]:
+
+
+
+
+
+
+
+        try:
+
+
+
+
+
+
+
+            b = (ML_STATE_DIR / "base.json.gz").read_bytes()
+
+
+
+
+
+
+
+            return (ML_STATE_DIR / "base.id").read_text(encoding="utf-8").strip(), b
+
+
+
+
+
+
+
+        except Exception:
+
+
+
+
+
+
+
+            return None
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+    def _write_local_base(self, base_id: str, b: bytes) -> None:
+
+
+
+
+
+
+
+        try:
+
+
+
+
+
+
+
+            ML_STATE_DIR.mkdir(parents=True, exist_ok=True)
+
+
+
+
+
+
+
+            tmp = ML_STATE_DIR / "base.json.gz.tmp"
+
+
+
+
+
+
+
+            tmp.write_bytes(b)
+
+
+
+
+
+
+
+            os.replace(tmp, ML_STATE_DIR / "base.json.gz")
+
+
+
+
+
+
+
+            (ML_STATE_DIR / "base.id").write_text(base_id, encoding="utf-8")
+
+
+
+
+
+
+
+        except Exception as e:
+
+
+
+
+
+
+
+            log.debug("[ml_state] local base not written: %r", e)
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+    # --- manifest ---
+
+
+
+
+
+
+
+    async def _read_manifest(self, th: discord.Thread) -> Optional[Dict[str, Any]]:
+
+
+
+
+
+
+
+        me = getattr(self.bot, "user", None)
+
+
+
+
+
+
+
+        for msg in await th.pins():
+
+
+
+
+
+
+
+            if me is not None and msg.author.id != me.id:
+
+
+
+
+
+
+
+                continue
+
+
+
+
+
+
+
+            if (msg.content or "").startswith(MANIFEST_HEADER):
+
+
+
+
+
+
+
+                try:
+
+
+
+
+
+
+
+                    body = msg.content[len(MANIFEST_HEADER):].strip().strip("`")
+
+
+
+
+
+
+
+                    self._manifest_msg = msg
+
+
+
+
+
+
+
+                    return json.loads(body[4:] if body.startswith("json") else body)
+
+
+
+
+
+
+
+                except Exception:
+
+
+
+
+
+
+
+                    continue
+
+
+
+
+
+
+
+        return None
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+    async def _write_manifest(self, th: discord.Thread, manifest: Dict[str, Any]) -> None:
+
+
+
+
+
+
+
+        content = f"{MANIFEST_HEADER}\n```json\n{json.dumps(manifest, separators=(',', ':'))}\n```"
+
+
+
+
+
+
+
+        if self._manifest_msg is not None:
+
+
+
+
+
+
+
+            try:
+
+
+
+
+
+
+
+                await self._manifest_msg.edit(content=content)
+
+
+
+
+
+
+
+                self.manifest = manifest
+
+
+
+
+
+
+
+                return
+
+
+
+
+
+
+
+            except Exception:
+
+
+
+
+
+
+
+                self._manifest_msg = None
+
+
+
+
+
+
+
+        msg = await th.send(content=content)
+
+
+
+
+
+
+
+        try:
+
+
+
+
+
+
+
+            await msg.pin()
+
+
+
+
+
+
+
+        except Exception:
+
+
+
+
+
+
+
+            log.warning("[ml_state] manifest could not be pinned")
+
+
+
+
+
+
+
+        self._manifest_msg = msg
+
+
+
+
+
+
+
+        self.manifest = manifest
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+    @staticmethod
+
+
+
+
+
+
+
+    async def _attachment(th: discord.Thread, msg_id: int, prefix: str) -> Optional[bytes]:
+
+
+
+
+
+
+
+        """Attachment bytes; None when the message is gone (other errors are transient and raise)."""
+
+
+
+
+
+
+
+        try:
+
+
+
+
+
+
+
+            msg = await th.fetch_message(int(msg_id))
+
+
+
+
+
+
+
+        except discord.NotFound:
+
+
+
+
+
+
+
+            return None
+
+
+
+
+
+
+
+        for a in msg.attachments:
+
+
+
+
+
+
+
+            if a.filename.startswith(prefix) and a.filename.endswith(".json.gz"):
+
+
+
+
+
+
+
+                return await a.read()
+
+
+
+
+
+
+
+        return None
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+    def _take_marks(self) -> Optional[Tuple[tuple, Dict[str, Any]]]:
+
+
+
+
+
+
+
+        return (self.model.mark(), self.combined.mark()) if self.model is not None else None
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+    def _set_marks(self) -> None:
+
+
+
+
+
+
+
+        self._marks = self._take_marks()
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+    async def _load_from_manifest(self, th: discord.Thread) -> bool:
+
+
+
+
+
+
+
+        from .online_nb import HASH_BITS, OnlineNB
+
+
+
+
+
+
+
+        manifest = await self._read_manifest(th)
+
+
+
+
+
+
+
+        if not manifest or not manifest.get("base"):
+
+
+
+
+
+
+
+            return False
+
+
+
+
+
+
+
+        base_msg, base_id = manifest["base"]
+
+
+
+
+
+
+
+        local = self._read_local_base()
+
+
+
+
+
+
+
+        if local is not None and local[0] == base_id:
+
+
+
+
+
+
+
+            b = local[1]
+
+
+
+
+
+
+
+        else:
+
+
+
+
+
+
+
+            b = await self._attachment(th, base_msg, SNAPSHOT_PREFIX)
+
+
+
+
+
+
+
+            if b is None:
+
+
+
+
+
+
+
+                return False
+
+
+
+
+
+
+
+            self._write_local_base(base_id, b)
+
+
+
+
+
+
+
+        cs = CombinedState.from_json_bytes(b)
+
+
+
+
+
+
+
+        model = OnlineNB.from_dict(cs.model_dict, hash_bits=0)  # the base's own mode; its deltas use it too
+
+
+
+
+
+
+
+        chain = manifest.get("deltas", [])
+
+
+
+
+
+
+
+        applied = 0
+
+
+
+
+
+
+
+        for msg_id, _ in chain:
+
+
+
+
+
+
+
+            db = await self._attachment(th, msg_id, DELTA_PREFIX)
+
+
+
+
+
+
+
+            if db is None:
+
+
+
+
+
+
+
+                log.warning("[ml_state] delta %s missing; %d later delta(s) dropped, next save uploads a base",
+
+
+
+
+
+
+
+                            msg_id, len(chain) - applied - 1)
+
+
+
+
+
+
+
+                break
+
+
+
+
+
+
+
+            d = json.loads(gzip.decompress(db).decode("utf-8"))
+
+
+
+
+
+
+
+            model.apply_delta(d.get("model") or {})
+
+
+
+
+
+
+
+            cs.apply_delta(d)
+
+
+
+
+
+
+
+            applied += 1
+
+
+
+
+
+
+
+        cs.model_dict = {}  # the live model is authoritative; to_dict() runs again on compaction
+
+
+
+
+
+
+
+        self.combined, self.model, self.manifest = cs, model, {**manifest, "deltas": chain[:applied]}
+
+
+
+
+
+
+
+        self._set_marks()
+
+
+
+
+
+
+
+        if applied < len(chain):
+
+
+
+
+
+
+
+            # never chain new deltas behind a hole: every boot would stop there again
+
+
+
+
+
+
+
+            self._marks = None
+
+
+
+
+
+
+
+        if HASH_BITS and not model.hash_bits:
+
+
+
+
+
+
+
+            # ML_NB_HASH_BITS was switched on: hash the token model, the next save uploads a base
+
+
+
+
+
+
+
+            self.model = OnlineNB.from_dict(model.to_dict())
+
+
+
+
+
+
+
+            self._marks = None
+
+
+
+
+
+
+
+        return True
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+    async def load_latest(self) -> bool:
+
+
+
+
+
+
+
+        from .online_nb import OnlineNB
+
+
+
+
+
+
+
+        th = await self._ensure_thread()
+
+
+
+
+
+
+
+        if th is None:
+
+
+
+
+
+
+
+            self.model = OnlineNB()
+
+
+
+
+
+
+
+            return False
+
+
+
+
+
+
+
+        for attempt in range(ML_LOAD_RETRIES):
+
+
+
+
+
+
+
+            try:
+
+
+
+
+
+
+
+                if await self._load_from_manifest(th):
+
+
+
+
+
+
+
+                    return True
+
+
+
+
+
+
+
+                break  # no manifest: older thread
+
+
+
+
+
+
+
+            except Exception as e:
+
+
+
+
+
+
+
+                log.warning("[ml_state] manifest load failed (attempt %d/%d): %r", attempt + 1, ML_LOAD_RETRIES, e)
+
+
+
+
+
+
+
+                if attempt + 1 < ML_LOAD_RETRIES:
+
+
+
+
+
+
+
+                    await asyncio.sleep(2 ** attempt)
+
+
+
+
+
+
+
+        else:
+
+
+
+
+
+
+
+            log.warning("[ml_state] manifest unreadable: loading the newest base from history; the deltas after it "
+
+
+
+
+
+
+
+                        "are not applied and the next save uploads a fresh base")
+
+
+
+
+
+
+
+        try:
+
+
+
+
+
+
+
+            async for msg in th.history(limit=50, oldest_first=False):
+
+
+
+
+
+
+
+                for a in msg.attachments:
+
+
+
+
+
+
+
+                    if a.filename.startswith(SNAPSHOT_PREFIX) and a.filename.endswith(".json.gz"):
+
+
+
+
+
+
+
+                        b = await a.read()
+
+
+
+
+
+
+
+                        cs = CombinedState.from_json_bytes(b)
+
+
+
+
+
+
+
+                        self.combined = cs
+
+
+
+
+
+
+
+                        self.model = OnlineNB.from_dict(cs.model_dict) if cs.model_dict else OnlineNB()
+
+
+
+
+
+
+
+                        self._set_marks()
+
+
+
+
+
+
+
+                        if self._manifest_msg is not None:
+
+
+
+
+
+
+
+                            self._marks = None  # a manifest exists that this state does not match
+
+
+
+
+
+
+
+                        return True
+
+
+
+
+
+
+
+        except Exception:
+
+
+
+
+
+
+
+            pass
+
+
+
+
+
+
+
+        self.model = OnlineNB()
+
+
+
+
+
+
+
+        self._set_marks()
+
+
+
+
+
+
+
+        return False
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+    async def _save_base(self, th: discord.Thread) -> bool:
+
+
+
+
+
+
+
+        # marks are taken with the snapshot, before any await: learn() may run while it uploads
+
+
+
+
+
+
+
+        marks = self._take_marks()
+
+
+
+
+
+
+
+        self.combined.model_dict = self.model.to_dict()
+
+
+
+
+
+
+
+        data = self.combined.to_data()
+
+
+
+
+
+
+
+        base_id = _content_id(data)
+
+
+
+
+
+
+
+        b = _gz(data)
+
+
+
+
+
+
+
+        self.combined.model_dict = {}
+
+
+
+
+
+
+
+        ts = datetime.datetime.utcnow().strftime("%Y%m%d_%H%M%S")
+
+
+
+
+
+
+
+        msg = await th.send(content="ML combined snapshot", file=discord.File(io.BytesIO(b), filename=f"{SNAPSHOT_PREFIX}{ts}.json.gz"))
+
+
+
+
+
+
+
+        self._write_local_base(base_id, b)
+
+
+
+
+
+
+
+        await self._write_manifest(th, {"base": [msg.id, base_id], "deltas": []})
+
+
+
+
+
+
+
+        self._marks = marks
+
+
+
+
+
+
+
+        return True
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+    async def save_snapshot(self, force_base: bool = False) -> bool:
+
+
+
+
+
+
+
+        """Upload what changed since the last save as a delta; a full base when needed (see top of file)."""
+
+
+
+
+
+
+
+        if self.model is None:
+
+
+
+
+
+
+
+            return False
+
+
+
+
+
+
+
+        th = await self._ensure_thread()
+
+
+
+
+
+
+
+        if th is None:
+
+
+
+
+
+
+
+            return False
+
+
+
+
+
+
+
+        if not self.manifest and self._manifest_msg is None:
+
+
+
+
+
+
+
+            try:
+
+
+
+
+
+
+
+                self.manifest = await self._read_manifest(th) or {}
+
+
+
+
+
+
+
+            except Exception:
+
+
+
+
+
+
+
+                self.manifest = {}
+
+
+
+
+
+
+
+        chain = list(self.manifest.get("deltas", []))
+
+
+
+
+
+
+
+        if force_base or not self.manifest.get("base") or self._marks is None or len(chain) >= ML_DELTA_COMPACT:
+
+
+
+
+
+
+
+            return await self._save_base(th)
+
+
+
+
+
+
+
+        marks = self._take_marks()  # same step as the delta, see _save_base
+
+
+
+
+
+
+
+        model_delta = self.model.delta_since(self._marks[0])
+
+
+
+
+
+
+
+        state_delta = self.combined.delta_since(self._marks[1])
+
+
+
+
+
+
+
+        if model_delta is None or state_delta is None:
+
+
+
+
+
+
+
+            return await self._save_base(th)
+
+
+
+
+
+
+
+        if not model_delta and not state_delta:
+
+
+
+
+
+
+
+            return True  # nothing learned since the last save
+
+
+
+
+
+
+
+        delta = {"version": 1, "base": self.manifest["base"][1], "model": model_delta, **state_delta}
+
+
+
+
+
+
+
+        delta_id = _content_id(delta)
+
+
+
+
+
+
+
+        if any(did == delta_id for _, did in chain):
+
+
+
+
+
+
+
+            return True
 
 
 
@@ -1118,7 +2806,7 @@ class MLState:
 
 
 
-        fname = f"{SNAPSHOT_PREFIX}{ts}.json.gz"
+        msg = await th.send(content=f"ML state delta {len(chain) + 1}/{ML_DELTA_COMPACT}",
 
 
 
@@ -1126,7 +2814,7 @@ class MLState:
 
 
 
-        b = self.combined.to_json_bytes()
+                            file=discord.File(io.BytesIO(_gz(delta)), filename=f"{DELTA_PREFIX}{delta_id}.json.gz"))
 
 
 
@@ -1134,7 +2822,7 @@ class MLState:
 
 
 
-        file = discord.File(io.BytesIO(b), filename=fname)
+        await self._write_manifest(th, {"base": self.manifest["base"], "deltas": chain + [[msg.id, delta_id]]})
 
 
 
@@ -1142,7 +2830,7 @@ class MLState:
 
 
 
-        await th.send(content="ML combined snapshot", file=file)
+        self._marks = marks
 
 
 
@@ -0,0 +1,48 @@
+# tests/test_hash_index.py
+import numpy as np
+import pytest
+
+from satpambot.bot.modules.discord_bot.helpers import phash_blocklist
+from satpambot.bot.modules.discord_bot.helpers.hash_index import HashIndex
+
+
+def _values(n=3000, seed=0):
+    return np.unique(np.random.default_rng(seed).integers(0, 2**63, n, dtype=np.uint64))
+
+
+@pytest.mark.parametrize("strategy", ["auto", "linear", "mih", "bktree"])
+def test_from_sorted_matches_a_built_index(strategy):
+    vals = _values()
+    view = HashIndex.from_sorted(vals, strategy=strategy)
+    built = HashIndex([int(v) for v in vals], strategy=strategy)
+    queries = [int(v) ^ 0b101 for v in vals[:40]] + [int(v) for v in vals[40:60]]
+    for q in queries:
+        assert view.first_within([q], max_distance=6) == built.first_within([q], max_distance=6)
+        assert (q in view) == (q in built)
+    assert view.hits(queries, max_distance=3) == built.hits(queries, max_distance=3)
+    assert view.key(5) == int(vals[5])
+    with pytest.raises(TypeError):
+        view.add(1)
+
+
+def test_blocklist_snapshot_uses_the_memmap_in_place(tmp_path):
+    path = tmp_path / "blocklist.u64"
+    vals = _values(500)
+    phash_blocklist.replace_hashes([int(v) for v in vals], path=path)
+    snap = phash_blocklist.PhashBlocklist(path, poll=0).snapshot()
+    assert isinstance(snap.hashes, np.memmap)
+    assert np.shares_memory(snap.index._arr, snap.hashes)
+    assert snap.index.first_within([int(vals[7]) ^ 1], max_distance=2) == (0, 7, 1)
+
+
+@pytest.mark.parametrize("strategy", ["auto", "linear", "mih", "bktree"])
+def test_wide_query_leaves_the_index_unchanged(strategy):
+    vals = [int(v) for v in _values(2000, seed=1)]
+    idx = HashIndex(vals, strategy=strategy)
+    wide = (1 << 64) | vals[3] ^ 0b11  # one bit above 64 plus two flipped low bits
+    assert idx.first_within([wide], max_distance=3) == (0, 3, 3)
+    assert idx.first_within([wide], max_distance=2) is None
+    assert idx.distances(wide)[3] == 3
+    assert idx.nearest([wide], k=1) == [[(3, 3)]]
+    assert idx.words == 1 and idx._arr.shape[1] == 1
+    assert idx.first_within([vals[9] ^ 1], max_distance=1) == (0, 9, 1)
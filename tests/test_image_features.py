@@ -0,0 +1,42 @@
+# tests/test_image_features.py
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from satpambot.ml.feature_extractor import dhash64
+
+
+def _image():
+    y, x = np.mgrid[0:600, 0:900]
+    a = np.stack([(x * 7 + y * 3) % 256, (x * y // 97) % 256, ((x - 450) ** 2 + (y - 300) ** 2) // 300 % 256], -1)
+    return Image.fromarray(a.astype(np.uint8))
+
+
+def _encode(img, fmt, **kw):
+    buf = io.BytesIO()
+    img.save(buf, fmt, **kw)
+    return buf.getvalue()
+
+
+def _legacy_dhash64(b):
+    """feature_extractor.dhash64 before ImageFeatures: values persisted in the ML state whitelist."""
+    with Image.open(io.BytesIO(b)) as im:
+        px = list(im.convert("L").resize((9, 8)).getdata())
+    bits = 0
+    for r in range(8):
+        for c in range(8):
+            bits = (bits << 1) | (1 if px[r * 9 + c] > px[r * 9 + c + 1] else 0)
+    return f"{bits:016x}"
+
+
+def test_dhash64_pinned_value():
+    assert dhash64(_encode(_image(), "PNG")) == "0c5432323232164d"
+
+
+@pytest.mark.parametrize("fmt,mode,size", [("JPEG", "RGB", (3000, 2000)), ("PNG", "RGBA", (640, 360)),
+                                           ("GIF", "P", (500, 700)), ("WEBP", "RGB", (1280, 720))])
+def test_dhash64_matches_the_legacy_decode(fmt, mode, size):
+    data = _encode(_image().resize(size).convert(mode), fmt)
+    assert dhash64(data) == _legacy_dhash64(data)
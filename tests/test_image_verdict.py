@@ -0,0 +1,204 @@
+# tests/test_image_verdict.py
+import asyncio, hashlib
+
+import pytest
+
+from satpambot.bot.modules.discord_bot.helpers import image_check
+from satpambot.bot.modules.discord_bot.helpers.image_hash_executor import ImageHashBusy
+from satpambot.bot.modules.discord_bot.helpers.image_verdict import STAGES, ImageVerdictPipeline
+
+DATA = b"\x89PNG not really an image"
+
+
+class FakeBlocklist:
+    def __init__(self):
+        self.generation = 0
+        self.hit = None
+
+    def first_within(self, hashes, max_distance):
+        return self.hit
+
+
+class FakeExecutor:
+    """Records the families of every job; ``delay`` / ``busy`` make the hash stage slow or full."""
+    def __init__(self):
+        self.calls = []
+        self.delay = 0.0
+        self.busy = False
+
+    async def submit(self, data, families, timeout=None):
+        kind = "tile" if isinstance(families, dict) else families[0]
+        self.calls.append(kind)
+        if kind == "phash" and self.busy:
+            raise ImageHashBusy("full")
+        if kind == "phash" and self.delay:
+            await asyncio.wait_for(asyncio.sleep(self.delay), timeout)
+        return {"phash": ["0" * 16], "multi": None, "tile": ["0" * 16] * 9, "orb": [[0] * 32]}
+
+
+class FakeOcr:
+    def __init__(self, text="hello"):
+        self.calls = 0
+        self.text = text
+
+    async def ocr(self, data, sha256=None, priority=None, deadline=None):
+        self.calls += 1
+        return self.text
+
+
+class FakeTiles:
+    def __len__(self):
+        return 1
+
+    def best(self, sigs, hit_min, distance):
+        return 0
+
+
+class FakeStore:
+    def __len__(self):
+        return 1
+
+
+class FakeOrb:
+    store = FakeStore()
+
+    def top_k(self, desc, k, min_match):
+        return []
+
+
+@pytest.fixture
+def refs(monkeypatch):
+    """Stubs for image_check's reference lists; bump refs["db"] to change its version."""
+    state = {"db": 0, "md5": set()}
+    monkeypatch.setattr(image_check, "md5_blacklist", lambda: state["md5"])
+    monkeypatch.setattr(image_check, "db_version", lambda: state["db"])
+    monkeypatch.setattr(image_check, "matches_blacklist", lambda sample: False)
+    return state
+
+
+def _pipe(whitelist=None, **kw):
+    kw.setdefault("stage_budgets", {s: 1000 for s in STAGES})
+    return ImageVerdictPipeline(whitelist, blocklist=FakeBlocklist(), executor=FakeExecutor(), ocr=FakeOcr(),
+                                tiles=FakeTiles(), orb=FakeOrb(), **kw)
+
+
+@pytest.mark.asyncio
+async def test_stages_run_in_cost_order(refs):
+    pipe = _pipe()
+    v = await pipe.check(DATA)
+    assert (v.action, v.stage, v.skipped) == ("clean", "", [])
+    assert list(v.timings) == list(STAGES)
+    assert pipe.executor.calls == ["phash", "tile", "orb"]
+    assert pipe.ocr.calls == 1 and v.text == "hello"
+
+
+def test_stage_order_is_fixed_whatever_the_caller_passes():
+    pipe = _pipe(stages=("ocr", "hash", "exact"))
+    assert pipe.stages == ("exact", "hash", "ocr")
+    with pytest.raises(ValueError):
+        _pipe(stages=("hash", "clip"))
+
+
+@pytest.mark.asyncio
+async def test_confident_stage_short_circuits(refs):
+    pipe = _pipe(whitelist={"wl-sha1"})
+    v = await pipe.check(DATA, sha1="wl-sha1")
+    assert (v.action, v.stage) == ("allow", "whitelist")
+    assert list(v.timings) == ["exact", "whitelist"]
+    assert pipe.executor.calls == [] and pipe.ocr.calls == 0
+
+    pipe = _pipe()
+    pipe.blocklist.hit = (0, "3a5f", 2)
+    v = await pipe.check(DATA)
+    assert (v.action, v.stage, v.reason) == ("block", "hash", "phash 3a5f d=2")
+    assert pipe.executor.calls == ["phash"] and pipe.ocr.calls == 0
+
+
+@pytest.mark.asyncio
+async def test_md5_blacklist_exits_in_exact_stage(refs):
+    refs["md5"] = {hashlib.md5(DATA).hexdigest()}
+    pipe = _pipe()
+    v = await pipe.check(DATA)
+    assert (v.action, v.stage, v.reason) == ("block", "exact", "md5 blacklist")
+    assert pipe.executor.calls == []
+
+
+@pytest.mark.asyncio
+async def test_suspect_is_not_confident(refs):
+    pipe = _pipe()
+    pipe.ocr.text = "free nitro, login to claim your gift"
+    v = await pipe.check(DATA)
+    assert (v.action, v.stage, v.confident) == ("suspect", "ocr", False)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("busy", [False, True])
+async def test_stage_over_its_budget_is_skipped_and_not_memoized(refs, busy):
+    pipe = _pipe(stage_budgets={"hash": 30})
+    pipe.executor.delay, pipe.executor.busy = 1.0, busy
+    v = await pipe.check(DATA)
+    assert v.skipped == ["hash:busy" if busy else "hash:timeout"]
+    assert v.timings["hash"] < 500
+    # the cascade goes on after a skipped stage
+    assert pipe.executor.calls[1:] == ["tile", "orb"] and pipe.ocr.calls == 1
+    assert pipe._memo == {} and pipe.stats["skipped"] == 1
+
+    pipe.executor.delay, pipe.executor.busy = 0.0, False
+    v = await pipe.check(DATA)
+    assert v.stage != "exact" and v.skipped == []
+    assert pipe.executor.calls.count("phash") == 2
+
+
+@pytest.mark.asyncio
+async def test_whole_check_budget_skips_the_remaining_stages(refs):
+    pipe = _pipe(stage_budgets={"hash": 5000}, budget_ms=60)
+    pipe.executor.delay = 1.0
+    v = await pipe.check(DATA)
+    # the hash stage is cut at what is left of the whole budget, not its own 5 s
+    assert v.timings["hash"] < 500
+    assert v.skipped == ["hash:timeout", "tile:budget", "orb:budget", "ocr:budget"]
+    assert pipe.executor.calls == ["phash"] and pipe.ocr.calls == 0
+    assert pipe._memo == {}
+
+
+@pytest.mark.asyncio
+async def test_memo_answers_reposts_in_the_exact_stage(refs):
+    pipe = _pipe()
+    pipe.blocklist.hit = (0, "3a5f", 2)
+    first = await pipe.check(DATA)
+    pipe.blocklist.hit = None  # unchanged generation: the memo still answers
+    v = await pipe.check(DATA)
+    assert (v.action, v.stage) == ("block", "exact")
+    assert v.reason == "seen before: block by hash (phash 3a5f d=2)"
+    assert first.stage == "hash" and pipe.executor.calls == ["phash"]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("change", ["blocklist", "image_check", "whitelist"])
+async def test_memo_is_invalidated_when_a_reference_list_changes(refs, change):
+    wl = {"other-sha1"}
+    pipe = _pipe(whitelist=lambda: wl)
+    pipe.blocklist.hit = (0, "3a5f", 2)
+    await pipe.check(DATA)
+    before = pipe._refs_version()
+    pipe.blocklist.hit = None
+    if change == "blocklist":
+        pipe.blocklist.generation += 1
+    elif change == "image_check":
+        refs["db"] += 1
+    else:
+        wl = {"other-sha1", "another-sha1"}
+    assert pipe._refs_version() != before
+    v = await pipe.check(DATA)
+    assert (v.action, v.stage) == ("clean", "")
+    assert pipe.executor.calls.count("phash") == 2
+
+
+@pytest.mark.asyncio
+async def test_memo_follows_reference_store_sizes(refs, monkeypatch):
+    pipe = _pipe()
+    await pipe.check(DATA)
+    assert (await pipe.check(DATA)).stage == "exact"
+    monkeypatch.setattr(FakeTiles, "__len__", lambda self: 2)
+    v = await pipe.check(DATA)
+    assert v.stage == "" and "tile" in v.timings
@@ -0,0 +1,34 @@
+# tests/test_keyword_scanner.py
+import pytest
+
+from satpambot.bot.modules.discord_bot.helpers import keyword_scanner as ks
+
+
+def _scanner(terms, category="ocr_block"):
+    return ks.KeywordScanner(lambda: [(category, terms, False)])
+
+
+@pytest.mark.parametrize("text", ["claim 2500$ today", "USD2500 bonus", "win $2500 now", "hadiah 25000"])
+def test_scam_amounts_are_substrings(text):
+    assert "ocr_block" in _scanner(["2500", "$2500"]).scan(text)
+
+
+def test_leet_terms_with_letters_are_whole_words():
+    sc = _scanner(["r18"], "soft")
+    assert sc.scan("konten R18 di sini") == {"soft": {"r18"}}
+    assert sc.scan("bar18x") == {}
+    assert sc.scan("parri8") == {}
+
+
+def test_default_scanner_picks_up_edited_sources(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(ks, "KEYWORD_SOURCES_POLL", 0.0)
+    monkeypatch.delenv("OCR_BLOCKWORDS", raising=False)
+    sc = ks.KeywordScanner()
+    assert "zorblax" not in sc.scan("zorblax").get("ocr_block", set())
+    monkeypatch.setenv("OCR_BLOCKWORDS", "zorblax")
+    assert "zorblax" in sc.scan("zorblax")["ocr_block"]
+
+    (tmp_path / "config").mkdir()
+    (tmp_path / "config" / "ocr.json").write_text('{"blockwords": ["quintox"]}', encoding="utf-8")
+    assert "quintox" in sc.scan("quintox")["ocr_block"]
@@ -0,0 +1,200 @@
+# tests/test_ml_state.py
+import types
+
+import discord
+import pytest
+
+from satpambot.ml import state_store_discord as ssd
+from satpambot.ml.online_nb import OnlineNB
+
+
+class FakeAttachment:
+    def __init__(self, filename, data):
+        self.filename = filename
+        self._data = data
+
+    async def read(self):
+        return self._data
+
+
+class FakeMessage:
+    def __init__(self, thread, mid, content, attachments):
+        self.thread = thread
+        self.id = mid
+        self.content = content
+        self.attachments = attachments
+        self.author = types.SimpleNamespace(id=1)
+
+    async def edit(self, content):
+        self.content = content
+
+    async def pin(self):
+        self.thread.pinned.append(self)
+
+
+class FakeThread:
+    """The slice of discord.Thread that MLState uses."""
+
+    def __init__(self):
+        self.messages = {}
+        self.pinned = []
+
+    async def send(self, content=None, file=None):
+        atts = [FakeAttachment(file.filename, file.fp.read())] if file is not None else []
+        msg = FakeMessage(self, 1000 + len(self.messages), content, atts)
+        self.messages[msg.id] = msg
+        return msg
+
+    async def pins(self):
+        return list(self.pinned)
+
+    async def fetch_message(self, mid):
+        if mid not in self.messages:
+            raise discord.NotFound(types.SimpleNamespace(status=404, reason="Not Found"), "Unknown Message")
+        return self.messages[mid]
+
+    async def history(self, limit=None, oldest_first=False):
+        for m in sorted(self.messages.values(), key=lambda m: m.id, reverse=not oldest_first)[:limit]:
+            yield m
+
+
+def _state(thread):
+    st = ssd.MLState(types.SimpleNamespace(user=types.SimpleNamespace(id=1)))
+
+    async def ensure():
+        return thread
+
+    st._ensure_thread = ensure
+    return st
+
+
+@pytest.fixture(autouse=True)
+def _local_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(ssd, "ML_STATE_DIR", tmp_path)
+
+
+def _snapshot(model):
+    d = model.to_dict()
+    return d["pos_counts"], d["neg_counts"], d["pos_docs"], d["neg_docs"]
+
+
+@pytest.mark.asyncio
+async def test_base_and_deltas_round_trip():
+    th = FakeThread()
+    st = _state(th)
+    await st.load_latest()
+    st.model.learn(["free", "nitro"], "phish")
+    assert await st.save_snapshot()  # first save: base
+    st.model.learn(["halo", "semua"], "safe")
+    st.combined.whitelist["dhash64"].append("abcd")
+    assert await st.save_snapshot()
+    st.model.learn(["free", "gift"], "phish")
+    assert await st.save_snapshot()
+    assert await st.save_snapshot()  # nothing new: no upload
+    assert len(st.manifest["deltas"]) == 2
+    assert len(th.messages) == 4  # base, manifest, two deltas
+
+    st2 = _state(th)
+    assert await st2.load_latest()
+    assert _snapshot(st2.model) == _snapshot(st.model)
+    assert st2.combined.whitelist["dhash64"] == ["abcd"]
+    assert st2._marks is not None
+
+
+@pytest.mark.asyncio
+async def test_missing_delta_forces_a_fresh_base():
+    th = FakeThread()
+    st = _state(th)
+    await st.load_latest()
+    for words in (["a1"], ["b2"], ["c3"]):
+        st.model.learn(words, "phish")
+        await st.save_snapshot()
+    lost = st.manifest["deltas"][0][0]
+    del th.messages[lost]
+
+    st2 = _state(th)
+    assert await st2.load_latest()
+    assert st2.manifest["deltas"] == []
+    assert st2._marks is None
+    st2.model.learn(["d4"], "phish")
+    await st2.save_snapshot()
+    assert st2.manifest["deltas"] == [] and st2.manifest["base"][0] != st.manifest["base"][0]
+
+    st3 = _state(th)
+    assert await st3.load_latest()
+    assert _snapshot(st3.model) == _snapshot(st2.model)
+    assert st3._marks is not None
+
+
+@pytest.mark.parametrize("hash_bits", [0, 8])
+def test_online_nb_dict_and_delta_round_trip(hash_bits):
+    m = OnlineNB(hash_bits=hash_bits)
+    m.learn(["free", "nitro", "gift"], "phish")
+    m.learn(["halo", "semua"], "safe")
+    copy = OnlineNB.from_dict(m.to_dict(), hash_bits=hash_bits)
+    assert copy.to_dict() == m.to_dict()
+
+    mark = m.mark()
+    m.learn(["free", "steam"], "phish")
+    m.learn(["gas", "main"], "safe")
+    copy.apply_delta(m.delta_since(mark))
+    assert copy.to_dict() == m.to_dict()
+    doc = ["free", "steam", "gift"]
+    assert copy.predict_proba(doc) == pytest.approx(m.predict_proba(doc))
+    assert m.delta_since(m.mark()) == {}
+
+
+def test_online_nb_delta_mode_mismatch():
+    m = OnlineNB(hash_bits=8)
+    mark = m.mark()
+    m.learn(["x"], "phish")
+    with pytest.raises(ValueError):
+        OnlineNB(hash_bits=0).apply_delta(m.delta_since(mark))
+
+
+class SlowThread(FakeThread):
+    """send() yields to the loop, where learn() runs before the upload finishes."""
+
+    def __init__(self):
+        super().__init__()
+        self.during_send = []
+
+    async def send(self, content=None, file=None):
+        msg = await super().send(content=content, file=file)
+        while self.during_send:
+            self.during_send.pop(0)()
+        return msg
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("first_save", ["base", "delta"])
+async def test_learning_during_a_slow_upload_is_not_lost(first_save):
+    th = SlowThread()
+    st = _state(th)
+    await st.load_latest()
+    st.model.learn(["free", "nitro"], "phish")
+    if first_save == "delta":
+        await st.save_snapshot()
+        st.model.learn(["halo"], "safe")
+    th.during_send.append(lambda: st.model.learn(["late", "token"], "phish"))
+    th.during_send.append(lambda: st.combined.whitelist["dhash64"].append("beef"))
+    await st.save_snapshot()
+    assert await st.save_snapshot()  # the late changes go out as the next delta
+
+    st2 = _state(th)
+    assert await st2.load_latest()
+    assert _snapshot(st2.model) == _snapshot(st.model)
+    assert st2.combined.whitelist["dhash64"] == ["beef"]
+
+
+def test_online_nb_hashed_snapshot_with_other_bucket_count():
+    small = OnlineNB(hash_bits=6)
+    small.learn(["free", "nitro"], "phish")
+    small.learn(["halo"], "safe")
+    d = {**small.to_dict(), "hash_bits": 8}  # header disagrees with the arrays
+    m = OnlineNB.from_dict(d)
+    assert m.hash_bits == 6 and m.to_dict() == small.to_dict()
+
+    bad = {**small.to_dict(), "neg_buckets": OnlineNB(hash_bits=7).to_dict()["neg_buckets"]}
+    with pytest.raises(ValueError):
+        OnlineNB.from_dict(bad)
@@ -0,0 +1,81 @@
+# tests/test_near_duplicate.py
+from satpambot.bot.modules.discord_bot.helpers import near_duplicate as nd
+
+WAVE = [
+    "FREE NITRO for everyone, claim yours now https://discord-gift.ru/abc123",
+    "free nitro for everyone!! claim yours now https://discord-gift.ru/zzz999",
+    "FREE N1TRO for everyone, claim yours now 🎁 https://discord-gift.ru/q",
+    "Free nitro for everyone claim yours now https://discord-gift.ru/abc124",
+    "free nitro for everyone, claim yours now!!! https://discord-gift.ru/x1",
+]
+OTHER = [
+    "ada yang tahu jadwal turnamen minggu depan di server ini?",
+    "screenshot build terbaru sudah saya upload ke channel galeri",
+    "jangan lupa rapat moderator jam delapan malam nanti ya teman",
+]
+G = 1
+
+
+def test_simhash_ignores_short_text_and_groups_edits():
+    assert nd.simhash64("hi all") is None
+    hs = [nd.simhash64(t) for t in WAVE]
+    others = [nd.simhash64(t) for t in OTHER]
+    assert all(isinstance(h, int) for h in hs + others)
+    assert max((a ^ b).bit_count() for a in hs for b in hs) <= nd.NEARDUP_MAX_DISTANCE
+    assert min((a ^ b).bit_count() for a in hs for b in others) > nd.NEARDUP_MAX_DISTANCE
+
+
+def test_numpy_and_pure_python_simhash_agree(monkeypatch):
+    texts = WAVE + OTHER
+    fast = [nd.simhash64(t) for t in texts]
+    monkeypatch.setattr(nd, "np", None)
+    assert [nd.simhash64(t) for t in texts] == fast
+
+
+def test_cross_channel_wave_is_flagged_once():
+    det = nd.NearDuplicateDetector()
+    quiet = [det.add(G, nd.simhash64(t), 100.0 + i, author_id=50 + i, channel_id=9, message_id=900 + i)
+             for i, t in enumerate(OTHER)]
+    assert len({v.cluster for v in quiet}) == len(OTHER) and not any(v.flagged for v in quiet)
+
+    verdicts = [det.add(G, nd.simhash64(t), 110.0 + i, author_id=1, channel_id=10 + i, message_id=1000 + i)
+                for i, t in enumerate(WAVE)]
+    assert len({v.cluster for v in verdicts}) == 1
+    newly = [i for i, v in enumerate(verdicts) if v.newly_flagged]
+    assert newly == [nd.NEARDUP_MIN_COUNT - 1]
+    hit = verdicts[newly[0]]
+    assert hit.size == nd.NEARDUP_MIN_COUNT and hit.channels == nd.NEARDUP_MIN_COUNT
+    assert hit.earlier == tuple((10 + i, 1000 + i) for i in range(nd.NEARDUP_MIN_COUNT - 1))
+    assert verdicts[-1].flagged and not verdicts[-1].newly_flagged and verdicts[-1].earlier == ()
+
+
+def test_one_author_in_one_channel_is_not_flagged():
+    det = nd.NearDuplicateDetector()
+    verdicts = [det.add(G, nd.simhash64(t), 100.0 + i, author_id=1, channel_id=10, message_id=i)
+                for i, t in enumerate(WAVE)]
+    assert verdicts[-1].size == len(WAVE) and not any(v.flagged for v in verdicts)
+
+
+def test_different_links_to_one_host_do_not_cluster():
+    links = ["https://media.discordapp.net/attachments/1187/2291/IMG_2231.png",
+             "https://media.discordapp.net/attachments/1187/4410/screenshot.jpg",
+             "https://media.discordapp.net/attachments/9921/1022/clip.gif",
+             "https://media.discordapp.net/attachments/5532/7713/meme.webp",
+             "https://store.steampowered.com/app/1091500/",
+             "https://store.steampowered.com/app/413150/"]
+    assert all(nd.simhash64(u) is None for u in links)
+    assert nd.simhash64("lihat ini " + links[0]) is None
+    det = nd.NearDuplicateDetector()
+    verdicts = [det.add(G, nd.simhash64(u), 100.0 + 20 * i, author_id=i, channel_id=i % 3, message_id=i)
+                for i, u in enumerate(links)]
+    assert verdicts == [None] * len(links)
+
+
+def test_window_expiry_starts_a_new_cluster():
+    det = nd.NearDuplicateDetector(window=60)
+    h = [nd.simhash64(t) for t in WAVE]
+    first = det.add(G, h[0], 0.0, channel_id=1)
+    assert det.add(G, h[1], 10.0, channel_id=2).cluster == first.cluster
+    late = det.add(G, h[2], 10.0 + 61 + det.width, channel_id=3)
+    assert late.cluster != first.cluster and late.size == 1
+    assert det.add(G, None, 200.0) is None
@@ -0,0 +1,62 @@
+# tests/test_pattern_matcher.py
+import time
+
+import pytest
+
+from satpambot.bot.modules.discord_bot.helpers import pattern_matcher
+from satpambot.bot.modules.discord_bot.helpers.pattern_matcher import PatternSet, validate_pattern
+
+EVIL = [r"(a|aa)+$", r"(a|a)*b", r"(?:ab|a)*c", r"(\w|\d)+x", r"(.|.)*z", r"(a+)+$", r"(\w*x)*y", r"(a)\1",
+        r"^(a?){25}a{25}$"]
+# polynomial: each unbounded run tries every length of what the previous one left
+POLY = [r"(.*)(.*)(.*)x", r".*a.*b", r"discord.*gift.*nitro", r"\w+\d+!"]
+OK = [r"discord-?nitro\.", r"/gift/[a-z0-9]{16}", r"([a-z0-9-]+\.)+ru", r"(https?://)?(discord|dlscord)\.gift",
+      r"(ab|cd)+x", r"[\w.-]+@", r"st[e3]am(community|powered)", r"[a-z]+\.[a-z]+/gift", r"https?://[^/]+/.*nitro",
+      r"discord.{0,40}gift.{0,40}nitro"]
+
+
+@pytest.mark.parametrize("pattern", EVIL + POLY)
+def test_backtracking_patterns_rejected(pattern):
+    assert validate_pattern(pattern) is not None
+    ps = PatternSet([pattern])
+    assert len(ps) == 0
+    assert ps.rejected and ps.rejected[0][0] == pattern
+
+
+@pytest.mark.parametrize("pattern", OK)
+def test_ordinary_patterns_accepted(pattern):
+    assert validate_pattern(pattern) is None
+
+
+def test_invalid_and_flagged_patterns():
+    assert validate_pattern("") == "empty pattern"
+    assert validate_pattern("(").startswith("invalid regex")
+    assert validate_pattern("(?i)abc").startswith("invalid regex")
+    assert validate_pattern("(?P<x>abc)") == "named groups are not allowed"
+
+
+def test_match_and_prefilter():
+    ps = PatternSet(OK + EVIL + POLY)
+    assert len(ps) == len(OK)
+    assert ps.match("https://Discord-Nitro.ru/x") == r"discord-?nitro\."
+    assert ps.match("https://steampowered.example/") == r"st[e3]am(community|powered)"
+    assert ps.match("https://example.com/") is None
+
+
+def test_adversarial_input_stays_fast():
+    ps = PatternSet(OK + EVIL + POLY)
+    url = "https://example.com/" + "a" * 2000
+    t0 = time.perf_counter()
+    for s in ("a" * 5000 + "!", "ab" * 3000, "x." * 3000, url, "discord" + "gift" * 500):
+        ps.match(s)
+    assert time.perf_counter() - t0 < 1.0
+
+
+
+def test_timeout_counts_as_no_match(monkeypatch):
+    class SlowRegex:
+        def search(self, text, timeout=None):
+            raise TimeoutError
+
+    monkeypatch.setattr(pattern_matcher, "_regex", object())
+    assert pattern_matcher._search(SlowRegex(), "aaaa") is None
@@ -0,0 +1,94 @@
+# tests/test_phash_store.py
+import json
+
+from satpambot.bot.modules.discord_bot.helpers.phash_store import AppendOnlyStore, _fsync_write
+
+
+def _open(path, **kw):
+    return AppendOnlyStore(str(path), read_snapshot=lambda obj: (obj or {}).get("items", []),
+                           write_snapshot=lambda items: {"items": items},
+                           keys=lambda it: (("h", it["h"]),), **kw)
+
+
+def _hashes(store):
+    return [it["h"] for it in store.items]
+
+
+def test_log_replay_and_torn_tail(tmp_path):
+    path = tmp_path / "phash.json"
+    s = _open(path)
+    s.add({"h": "a"})
+    s.extend([{"h": "b"}, {"h": "a"}])
+    with open(s.log_path, "ab") as f:
+        f.write(b'{"op": "add", "item": {"h": "c"')  # crash mid-write
+    s2 = _open(path)
+    assert _hashes(s2) == ["a", "b"]
+    s2.add({"h": "d"})
+    assert _hashes(_open(path)) == ["a", "b", "d"]
+
+
+def test_crash_between_snapshot_and_log_reset(tmp_path):
+    path = tmp_path / "phash.json"
+    s = _open(path)
+    s.extend([{"h": "a"}, {"h": "b"}])
+    # compaction wrote the new snapshot, then the process died before resetting the log
+    _fsync_write(path, json.dumps({"items": s.items}).encode("utf-8"))
+    s2 = _open(path)
+    assert _hashes(s2) == ["a", "b"]
+    s2.add({"h": "c"})
+    assert _hashes(_open(path)) == ["a", "b", "c"]
+
+
+def test_two_writers_share_the_store(tmp_path):
+    path = tmp_path / "phash.json"
+    web, bot = _open(path), _open(path)
+    web.add({"h": "a"})
+    bot.add({"h": "b"})  # refreshes under the lock first, so it sees "a"
+    assert _hashes(bot) == ["a", "b"]
+    web.compact()  # must not drop "b", which web had not loaded yet
+    bot.add({"h": "c"})
+    assert _hashes(_open(path)) == ["a", "b", "c"]
+
+
+def test_update_is_keyed_not_positional(tmp_path):
+    path = tmp_path / "phash.json"
+    web, bot = _open(path), _open(path)
+    bot.add({"h": "x"})
+    web.add({"h": "y"})
+    web.update(web.position(("h", "x")), seen=2)
+    bot.refresh()  # readers pick up the other process's items on refresh
+    bot.update(bot.position(("h", "y")), seen=5)
+    fresh = _open(path)
+    assert fresh.get(("h", "x"))["seen"] == 2
+    assert fresh.get(("h", "y"))["seen"] == 5
+    fresh.compact()
+    again = _open(path)
+    assert _hashes(again) == ["x", "y"] and again.get(("h", "y"))["seen"] == 5
+
+
+def test_background_compaction(tmp_path):
+    path = tmp_path / "phash.json"
+    s = _open(path, compact_every=3)
+    for h in "abcd":
+        s.add({"h": h})
+    if s._compacting is not None:
+        s._compacting.join(5)
+    assert _hashes(_open(path)) == ["a", "b", "c", "d"]
+
+
+def test_dashboard_blueprints_share_one_store(tmp_path, monkeypatch):
+    from satpambot.dashboard import live_routes, phish_api
+
+    path = tmp_path / "phish_phash.json"
+    path.write_text(json.dumps({"aaaa": {"source": "old", "ts": 1}}), encoding="utf-8")  # live_routes' old shape
+    monkeypatch.setenv("PHISH_PHASH_JSON", str(path))
+    monkeypatch.setattr(phish_api, "_stores", {})
+    api = phish_api.open_phash_store(str(path))
+    assert [it["hash"] for it in api.items] == ["aaaa"]
+    api.add({"hash": "bbbb", "filename": "x.png", "ts": 2})
+    live_routes._store().add({"hash": "cccc", "source": "url", "ts": 3})
+    assert live_routes._load_json() == {"aaaa": {"source": "old", "ts": 1}, "bbbb": {"filename": "x.png", "ts": 2},
+                                        "cccc": {"source": "url", "ts": 3}}
+    api.compact()
+    monkeypatch.setattr(phish_api, "_stores", {})
+    assert [it["hash"] for it in phish_api.open_phash_store(str(path)).items] == ["aaaa", "bbbb", "cccc"]
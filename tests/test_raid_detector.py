@@ -0,0 +1,67 @@
+# tests/test_raid_detector.py
+from satpambot.bot.modules.discord_bot.helpers import raid_detector as rd
+
+NAMES = ["anna", "bima", "cici", "dodi", "eka", "fajar", "gita", "hadi", "intan", "joko",
+         "kiki", "lina", "made", "nina", "oki", "putu", "rina", "sari", "tono", "umar"]
+DAY = 86400.0
+G = 1
+
+
+def _join_wave(det, start, n, young=True, names=NAMES):
+    out = []
+    for i in range(n):
+        now = start + i
+        age = (1 + i * 0.1) if young else 365 + i  # distinct creation hours: no cluster signal
+        out.append(det.on_join(G, 100 + i, now, created_at=now - age * DAY, name=names[i]))
+    return out
+
+
+def test_young_join_wave_starts_one_raid():
+    det = rd.RaidDetector()
+    n = max(rd.RAID_JOIN_RATE, rd.RAID_YOUNG_RATE)
+    verdicts = _join_wave(det, 1000.0, n + 3)
+    started = [i for i, v in enumerate(verdicts) if v.started]
+    assert started == [n - 1]
+    first = verdicts[n - 1]
+    assert first.active and any(r.startswith("young_joins=") for r in first.reasons)
+    # every young joiner of the window is reported once, then only the new ones
+    assert sorted(first.suspects) == [100 + i for i in range(n)]
+    assert [v.suspects for v in verdicts[n:]] == [(100 + i,) for i in range(n, n + 3)]
+    assert all(v.active for v in verdicts[n:])
+
+
+def test_organic_joins_do_not_trigger():
+    det = rd.RaidDetector()
+    verdicts = _join_wave(det, 1000.0, len(NAMES), young=False)
+    assert not any(v.active for v in verdicts)
+    assert not det.is_active(G, 1000.0 + len(NAMES))
+
+
+def test_repeated_greetings_alone_do_not_trigger():
+    det = rd.RaidDetector()
+    for i in range(4 * rd.RAID_DUP_AUTHORS):
+        assert not det.on_message(G, 100 + i, 7, 1000.0 + i, "selamat pagi semuanya").active
+
+
+def test_duplicated_link_messages_start_a_message_raid():
+    det = rd.RaidDetector()
+    # the first RAID_DUP_AUTHORS - 1 posts are not duplicates yet
+    need = rd.RAID_DUP_AUTHORS - 1 + 2 * rd.RAID_DUP_AUTHORS
+    verdicts = [det.on_message(G, 500 + i, 7, 2000.0 + i, "free nitro https://dlscord-gift.example/claim")
+                for i in range(need)]
+    assert [v.started for v in verdicts].index(True) == need - 1
+    assert any(r.startswith("dup_link_msgs=") for r in verdicts[-1].reasons)
+    assert 500 + need - 1 in verdicts[-1].suspects
+    assert det.is_active(G, 2000.0 + need)
+
+
+def test_cooldown_ends_the_raid_and_a_new_wave_restarts_it():
+    det = rd.RaidDetector()
+    n = max(rd.RAID_JOIN_RATE, rd.RAID_YOUNG_RATE)
+    last = 1000.0 + n + 1
+    _join_wave(det, 1000.0, n + 2)
+    assert det.is_active(G, last + rd.RAID_COOLDOWN_SEC - 1)
+    assert not det.is_active(G, last + rd.RAID_COOLDOWN_SEC)
+    later = last + rd.RAID_COOLDOWN_SEC + det.window
+    again = _join_wave(det, later, n, names=NAMES[::-1])
+    assert [v.started for v in again].count(True) == 1